@@ -0,0 +1,154 @@
+"""
+单张图像的分析中间结果缓存
+
+同一张图像上依次运行测量、锥度、孔壁轮廓和粗糙度分析时，行/列投影、水平线分组、
+高斯滤波、Canny、Sobel 梯度幅值、CLAHE、自适应阈值和孔壁轮廓只计算一次。
+
+结果按来源分为两类：由原始灰度图像得到的（image 类）和由二值图像得到的（binary 类）。
+调用 update(image, binary) 传入当前图像，数组对象变化时只清空对应一类的缓存
+（以对象身份判断，调用方替换数组而不是原地修改）。
+
+用法:
+    context = AnalysisContext()
+    context.update(original_image, binary_image)
+    lines = context.horizontal_lines(params['row_projection_threshold'])
+"""
+import numpy as np
+import cv2
+
+import perf_trace
+import hole_engine
+
+
+class AnalysisContext:
+    """按需计算并缓存一张图像的派生结果"""
+
+    def __init__(self, image=None, binary=None):
+        self._image = None
+        self._binary = None
+        self._image_cache = {}
+        self._binary_cache = {}
+        self.hits = 0
+        self.misses = 0
+        self.update(image, binary)
+
+    def update(self, image=None, binary=None):
+        """设置当前图像；对象与缓存时不同的一类结果会被清空"""
+        if image is not self._image:
+            self._image = image
+            self._image_cache.clear()
+        if binary is not self._binary:
+            self._binary = binary
+            self._binary_cache.clear()
+        return self
+
+    @property
+    def image(self):
+        return self._image
+
+    @property
+    def binary(self):
+        return self._binary
+
+    def clear(self):
+        """清空全部缓存（保留图像引用）"""
+        self._image_cache.clear()
+        self._binary_cache.clear()
+
+    def _memo(self, cache, key, factory):
+        if key in cache:
+            self.hits += 1
+            return cache[key]
+        self.misses += 1
+        with perf_trace.span(f'ctx_{key[0]}', 'cache'):
+            value = factory()
+        cache[key] = value
+        return value
+
+    def _source(self, source, roi):
+        if source is None:
+            raise ValueError("分析上下文中没有对应的图像")
+        if roi is None:
+            return source
+        y0, y1, x0, x1 = roi
+        return source[y0:y1, x0:x1]
+
+    def _image_op(self, name, params, roi, func):
+        key = (name, params, None if roi is None else tuple(int(v) for v in roi))
+        return self._memo(self._image_cache, key, lambda: func(self._source(self._image, roi)))
+
+    def _binary_op(self, name, params, func):
+        return self._memo(self._binary_cache, (name, params), lambda: func(self._source(self._binary, None)))
+
+    # ---- 二值图像派生结果 ----
+
+    def row_projection(self):
+        return self._binary_op('row_projection', (), lambda b: np.sum(b, axis=1))
+
+    def column_projection(self):
+        return self._binary_op('column_projection', (), lambda b: np.sum(b, axis=0))
+
+    def smooth_row_projection(self):
+        """5点平滑的行投影（与 hole_engine.smooth_row_projection 相同）"""
+        return self._binary_op('smooth_row_projection', (),
+                               lambda b: np.convolve(self.row_projection(), np.ones(5)/5, mode='same'))
+
+    def horizontal_lines(self, threshold_percent):
+        """显著水平线行号列表（与 hole_engine.find_horizontal_lines 相同）"""
+        return list(self._binary_op('horizontal_lines', (threshold_percent,),
+                                    lambda b: hole_engine.group_horizontal_lines(self.smooth_row_projection(),
+                                                                                 threshold_percent)))
+
+    def wall_profile(self, upper_surface_row, bottom_surface_row, hole_start, hole_end,
+                     pixel_to_um_x=1.0, pixel_to_um_y=1.0, **kwargs):
+        """逐行孔壁轮廓（见 hole_engine.extract_wall_profile）"""
+        params = (int(upper_surface_row), int(bottom_surface_row), int(hole_start), int(hole_end),
+                  float(pixel_to_um_x), float(pixel_to_um_y), tuple(sorted(kwargs.items())))
+        return self._binary_op('wall_profile', params,
+                               lambda b: hole_engine.extract_wall_profile(b, *params[:6], **kwargs))
+
+    # ---- 原始灰度图像派生结果（roi 为 (y0, y1, x0, x1)，None 表示整幅图像）----
+
+    def gaussian_blur(self, kernel_size, roi=None):
+        return self._image_op('gaussian_blur', (kernel_size,), roi,
+                              lambda img: cv2.GaussianBlur(img, (kernel_size, kernel_size), 0))
+
+    def canny(self, low, high, blur_kernel=0, roi=None):
+        """Canny 边缘，blur_kernel > 0 时先做高斯滤波（复用 gaussian_blur 的缓存）"""
+        def compute(img):
+            source = self.gaussian_blur(blur_kernel, roi) if blur_kernel > 0 else img
+            return cv2.Canny(source, low, high)
+        return self._image_op('canny', (low, high, blur_kernel), roi, compute)
+
+    def sobel_magnitude(self, ksize=3, roi=None):
+        def compute(img):
+            gx = cv2.Sobel(img, cv2.CV_32F, 1, 0, ksize=ksize)
+            gy = cv2.Sobel(img, cv2.CV_32F, 0, 1, ksize=ksize)
+            return cv2.magnitude(gx, gy)
+        return self._image_op('sobel_magnitude', (ksize,), roi, compute)
+
+    def clahe(self, clip_limit=2.0, tile_size=8, roi=None):
+        return self._image_op('clahe', (clip_limit, tile_size), roi,
+                              lambda img: cv2.createCLAHE(clip_limit, (tile_size, tile_size)).apply(img))
+
+    def adaptive_threshold(self, block_size, c, roi=None):
+        return self._image_op('adaptive_threshold', (block_size, c), roi,
+                              lambda img: cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                                                cv2.THRESH_BINARY, block_size, c))
+
+    # ---- 统计 ----
+
+    def nbytes(self):
+        """缓存的数组占用的字节数"""
+        total = 0
+        for cache in (self._image_cache, self._binary_cache):
+            for value in cache.values():
+                if isinstance(value, np.ndarray):
+                    total += value.nbytes
+                elif isinstance(value, dict):
+                    total += sum(v.nbytes for v in value.values() if isinstance(v, np.ndarray))
+        return total
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self._image_cache) + len(self._binary_cache), 'bytes': self.nbytes()}
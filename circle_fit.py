@@ -0,0 +1,595 @@
+"""
+批量圆拟合（向量化，多组点一次求解）
+
+多深度重建、自助法置信区间、RANSAC 等场景需要对几十到几千组点分别拟合圆。
+这里把 K 组点排成 (K, N, 2) 数组（点数不同的组用 mask 或 NaN 补齐），
+所有组的矩量用 einsum 一次算出，代数拟合直接由矩量得到闭式解或少量向量化牛顿迭代，
+几何拟合用解析雅可比矩阵的向量化 Levenberg-Marquardt 迭代，组数增加时耗时几乎不变。
+
+代数拟合:
+    kasa   最小化 Σ(x² + y² + Dx + Ey + F)²，最快，对圆弧较短的点集半径偏小
+    pratt  以梯度范数为约束的代数距离，偏差小于 Kåsa
+    taubin 以平均梯度范数为约束，统计偏差最小，适合作为几何拟合的初值
+Pratt/Taubin 采用 Chernov 的牛顿迭代求特征多项式的最小根。
+
+稳健拟合（robust_fit_circle）用 RANSAC/LMedS 一次评估数千个三点假设，找出离群点后只在内点上精化。
+增量拟合（IncrementalCircleFit）只保存代数拟合所需的幂和，逐组加入/删除点时 O(1) 更新，
+用于标记切片时实时显示直径和圆心。
+
+用法:
+    fits = fit_circles(points, mask, method='taubin')     # points: (K, N, 2)
+    fits = refine_circles(points, mask, initial=fits)     # 几何（正交距离）精化
+    print(fits.r, fits.rms)
+    fit, inliers = robust_fit_circle(points_2d, 'lmeds')  # 单个圆，inliers 为内点标记
+    live = IncrementalCircleFit(); live.update('slice-1', [[x1, y1], [x2, y2]]); live.fit()
+"""
+import math
+import warnings
+from collections import namedtuple
+from statistics import NormalDist
+
+import numpy as np
+
+ALGEBRAIC_METHODS = ('kasa', 'pratt', 'taubin')
+
+# cx, cy, r: (K,) 拟合结果；rms/max_abs: 点到圆的几何距离的均方根/最大绝对值；
+# count: 有效点数；iterations: 迭代次数（代数法为牛顿迭代，几何法为 LM 迭代）
+# 有效点少于3个或退化（共线）的组各字段为 NaN
+CircleFits = namedtuple('CircleFits', ['cx', 'cy', 'r', 'rms', 'max_abs', 'count', 'iterations'])
+
+# 牛顿/LM 迭代的默认最大次数
+_NEWTON_ITERATIONS = 20
+_LM_ITERATIONS = 50
+
+
+def as_batch(points, mask=None):
+    """
+    把 (N, 2) 或 (K, N, 2) 点集整理为 (K, N) 的 x、y 和有效标记
+
+    mask 为 False 或坐标非有限的点视为缺失，缺失点坐标置 0
+    """
+    points = np.asarray(points, dtype=float)
+    if points.ndim == 2:
+        points = points[None]
+    if points.ndim != 3 or points.shape[2] != 2:
+        raise ValueError(f"点集形状应为 (N, 2) 或 (K, N, 2)，得到 {points.shape}")
+    valid = np.isfinite(points).all(axis=2)
+    if mask is not None:
+        valid &= np.asarray(mask, dtype=bool).reshape(valid.shape)
+    x = np.where(valid, points[..., 0], 0.0)
+    y = np.where(valid, points[..., 1], 0.0)
+    return x, y, valid
+
+
+def _moments(x, y, valid):
+    """
+    各组相对质心的矩量
+
+    返回:
+        (质心 x, 质心 y, 有效点数, 矩量字典)；矩量为对有效点的平均值
+    """
+    w = valid.astype(float)
+    count = w.sum(axis=1)
+    safe = np.maximum(count, 1)
+    mean_x = np.einsum('kn,kn->k', w, x) / safe
+    mean_y = np.einsum('kn,kn->k', w, y) / safe
+    u = (x - mean_x[:, None]) * w
+    v = (y - mean_y[:, None]) * w
+    z = u * u + v * v
+    m = {'xx': np.einsum('kn,kn->k', u, u) / safe,
+         'yy': np.einsum('kn,kn->k', v, v) / safe,
+         'xy': np.einsum('kn,kn->k', u, v) / safe,
+         'xz': np.einsum('kn,kn->k', u, z) / safe,
+         'yz': np.einsum('kn,kn->k', v, z) / safe,
+         'zz': np.einsum('kn,kn->k', z, z) / safe}
+    return mean_x, mean_y, count, m
+
+
+def _newton_root(coefficients, derivative, iterations):
+    """
+    从 0 开始对每组的特征多项式做向量化牛顿迭代，函数值不再下降的组停止
+
+    参数:
+        coefficients: 返回多项式值的函数 f(root)
+        derivative: 返回导数的函数 f'(root)
+    返回:
+        (根, 每组迭代次数)
+    """
+    root = np.zeros_like(derivative(0.0))
+    value = coefficients(root)
+    active = np.isfinite(value)
+    steps = np.zeros(root.shape, dtype=int)
+    for _ in range(iterations):
+        if not active.any():
+            break
+        with np.errstate(invalid='ignore', divide='ignore'):
+            candidate = root - value / derivative(root)
+        new_value = coefficients(candidate)
+        improved = active & np.isfinite(candidate) & (np.abs(new_value) < np.abs(value))
+        converged = improved & (np.abs(candidate - root) <= 1e-12 * np.maximum(np.abs(candidate), 1.0))
+        root = np.where(improved, candidate, root)
+        value = np.where(improved, new_value, value)
+        steps += improved
+        active = improved & ~converged
+    return root, steps
+
+
+def _algebraic(x, y, valid, method, iterations):
+    mean_x, mean_y, count, m = _moments(x, y, valid)
+    return _solve_moments(mean_x, mean_y, count, m, method, iterations)
+
+
+def _solve_moments(mean_x, mean_y, count, m, method, iterations):
+    """由质心和中心矩量（见 _moments）求各组的代数拟合圆，返回 (cx, cy, r, count, steps)"""
+    mxx, myy, mxy, mxz, myz, mzz = m['xx'], m['yy'], m['xy'], m['xz'], m['yz'], m['zz']
+    mz = mxx + myy
+    cov_xy = mxx * myy - mxy * mxy
+    steps = np.zeros(len(count), dtype=int)
+
+    if method == 'kasa':
+        root = np.zeros_like(mz)
+    elif method == 'pratt':
+        a2 = 4 * cov_xy - 3 * mz * mz - mzz
+        a1 = mzz * mz + 4 * cov_xy * mz - mxz * mxz - myz * myz - mz * mz * mz
+        a0 = mxz * mxz * myy + myz * myz * mxx - mzz * cov_xy - 2 * mxz * myz * mxy + mz * mz * cov_xy
+        root, steps = _newton_root(lambda t: a0 + t * (a1 + t * (a2 + 4 * t * t)),
+                                   lambda t: a1 + t * (2 * a2 + 16 * t * t), iterations)
+    elif method == 'taubin':
+        var_z = mzz - mz * mz
+        a3 = 4 * mz
+        a2 = -3 * mz * mz - mzz
+        a1 = var_z * mz + 4 * cov_xy * mz - mxz * mxz - myz * myz
+        a0 = mxz * (mxz * myy - myz * mxy) + myz * (myz * mxx - mxz * mxy) - var_z * cov_xy
+        root, steps = _newton_root(lambda t: a0 + t * (a1 + t * (a2 + t * a3)),
+                                   lambda t: a1 + t * (2 * a2 + 3 * a3 * t), iterations)
+    else:
+        raise ValueError(f"未知的拟合方法: {method}")
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        det = root * root - root * mz + cov_xy
+        center_u = (mxz * (myy - root) - myz * mxy) / det / 2
+        center_v = (myz * (mxx - root) - mxz * mxy) / det / 2
+        extra = 2 * root if method == 'pratt' else 0.0
+        r = np.sqrt(center_u * center_u + center_v * center_v + mz + extra)
+    # 点数不足或退化（共线）的组
+    scale = np.maximum(mz * mz, 1e-300)
+    bad = (count < 3) | ~np.isfinite(r) | (np.abs(det) <= 1e-12 * scale)
+    cx = np.where(bad, np.nan, mean_x + center_u)
+    cy = np.where(bad, np.nan, mean_y + center_v)
+    r = np.where(bad, np.nan, r)
+    return cx, cy, r, count, steps
+
+
+def residual_stats(x, y, valid, cx, cy, r):
+    """几何距离残差的均方根和最大绝对值（缺失点不计）"""
+    residual = circle_residuals(np.stack([x, y], axis=-1), cx, cy, r, valid)
+    if residual.shape[1] == 0:
+        return np.full(len(residual), np.nan), np.full(len(residual), np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # 全部缺失的组
+        rms = np.sqrt(np.nanmean(residual ** 2, axis=1))
+        max_abs = np.nanmax(np.abs(residual), axis=1)
+    return rms, max_abs
+
+
+def fit_circles(points, mask=None, method='kasa', iterations=_NEWTON_ITERATIONS):
+    """
+    批量代数拟合圆
+
+    参数:
+        points: (K, N, 2) 或 (N, 2) 点集
+        mask: (K, N) 布尔数组，False 的点不参与拟合；NaN 坐标自动忽略
+        method: 'kasa'、'pratt' 或 'taubin'
+
+    返回:
+        CircleFits，各字段为 (K,) 数组
+    """
+    x, y, valid = as_batch(points, mask)
+    cx, cy, r, count, steps = _algebraic(x, y, valid, method, iterations)
+    rms, max_abs = residual_stats(x, y, valid, cx, cy, r)
+    return CircleFits(cx, cy, r, rms, max_abs, count.astype(int), steps)
+
+
+def refine_circles(points, mask=None, initial=None, max_iterations=_LM_ITERATIONS, tolerance=1e-10):
+    """
+    向量化 Levenberg-Marquardt 几何拟合：最小化各点到圆的正交距离平方和
+
+    所有组同时迭代，雅可比矩阵解析计算（∂d/∂cx = -(x-cx)/ρ，∂d/∂cy = -(y-cy)/ρ，∂d/∂r = -1），
+    每组有独立的阻尼系数，代价不再明显下降的组停止更新。
+
+    参数:
+        initial: 初值（CircleFits 或 (cx, cy, r) 数组元组），默认用 Taubin 拟合
+        tolerance: 代价的相对下降小于该值时视为收敛
+
+    返回:
+        CircleFits（iterations 为各组接受的 LM 步数）
+    """
+    x, y, valid = as_batch(points, mask)
+    if initial is None:
+        initial = fit_circles(points, mask, method='taubin')
+    cx, cy, r = (np.array(v, dtype=float, copy=True) for v in initial[:3])
+    w = valid.astype(float)
+    count = w.sum(axis=1)
+
+    def evaluate(rows, cx, cy, r):
+        """rows 组在 (cx, cy, r) 处的坐标差、距离和加权残差"""
+        dx = x[rows] - cx[:, None]
+        dy = y[rows] - cy[:, None]
+        rho = np.hypot(dx, dy)
+        residual = (rho - r[:, None]) * w[rows]
+        return dx, dy, rho, residual
+
+    active = np.isfinite(cx) & np.isfinite(cy) & np.isfinite(r) & (count >= 3)
+    damping = np.full(len(cx), 1e-3)
+    steps = np.zeros(len(cx), dtype=int)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(max_iterations):
+            # 只计算尚未收敛的组
+            rows = np.flatnonzero(active)
+            if len(rows) == 0:
+                break
+            dx, dy, rho, residual = evaluate(rows, cx[rows], cy[rows], r[rows])
+            cost = np.einsum('kn,kn->k', residual, residual)
+            safe_rho = np.where(rho > 0, rho, 1.0)
+            # 雅可比矩阵的列为 (-gx, -gy, -w)，JᵀJ 和 Jᵀr 直接由逐组求和得到
+            wk = w[rows]
+            gx = dx / safe_rho * wk
+            gy = dy / safe_rho * wk
+            sxx, sxy, syy = (np.einsum('kn,kn->k', a, b) for a, b in ((gx, gx), (gx, gy), (gy, gy)))
+            sx, sy, sn = gx.sum(axis=1), gy.sum(axis=1), count[rows]
+            jtj = np.stack([np.stack([sxx, sxy, sx], -1),
+                            np.stack([sxy, syy, sy], -1),
+                            np.stack([sx, sy, sn], -1)], -2)
+            jtr = -np.stack([np.einsum('kn,kn->k', gx, residual), np.einsum('kn,kn->k', gy, residual),
+                             residual.sum(axis=1)], -1)
+            diagonal = np.stack([sxx, syy, sn], -1)
+            system = jtj + (damping[rows, None] * np.maximum(diagonal, 1e-12))[:, :, None] * np.eye(3)
+            solvable = np.abs(np.linalg.det(system)) > 0
+            delta = np.zeros((len(rows), 3))
+            if solvable.any():
+                delta[solvable] = np.linalg.solve(system[solvable], -jtr[solvable][..., None])[..., 0]
+
+            new_cx, new_cy, new_r = cx[rows] + delta[:, 0], cy[rows] + delta[:, 1], r[rows] + delta[:, 2]
+            new_residual = evaluate(rows, new_cx, new_cy, new_r)[3]
+            new_cost = np.einsum('kn,kn->k', new_residual, new_residual)
+            accept = solvable & (new_cost < cost)
+            # 代价的相对变化足够小（无论是否接受）即视为收敛
+            converged = np.abs(cost - new_cost) <= tolerance * np.maximum(cost, 1e-300)
+            cx[rows] = np.where(accept, new_cx, cx[rows])
+            cy[rows] = np.where(accept, new_cy, cy[rows])
+            r[rows] = np.where(accept, new_r, r[rows])
+            steps[rows] += accept
+            # 接受则减小阻尼（更接近高斯-牛顿），拒绝则增大阻尼（更接近梯度下降）
+            damping[rows] = np.where(accept, damping[rows] / 10, damping[rows] * 10)
+            active[rows] = ~converged & solvable & (damping[rows] < 1e12)
+
+    r = np.abs(r)
+    rms, max_abs = residual_stats(x, y, valid, cx, cy, r)
+    return CircleFits(cx, cy, r, rms, max_abs, count.astype(int), steps)
+
+
+def circle_residuals(points, cx, cy, r, mask=None):
+    """
+    各点到圆的几何距离（点在圆外为正）
+
+    参数:
+        points: (K, N, 2) 或 (N, 2)
+        cx, cy, r: (K,) 数组或标量
+
+    返回:
+        (K, N) 数组，缺失点为 NaN
+    """
+    x, y, valid = as_batch(points, mask)
+    cx, cy, r = (np.atleast_1d(np.asarray(v, dtype=float)) for v in (cx, cy, r))
+    residual = np.hypot(x - cx[:, None], y - cy[:, None]) - r[:, None]
+    return np.where(valid, residual, np.nan)
+
+
+# 稳健拟合方法与尺度估计的常数：正态分布下 1.4826 × 中位绝对残差 ≈ 标准差，
+# 内点阈值取 3.5 倍标准差（只有横向噪声时径向残差的中位数偏小，阈值过紧会误判正常切片）
+ROBUST_METHODS = ('ransac', 'lmeds')
+_MAD_TO_SIGMA = 1.4826
+_ROBUST_CUTOFF = 3.5
+
+
+def circles_from_triplets(points, triplets):
+    """
+    三点确定的外接圆（向量化）
+
+    参数:
+        points: (N, 2)
+        triplets: (H, 3) 点序号
+
+    返回:
+        (cx, cy, r)，各为 (H,) 数组；三点共线的假设为 NaN
+    """
+    a, b, c = (points[triplets[:, i]] for i in range(3))
+    # 以 a 为原点求解，减小大坐标下的舍入误差
+    bx, by = b[:, 0] - a[:, 0], b[:, 1] - a[:, 1]
+    cx_, cy_ = c[:, 0] - a[:, 0], c[:, 1] - a[:, 1]
+    d = 2 * (bx * cy_ - by * cx_)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        b2, c2 = bx * bx + by * by, cx_ * cx_ + cy_ * cy_
+        ux = (cy_ * b2 - by * c2) / d
+        uy = (bx * c2 - cx_ * b2) / d
+    degenerate = np.abs(d) <= 1e-12 * np.maximum(b2 + c2, 1e-300)
+    ux[degenerate] = np.nan
+    uy[degenerate] = np.nan
+    return a[:, 0] + ux, a[:, 1] + uy, np.hypot(ux, uy)
+
+
+def robust_fit_circle(points, method='ransac', threshold=None, hypotheses=2000, seed=0, max_points=None):
+    """
+    RANSAC / LMedS 稳健拟合单个圆，找出离群点
+
+    一次随机生成全部三点假设，所有假设对所有点的残差作为 (假设数, 点数) 数组一次算出：
+        ransac  内点数最多的假设（相同内点数时取截断残差和最小者，即 MSAC 评分）
+        lmeds   残差平方中位数最小的假设
+    再用 refine_circles 只在内点上做几何精化。
+
+    参数:
+        points: (N, 2) 点集
+        method: 'ransac' 或 'lmeds'
+        threshold: 内点的距离阈值（与坐标同单位）；默认由最优 LMedS 假设的稳健尺度估计
+        hypotheses: 三点假设数
+        seed: 随机种子（同一数据每次得到相同结果）
+        max_points: 点数超过该值时仅用随机子集评分（精化仍使用全部点）
+
+    返回:
+        (CircleFits（长度为1）, 内点布尔数组 (N,))
+    """
+    if method not in ROBUST_METHODS:
+        raise ValueError(f"未知的稳健拟合方法: {method}")
+    points = np.asarray(points, dtype=float)
+    finite = np.isfinite(points).all(axis=1)
+    n = int(finite.sum())
+    if n < 3:
+        raise ValueError("至少需要3个点才能拟合圆")
+    index = np.flatnonzero(finite)
+    rng = np.random.default_rng(seed)
+
+    # 三点假设：每行三个不同的点
+    triplets = np.stack([rng.integers(0, n, hypotheses) for _ in range(3)], axis=1)
+    distinct = (triplets[:, 0] != triplets[:, 1]) & (triplets[:, 0] != triplets[:, 2]) & (triplets[:, 1] != triplets[:, 2])
+    triplets = index[triplets[distinct]]
+    hx, hy, hr = circles_from_triplets(points, triplets)
+    usable = np.isfinite(hr)
+    if not usable.any():
+        raise ValueError("点集退化（共线），无法拟合圆")
+    hx, hy, hr = hx[usable], hy[usable], hr[usable]
+
+    scored = index if max_points is None or n <= max_points else rng.choice(index, max_points, replace=False)
+    residual = np.abs(np.hypot(points[scored, 0][None, :] - hx[:, None],
+                               points[scored, 1][None, :] - hy[:, None]) - hr[:, None])   # (H, N)
+    median = np.median(residual, axis=1)
+    best = int(np.argmin(median))
+    auto_threshold = threshold is None
+    if auto_threshold:
+        # 稳健尺度（有限样本修正），保证至少覆盖一半的点
+        scale = _MAD_TO_SIGMA * (1 + 5.0 / max(len(scored) - 3, 1)) * median[best]
+        threshold = max(_ROBUST_CUTOFF * scale, 1e-9)
+    if method == 'ransac':
+        truncated = np.minimum(residual, threshold)
+        inlier_counts = (residual < threshold).sum(axis=1)
+        # 内点数优先，其次截断残差和
+        best = int(np.lexsort((truncated.sum(axis=1), -inlier_counts))[0])
+
+    all_residual = np.abs(np.hypot(points[:, 0] - hx[best], points[:, 1] - hy[best]) - hr[best])
+    inliers = finite & (all_residual < threshold)
+    if inliers.sum() < 3:
+        inliers = finite
+    fit = refine_circles(points, inliers[None, :], initial=fit_circles(points, inliers[None, :], method='taubin'))
+    # 精化后重新判定内点；自动阈值时按精化结果重新估计尺度（最优假设的中位数偏小）
+    final_residual = np.abs(circle_residuals(points, fit.cx, fit.cy, fit.r)[0])
+    if auto_threshold:
+        threshold = max(_ROBUST_CUTOFF * _MAD_TO_SIGMA * np.median(final_residual[finite]), 1e-9)
+    inliers = finite & (final_residual < threshold)
+    return fit, inliers
+
+
+UNCERTAINTY_METHODS = ('bootstrap', 'jackknife')
+
+
+def _group_table(groups):
+    """把每个点所属的组号整理为 (组数, 最大组大小) 的点序号表，空位为 -1"""
+    groups = np.asarray(groups)
+    labels, inverse = np.unique(groups, return_inverse=True)
+    sizes = np.bincount(inverse, minlength=len(labels))
+    table = np.full((len(labels), sizes.max()), -1, dtype=int)
+    order = np.argsort(inverse, kind='stable')
+    slots = np.arange(len(order)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    table[inverse[order], slots] = order
+    return table
+
+
+def _fit_batch(points, mask, method, refine):
+    fits = fit_circles(points, mask, method=method)
+    if refine:
+        fits = refine_circles(points, mask, initial=fits)
+    return fits
+
+
+def circle_uncertainty(points, groups=None, method='bootstrap', samples=1000, fit_method='kasa', refine=False,
+                       confidence=0.95, seed=0):
+    """
+    圆拟合结果的置信区间（按组重采样，如OCT的每张切片两个端点为一组）
+
+    所有重采样的点集排成 (重采样数, 点数, 2) 一次用批量内核拟合：
+        bootstrap  有放回地抽取与原数据相同数量的组，取各统计量的百分位区间
+        jackknife  依次去掉一组，按刀切法方差求标准误，区间为 估计值 ± z × 标准误
+
+    参数:
+        points: (N, 2) 点集（非有限值的点忽略）
+        groups: (N,) 每个点所属的组，默认每个点单独一组
+        samples: bootstrap 的重采样次数
+        fit_method, refine: 每次重采样的拟合方式（见 fit_circles / refine_circles）
+        confidence: 置信水平
+
+    返回:
+        字典：method、confidence、samples（有效重采样数）、failed、
+        diameter/cx/cy 各为 {'estimate', 'low', 'high', 'se'}，diameters（各重采样的直径数组）
+    """
+    if method not in UNCERTAINTY_METHODS:
+        raise ValueError(f"未知的不确定度方法: {method}")
+    points = np.asarray(points, dtype=float)
+    groups = np.arange(len(points)) if groups is None else np.asarray(groups)
+    table = _group_table(groups)
+    group_count = len(table)
+    if group_count < 3:
+        raise ValueError("至少需要3组数据才能估计置信区间")
+    full = _fit_batch(points, None, fit_method, refine)
+    estimate = {'cx': full.cx[0], 'cy': full.cy[0], 'diameter': 2 * full.r[0]}
+
+    if method == 'bootstrap':
+        rng = np.random.default_rng(seed)
+        chosen = rng.integers(0, group_count, (samples, group_count))
+        index = table[chosen].reshape(samples, -1)                      # (B, 组数×组大小)
+    else:
+        # 第 i 行去掉第 i 组
+        keep = ~np.eye(group_count, dtype=bool)
+        index = np.where(keep[:, :, None], table[None], -1).reshape(group_count, -1)
+    mask = index >= 0
+    fits = _fit_batch(points[np.maximum(index, 0)], mask, fit_method, refine)
+
+    values = {'cx': fits.cx, 'cy': fits.cy, 'diameter': 2 * fits.r}
+    ok = np.isfinite(fits.r)
+    alpha = 1 - confidence
+    result = {'method': method, 'confidence': confidence, 'samples': int(ok.sum()), 'failed': int((~ok).sum()),
+              'diameters': values['diameter'][ok]}
+    for name, value in values.items():
+        value = value[ok]
+        if method == 'bootstrap':
+            low, high = np.percentile(value, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+            se = float(np.std(value, ddof=1))
+        else:
+            n = len(value)
+            se = float(np.sqrt((n - 1) / n * np.sum((value - value.mean()) ** 2)))
+            z = NormalDist().inv_cdf(1 - alpha / 2)
+            low, high = estimate[name] - z * se, estimate[name] + z * se
+        result[name] = {'estimate': float(estimate[name]), 'low': float(low), 'high': float(high), 'se': se}
+    return result
+
+
+# 增量拟合保存的幂和 Σuᵃvᵇ（a + b ≤ 4，共15项；u、v 为相对固定原点的坐标）
+_POWERS = tuple((a, b) for a in range(5) for b in range(5 - a))
+
+
+class IncrementalCircleFit:
+    """
+    可逐组增删点的代数圆拟合（如OCT每标记一张切片加入两个端点）
+
+    只保存 Σuᵃvᵇ（a + b ≤ 4）这15个幂和，加入或删除一组点只需把该组的幂和加上或减去，
+    拟合时由幂和换算出与 _moments 相同的中心矩量，再用与 fit_circles 相同的闭式解/牛顿迭代求圆，
+    耗时与已有点数无关。坐标相对第一个加入的点，避免四次幂和的有效数字损失。
+
+    参数:
+        method: 代数拟合方法（见 ALGEBRAIC_METHODS）
+    """
+
+    def __init__(self, method='kasa'):
+        if method not in ALGEBRAIC_METHODS:
+            raise ValueError(f"未知的拟合方法: {method}")
+        self.method = method
+        self.origin = None
+        self._sums = np.zeros(len(_POWERS))
+        self._groups = {}  # 键 -> (点, 幂和)
+        self._last = None  # 上一次几何精化的结果，作为下一次的初值
+
+    def __len__(self):
+        return len(self._groups)
+
+    def __contains__(self, key):
+        return key in self._groups
+
+    @property
+    def count(self):
+        """当前的点数"""
+        return int(round(self._sums[0]))
+
+    def _power_sums(self, points):
+        u = points[:, 0] - self.origin[0]
+        v = points[:, 1] - self.origin[1]
+        return np.array([np.sum(u ** a * v ** b) for a, b in _POWERS])
+
+    def update(self, key, points):
+        """加入或替换键为 key 的一组点（(n, 2)，非有限值的点忽略）；points 为空时等同于 remove"""
+        self.remove(key)
+        points = np.asarray(points if points is not None else [], dtype=float).reshape(-1, 2)
+        points = points[np.isfinite(points).all(axis=1)]
+        if len(points) == 0:
+            return
+        if self.origin is None:
+            self.origin = points[0].copy()
+        sums = self._power_sums(points)
+        self._groups[key] = (points, sums)
+        self._sums += sums
+
+    def remove(self, key):
+        """删除键为 key 的一组点（不存在时忽略）"""
+        group = self._groups.pop(key, None)
+        if group is None:
+            return
+        self._sums -= group[1]
+        if not self._groups:
+            # 全部删除后清零，消除加减累积的舍入误差
+            self.clear()
+
+    def clear(self):
+        self.origin = None
+        self._sums[:] = 0
+        self._groups.clear()
+        self._last = None
+
+    def points(self):
+        """当前全部点 (N, 2)"""
+        if not self._groups:
+            return np.empty((0, 2))
+        return np.concatenate([points for points, _ in self._groups.values()])
+
+    def _central_moments(self):
+        """由幂和换算质心和中心矩量 E[(u-ū)ᵃ(v-v̄)ᵇ]（二项式展开）"""
+        count = self._sums[0]
+        raw = dict(zip(_POWERS, self._sums / count))
+        mean_u, mean_v = raw[(1, 0)], raw[(0, 1)]
+
+        def central(a, b):
+            return sum(math.comb(a, i) * math.comb(b, j) * (-mean_u) ** (a - i) * (-mean_v) ** (b - j) * raw[(i, j)]
+                       for i in range(a + 1) for j in range(b + 1))
+
+        m = {'xx': central(2, 0), 'yy': central(0, 2), 'xy': central(1, 1),
+             'xz': central(3, 0) + central(1, 2), 'yz': central(2, 1) + central(0, 3),
+             'zz': central(4, 0) + 2 * central(2, 2) + central(0, 4)}
+        return mean_u + self.origin[0], mean_v + self.origin[1], count, m
+
+    def fit(self):
+        """
+        当前点集的代数拟合
+
+        返回:
+            (cx, cy, r)；点数少于3个或退化时为 NaN
+        """
+        if self.count < 3:
+            return (np.nan, np.nan, np.nan)
+        mean_x, mean_y, count, m = self._central_moments()
+        cx, cy, r, _, _ = _solve_moments(np.array([mean_x]), np.array([mean_y]), np.array([count]),
+                                         {name: np.array([value]) for name, value in m.items()},
+                                         self.method, _NEWTON_ITERATIONS)
+        return (float(cx[0]), float(cy[0]), float(r[0]))
+
+    def refine(self, max_iterations=_LM_ITERATIONS):
+        """
+        几何（正交距离）精化，以上一次精化结果为初值（点集变化不大时只需一两步 LM），
+        没有可用的上一次结果时以代数拟合为初值
+
+        返回:
+            CircleFits（各字段为单元素数组）；点数不足时为 None
+        """
+        initial = self._last if self._last is not None and np.isfinite(self._last.r[0]) else None
+        if initial is None:
+            cx, cy, r = self.fit()
+            if not np.isfinite(r):
+                return None
+            initial = (np.array([cx]), np.array([cy]), np.array([r]))
+        fits = refine_circles(self.points(), initial=initial, max_iterations=max_iterations)
+        self._last = fits
+        return fits
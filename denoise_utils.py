@@ -0,0 +1,172 @@
+import numpy as np
+import cv2
+
+import perf_trace
+
+# 去噪档位，按计算代价从低到高排列
+# gain 为"高斯预滤波 + 该档位"对原始噪声标准差的大致抑制倍数（在含噪截面图上标定），用于自动选择
+DENOISE_TIERS = ['none', 'median', 'bilateral', 'nlm_fast', 'nlm']
+DENOISE_TIER_GAIN = {
+    'none': 3.5,
+    'median': 5.5,
+    'bilateral': 7.5,
+    'nlm_fast': 10.0,
+    'nlm': 11.5,
+}
+DENOISE_TIER_NAMES = {
+    'none': '不去噪',
+    'median': '中值滤波',
+    'bilateral': '中值+双边滤波',
+    'nlm_fast': '降采样非局部均值',
+    'nlm': '完整非局部均值',
+}
+
+# 噪声估计时最多使用的像素数，超过时按步长抽样
+_MAX_ESTIMATE_PIXELS = 1 << 20
+# 椒盐噪声比例超过该值时至少使用中值滤波
+_IMPULSE_RATIO_THRESHOLD = 0.002
+
+# Immerkær 噪声估计算子，其系数平方和为36
+_NOISE_KERNEL = np.array([[1, -2, 1],
+                          [-2, 4, -2],
+                          [1, -2, 1]], dtype=np.float32)
+
+
+def _sample_for_estimate(image):
+    """大图按步长抽样，保持单像素噪声统计不变"""
+    h, w = image.shape[:2]
+    step = int(np.ceil(np.sqrt(h * w / _MAX_ESTIMATE_PIXELS)))
+    if step > 1:
+        return image[::step, ::step]
+    return image
+
+
+def estimate_noise_sigma(image):
+    """
+    使用拉普拉斯残差的中位数绝对偏差(MAD)快速估计高斯噪声标准差
+
+    参数:
+        image: 灰度图像 (uint8)
+
+    返回:
+        噪声标准差估计值（灰度级）
+    """
+    sample = _sample_for_estimate(image)
+    if sample.shape[0] < 3 or sample.shape[1] < 3:
+        return 0.0
+
+    response = cv2.filter2D(sample.astype(np.float32), -1, _NOISE_KERNEL,
+                            borderType=cv2.BORDER_REFLECT)[1:-1, 1:-1]
+    mad = np.median(np.abs(response - np.median(response)))
+    return float(1.4826 * mad / 6.0)
+
+
+def estimate_impulse_ratio(image):
+    """估计椒盐噪声像素所占比例（与3x3中值相差很大的饱和像素）"""
+    sample = _sample_for_estimate(image)
+    if sample.size == 0:
+        return 0.0
+
+    median = cv2.medianBlur(np.ascontiguousarray(sample), 3)
+    saturated = (sample == 0) | (sample == 255)
+    outlier = np.abs(sample.astype(np.int16) - median.astype(np.int16)) > 64
+    return float(np.count_nonzero(saturated & outlier)) / sample.size
+
+
+def estimate_snr(image, sigma=None):
+    """
+    估计图像信噪比：稳健的灰度动态范围(1%~99%分位)与噪声标准差之比
+    """
+    if sigma is None:
+        sigma = estimate_noise_sigma(image)
+    sample = _sample_for_estimate(image)
+    low, high = np.percentile(sample, [1, 99])
+    signal = max(float(high - low), 1.0)
+    return signal / max(sigma, 1e-3)
+
+
+@perf_trace.traced('noise_estimate')
+def analyze_noise(image):
+    """
+    返回噪声分析结果字典: sigma, snr, impulse_ratio
+    """
+    sigma = estimate_noise_sigma(image)
+    return {
+        'sigma': sigma,
+        'snr': estimate_snr(image, sigma),
+        'impulse_ratio': estimate_impulse_ratio(image),
+    }
+
+
+def select_denoise_tier(image, target_snr=60.0, noise_info=None):
+    """
+    选择满足目标信噪比的最便宜去噪档位
+
+    参数:
+        image: 原始灰度图像（高斯滤波之前，噪声估计更准确）
+        target_snr: 目标信噪比
+        noise_info: 可选，已计算好的 analyze_noise 结果
+
+    返回:
+        (档位名称, 噪声分析结果字典)
+    """
+    if noise_info is None:
+        noise_info = analyze_noise(image)
+
+    snr = noise_info['snr']
+    min_index = 0
+    if noise_info['impulse_ratio'] > _IMPULSE_RATIO_THRESHOLD:
+        # 椒盐噪声会干扰其他滤波器，先保证中值滤波
+        min_index = DENOISE_TIERS.index('median')
+
+    for tier in DENOISE_TIERS[min_index:]:
+        if snr * DENOISE_TIER_GAIN[tier] >= target_snr:
+            return tier, noise_info
+    return DENOISE_TIERS[-1], noise_info
+
+
+def apply_denoise(image, tier):
+    """
+    按指定档位对灰度图像去噪
+
+    参数:
+        image: 灰度图像 (uint8)
+        tier: DENOISE_TIERS 中的档位名称
+
+    返回:
+        去噪后的图像（tier为'none'时直接返回输入）
+    """
+    if tier not in DENOISE_TIER_GAIN:
+        raise ValueError(f"未知的去噪档位: {tier}")
+
+    if tier == 'none':
+        return image
+
+    with perf_trace.span(f'denoise_{tier}'):
+        return _apply_denoise(image, tier)
+
+
+def _apply_denoise(image, tier):
+    """apply_denoise 的具体实现（tier 不为 'none'）"""
+    # 中值滤波去除椒盐噪声
+    result = cv2.medianBlur(image, 5)
+
+    if tier == 'median':
+        return result
+
+    if tier == 'bilateral':
+        # 双边滤波保留边缘
+        return cv2.bilateralFilter(result, 9, 75, 75)
+
+    if tier == 'nlm_fast':
+        # 在半分辨率图像上进行非局部均值去噪，再放大回原尺寸
+        h, w = result.shape[:2]
+        if h < 64 or w < 64:
+            return cv2.fastNlMeansDenoising(result, None, 10, 7, 21)
+        small = cv2.pyrDown(result)
+        small = cv2.fastNlMeansDenoising(small, None, 10, 7, 21)
+        return cv2.resize(small, (w, h), interpolation=cv2.INTER_LINEAR)
+
+    # 完整流程：中值 + 双边 + 全分辨率非局部均值
+    result = cv2.bilateralFilter(result, 9, 75, 75)
+    return cv2.fastNlMeansDenoising(result, None, 10, 7, 21)
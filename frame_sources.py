@@ -0,0 +1,163 @@
+"""
+流式帧来源
+
+把视频文件、编号图像序列和多页TIFF统一为按顺序产生 Frame(index, timestamp, image) 的生成器，
+每次只解码一帧（多页TIFF按小块读取），内存占用与帧数无关。image 为灰度 uint8 图像。
+
+用法:
+    for frame in open_source('drilling.mp4', step=5):
+        binary, detection = hole_engine.measure_image(frame.image, params)
+"""
+import os
+import re
+import glob
+from collections import namedtuple
+
+import cv2
+
+import image_io
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.wmv', '.m4v', '.mpg', '.mpeg')
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+# 多页TIFF每次读取的页数（OpenCV 每次调用都从文件开头定位，逐页读取会变成平方复杂度）
+TIFF_CHUNK_PAGES = 16
+
+Frame = namedtuple('Frame', ['index', 'timestamp', 'image'])
+
+
+def _to_gray(image):
+    if image is None or image.ndim == 2:
+        return image
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def _timestamp(index, fps):
+    return index / fps if fps else None
+
+
+def iter_video(path, step=1, start=0, stop=None):
+    """
+    逐帧读取视频
+
+    参数:
+        step: 每隔 step 帧取一帧（跳过的帧只 grab 不解码）
+        start, stop: 帧号范围，stop 为 None 表示读到结尾
+
+    产生:
+        Frame，timestamp 为视频中的时间（秒）
+    """
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise IOError(f"无法打开视频: {path}")
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or None
+        if start > 0:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+        index = start
+        while stop is None or index < stop:
+            if (index - start) % step == 0:
+                ok, image = capture.read()
+                if not ok:
+                    break
+                position_ms = capture.get(cv2.CAP_PROP_POS_MSEC)
+                timestamp = position_ms / 1000.0 if position_ms > 0 else _timestamp(index, fps)
+                yield Frame(index, timestamp, _to_gray(image))
+            elif not capture.grab():
+                break
+            index += 1
+    finally:
+        capture.release()
+
+
+def _natural_key(path):
+    """按文件名中的数字大小排序（frame_2 排在 frame_10 之前）"""
+    name = os.path.basename(path)
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name)]
+
+
+def sequence_paths(source):
+    """
+    解析图像序列
+
+    参数:
+        source: 文件夹、通配符（如 frames/*.png）或 printf 格式（如 frames/img_%04d.png）
+
+    返回:
+        按编号排序的文件路径列表
+    """
+    if os.path.isdir(source):
+        paths = [os.path.join(source, f) for f in os.listdir(source) if f.lower().endswith(image_io.IMAGE_EXTENSIONS)]
+    elif re.search(r'%0?\d*d', source):
+        match = re.search(r'%0?\d*d', source)
+        prefix, suffix = source[:match.start()], source[match.end():]
+        paths = [p for p in glob.glob(glob.escape(prefix) + '*' + glob.escape(suffix))
+                 if p[len(prefix):len(p) - len(suffix)].isdigit()]
+    else:
+        paths = glob.glob(source)
+    return sorted(paths, key=_natural_key)
+
+
+def iter_image_sequence(source, step=1, start=0, stop=None, fps=None):
+    """
+    逐张读取编号图像序列（参数含义同 iter_video），fps 给定时按帧号换算时间戳
+
+    无法读取的文件产生 image 为 None 的帧，由调用方记录失败
+    """
+    paths = sequence_paths(source)
+    for index in range(start, len(paths) if stop is None else min(stop, len(paths)), step):
+        yield Frame(index, _timestamp(index, fps), image_io.read_gray(paths[index]))
+
+
+def iter_tiff_pages(path, step=1, start=0, stop=None, fps=None):
+    """逐页读取多页TIFF（参数含义同 iter_image_sequence）"""
+    page_count = cv2.imcount(path)
+    if page_count <= 0:
+        raise IOError(f"无法读取TIFF: {path}")
+    stop = page_count if stop is None else min(stop, page_count)
+    if step > 1:
+        # 隔页读取时只解码选中的页（imreadmulti 按 start 定位，跳过的页不解码）
+        for index in range(start, stop, step):
+            ok, pages = cv2.imreadmulti(path, index, 1, flags=cv2.IMREAD_GRAYSCALE)
+            if not ok or not pages:
+                raise IOError(f"读取TIFF第 {index} 页时出错: {path}")
+            yield Frame(index, _timestamp(index, fps), _to_gray(pages[0]))
+        return
+    for chunk_start in range(start, stop, TIFF_CHUNK_PAGES):
+        count = min(TIFF_CHUNK_PAGES, stop - chunk_start)
+        ok, pages = cv2.imreadmulti(path, chunk_start, count, flags=cv2.IMREAD_GRAYSCALE)
+        if not ok:
+            raise IOError(f"读取TIFF第 {chunk_start} 页时出错: {path}")
+        for offset, page in enumerate(pages):
+            index = chunk_start + offset
+            yield Frame(index, _timestamp(index, fps), _to_gray(page))
+
+
+def source_kind(source):
+    """判断来源类型：'video'、'tiff' 或 'sequence'"""
+    ext = os.path.splitext(source)[1].lower()
+    if os.path.isfile(source) and ext in VIDEO_EXTENSIONS:
+        return 'video'
+    if os.path.isfile(source) and ext in TIFF_EXTENSIONS and cv2.imcount(source) > 1:
+        return 'tiff'
+    return 'sequence'
+
+
+def open_source(source, step=1, start=0, stop=None, fps=None):
+    """
+    按来源类型返回帧生成器
+
+    参数:
+        source: 视频文件、多页TIFF、图像文件夹、通配符或 printf 格式的序列
+        fps: 图像序列/TIFF 的帧率，用于计算时间戳（视频使用文件自带的时间）
+    """
+    if step < 1:
+        raise ValueError("step 必须大于等于1")
+    kind = source_kind(source)
+    if kind == 'video':
+        return iter_video(source, step, start, stop)
+    if kind == 'tiff':
+        return iter_tiff_pages(source, step, start, stop, fps)
+    return iter_image_sequence(source, step, start, stop, fps)
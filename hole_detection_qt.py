@@ -1,5 +1,6 @@
 import sys
 import os
+import multiprocessing
 import cv2  # OpenCV库
 import numpy as np
 import time
@@ -8,9 +9,10 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QH
                             QGroupBox, QGridLayout, QCheckBox, QSplitter, QSizePolicy,
                             QMenuBar, QMenu, QAction, QMessageBox, QDialog, QFormLayout,
                             QProgressDialog, QFrame, QToolButton, QScrollArea, QDoubleSpinBox,
-                            QDialogButtonBox)
+                            QDialogButtonBox, QDockWidget, QTableWidget, QTableWidgetItem,
+                            QHeaderView)
 from PyQt5.QtGui import QPixmap, QImage, QIcon, QKeySequence, QFont, QColor, QPalette, QPainter, QPen, QCursor
-from PyQt5.QtCore import Qt, pyqtSlot, QSize, QPoint, QRect
+from PyQt5.QtCore import Qt, pyqtSlot, QSize, QPoint, QRect, QTimer
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
@@ -20,7 +22,15 @@ import pandas as pd
 from datetime import datetime
 from PIL import Image, ImageDraw, ImageFont
 import oct_module
-from sklearn.decomposition import PCA
+import denoise_utils
+import hole_engine
+import synthetic_holes
+import perf_trace
+import memory_monitor
+import analysis_context
+import image_io
+import zlib
+from packed_mask import PackedMask
 from pixel_calibration import PixelCalibrationApp
 
 # 设置中文字体
@@ -470,6 +480,12 @@ class HoleDetectionApp(QMainWindow):
         self.cropped_image = None
         self.current_image_path = None
         self.saved_results = 0
+        # 当前图像的投影、边缘图和孔壁轮廓缓存，由各分析功能共享
+        self.analysis_context = analysis_context.AnalysisContext()
+        # 已处理图像的二值掩膜（按位压缩后再 zlib 压缩），图像路径 -> 条目，用于切换图像时复用和导出
+        self.mask_history = {}
+        # 后台预读取相邻图像（上一张/下一张）
+        self.image_prefetcher = image_io.ImagePrefetcher()
         
         # 图像导航参数
         self.image_files = []
@@ -520,6 +536,12 @@ class HoleDetectionApp(QMainWindow):
         # 创建菜单栏
         self.createMenuBar()
         
+        # 创建性能分析面板
+        self.createPerfPanel()
+        
+        # 登记内存统计
+        self.setupMemoryMonitor()
+        
         # 创建文件夹
         for directory in [input_dir, output_dir, debug_dir]:
             if not os.path.exists(directory):
@@ -557,6 +579,10 @@ class HoleDetectionApp(QMainWindow):
         exportDataAction.triggered.connect(self.exportMeasurementData)
         fileMenu.addAction(exportDataAction)
         
+        exportMasksAction = QAction('导出二值图像', self)
+        exportMasksAction.triggered.connect(self.exportBinaryMasks)
+        fileMenu.addAction(exportMasksAction)
+        
         exitAction = QAction('退出', self)
         exitAction.setShortcut('Ctrl+Q')
         exitAction.triggered.connect(self.close)
@@ -637,6 +663,15 @@ class HoleDetectionApp(QMainWindow):
         roughnessAction.triggered.connect(self.analyzeRoughness)
         scriptMenu.addAction(roughnessAction)
         
+        batchRoughnessAction = QAction('批量粗糙度分析', self)
+        batchRoughnessAction.triggered.connect(self.batchRoughnessAnalysis)
+        scriptMenu.addAction(batchRoughnessAction)
+        
+        # 添加孔壁轮廓分析菜单项
+        wallProfileAction = QAction('孔壁轮廓分析', self)
+        wallProfileAction.triggered.connect(self.analyzeWallProfile)
+        scriptMenu.addAction(wallProfileAction)
+        
         # 帮助菜单
 
         # OCT圆孔重建菜单项
@@ -655,35 +690,232 @@ class HoleDetectionApp(QMainWindow):
         calibrationAction.triggered.connect(self.open_pixel_calibrator)
         self.analyzeMenu.addAction(calibrationAction)
 
+        # 性能计时菜单项
+        self.analyzeMenu.addSeparator()
+        self.perfTraceAction = QAction('启用性能计时', self)
+        self.perfTraceAction.setCheckable(True)
+        self.perfTraceAction.setChecked(perf_trace.is_enabled())
+        self.perfTraceAction.toggled.connect(self.togglePerfTrace)
+        self.analyzeMenu.addAction(self.perfTraceAction)
+
+        exportTraceAction = QAction('导出性能追踪(Chrome格式)', self)
+        exportTraceAction.triggered.connect(self.exportPerfTrace)
+        self.analyzeMenu.addAction(exportTraceAction)
+
+        memoryAction = QAction('内存使用情况', self)
+        memoryAction.triggered.connect(self.showMemoryDialog)
+        self.analyzeMenu.addAction(memoryAction)
+
         helpMenu = menubar.addMenu('帮助')
         
         aboutAction = QAction('关于', self)
         aboutAction.triggered.connect(self.showAboutDialog)
         helpMenu.addAction(aboutAction)
         
+    def createPerfPanel(self):
+        """创建性能分析停靠面板和状态栏耗时标签"""
+        self.perfLabel = QLabel("")
+        self.statusbar.addPermanentWidget(self.perfLabel)
+        
+        self.perfDock = QDockWidget("性能分析", self)
+        self.perfDock.setObjectName("perfDock")
+        panel = QWidget()
+        layout = QVBoxLayout(panel)
+        
+        self.perfTable = QTableWidget(0, 3)
+        self.perfTable.setHorizontalHeaderLabels(["阶段", "耗时 (ms)", "占比"])
+        self.perfTable.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.perfTable.verticalHeader().setVisible(False)
+        self.perfTable.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.perfTable)
+        
+        btnLayout = QHBoxLayout()
+        exportBtn = QPushButton("导出Chrome Trace")
+        exportBtn.clicked.connect(self.exportPerfTrace)
+        clearBtn = QPushButton("清空")
+        clearBtn.clicked.connect(self.clearPerfTrace)
+        btnLayout.addWidget(exportBtn)
+        btnLayout.addWidget(clearBtn)
+        layout.addLayout(btnLayout)
+        
+        self.perfDock.setWidget(panel)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.perfDock)
+        self.perfDock.setVisible(perf_trace.is_enabled())
+        if hasattr(self, 'analyzeMenu'):
+            self.analyzeMenu.addAction(self.perfDock.toggleViewAction())
+        
+        perf_trace.add_listener(self.onPerfFrame)
+    
+    def togglePerfTrace(self, checked):
+        """启用/关闭性能计时"""
+        perf_trace.enable(checked)
+        if checked:
+            self.perfDock.setVisible(True)
+            self.statusbar.showMessage("性能计时已启用")
+        else:
+            self.perfLabel.setText("")
+            self.statusbar.showMessage("性能计时已关闭")
+    
+    def onPerfFrame(self, root_event, frame_events):
+        """一次完整操作（根区间）结束后更新状态栏和性能面板"""
+        import threading
+        if threading.current_thread() is not threading.main_thread():
+            return
+        
+        self.perfLabel.setText(perf_trace.format_breakdown(root_event, frame_events))
+        
+        total_ms = root_event['dur'] / 1000.0
+        rows = perf_trace.breakdown(frame_events)
+        self.perfTable.setRowCount(len(rows))
+        for i, (name, depth, ms, count) in enumerate(rows):
+            label = "    " * depth + name + (f" ×{count}" if count > 1 else "")
+            self.perfTable.setItem(i, 0, QTableWidgetItem(label))
+            self.perfTable.setItem(i, 1, QTableWidgetItem(f"{ms:.2f}"))
+            ratio = ms / total_ms * 100 if total_ms > 0 else 0
+            self.perfTable.setItem(i, 2, QTableWidgetItem(f"{ratio:.1f}%"))
+    
+    def exportPerfTrace(self):
+        """导出Chrome trace-event JSON"""
+        if not perf_trace.events():
+            QMessageBox.information(self, "导出性能追踪", "没有已记录的计时数据，请先启用性能计时并处理图像")
+            return
+        filePath, _ = QFileDialog.getSaveFileName(self, "导出性能追踪", 
+                                                f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                                                "Chrome Trace (*.json)")
+        if filePath:
+            try:
+                count = perf_trace.export_chrome_trace(filePath)
+                QMessageBox.information(self, "导出性能追踪", 
+                                      f"已导出 {count} 个计时事件到: {filePath}\n可在 chrome://tracing 或 ui.perfetto.dev 中打开")
+            except Exception as e:
+                QMessageBox.critical(self, "错误", f"导出性能追踪时出错: {str(e)}")
+    
+    def clearPerfTrace(self):
+        """清空已记录的计时数据"""
+        perf_trace.clear()
+        self.perfTable.setRowCount(0)
+        self.perfLabel.setText("")
+    
+    def setupMemoryMonitor(self):
+        """登记主窗口持有的图像缓冲区和可释放缓存，并定时检查软内存预算"""
+        memory_monitor.track('主窗口', self, ['original_image', 'binary_image', 'result_image',
+                                             'cropped_image', 'original_image_backup',
+                                             'original_image_before_crop'])
+        memory_monitor.register_cache('pyplot图形', self._pyplotFigureBytes, self._closePyplotFigures, priority=0)
+        # 每个计时事件是一个小字典，约400字节
+        memory_monitor.register_cache('性能计时事件', lambda: len(perf_trace.events()) * 400,
+                                      perf_trace.clear, priority=1)
+        memory_monitor.register_cache('分析中间结果', self.analysis_context.nbytes,
+                                      self.analysis_context.clear, priority=2)
+        memory_monitor.register_cache('二值掩膜历史',
+                                      lambda: sum(len(entry['data']) for entry in self.mask_history.values()),
+                                      self.mask_history.clear, priority=3)
+        memory_monitor.register_cache('预读取图像', self.image_prefetcher.nbytes,
+                                      self.image_prefetcher.clear, priority=1)
+        
+        self.memoryTimer = QTimer(self)
+        self.memoryTimer.timeout.connect(self.checkMemoryBudget)
+        self.memoryTimer.start(5000)
+    
+    def getAnalysisContext(self):
+        """返回与当前原始图像和二值图像对应的分析缓存（图像被替换后自动失效）"""
+        return self.analysis_context.update(self.original_image, self.binary_image)
+    
+    def _pyplotFigureBytes(self):
+        """估算 pyplot 管理的图形占用（按画布像素的RGBA缓冲区计算）"""
+        from matplotlib._pylab_helpers import Gcf
+        total = 0
+        for manager in Gcf.get_all_fig_managers():
+            fig = manager.canvas.figure
+            width, height = fig.get_size_inches() * fig.dpi
+            total += int(width * height * 4)
+        return total
+    
+    def _closePyplotFigures(self):
+        """关闭所有 pyplot 图形（嵌入界面的 Figure 不受 pyplot 管理，不会被关闭）"""
+        plt.close('all')
+    
+    def checkMemoryBudget(self):
+        """超出软预算时释放缓存并在状态栏提示"""
+        evicted = memory_monitor.check_budget()
+        if evicted:
+            freed = sum(size for _, size in evicted)
+            self.statusbar.showMessage(f"内存超出预算，已释放缓存 {memory_monitor.format_bytes(freed)}", 5000)
+    
+    def showMemoryDialog(self):
+        """显示内存使用情况（缓冲区、缓存、图形对象和 tracemalloc 分配统计）"""
+        dialog = QDialog(self)
+        dialog.setWindowTitle("内存使用情况")
+        dialog.resize(560, 600)
+        layout = QVBoxLayout(dialog)
+        
+        reportLabel = QLabel()
+        reportLabel.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        reportLabel.setAlignment(Qt.AlignTop | Qt.AlignLeft)
+        reportLabel.setFont(QFont("Consolas", 9))
+        scroll = QScrollArea()
+        scroll.setWidgetResizable(True)
+        scroll.setWidget(reportLabel)
+        layout.addWidget(scroll)
+        
+        budgetLayout = QHBoxLayout()
+        budgetLayout.addWidget(QLabel("软预算 (MB, 0为不限制):"))
+        budgetSpin = QSpinBox()
+        budgetSpin.setRange(0, 1024 * 1024)
+        budgetSpin.setValue(memory_monitor.get_budget() // (1024 * 1024))
+        budgetSpin.valueChanged.connect(lambda v: memory_monitor.set_budget(v * 1024 * 1024))
+        budgetLayout.addWidget(budgetSpin)
+        layout.addLayout(budgetLayout)
+        
+        tracemallocCheck = QCheckBox("启用 tracemalloc 分配统计（会增加开销）")
+        tracemallocCheck.setChecked(memory_monitor.snapshot()['tracemalloc'])
+        layout.addWidget(tracemallocCheck)
+        
+        def refresh():
+            text = memory_monitor.format_snapshot()
+            top = memory_monitor.top_allocations(15)
+            if top:
+                text += "\n\ntracemalloc 分配最多的位置:"
+                for location, size, count in top:
+                    text += f"\n  {location:<40s} {memory_monitor.format_bytes(size):>10s} ({count} 次)"
+            decode_text = image_io.format_decode_stats()
+            if decode_text:
+                text += "\n\n图像解码统计:\n" + decode_text
+            reportLabel.setText(text)
+        
+        def toggleTracemalloc(checked):
+            if checked:
+                memory_monitor.start_tracemalloc()
+            else:
+                memory_monitor.stop_tracemalloc()
+            refresh()
+        tracemallocCheck.toggled.connect(toggleTracemalloc)
+        
+        def evictAll():
+            evicted = memory_monitor.evict()
+            freed = sum(size for _, size in evicted)
+            self.statusbar.showMessage(f"已释放缓存 {memory_monitor.format_bytes(freed)}", 5000)
+            refresh()
+        
+        btnLayout = QHBoxLayout()
+        refreshBtn = QPushButton("刷新")
+        refreshBtn.clicked.connect(refresh)
+        evictBtn = QPushButton("释放缓存")
+        evictBtn.clicked.connect(evictAll)
+        closeBtn = QPushButton("关闭")
+        closeBtn.clicked.connect(dialog.accept)
+        btnLayout.addWidget(refreshBtn)
+        btnLayout.addWidget(evictBtn)
+        btnLayout.addStretch()
+        btnLayout.addWidget(closeBtn)
+        layout.addLayout(btnLayout)
+        
+        refresh()
+        dialog.exec_()
+    
     def resetParameters(self):
         """重置所有参数为默认值"""
-        self.params = {
-            'gaussian_kernel': 5,
-            'adaptive_block_size': 51,
-            'adaptive_c': 5,
-            'binary_threshold': 128,  # 添加全局二值化阈值参数
-            'top_line_index': 1,  # 第几条水平线作为顶部
-            'row_projection_threshold': 70,  # 行投影阈值
-            'gap_min_width': 50,  # 缺口最小宽度
-            'horizontal_kernel_size': 25,  # 水平线检测核大小
-            'column_projection_threshold': 30,  # 列投影阈值
-            'column_peak_window': 10,  # 峰值检测窗口大小
-            'bottom_enhance_contrast': 1.5,  # 底部增强对比度
-            'bottom_search_range': 0.8,  # 底部搜索范围（占图像高度的比例）
-            'bottom_line_index': 0,  # 第几条水平线作为底部
-            'short_line_min_length': 5,  # 短横线最小长度
-            'short_line_min_white_ratio': 0.4,  # 短横线区域白色像素最小比例
-            'short_line_max_white_ratio': 0.9,  # 短横线区域白色像素最大比例
-            'invert_binary': False,  # 是否反转二值图像
-            'pixel_to_um_x': 1.60,  # X方向（直径）像素到微米的转换比例
-            'pixel_to_um_y': 1.94   # Y方向（深度）像素到微米的转换比例
-        }
+        self.params = hole_engine.DEFAULT_PARAMS.copy()
         
         # 更新全局变量
         global PIXEL_TO_UM_X, PIXEL_TO_UM_Y, PIXEL_TO_UM
@@ -1699,7 +1931,7 @@ class HoleDetectionApp(QMainWindow):
         """加载单个图像"""
         options = QFileDialog.Options()
         filePath, _ = QFileDialog.getOpenFileName(self, "选择图像文件", "", 
-                                                "图像文件 (*.png *.jpg *.jpeg *.bmp);;所有文件 (*)", 
+                                                "图像文件 (*.png *.jpg *.jpeg *.bmp *.tif *.tiff);;所有文件 (*)", 
                                                 options=options)
         if filePath:
             self.image_files = [filePath]
@@ -1713,12 +1945,11 @@ class HoleDetectionApp(QMainWindow):
         folder_path = QFileDialog.getExistingDirectory(self, "选择图像文件夹")
         if folder_path:
             # 获取所有支持的图像文件
-            image_extensions = ['.png', '.jpg', '.jpeg', '.bmp']
             self.image_files = []
             
             for file in os.listdir(folder_path):
                 file_path = os.path.join(folder_path, file)
-                if os.path.isfile(file_path) and any(file.lower().endswith(ext) for ext in image_extensions):
+                if os.path.isfile(file_path) and file.lower().endswith(image_io.IMAGE_EXTENSIONS):
                     self.image_files.append(file_path)
             
             if self.image_files:
@@ -1741,6 +1972,7 @@ class HoleDetectionApp(QMainWindow):
         self.depth_diameter_ratio = 0
         self.measureCountLabel.setText("测量次数: 0/3")
     
+    @perf_trace.traced('load_image', 'ui')
     def loadImageAtCurrentIndex(self):
         """加载当前索引位置的图像"""
         if not self.image_files:
@@ -1752,23 +1984,26 @@ class HoleDetectionApp(QMainWindow):
         file_path = self.image_files[self.current_image_index]
         
         try:
-            # 使用PIL库加载图像，解决中文路径问题
-            from PIL import Image
-            pil_image = Image.open(file_path)
-            # 转换为灰度图
-            pil_image_gray = pil_image.convert('L')
-            # 转换为numpy数组供OpenCV使用
-            img = np.array(pil_image_gray)
+            # 直接解码为灰度（支持中文路径）；相邻图像已在后台预读取时直接取结果
+            img = self.image_prefetcher.get(file_path)
             
             if img is None or img.size == 0:
                 QMessageBox.warning(self, "图像加载错误", f"无法加载图像: {file_path}")
                 return
+            
+            # 预读取前后相邻的图像，翻页时不必等待解码
+            neighbors = [self.image_files[i] for i in (self.current_image_index + 1, self.current_image_index - 1)
+                         if 0 <= i < len(self.image_files)]
+            self.image_prefetcher.prefetch(neighbors)
                 
-            # 更新图像和路径
-            self.original_image = img.copy()
+            # 更新图像和路径（img 是新解码的数组，无需再复制一份）
+            self.original_image = img
             self.current_image_path = file_path
             self.result_image = None
             self.binary_image = None
+            # 释放上一张图像的旋转/裁剪备份，否则会一直持有旧图像的整幅缓冲区
+            self.original_image_backup = None
+            self.original_image_before_crop = None
             
             # 重置测量结果
             self.resetMeasurements()
@@ -1876,6 +2111,7 @@ class HoleDetectionApp(QMainWindow):
         
         return True
     
+    @perf_trace.traced('render', 'ui')
     def displayImage(self, img, label, title=None):
         """在Qt标签中显示图像"""
         if img is None:
@@ -1914,40 +2150,19 @@ class HoleDetectionApp(QMainWindow):
             traceback.print_exc()
     
     @pyqtSlot()
+    @perf_trace.traced('processImage', 'ui')
     def processImage(self):
         """处理图像并更新显示"""
         if self.original_image is None:
             return
         
         try:
-            # 应用高斯滤波减少噪声
-            gaussian_kernel_size = self.params['gaussian_kernel']
-            blurred = cv2.GaussianBlur(self.original_image, (gaussian_kernel_size, gaussian_kernel_size), 0)
-            
-            # 应用自适应二值化
-            adaptive_block_size = self.params['adaptive_block_size']
-            adaptive_c = self.params['adaptive_c']
-            binary_adaptive = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                                                  cv2.THRESH_BINARY, adaptive_block_size, adaptive_c)
-            
-            # 全局OTSU二值化
-            _, binary_otsu = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            
-            # 使用自定义全局阈值进行二值化
-            _, binary_global = cv2.threshold(blurred, self.params['binary_threshold'], 255, cv2.THRESH_BINARY)
-            
-            # 合并三种二值化结果
-            binary_combined = cv2.bitwise_and(binary_otsu, binary_adaptive)
-            binary_combined = cv2.bitwise_and(binary_combined, binary_global)
-            
-            # 形态学操作
-            kernel = np.ones((3, 3), np.uint8)
-            binary_opened = cv2.morphologyEx(binary_combined, cv2.MORPH_OPEN, kernel)
-            binary_final = cv2.morphologyEx(binary_opened, cv2.MORPH_CLOSE, kernel)
-            
-            # 如果需要反转二值图像
-            if self.params['invert_binary']:
-                binary_final = 255 - binary_final
+            # 高斯滤波、三种阈值合并和形态学处理（与批处理、自动调参共用同一实现）
+            # 同一图像、同一预处理参数已处理过时直接解压保留的掩膜
+            binary_final = self.restoreBinaryMask()
+            if binary_final is None:
+                binary_final = hole_engine.preprocess_image(self.original_image, self.params)
+                self.rememberBinaryMask(binary_final)
             
             self.binary_image = binary_final
             # 确保二值图像显示正确
@@ -1981,6 +2196,48 @@ class HoleDetectionApp(QMainWindow):
             self.statusbar.showMessage(f"处理图像出错: {str(e)}")
             QMessageBox.critical(self, "处理错误", f"处理图像时出错: {str(e)}")
     
+    def _maskHistoryKey(self):
+        """当前图像在掩膜历史中的校验信息：预处理参数、图像尺寸和像素校验和（裁剪、旋转后不再匹配）"""
+        return (hole_engine.preprocess_key(self.params), self.original_image.shape,
+                zlib.crc32(np.ascontiguousarray(self.original_image)))
+    
+    def rememberBinaryMask(self, binary):
+        """压缩保存当前图像的二值掩膜"""
+        if not self.current_image_path:
+            return
+        self.mask_history[self.current_image_path] = {
+            'key': self._maskHistoryKey(),
+            'data': PackedMask.from_array(binary).tobytes(),
+        }
+    
+    def restoreBinaryMask(self):
+        """返回掩膜历史中与当前图像和参数一致的二值图像，没有时返回None"""
+        entry = self.mask_history.get(self.current_image_path)
+        if entry is None or entry['key'] != self._maskHistoryKey():
+            return None
+        return PackedMask.frombytes(entry['data']).to_array()
+    
+    def exportBinaryMasks(self):
+        """将当前及历史中保留的二值掩膜导出为 1 位 PNG"""
+        if self.binary_image is None and not self.mask_history:
+            QMessageBox.warning(self, "警告", "没有可导出的二值图像，请先处理图像")
+            return
+        folder = QFileDialog.getExistingDirectory(self, "选择导出文件夹", output_dir)
+        if not folder:
+            return
+        
+        try:
+            masks = {path: PackedMask.frombytes(entry['data']) for path, entry in self.mask_history.items()}
+            if self.binary_image is not None:
+                masks[self.current_image_path or 'current'] = PackedMask.from_array(self.binary_image)
+            for path, mask in masks.items():
+                name = os.path.splitext(os.path.basename(path))[0]
+                mask.save(os.path.join(folder, f"{name}_binary.png"))
+            self.statusbar.showMessage(f"已导出 {len(masks)} 张二值图像到: {folder}")
+        except Exception as e:
+            QMessageBox.critical(self, "导出错误", f"导出二值图像时出错: {str(e)}")
+    
+    @perf_trace.traced('measure', 'ui')
     def detect_hole_dimensions(self):
         """检测孔的尺寸"""
         if self.original_image is None or self.binary_image is None:
@@ -1989,32 +2246,14 @@ class HoleDetectionApp(QMainWindow):
         # 创建结果图像
         result_img = cv2.cvtColor(self.original_image, cv2.COLOR_GRAY2BGR)
         
-        # 计算行投影以找到水平线
-        row_projection = np.sum(self.binary_image, axis=1)
-        row_projection_smooth = np.convolve(row_projection, np.ones(5)/5, mode='same')
-        
-        # 找到所有显著的水平线
-        threshold = np.max(row_projection_smooth) * (self.params['row_projection_threshold'] / 100.0)
-        significant_rows = np.where(row_projection_smooth > threshold)[0]
-        
-        # 对找到的行进行分组
-        horizontal_lines = []
-        current_group = []
+        height, width = self.original_image.shape[:2]
         
-        for i in range(len(significant_rows)):
-            if i == 0 or significant_rows[i] - significant_rows[i-1] <= 5:
-                current_group.append(significant_rows[i])
-            else:
-                if current_group:
-                    horizontal_lines.append(int(np.mean(current_group)))
-                    current_group = [significant_rows[i]]
-        
-        # 添加最后一组
-        if current_group:
-            horizontal_lines.append(int(np.mean(current_group)))
-        
-        # 按从上到下排序水平线
-        horizontal_lines.sort()
+        # 核心检测算法由 hole_engine 完成，这里只负责绘图和更新界面
+        context = self.getAnalysisContext()
+        detection = hole_engine.detect_hole_dimensions(
+            self.binary_image, self.params, PIXEL_TO_UM_X, PIXEL_TO_UM_Y,
+            horizontal_lines=context.horizontal_lines(self.params['row_projection_threshold']))
+        horizontal_lines = detection['horizontal_lines']
         
         # 在图像上标记所有检测到的水平线，用不同颜色标记顶部和底部
         for i, line_pos in enumerate(horizontal_lines):
@@ -2023,94 +2262,14 @@ class HoleDetectionApp(QMainWindow):
                 color = (0, 255, 255)  # 黄色标记顶部线
             elif i == self.params['bottom_line_index'] and self.params['bottom_line_index'] < len(horizontal_lines):
                 color = (255, 0, 255)  # 品红色标记底部线
-            cv2.line(result_img, (0, line_pos), (self.original_image.shape[1], line_pos), color, 1)
+            cv2.line(result_img, (0, line_pos), (width, line_pos), color, 1)
         
-        # 确定孔的顶部位置
-        top_line_index = self.params['top_line_index']
-        if len(horizontal_lines) > top_line_index:
-            self.upper_surface_row = horizontal_lines[top_line_index]
-        else:
-            self.upper_surface_row = self.original_image.shape[0] // 4
-        
-        # 在顶部位置找缺口 - 重新实现缺口检测算法
-        # 首先检查二值化图像中选定行的像素值
-        search_range = 10
-        best_row = self.upper_surface_row
-        max_gap_width = 0
-        self.hole_start = 0
-        self.hole_end = 0
-        
-        # 在选定行附近搜索最明显的缺口
-        for i in range(max(0, self.upper_surface_row - search_range), 
-                      min(self.original_image.shape[0], self.upper_surface_row + search_range)):
-            # 获取当前行的像素值
-            line = self.binary_image[i, :]
-            
-            # 寻找黑白转换点
-            transitions = np.where(np.diff(line) != 0)[0]
-            # 如果检测到的转换点不少于2个
-            if len(transitions) >= 2:
-                # 查找连续的白-黑-白模式（白线上的黑色缺口）
-                for j in range(0, len(transitions) - 1):
-                    # 确认这是白到黑的转换（缺口开始）
-                    if line[transitions[j]] == 255 and transitions[j] + 1 < len(line) and line[transitions[j] + 1] == 0:
-                        # 查找黑到白的转换点（缺口结束）
-                        for k in range(j + 1, len(transitions)):
-                            if line[transitions[k]] == 0 and transitions[k] + 1 < len(line) and line[transitions[k] + 1] == 255:
-                                # 计算缺口宽度
-                                gap_width = transitions[k] - transitions[j]
-                                
-                                # 检查缺口是否符合最小宽度要求，并且是否是目前找到的最宽的缺口
-                                if gap_width > self.params['gap_min_width'] and gap_width > max_gap_width:
-                                    max_gap_width = gap_width
-                                    best_row = i
-                                    self.hole_start = transitions[j]
-                                    self.hole_end = transitions[k]
-                                break
-        
-        # 如果找到了有效的缺口
-        if max_gap_width > 0:
-            self.upper_surface_row = best_row
-            self.hole_diameter = (self.hole_end - self.hole_start) * PIXEL_TO_UM_X
-        else:
-            # 备选检测方法：寻找行中最长的黑色区域
-            for i in range(max(0, self.upper_surface_row - search_range), 
-                          min(self.original_image.shape[0], self.upper_surface_row + search_range)):
-                line = self.binary_image[i, :]
-                black_regions = []
-                start = None
-                
-                # 寻找所有黑色区域
-                for j in range(len(line)):
-                    if line[j] == 0 and start is None:  # 黑色区域开始
-                        start = j
-                    elif line[j] == 255 and start is not None:  # 黑色区域结束
-                        black_regions.append((start, j))
-                        start = None
-                
-                # 处理最后一个黑色区域（如果存在）
-                if start is not None:
-                    black_regions.append((start, len(line)))
-                
-                # 在黑色区域中找最宽的一个
-                for region in black_regions:
-                    region_width = region[1] - region[0]
-                    # 检查该区域是否在一条明显的白线上
-                    if region[0] > 0 and region[1] < len(line) - 1 and line[region[0] - 1] == 255 and line[region[1]] == 255:
-                        if region_width > self.params['gap_min_width'] and region_width > max_gap_width:
-                            max_gap_width = region_width
-                            best_row = i
-                            self.hole_start = region[0]
-                            self.hole_end = region[1]
-            
-            if max_gap_width > 0:
-                self.upper_surface_row = best_row
-                self.hole_diameter = (self.hole_end - self.hole_start) * PIXEL_TO_UM_X
-            else:
-                # 最后的备选方案
-                self.hole_start = self.original_image.shape[1] // 3
-                self.hole_end = self.original_image.shape[1] * 2 // 3
-                self.hole_diameter = (self.hole_end - self.hole_start) * PIXEL_TO_UM_X
+        self.upper_surface_row = detection['upper_surface_row']
+        self.bottom_surface_row = detection['bottom_surface_row']
+        self.hole_start = detection['hole_start']
+        self.hole_end = detection['hole_end']
+        self.hole_diameter = detection['hole_diameter']
+        max_gap_width = detection['max_gap_width']
         
         # 计算孔的中心x坐标，确保在后续代码中可用
         hole_center_x = (self.hole_start + self.hole_end) // 2
@@ -2122,225 +2281,73 @@ class HoleDetectionApp(QMainWindow):
                    (int(max_gap_width / 2), 10), 
                    0, 0, 360, (0, 0, 255), 2)
         
-        # 为寻找底部做准备 - 改进底部检测算法
-        found_bottom = False
-        
-        # 计算搜索范围
-        max_search_depth = int(self.original_image.shape[0] * self.params['bottom_search_range'])
-        search_end_row = min(self.original_image.shape[0], self.upper_surface_row + max_search_depth)
-        
-        # 首先尝试使用底部线索引
-        bottom_line_index = self.params['bottom_line_index']
-        if bottom_line_index < len(horizontal_lines) and bottom_line_index >= 0:
-            # 确保选择的底部线在顶部线之下
-            if horizontal_lines[bottom_line_index] > self.upper_surface_row + 20:
-                self.bottom_surface_row = horizontal_lines[bottom_line_index]
-                found_bottom = True
-        
-        # 如果未找到底部，设置一个默认值
-        if not found_bottom:
-            # 默认将底部设置为顶部行的一定距离下方
-            self.bottom_surface_row = min(self.original_image.shape[0] - 1, self.upper_surface_row + 100)
-        
-        # 如果未找到底部或索引无效，使用改进的方法继续查找
-        if not found_bottom:
-            # 1. 首先尝试特别关注孔洞中心区域的底部短横线
-            # hole_center_x已经在上面计算过了，这里不需要重复
-            hole_width = self.hole_end - self.hole_start
-            search_width = max(hole_width // 2, 30)  # 孔宽度的一半或至少30像素
-            
-            # 在原始二值图像中在孔中心区域搜索短横线
-            hole_center_min_x = max(0, hole_center_x - search_width)
-            hole_center_max_x = min(self.original_image.shape[1], hole_center_x + search_width)
+        # 底部通过孔中心短横线搜索得到时，输出调试信息
+        bottom_search = detection['bottom_search']
+        if bottom_search is not None:
+            hole_center_min_x = bottom_search['min_x']
+            hole_center_max_x = bottom_search['max_x']
             
             # 创建调试图像以显示短横线检测过程
             debug_img = cv2.cvtColor(self.binary_image.copy(), cv2.COLOR_GRAY2BGR)
             
             # 在调试图像中标记孔中心搜索区域
             cv2.rectangle(debug_img, 
-                        (hole_center_min_x, self.upper_surface_row + 50), 
-                        (hole_center_max_x, search_end_row), 
+                        (hole_center_min_x, bottom_search['start_row']), 
+                        (hole_center_max_x, bottom_search['end_row']), 
                         (0, 255, 255), 1)
             
-            # 计算孔中心区域的列投影，用于确定底部位置
-            column_sum = np.sum(self.binary_image[self.upper_surface_row + 50:search_end_row, 
-                                                hole_center_min_x:hole_center_max_x], axis=1)
-            
             # 为列投影创建调试图像
             plt.figure(figsize=(10, 4))
             plt.title("孔中心区域垂直投影")
-            plt.plot(column_sum)
+            plt.plot(bottom_search['column_sum'])
             plt.savefig(os.path.join(debug_dir, "hole_center_column_projection.png"))
             plt.close()
             
-            # 自适应确定短横线的阈值，避免受噪声影响
-            # 计算投影的平均值和标准差
-            projection_mean = np.mean(column_sum)
-            projection_std = np.std(column_sum)
-            
-            # 检测峰值 - 峰值表示水平线（高于平均值+标准差的区域）
-            potential_lines = []
-            min_peak_height = projection_mean + projection_std * 1.5  # 调整这个系数可以控制灵敏度
-            
-            for i in range(len(column_sum)):
-                if column_sum[i] > min_peak_height:
-                    # 检查是否是局部最大值
-                    window = 5  # 窗口大小
-                    start_idx = max(0, i - window)
-                    end_idx = min(len(column_sum), i + window + 1)
-                    if column_sum[i] == np.max(column_sum[start_idx:end_idx]):
-                        row_position = self.upper_surface_row + 50 + i
-                        potential_lines.append((row_position, column_sum[i]))
-            
-            # 去除过近的峰值
-            filtered_lines = []
-            if potential_lines:
-                filtered_lines.append(potential_lines[0])
-                for i in range(1, len(potential_lines)):
-                    # 如果与之前添加的峰值距离足够远，则添加
-                    if potential_lines[i][0] - filtered_lines[-1][0] > 20:  # 至少20像素的距离
-                        filtered_lines.append(potential_lines[i])
-            
-            # 在底部附近寻找最合适的短横线
-            # 1. 首先查看二值化图像中是否有明显的短横线
-            bottom_found = False
-            
-            # 将潜在的水平线按照从上到下排序
-            filtered_lines.sort(key=lambda x: x[0])
-            
             # 在调试图像中标记所有检测到的水平线位置
-            for row_pos, strength in filtered_lines:
-                cv2.line(debug_img, (0, row_pos), (self.original_image.shape[1], row_pos), 
+            for row_pos, strength in bottom_search['filtered_lines']:
+                cv2.line(debug_img, (0, row_pos), (width, row_pos), 
                         (0, 255, 0), 1)  # 绿色标记所有潜在的水平线
             
             # 保存标记了潜在水平线的调试图像
             cv2.imwrite(os.path.join(debug_dir, "potential_horizontal_lines.jpg"), debug_img)
             
-            # 特别关注孔洞底部区域，避免错误检测上方的噪声
-            # 设置最小搜索深度，确保在孔洞足够深的位置寻找底部
-            min_valid_depth = 100  # 至少需要100像素的深度
-            
-            for row_pos, strength in filtered_lines:
-                # 只考虑距离上表面足够远的水平线
-                if row_pos < self.upper_surface_row + min_valid_depth:
-                    continue
-                
-                # 获取当前行在孔中心区域的像素
-                line_segment = self.binary_image[row_pos, hole_center_min_x:hole_center_max_x]
-                
-                if len(line_segment) == 0:
-                    continue
-                
-                # 计算这一段中白色像素的比例
-                white_ratio = np.sum(line_segment == 255) / len(line_segment)
-                
-                # 寻找短横线特征：白色像素比例适中
-                if white_ratio > self.params['short_line_min_white_ratio'] and white_ratio < self.params['short_line_max_white_ratio']:
-                    # 在这一行中查找最长的连续白色区域
-                    max_run_length = 0
-                    current_run = 0
-                    
-                    for pixel in line_segment:
-                        if pixel == 255:  # 白色像素
-                            current_run += 1
-                        else:
-                            max_run_length = max(max_run_length, current_run)
-                            current_run = 0
-                    
-                    # 检查最后一个连续区域
-                    max_run_length = max(max_run_length, current_run)
-                    
-                    # 如果有足够长的连续白色区域，认为这是短横线
-                    if max_run_length > self.params['short_line_min_length']:
-                        # 在调试图像和结果图像上标记找到的短横线
-                        cv2.line(debug_img, (hole_center_min_x, row_pos), 
-                                (hole_center_max_x, row_pos), (0, 0, 255), 2)  # 红色
-                        cv2.line(result_img, (hole_center_min_x, row_pos), 
-                                (hole_center_max_x, row_pos), (0, 0, 255), 3)
-                        
-                        # 找到底部短横线
-                        self.bottom_surface_row = row_pos
-                        bottom_found = True
-                        break
-            
-            # 如果还是没找到底部，尝试在可能的峰值中选择最下面的一个
-            if not bottom_found and filtered_lines:
-                # 排除上表面附近的峰值
-                valid_lines = [line for line in filtered_lines 
-                              if line[0] > self.upper_surface_row + min_valid_depth]
-                
-                if valid_lines:
-                    # 找出强度最大的底部线
-                    max_strength_line = max(valid_lines, key=lambda x: x[1])
-                    self.bottom_surface_row = max_strength_line[0]
-                    
-                    # 在结果图像上标记
-                    cv2.line(result_img, (hole_center_min_x, self.bottom_surface_row), 
-                            (hole_center_max_x, self.bottom_surface_row), (0, 0, 255), 3)
-                    bottom_found = True
-            
-            # 保存最终的调试图像
-            if bottom_found:
+            if bottom_search['bottom_row'] is not None:
+                if bottom_search['method'] == 'short_line':
+                    cv2.line(debug_img, (hole_center_min_x, self.bottom_surface_row), 
+                            (hole_center_max_x, self.bottom_surface_row), (0, 0, 255), 2)  # 红色
+                cv2.line(result_img, (hole_center_min_x, self.bottom_surface_row), 
+                        (hole_center_max_x, self.bottom_surface_row), (0, 0, 255), 3)
                 cv2.imwrite(os.path.join(debug_dir, "bottom_line_detected.jpg"), debug_img)
-                found_bottom = True
             else:
                 cv2.imwrite(os.path.join(debug_dir, "bottom_line_search_failed.jpg"), debug_img)
         
-        # 计算深度
-        self.hole_depth = (self.bottom_surface_row - self.upper_surface_row) * PIXEL_TO_UM_Y
-        
-        # === 新增：计算指定位置的直径（上表面下0.1mm和底部上0.1mm处） ===
-        
-        # 从像素转换到0.1mm的距离
-        distance_01mm_pixels = int(0.1 * 1000 / PIXEL_TO_UM_Y)  # 0.1mm转换为像素
-        
-        # 计算上表面下0.1mm处的行位置
-        upper_measure_row = self.upper_surface_row + distance_01mm_pixels
+        # 深度
+        self.hole_depth = detection['hole_depth']
         
-        # 计算底部上0.1mm处的行位置
-        lower_measure_row = self.bottom_surface_row - distance_01mm_pixels
+        # 标记上表面下0.1mm和底部上0.1mm处的测量位置
+        upper_measure_row = detection['upper_measure_row']
+        lower_measure_row = detection['lower_measure_row']
+        cv2.line(result_img, (0, upper_measure_row), (width, upper_measure_row), (0, 128, 255), 1)
+        cv2.line(result_img, (0, lower_measure_row), (width, lower_measure_row), (0, 128, 255), 1)
         
-        # 确保行位置在有效范围内
-        upper_measure_row = min(max(0, upper_measure_row), self.original_image.shape[0]-1)
-        lower_measure_row = min(max(0, lower_measure_row), self.original_image.shape[0]-1)
-        
-        # 标记测量位置
-        cv2.line(result_img, (0, upper_measure_row), (self.original_image.shape[1], upper_measure_row), (0, 128, 255), 1)
-        cv2.line(result_img, (0, lower_measure_row), (self.original_image.shape[1], lower_measure_row), (0, 128, 255), 1)
-        
-        # 根据宽度查找这两个位置的直径
-        upper_diameter = 0
-        lower_diameter = 0
-        
-        # 检测上测量点处的直径
-        upper_found, upper_left, upper_right = self.find_hole_edges_at_row(upper_measure_row)
+        # 标记上测量点处的直径
+        upper_found, upper_left, upper_right = detection['upper_edges']
         if upper_found:
-            upper_diameter = (upper_right - upper_left) * PIXEL_TO_UM_X
             cv2.line(result_img, (upper_left, upper_measure_row), (upper_right, upper_measure_row), (255, 128, 0), 2)
             cv2.circle(result_img, (upper_left, upper_measure_row), 4, (255, 0, 0), -1)
             cv2.circle(result_img, (upper_right, upper_measure_row), 4, (255, 0, 0), -1)
         
-        # 检测下测量点处的直径
-        lower_found, lower_left, lower_right = self.find_hole_edges_at_row(lower_measure_row)
+        # 标记下测量点处的直径
+        lower_found, lower_left, lower_right = detection['lower_edges']
         if lower_found:
-            lower_diameter = (lower_right - lower_left) * PIXEL_TO_UM_X
             cv2.line(result_img, (lower_left, lower_measure_row), (lower_right, lower_measure_row), (255, 128, 0), 2)
             cv2.circle(result_img, (lower_left, lower_measure_row), 4, (255, 0, 0), -1)
             cv2.circle(result_img, (lower_right, lower_measure_row), 4, (255, 0, 0), -1)
         
         # 更新测量结果
-        self.upper_diameter_at_01mm = upper_diameter
-        self.lower_diameter_at_01mm = lower_diameter
-        
-        # 计算标准直径（上下两处的平均值）
-        if upper_diameter > 0 and lower_diameter > 0:
-            standard_diameter = (upper_diameter + lower_diameter) / 2
-        elif upper_diameter > 0:
-            standard_diameter = upper_diameter
-        elif lower_diameter > 0:
-            standard_diameter = lower_diameter
-        else:
-            standard_diameter = self.hole_diameter  # 如果两个位置都无法测量，使用原始直径
+        self.upper_diameter_at_01mm = detection['upper_diameter_at_01mm']
+        self.lower_diameter_at_01mm = detection['lower_diameter_at_01mm']
+        standard_diameter = detection['standard_diameter']
         
         # 累加测量次数和历史测量值
         if standard_diameter > 0:
@@ -2428,59 +2435,7 @@ class HoleDetectionApp(QMainWindow):
     
     def find_hole_edges_at_row(self, row):
         """在指定行查找孔洞的左右边缘，优先使用已知的孔洞边界（蓝色竖线）"""
-        if self.binary_image is None:
-            return False, 0, 0
-            
-        if row < 0 or row >= self.binary_image.shape[0]:
-            return False, 0, 0
-            
-        # 计算在当前行的位置应与原始检测到的孔洞边界保持一致
-        # 这样可以确保始终测量的是蓝色竖线之间的区域
-        
-        # 蓝色竖线通常是垂直的，所以x坐标在不同行应该相同
-        left_x = self.hole_start
-        right_x = self.hole_end
-        
-        # 但如果图像经过旋转，或者孔洞呈现一定角度，
-        # 可能需要根据行的位置调整x坐标
-        if hasattr(self, 'is_image_rotated') and self.is_image_rotated:
-            # 对于旋转的图像，可能需要投影蓝色线到当前行
-            # 这部分代码在detect_hole_in_rotated_image方法中已经考虑
-            pass
-        
-        # 在确定的位置附近搜索实际的边缘，以提高精度
-        search_range = 10  # 每边搜索10个像素的范围
-        
-        # 获取指定行
-        line = self.binary_image[row, :]
-        
-        # 在左边缘附近搜索实际边界
-        left_search_start = max(0, left_x - search_range)
-        left_search_end = min(self.binary_image.shape[1]-1, left_x + search_range)
-        
-        for x in range(left_search_start, left_search_end):
-            # 寻找从白到黑的过渡（边缘）
-            if x < len(line)-1 and line[x] == 255 and line[x+1] == 0:
-                left_x = x
-                break
-        
-        # 在右边缘附近搜索实际边界
-        right_search_start = max(0, right_x - search_range)
-        right_search_end = min(self.binary_image.shape[1]-1, right_x + search_range)
-        
-        for x in range(right_search_start, right_search_end):
-            # 寻找从黑到白的过渡（边缘）
-            if x < len(line)-1 and line[x] == 0 and line[x+1] == 255:
-                right_x = x
-                break
-        
-        # 确保左边缘在右边缘之前
-        if left_x >= right_x:
-            # 如果搜索失败，使用原始的边界
-            left_x = self.hole_start
-            right_x = self.hole_end
-            
-        return True, left_x, right_x
+        return hole_engine.find_hole_edges_at_row(self.binary_image, row, self.hole_start, self.hole_end)
     
     # 参数更新回调函数
     def updateGaussianKernel(self, value):
@@ -2840,35 +2795,8 @@ class HoleDetectionApp(QMainWindow):
             progress.close()
     
     def addNoise(self, image, noise_type, seed=0):
-        """添加不同类型的噪声"""
-        np.random.seed(seed)  # 设置随机种子以获得可重现的结果
-        noisy_image = image.copy().astype(np.float32)
-        
-        if noise_type == 0:  # 高斯噪声
-            mean = 0
-            sigma = 25.0 + seed * 5
-            gauss = np.random.normal(mean, sigma, image.shape)
-            noisy_image = noisy_image + gauss
-        
-        elif noise_type == 1:  # 椒盐噪声
-            s_vs_p = 0.5
-            amount = 0.01 + seed * 0.005
-            # 添加盐噪声
-            salt_mask = np.random.random(image.shape) < (amount * s_vs_p)
-            noisy_image[salt_mask] = 255
-            # 添加椒噪声
-            pepper_mask = np.random.random(image.shape) < (amount * (1.0 - s_vs_p))
-            noisy_image[pepper_mask] = 0
-        
-        elif noise_type == 2:  # 泊松噪声
-            vals = len(np.unique(image))
-            vals = 2 ** np.ceil(np.log2(vals))
-            factor = 5.0 - seed * 0.5
-            noisy_image = np.random.poisson(noisy_image / factor) * factor
-        
-        # 确保值在[0, 255]范围内
-        noisy_image = np.clip(noisy_image, 0, 255).astype(np.uint8)
-        return noisy_image
+        """添加不同类型的噪声（0=高斯, 1=椒盐, 2=泊松），实现见 synthetic_holes.add_noise"""
+        return synthetic_holes.add_noise(image, noise_type, seed)
     
     def mergeImages(self, images):
         """将三张图像合并为一张"""
@@ -2901,6 +2829,7 @@ class HoleDetectionApp(QMainWindow):
         
         return merged
 
+    @perf_trace.traced('analyzeMergedImage', 'ui')
     def analyzeMergedImage(self):
         """分析合并图像中的三个孔洞 - 完善版：先准确分割，再单独处理，最后合并结果"""
         if self.original_image is None:
@@ -2978,11 +2907,11 @@ class HoleDetectionApp(QMainWindow):
                 ref_depth = first_depth
                 
                 # 对当前子图像进行处理
+                # 去噪档位根据子图像的噪声估计自动选择
                 diameter, depth, hole_data = self.processSingleImage(
                     sub_img, 
                     ref_diameter=ref_diameter,
-                    ref_depth=ref_depth,
-                    is_noisy=(idx > 0)  # 第一张图像噪声较少
+                    ref_depth=ref_depth
                 )
                 
                 # 处理测量结果并绘制到合并图像上
@@ -3077,8 +3006,14 @@ class HoleDetectionApp(QMainWindow):
         finally:
             progress.close()
             
-    def processSingleImage(self, image, ref_diameter=200.0, ref_depth=1000.0, is_noisy=False):
-        """处理单个子图像，返回测量结果"""
+    @perf_trace.traced('processSingleImage', 'ui')
+    def processSingleImage(self, image, ref_diameter=200.0, ref_depth=1000.0, is_noisy=None, denoise_tier=None):
+        """处理单个子图像，返回测量结果
+        
+        Args:
+            is_noisy: 兼容旧接口，True使用完整去噪流程，False不去噪，None根据图像噪声自动判断
+            denoise_tier: 指定去噪档位（见denoise_utils.DENOISE_TIERS），优先于is_noisy
+        """
         # 备份原始图像和当前参数
         original_image_backup = self.original_image
         binary_image_backup = self.binary_image
@@ -3098,16 +3033,21 @@ class HoleDetectionApp(QMainWindow):
                 gaussian_kernel_size += 1  # 确保是奇数
             blurred = cv2.GaussianBlur(image, (gaussian_kernel_size, gaussian_kernel_size), 0)
             
-            # 2. 对于噪声较大的图像，应用额外的滤波
-            if is_noisy:
-                # 中值滤波去除椒盐噪声
-                blurred = cv2.medianBlur(blurred, 5)
-                
-                # 双边滤波保留边缘
-                blurred = cv2.bilateralFilter(blurred, 9, 75, 75)
-                
-                # 非局部均值去噪处理高斯噪声
-                blurred = cv2.fastNlMeansDenoising(blurred, None, 10, 7, 21)
+            # 2. 对于噪声较大的图像，按去噪档位应用额外的滤波
+            if denoise_tier is None:
+                denoise_tier = self.params.get('denoise_tier', 'auto')
+                if denoise_tier == 'auto' and is_noisy is not None:
+                    denoise_tier = 'nlm' if is_noisy else 'none'
+            
+            if denoise_tier == 'auto':
+                # 在原始图像上估计噪声，选择满足目标信噪比的最便宜档位
+                denoise_tier, noise_info = denoise_utils.select_denoise_tier(
+                    image, self.params.get('denoise_target_snr', 60.0))
+                print(f"噪声估计: sigma={noise_info['sigma']:.2f}, SNR={noise_info['snr']:.1f}, "
+                      f"椒盐比例={noise_info['impulse_ratio']:.4f}, "
+                      f"选择去噪档位: {denoise_utils.DENOISE_TIER_NAMES[denoise_tier]}")
+            
+            blurred = denoise_utils.apply_denoise(blurred, denoise_tier)
             
             # 保存预处理图像用于调试
             cv2.imwrite(os.path.join(debug_dir, f"process_blurred_{int(time.time())}.jpg"), blurred)
@@ -3147,32 +3087,10 @@ class HoleDetectionApp(QMainWindow):
             
             # 检测孔的尺寸 - 以下采用与单图像处理相同的逻辑
             
-            # 计算行投影找到水平线
-            row_projection = np.sum(self.binary_image, axis=1)
-            row_projection_smooth = np.convolve(row_projection, np.ones(5)/5, mode='same')
-            
-            # 找到显著水平线
-            threshold = np.max(row_projection_smooth) * (self.params['row_projection_threshold'] / 100.0)
-            significant_rows = np.where(row_projection_smooth > threshold)[0]
-            
-            # 对找到的行分组
-            horizontal_lines = []
-            current_group = []
-            
-            for i in range(len(significant_rows)):
-                if i == 0 or significant_rows[i] - significant_rows[i-1] <= 5:
-                    current_group.append(significant_rows[i])
-                else:
-                    if current_group:
-                        horizontal_lines.append(int(np.mean(current_group)))
-                        current_group = [significant_rows[i]]
-            
-            # 添加最后一组
-            if current_group:
-                horizontal_lines.append(int(np.mean(current_group)))
-            
-            # 按从上到下排序
-            horizontal_lines.sort()
+            # 计算行投影找到水平线（分析缓存中的结果与单图像处理共用）
+            context = self.analysis_context.update(image, self.binary_image)
+            row_projection_smooth = context.smooth_row_projection()
+            horizontal_lines = context.horizontal_lines(self.params['row_projection_threshold'])
             
             # 在调试图像上标记找到的水平线
             debug_img = cv2.cvtColor(self.binary_image.copy(), cv2.COLOR_GRAY2BGR)
@@ -3785,6 +3703,7 @@ class HoleDetectionApp(QMainWindow):
             QMessageBox.warning(self, "裁剪失败", "未获取到有效的裁剪区域，请重新选择")
             return
 
+    @perf_trace.traced('calculateTaper', 'ui')
     def calculateTaper(self):
         """计算孔洞锥度并显示结果"""
         try:
@@ -3804,276 +3723,31 @@ class HoleDetectionApp(QMainWindow):
             debug_dir = 'debug'
             if not os.path.exists(debug_dir):
                 os.makedirs(debug_dir)
-                
-            # 改进图像增强以便更好地检测边缘
-            enhanced_image = self.original_image.copy()
-            # 应用CLAHE（对比度受限自适应直方图均衡化）增强对比度
-            clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-            enhanced_image = clahe.apply(enhanced_image)
-            
-            # 结合Sobel和Canny边缘增强可靠性
-            sobelx = cv2.Sobel(enhanced_image, cv2.CV_64F, 1, 0, ksize=3)
-            sobely = cv2.Sobel(enhanced_image, cv2.CV_64F, 0, 1, ksize=3)
-            sobel = np.sqrt(sobelx**2 + sobely**2)
-            sobel = np.uint8(np.clip(sobel, 0, 255))
-            
-            # 使用已知的顶部位置的洞口宽度
-            top_left = (self.hole_start, self.upper_surface_row)
-            top_right = (self.hole_end, self.upper_surface_row)
-            
-            # 计算搜索范围
-            bottom_half_start = self.upper_surface_row + 50  # 从顶部下方50像素开始搜索
-            search_end_row = min(self.original_image.shape[0], 
-                              int(self.original_image.shape[0] * self.params['bottom_search_range']))
-            
-            # 计算中心区域和期望宽度
-            hole_center_x = (self.hole_start + self.hole_end) // 2
-            hole_width = self.hole_end - self.hole_start
-            expected_bottom_width = hole_width * 0.85  # 假设底部略窄于顶部
-            
-            # ======= 改进的底部短横线检测 =======
-            # 1. 创建感兴趣区域ROI，集中在孔洞中心区域
-            search_width = max(hole_width, 60)  # 保证搜索宽度足够
-            roi_x_start = max(0, hole_center_x - search_width // 2)
-            roi_x_end = min(self.original_image.shape[1], hole_center_x + search_width // 2)
-            
-            # 选择合适的ROI区域
-            roi_height = search_end_row - bottom_half_start
-            roi = self.original_image[bottom_half_start:search_end_row, roi_x_start:roi_x_end]
-            
-            # 保存ROI用于调试
-            cv2.imwrite(os.path.join(debug_dir, "taper_roi.jpg"), roi)
-            
-            # 2. 使用不同的预处理方法增强ROI中的短横线
-            # 使用自适应阈值处理
-            roi_binary = cv2.adaptiveThreshold(roi, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                             cv2.THRESH_BINARY, 31, 5)
-            
-            # 使用边缘增强
-            roi_enhanced = cv2.GaussianBlur(roi, (5, 5), 0)
-            roi_edges = cv2.Canny(roi_enhanced, 30, 100)
-            
-            # 形态学操作增强水平结构
-            kernel_h = np.ones((1, 15), np.uint8)  # 水平核
-            roi_horizontal = cv2.morphologyEx(roi_binary, cv2.MORPH_OPEN, kernel_h)
-            
-            # 保存处理后的ROI用于调试
-            cv2.imwrite(os.path.join(debug_dir, "taper_roi_binary.jpg"), roi_binary)
-            cv2.imwrite(os.path.join(debug_dir, "taper_roi_edges.jpg"), roi_edges)
-            cv2.imwrite(os.path.join(debug_dir, "taper_roi_horizontal.jpg"), roi_horizontal)
-            
-            # 3. 计算行投影，查找短横线的位置
-            row_projection = np.sum(roi_horizontal, axis=1)
-            
-            # 平滑投影曲线
-            row_projection_smooth = np.convolve(row_projection, np.ones(5)/5, mode='same')
+            
+            # 底部短横线检测与锥度计算
+            taper_result = hole_engine.measure_taper(self.original_image, self.binary_image,
+                                                     self.upper_surface_row, self.hole_start, self.hole_end,
+                                                     self.params['bottom_search_range'],
+                                                     context=self.getAnalysisContext())
+            
+            # 保存ROI及处理结果用于调试
+            cv2.imwrite(os.path.join(debug_dir, "taper_roi.jpg"), taper_result['roi'])
+            cv2.imwrite(os.path.join(debug_dir, "taper_roi_binary.jpg"), taper_result['roi_binary'])
+            cv2.imwrite(os.path.join(debug_dir, "taper_roi_edges.jpg"), taper_result['roi_edges'])
+            cv2.imwrite(os.path.join(debug_dir, "taper_roi_horizontal.jpg"), taper_result['roi_horizontal'])
             
             # 保存投影曲线用于调试
             plt.figure(figsize=(10, 4))
-            plt.plot(row_projection_smooth)
+            plt.plot(taper_result['row_projection_smooth'])
             plt.title("底部短横线行投影")
             plt.savefig(os.path.join(debug_dir, "taper_row_projection.png"))
             plt.close()
             
-            # 4. 找到投影中的峰值，对应短横线位置
-            peaks = []
-            for i in range(1, len(row_projection_smooth) - 1):
-                if (row_projection_smooth[i] > row_projection_smooth[i-1] and 
-                    row_projection_smooth[i] > row_projection_smooth[i+1]):
-                    intensity = row_projection_smooth[i]
-                    # 筛选明显的峰值，避免噪声
-                    if intensity > np.mean(row_projection_smooth) + np.std(row_projection_smooth):
-                        peaks.append((i, intensity))
-            
-            # 按照投影强度降序排序峰值
-            peaks.sort(key=lambda x: x[1], reverse=True)
-            
-            # 记录最佳横线位置和点
-            best_short_line = None
-            bottom_left = None
-            bottom_right = None
-            best_short_line_row = None
-            best_short_line_score = 0
-            
-            # 5. 分析每个可能的短横线
-            for peak_idx, _ in peaks[:5]:  # 仅考虑前5个最强峰值
-                # 将峰值映射回原始图像坐标
-                peak_row = bottom_half_start + peak_idx
-                
-                # 获取该行像素
-                line_roi = roi_horizontal[peak_idx, :]
-                line_original = self.original_image[peak_row, roi_x_start:roi_x_end]
-                
-                # 寻找该行中的所有连通区域
-                transitions = np.where(np.diff(line_roi) != 0)[0]
-                if len(transitions) < 2:
-                    continue
-                
-                # 分析横线的特征
-                segments = []
-                for i in range(0, len(transitions) - 1, 2):
-                    if i + 1 < len(transitions):
-                        start_pos = transitions[i]
-                        end_pos = transitions[i + 1]
-                        length = end_pos - start_pos
-                        
-                        # 检查是否足够长且位于中心区域
-                        segment_center = roi_x_start + (start_pos + end_pos) // 2
-                        dist_from_center = abs(segment_center - hole_center_x)
-                        
-                        # 计算段的评分
-                        length_score = min(length / expected_bottom_width, 1.0)
-                        center_score = 1.0 - min(dist_from_center / (search_width / 2), 1.0)
-                        
-                        # 检查颜色对比度（短横线应该较亮）
-                        if start_pos > 0 and end_pos < len(line_original):
-                            segment_avg = np.mean(line_original[start_pos:end_pos])
-                            surrounding_avg = np.mean([np.mean(line_original[:start_pos]) if start_pos > 0 else 0, 
-                                                    np.mean(line_original[end_pos:]) if end_pos < len(line_original) else 0])
-                            contrast_score = max(0, min((segment_avg - surrounding_avg) / 50, 1.0))
-                        else:
-                            contrast_score = 0
-                        
-                        # 综合评分
-                        total_score = length_score * 0.4 + center_score * 0.4 + contrast_score * 0.2
-                        
-                        if length >= 5:  # 最小长度阈值
-                            segments.append({
-                                'start': roi_x_start + start_pos,
-                                'end': roi_x_start + end_pos,
-                                'length': length,
-                                'score': total_score,
-                                'row': peak_row
-                            })
-                
-                # 寻找最佳段
-                if segments:
-                    best_segment = max(segments, key=lambda s: s['score'])
-                    
-                    # 如果这个段比之前找到的更好，则更新
-                    if best_segment['score'] > best_short_line_score:
-                        best_short_line_score = best_segment['score']
-                        bottom_left = (best_segment['start'], best_segment['row'])
-                        bottom_right = (best_segment['end'], best_segment['row'])
-                        best_short_line_row = best_segment['row']
-                        best_short_line = best_segment
-            
-            # 如果没有找到好的短横线，使用传统方法尝试查找
-            if bottom_left is None or bottom_right is None:
-                # 尝试使用水平线霍夫变换
-                roi_edges = cv2.Canny(roi, 50, 150)
-                lines = cv2.HoughLinesP(roi_edges, 1, np.pi/180, 20, 
-                                     minLineLength=expected_bottom_width*0.3, 
-                                     maxLineGap=20)
-                
-                if lines is not None:
-                    best_line = None
-                    best_score = 0
-                    
-                    for line in lines:
-                        x1, y1, x2, y2 = line[0]
-                        
-                        # 转换回原始图像坐标
-                        x1 += roi_x_start
-                        x2 += roi_x_start
-                        y1 += bottom_half_start
-                        y2 += bottom_half_start
-                        
-                        # 检查是否为水平线
-                        if abs(y2 - y1) <= 3:  # 允许轻微倾斜
-                            # 计算评分
-                            length = abs(x2 - x1)
-                            length_score = min(length / expected_bottom_width, 1.0)
-                            
-                            center_pos = (x1 + x2) // 2
-                            center_score = 1.0 - min(abs(center_pos - hole_center_x) / (hole_width / 2), 1.0)
-                            
-                            # 检查亮度对比度
-                            y_mid = (y1 + y2) // 2
-                            if y_mid < self.original_image.shape[0]:
-                                line_segment = self.original_image[y_mid, min(x1, x2):max(x1, x2)]
-                                if len(line_segment) > 0:
-                                    segment_avg = np.mean(line_segment)
-                                    above_row = max(0, y_mid - 3)
-                                    below_row = min(self.original_image.shape[0] - 1, y_mid + 3)
-                                    surrounding_avg = (np.mean(self.original_image[above_row, min(x1, x2):max(x1, x2)]) + 
-                                                      np.mean(self.original_image[below_row, min(x1, x2):max(x1, x2)])) / 2
-                                    contrast_score = max(0, min((segment_avg - surrounding_avg) / 30, 1.0))
-                                else:
-                                    contrast_score = 0
-                            else:
-                                contrast_score = 0
-                                
-                            total_score = length_score * 0.4 + center_score * 0.4 + contrast_score * 0.2
-                            
-                            if total_score > best_score:
-                                best_score = total_score
-                                best_line = (x1, y1, x2, y2)
-                    
-                    if best_line and best_score > 0.5:
-                        x1, y1, x2, y2 = best_line
-                        bottom_left = (min(x1, x2), (y1 + y2) // 2)
-                        bottom_right = (max(x1, x2), (y1 + y2) // 2)
-                        best_short_line_row = (y1 + y2) // 2
-            
-            # 如果仍然没有找到，尝试使用二值图像中的转换点
-            if bottom_left is None or bottom_right is None:
-                # 在下半部分中搜索黑白转换模式
-                for row in range(int((bottom_half_start + search_end_row) * 0.7), bottom_half_start, -2):  # 从下往上搜索
-                    line = self.binary_image[row, :]
-                    transitions = np.where(np.diff(line) != 0)[0]
-                    
-                    if len(transitions) >= 2:
-                        # 分析所有可能的段
-                        candidates = []
-                        for i in range(0, len(transitions) - 1):
-                            start_idx = transitions[i]
-                            end_idx = transitions[i + 1]
-                            length = end_idx - start_idx
-                            
-                            # 检查是白到黑再到白的模式（黑色短横线）
-                            if (i < len(transitions) - 1 and 
-                                line[max(0, start_idx-1)] == 255 and 
-                                line[min(start_idx+1, len(line)-1)] == 0 and
-                                line[min(end_idx+1, len(line)-1)] == 255):
-                                
-                                # 计算评分
-                                center_pos = (start_idx + end_idx) // 2
-                                dist_from_hole_center = abs(center_pos - hole_center_x)
-                                
-                                if dist_from_hole_center < hole_width * 0.7:
-                                    length_score = min(length / expected_bottom_width, 1.0)
-                                    center_score = 1.0 - min(dist_from_hole_center / (hole_width / 2), 1.0)
-                                    total_score = length_score * 0.6 + center_score * 0.4
-                                    
-                                    candidates.append({
-                                        'start': start_idx,
-                                        'end': end_idx,
-                                        'score': total_score
-                                    })
-                        
-                        if candidates:
-                            best_candidate = max(candidates, key=lambda c: c['score'])
-                            if best_candidate['score'] > 0.5:
-                                bottom_left = (best_candidate['start'], row)
-                                bottom_right = (best_candidate['end'], row)
-                                best_short_line_row = row
-                                break
-            
-            # 如果仍然没有找到，回退到图像下部位置估计
-            if bottom_left is None or bottom_right is None:
-                # 估计底部位置
-                estimated_bottom_row = int(self.upper_surface_row + (self.original_image.shape[0] - self.upper_surface_row) * 0.7)
-                bottom_width = (self.hole_end - self.hole_start) * 0.8  # 假设底部宽度为顶部的80%
-                bottom_left = (int(hole_center_x - bottom_width / 2), estimated_bottom_row)
-                bottom_right = (int(hole_center_x + bottom_width / 2), estimated_bottom_row)
-                best_short_line_row = estimated_bottom_row
-            
-            # 确保所有点的坐标都是整数
-            top_left = (int(top_left[0]), int(top_left[1]))
-            top_right = (int(top_right[0]), int(top_right[1]))
-            bottom_left = (int(bottom_left[0]), int(bottom_left[1]))
-            bottom_right = (int(bottom_right[0]), int(bottom_right[1]))
+            top_left = taper_result['top_left']
+            top_right = taper_result['top_right']
+            bottom_left = taper_result['bottom_left']
+            bottom_right = taper_result['bottom_right']
+            best_short_line_row = taper_result['bottom_row']
             
             # 绘制辅助线以便更好地可视化锥度
             cv2.line(result_img, (0, top_left[1]), (result_img.shape[1], top_left[1]), (0, 200, 0), 1)  # 淡绿色顶部辅助线
@@ -4093,7 +3767,7 @@ class HoleDetectionApp(QMainWindow):
             cv2.circle(result_img, bottom_right, 5, (0, 255, 0), -1)  # 绿色
             
             # 如果找到了短横线，显著标记它
-            if best_short_line:
+            if taper_result['short_line']:
                 # 使用红色标记短横线
                 short_line_start = bottom_left[0]
                 short_line_end = bottom_right[0]
@@ -4101,15 +3775,14 @@ class HoleDetectionApp(QMainWindow):
                 cv2.line(result_img, (short_line_start, short_line_row), 
                        (short_line_end, short_line_row), (0, 0, 255), 2)  # 红色标记短横线
             
-            # 计算锥度
-            top_width = top_right[0] - top_left[0]
-            bottom_width = bottom_right[0] - bottom_left[0]
-            height = bottom_left[1] - top_left[1]  # 垂直高度
-            
-            if height > 0:
-                # 锥度计算 = (顶部宽度 - 底部宽度) / (2 * 高度)
-                taper = (top_width - bottom_width) / (2 * height)
-                taper_angle = np.arctan(taper) * 180 / np.pi
+            # 锥度
+            top_width = taper_result['top_width']
+            bottom_width = taper_result['bottom_width']
+            height = taper_result['height']  # 垂直高度
+            
+            if taper_result['taper'] is not None:
+                taper = taper_result['taper']
+                taper_angle = taper_result['taper_angle']
                 
                 # 创建结果图像的副本以避免修改原图
                 display_img = result_img.copy()
@@ -4407,6 +4080,127 @@ class HoleDetectionApp(QMainWindow):
             # 显示结果对话框
             self.showEnhancedTaperResult(self.result_image, top_width, bottom_width, height, taper, taper_angle)
 
+    @perf_trace.traced('wall_profile_ui', 'ui')
+    def analyzeWallProfile(self):
+        """提取整个孔深范围内逐行的孔壁边缘，显示直径-深度曲线、锥度和倾斜角"""
+        if self.binary_image is None:
+            QMessageBox.warning(self, "警告", "请先加载并处理图像")
+            return
+        if not hasattr(self, 'upper_surface_row') or not hasattr(self, 'bottom_surface_row'):
+            QMessageBox.warning(self, "警告", "无法进行孔壁轮廓分析：缺少孔洞尺寸信息")
+            return
+        
+        try:
+            profile = self.getAnalysisContext().wall_profile(self.upper_surface_row, self.bottom_surface_row,
+                                                             self.hole_start, self.hole_end,
+                                                             PIXEL_TO_UM_X, PIXEL_TO_UM_Y)
+            if profile['left_fit'] is None or profile['right_fit'] is None:
+                QMessageBox.warning(self, "警告", "无法提取孔壁轮廓：有效边缘点不足")
+                return
+            self.wall_profile = profile
+            self.showWallProfileResult(profile)
+        except Exception as e:
+            print(f"孔壁轮廓分析时出错: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            QMessageBox.critical(self, "错误", f"孔壁轮廓分析时出错: {str(e)}")
+    
+    def showWallProfileResult(self, profile):
+        """显示孔壁轮廓分析结果：边缘叠加图、直径-深度曲线和拟合参数"""
+        rows = profile['rows']
+        
+        # 在原图上绘制逐行边缘点（左红右蓝）和拟合直线（绿色）、中心线（黄色）
+        result_img = cv2.cvtColor(self.original_image, cv2.COLOR_GRAY2RGB)
+        for edges, color in ((profile['left_edges'], (255, 0, 0)), (profile['right_edges'], (0, 0, 255))):
+            found = ~np.isnan(edges)
+            result_img[rows[found], edges[found].astype(int)] = color
+        (a_left, b_left), (a_right, b_right) = profile['left_fit'], profile['right_fit']
+        r0, r1 = int(rows[0]), int(rows[-1])
+        for a, b, color in ((a_left, b_left, (0, 255, 0)), (a_right, b_right, (0, 255, 0)),
+                            ((a_left + a_right) / 2, (b_left + b_right) / 2, (255, 255, 0))):
+            cv2.line(result_img, (int(round(a * r0 + b)), r0), (int(round(a * r1 + b)), r1), color, 1)
+        
+        dialog = QDialog(self)
+        dialog.setWindowTitle("孔壁轮廓分析结果")
+        dialog.setMinimumSize(1100, 700)
+        layout = QVBoxLayout(dialog)
+        
+        topLayout = QHBoxLayout()
+        imgLabel = QLabel()
+        h, w = result_img.shape[:2]
+        pixmap = QPixmap.fromImage(QImage(result_img.data, w, h, 3 * w, QImage.Format_RGB888))
+        imgLabel.setPixmap(pixmap.scaled(500, 600, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        imgLabel.setAlignment(Qt.AlignCenter)
+        topLayout.addWidget(imgLabel, 1)
+        
+        # 直径-深度曲线
+        fig = Figure(figsize=(6, 5))
+        canvas = FigureCanvas(fig)
+        ax = fig.add_subplot(111)
+        valid = profile['valid']
+        ax.plot(profile['diameter_um'][valid], profile['depth_um'][valid], '.', markersize=2,
+                color='#888888', label='逐行直径')
+        ax.plot(profile['diameter_fit_um'], profile['depth_um'], 'r-', label='孔壁拟合')
+        ax.invert_yaxis()
+        ax.set_xlabel('直径 (μm)')
+        ax.set_ylabel('深度 (μm)')
+        ax.grid(True, alpha=0.3)
+        ax.legend()
+        fig.tight_layout()
+        topLayout.addWidget(canvas, 1)
+        layout.addLayout(topLayout, 3)
+        
+        resultGroupBox = QGroupBox("孔壁拟合结果")
+        resultLayout = QFormLayout()
+        resultLayout.addRow("入口直径 (拟合):", QLabel(f"{profile['entrance_diameter_um']:.2f} μm"))
+        resultLayout.addRow("出口直径 (拟合):", QLabel(f"{profile['exit_diameter_um']:.2f} μm"))
+        resultLayout.addRow("平均直径 (逐行):", QLabel(f"{profile['mean_diameter_um']:.2f} μm"
+                                                  if profile['mean_diameter_um'] is not None else "N/A"))
+        resultLayout.addRow("锥度 / 锥度角 (按微米):", QLabel(f"{profile['taper_um']:.4f} / {profile['taper_angle_um']:.3f}°"))
+        resultLayout.addRow("左壁角 / 右壁角:", QLabel(f"{profile['left_wall_angle']:.3f}° / "
+                                                  f"{profile['right_wall_angle']:.3f}°"))
+        resultLayout.addRow("中心线倾斜角:", QLabel(f"{profile['tilt_angle']:.3f}°"))
+        resultLayout.addRow("拟合残差RMS (左/右):", QLabel(f"{profile['left_rms']:.2f} / {profile['right_rms']:.2f} 像素"))
+        resultLayout.addRow("边缘覆盖率 (左/右):", QLabel(f"{profile['left_coverage']:.0%} / "
+                                                   f"{profile['right_coverage']:.0%}"))
+        resultGroupBox.setLayout(resultLayout)
+        layout.addWidget(resultGroupBox, 1)
+        
+        buttonBox = QHBoxLayout()
+        exportButton = QPushButton("导出CSV")
+        exportButton.clicked.connect(lambda: self.exportWallProfile(profile))
+        closeButton = QPushButton("关闭")
+        closeButton.clicked.connect(dialog.accept)
+        buttonBox.addWidget(exportButton)
+        buttonBox.addWidget(closeButton)
+        layout.addLayout(buttonBox)
+        
+        dialog.exec_()
+    
+    def exportWallProfile(self, profile):
+        """导出逐行孔壁轮廓数据"""
+        default_name = "wall_profile.csv"
+        if self.current_image_path:
+            default_name = os.path.splitext(os.path.basename(self.current_image_path))[0] + "_wall_profile.csv"
+        filePath, _ = QFileDialog.getSaveFileName(self, "导出孔壁轮廓", default_name, "CSV文件 (*.csv)")
+        if not filePath:
+            return
+        try:
+            df = pd.DataFrame({
+                "行 (像素)": profile['rows'],
+                "深度 (μm)": profile['depth_um'],
+                "左边缘 (像素)": profile['left_edges'],
+                "右边缘 (像素)": profile['right_edges'],
+                "中心线 (像素)": profile['centerline'],
+                "直径 (μm)": profile['diameter_um'],
+                "拟合直径 (μm)": profile['diameter_fit_um'],
+            })
+            df.to_csv(filePath, index=False, encoding='utf-8-sig')
+            QMessageBox.information(self, "导出成功", f"孔壁轮廓已导出至: {filePath}")
+        except Exception as e:
+            QMessageBox.critical(self, "导出错误", f"导出孔壁轮廓时出错: {str(e)}")
+    
+    @perf_trace.traced('analyzeRoughness', 'ui')
     def analyzeRoughness(self):
         if self.binary_image is None:
             QMessageBox.warning(self, "警告", "请先加载并处理图像")
@@ -4417,74 +4211,38 @@ class HoleDetectionApp(QMainWindow):
                 QMessageBox.warning(self, "警告", "无法进行粗糙度分析：缺少孔洞尺寸信息")
                 return
             
-            hole_mask = np.zeros_like(self.binary_image)
-            cv2.rectangle(hole_mask, (self.hole_start, self.upper_surface_row), 
-                          (self.hole_end, self.bottom_surface_row), 255, -1)
-            
-            inner_wall_roi = cv2.bitwise_and(self.binary_image, hole_mask)
-            edges = cv2.Canny(inner_wall_roi, 50, 150)
-            contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            long_contours = []
-            min_contour_length = (self.bottom_surface_row - self.upper_surface_row) * 0.3
-            for contour in contours:
-                if len(contour) > min_contour_length:
-                    _, _, w, h = cv2.boundingRect(contour)
-                    if h > w * 2:
-                        long_contours.append(contour)
+            roughness = self.computeRoughness(getattr(self, 'roughness_cutoff_um',
+                                                      hole_engine.DEFAULT_ROUGHNESS_CUTOFF_UM))
+            if roughness['roughness_score'] is None:
+                QMessageBox.warning(self, "警告", "无法计算粗糙度：未找到有效的孔壁边缘")
+                return
             
             result_img = cv2.cvtColor(self.original_image.copy(), cv2.COLOR_GRAY2BGR)
-            cv2.drawContours(result_img, long_contours, -1, (0, 255, 0), 1)
-            
-            if len(long_contours) > 0:
-                all_points = np.vstack(long_contours)
-                pca = PCA(n_components=1)
-                pca.fit(all_points.reshape(-1, 2))
-                main_axis = pca.components_[0]
-                mean_point = np.mean(all_points.reshape(-1, 2), axis=0)
-                deviations = np.abs(np.dot(all_points.reshape(-1, 2) - mean_point, 
-                                          np.array([-main_axis[1], main_axis[0]])))
-                avg_smoothness = np.std(deviations)
-                roughness_score = 100 / (1 + avg_smoothness)
-                
-                if roughness_score > 80:
-                    roughness_grade = "非常光滑"
-                elif roughness_score > 60:
-                    roughness_grade = "光滑"
-                elif roughness_score > 40:
-                    roughness_grade = "一般"
-                else:
-                    roughness_grade = "粗糙"
-                
-                curvatures = []
-                for contour in long_contours:
-                    arc_length = cv2.arcLength(contour, closed=False)
-                    start_point = contour[0][0]
-                    end_point = contour[-1][0]
-                    chord_length = np.linalg.norm(start_point - end_point)
-                    if chord_length > 1e-6:
-                        curvatures.append(arc_length / chord_length)
-                
-                avg_curvature = np.mean(curvatures) if curvatures else 1.0
-                self.showRoughnessResult(result_img, roughness_score, roughness_grade, avg_smoothness, 
-                                         avg_curvature, len(long_contours))
-            else:
-                QMessageBox.warning(self, "警告", "无法计算粗糙度：未找到有效的轮廓")
+            cv2.polylines(result_img, roughness['contours'], False, (0, 255, 0), 1)
+            self.showRoughnessResult(result_img, roughness)
                 
         except Exception as e:
             print(f"粗糙度分析时出错: {str(e)}")
             import traceback
             traceback.print_exc()
             QMessageBox.critical(self, "错误", f"在粗糙度分析过程中发生错误: {e}")
+    
+    def computeRoughness(self, cutoff_um):
+        """按当前检测结果计算两侧孔壁粗糙度（孔壁轮廓与孔壁轮廓分析共用缓存，改变截止波长时不重新提取）"""
+        profile = self.getAnalysisContext().wall_profile(self.upper_surface_row, self.bottom_surface_row,
+                                                         self.hole_start, self.hole_end,
+                                                         PIXEL_TO_UM_X, PIXEL_TO_UM_Y)
+        return hole_engine.analyze_roughness(self.binary_image, self.upper_surface_row,
+                                             self.bottom_surface_row, self.hole_start, self.hole_end,
+                                             PIXEL_TO_UM_X, PIXEL_TO_UM_Y, cutoff_um, wall_profile=profile)
 
-    def showRoughnessResult(self, result_img, roughness_score, roughness_grade, 
-                           smoothness, curvature, contour_count):
+    def showRoughnessResult(self, result_img, roughness):
         """显示粗糙度分析结果"""
         try:
             # 创建结果对话框
             dialog = QDialog(self)
             dialog.setWindowTitle("孔洞粗糙度分析结果")
-            dialog.setMinimumSize(900, 700)
+            dialog.setMinimumSize(900, 750)
             
             # 创建布局
             layout = QVBoxLayout()
@@ -4497,11 +4255,6 @@ class HoleDetectionApp(QMainWindow):
             imageWidget = QWidget()
             imageLayout = QVBoxLayout(imageWidget)
             
-            # 确保result_img不为None
-            if result_img is None:
-                print("警告: 结果图像为空，使用原始图像替代")
-                result_img = cv2.cvtColor(self.original_image.copy(), cv2.COLOR_GRAY2BGR)
-                
             imgLabel = QLabel()
             h, w, c = result_img.shape
             bytesPerLine = 3 * w
@@ -4509,8 +4262,7 @@ class HoleDetectionApp(QMainWindow):
             pixmap = QPixmap.fromImage(qImg)
             
             # 设置合适的图像大小
-            orig_width = pixmap.width()
-            if orig_width > 800:
+            if pixmap.width() > 800:
                 pixmap = pixmap.scaled(800, int(h * 800 / w), Qt.KeepAspectRatio, Qt.SmoothTransformation)
             
             imgLabel.setPixmap(pixmap)
@@ -4519,59 +4271,83 @@ class HoleDetectionApp(QMainWindow):
             
             scrollArea.setWidget(imageWidget)
             
-            # 创建结果显示区域
+            # 截止波长，修改后重新计算
+            cutoffLayout = QHBoxLayout()
+            cutoffLayout.addWidget(QLabel("粗糙度/波纹度截止波长 λc (μm):"))
+            cutoffSpin = QDoubleSpinBox()
+            cutoffSpin.setRange(1.0, 10000.0)
+            cutoffSpin.setDecimals(1)
+            cutoffSpin.setValue(roughness['cutoff_um'])
+            cutoffLayout.addWidget(cutoffSpin)
+            cutoffLayout.addStretch()
+            
+            # 创建结果显示区域：两侧孔壁分别列出
             resultGroupBox = QGroupBox("粗糙度测量结果")
-            resultLayout = QFormLayout()
+            resultLayout = QGridLayout()
+            metricNames = [('Ra', 'Ra (μm)'), ('Rq', 'Rq (μm)'), ('Rz', 'Rz (μm)'), ('Rt', 'Rt (μm)'),
+                           ('Wa', '波纹度 Wa (μm)'), ('Pq', '原始轮廓 Pq (μm)'),
+                           ('dominant_wavelength_um', '粗糙度主波长 (μm)'), ('axis_angle', '孔壁倾角 (°)'),
+                           ('n_points', '边缘点数')]
+            resultLayout.addWidget(QLabel("<b>左侧孔壁</b>"), 0, 1)
+            resultLayout.addWidget(QLabel("<b>右侧孔壁</b>"), 0, 2)
+            valueLabels = {}
+            for i, (key, name) in enumerate(metricNames, start=1):
+                resultLayout.addWidget(QLabel(name + ":"), i, 0)
+                for j, side in enumerate(('left', 'right'), start=1):
+                    label = QLabel()
+                    resultLayout.addWidget(label, i, j)
+                    valueLabels[(side, key)] = label
+            
+            summaryRow = len(metricNames) + 1
+            scoreLabel = QLabel()
+            gradeLabel = QLabel()
+            resultLayout.addWidget(QLabel("粗糙度评分:"), summaryRow, 0)
+            resultLayout.addWidget(scoreLabel, summaryRow, 1)
+            resultLayout.addWidget(QLabel("粗糙度等级:"), summaryRow + 1, 0)
+            resultLayout.addWidget(gradeLabel, summaryRow + 1, 1)
             
-            # 粗糙度分数和等级
-            roughnessScoreText = f"{roughness_score:.2f}/10.00"
-            
-            # 添加彩色评级标签
-            roughnessGradeLabel = QLabel(roughness_grade)
-            if roughness_grade == "极光滑":
-                roughnessGradeLabel.setStyleSheet("color: green; font-weight: bold;")
-            elif roughness_grade == "光滑":
-                roughnessGradeLabel.setStyleSheet("color: #00AA00; font-weight: bold;")
-            elif roughness_grade == "中等":
-                roughnessGradeLabel.setStyleSheet("color: #AAAA00; font-weight: bold;")
-            elif roughness_grade == "粗糙":
-                roughnessGradeLabel.setStyleSheet("color: #AA5500; font-weight: bold;")
-            else:
-                roughnessGradeLabel.setStyleSheet("color: red; font-weight: bold;")
+            # 添加说明文本
+            explainLabel = QLabel("说明: Ra/Rq/Rz 为高斯滤波去除波纹度后的粗糙度参数；评分范围为0-100，越高表示孔壁越光滑")
+            explainLabel.setStyleSheet("font-style: italic; color: #666666;")
+            resultLayout.addWidget(explainLabel, summaryRow + 2, 0, 1, 3)
+            resultGroupBox.setLayout(resultLayout)
             
-            # 添加技术指标
-            smoothnessText = f"{smoothness:.4f}"
-            curvatureText = f"{curvature:.4f}"
-            contourText = f"{contour_count}"
+            gradeColors = {"非常光滑": "green", "光滑": "#00AA00", "一般": "#AAAA00", "粗糙": "red"}
             
-            resultLayout.addRow("粗糙度评分:", QLabel(roughnessScoreText))
-            resultLayout.addRow("粗糙度等级:", roughnessGradeLabel)
-            resultLayout.addRow("平滑度指数:", QLabel(smoothnessText))
-            resultLayout.addRow("曲率变化指数:", QLabel(curvatureText))
-            resultLayout.addRow("检测到的轮廓数:", QLabel(contourText))
+            def updateLabels(result):
+                for (side, key), label in valueLabels.items():
+                    value = result['walls'].get(side, {}).get(key)
+                    if value is None:
+                        label.setText("N/A")
+                    elif isinstance(value, int):
+                        label.setText(str(value))
+                    else:
+                        label.setText(f"{value:.3f}")
+                scoreLabel.setText(f"{result['roughness_score']:.2f}/100.00")
+                gradeLabel.setText(result['roughness_grade'])
+                gradeLabel.setStyleSheet(f"color: {gradeColors.get(result['roughness_grade'], 'red')}; "
+                                         f"font-weight: bold;")
             
-            # 添加说明文本
-            explainLabel = QLabel("说明: 粗糙度评分越低表示孔洞边缘越光滑，评分范围为0-10")
-            explainLabel.setStyleSheet("font-style: italic; color: #666666;")
-            resultLayout.addRow("", explainLabel)
+            current = {'roughness': roughness}
             
-            resultGroupBox.setLayout(resultLayout)
+            def recompute():
+                self.roughness_cutoff_um = cutoffSpin.value()
+                current['roughness'] = self.computeRoughness(self.roughness_cutoff_um)
+                updateLabels(current['roughness'])
+            
+            updateLabels(roughness)
+            cutoffSpin.editingFinished.connect(recompute)
             
             # 添加到主布局
             layout.addWidget(scrollArea, 3)
+            layout.addLayout(cutoffLayout)
             layout.addWidget(resultGroupBox, 1)
             
             # 添加按钮
             buttonBox = QHBoxLayout()
             saveButton = QPushButton("保存结果")
             closeButton = QPushButton("关闭")
-            
-            # 创建保存结果方法
-            def saveRoughnessResult():
-                self.saveRoughnessResult(result_img, roughness_score, roughness_grade, 
-                                       smoothness, curvature, contour_count)
-            
-            saveButton.clicked.connect(saveRoughnessResult)
+            saveButton.clicked.connect(lambda: self.saveRoughnessResult(result_img, current['roughness']))
             closeButton.clicked.connect(dialog.accept)
             
             buttonBox.addWidget(saveButton)
@@ -4584,9 +4360,8 @@ class HoleDetectionApp(QMainWindow):
             print(f"显示粗糙度结果时出错: {str(e)}")
             QMessageBox.warning(self, "错误", f"显示粗糙度结果时出错: {str(e)}")
     
-    def saveRoughnessResult(self, result_img, roughness_score, roughness_grade, 
-                           smoothness, curvature, contour_count):
-        """保存粗糙度计算结果"""
+    def saveRoughnessResult(self, result_img, roughness):
+        """保存粗糙度计算结果（标注图像、参数CSV和两侧孔壁的等间距轮廓CSV）"""
         # 创建保存文件对话框
         options = QFileDialog.Options()
         fileName, _ = QFileDialog.getSaveFileName(self, "保存粗糙度结果", "", 
@@ -4598,14 +4373,11 @@ class HoleDetectionApp(QMainWindow):
             
             # 在图像上添加测量结果文本
             result_copy = result_img.copy()
-            
-            # 添加测量结果到图像
             info_text = [
-                f"粗糙度评分: {roughness_score:.2f}/10.00",
-                f"粗糙度等级: {roughness_grade}",
-                f"平滑度指数: {smoothness:.4f}",
-                f"曲率变化指数: {curvature:.4f}",
-                f"检测到的轮廓数: {contour_count}"
+                f"Ra: {roughness['Ra']:.3f} μm  Rq: {roughness['Rq']:.3f} μm  Rz: {roughness['Rz']:.3f} μm",
+                f"截止波长: {roughness['cutoff_um']:.1f} μm",
+                f"粗糙度评分: {roughness['roughness_score']:.2f}/100.00",
+                f"粗糙度等级: {roughness['roughness_grade']}",
             ]
             
             # 在图像上添加文本
@@ -4624,24 +4396,89 @@ class HoleDetectionApp(QMainWindow):
                 else:
                     raise Exception("无法编码图像")
                 
-                # 创建CSV文件名
-                csv_fileName = fileName.rsplit('.', 1)[0] + '.csv'
+                base_name = fileName.rsplit('.', 1)[0]
+                csv_fileName = base_name + '.csv'
                 
-                # 保存CSV数据
+                # 保存参数CSV
                 with open(csv_fileName, 'w', newline='', encoding='utf-8-sig') as csvfile:
                     writer = csv.writer(csvfile)
-                    writer.writerow(['参数', '数值'])
-                    writer.writerow(['粗糙度评分', f'{roughness_score:.2f}'])
-                    writer.writerow(['粗糙度等级', roughness_grade])
-                    writer.writerow(['平滑度指数', f'{smoothness:.4f}'])
-                    writer.writerow(['曲率变化指数', f'{curvature:.4f}'])
-                    writer.writerow(['检测到的轮廓数', f'{contour_count}'])
+                    writer.writerow(['参数', '左侧孔壁', '右侧孔壁'])
+                    for key in ('Ra', 'Rq', 'Rz', 'Rt', 'Wa', 'Wq', 'Wz', 'Pa', 'Pq', 'Pz',
+                                'dominant_wavelength_um', 'axis_angle', 'n_points'):
+                        writer.writerow([key] + [roughness['walls'].get(side, {}).get(key, '')
+                                                 for side in ('left', 'right')])
+                    writer.writerow(['cutoff_um', roughness['cutoff_um'], roughness['cutoff_um']])
+                    writer.writerow(['粗糙度评分', f"{roughness['roughness_score']:.2f}", ''])
+                    writer.writerow(['粗糙度等级', roughness['roughness_grade'], ''])
+                
+                # 保存两侧孔壁的等间距轮廓（原始/波纹度/粗糙度）
+                profile_fileNames = []
+                for side, wall in roughness['walls'].items():
+                    profile_fileName = f"{base_name}_{side}_profile.csv"
+                    pd.DataFrame({
+                        '位置 (μm)': wall['position_um'],
+                        '原始轮廓 (μm)': wall['primary_um'],
+                        '波纹度 (μm)': wall['waviness_um'],
+                        '粗糙度 (μm)': wall['roughness_um'],
+                    }).to_csv(profile_fileName, index=False, encoding='utf-8-sig')
+                    profile_fileNames.append(profile_fileName)
                 
-                QMessageBox.information(self, "保存成功", f"粗糙度分析结果已保存到:\n{fileName}\n{csv_fileName}")
+                QMessageBox.information(self, "保存成功", "粗糙度分析结果已保存到:\n" +
+                                        "\n".join([fileName, csv_fileName] + profile_fileNames))
             
             except Exception as e:
                 print(f"保存粗糙度结果时发生错误: {str(e)}")
                 QMessageBox.warning(self, "保存错误", f"保存文件时出错: {str(e)}")
+    
+    def batchRoughnessAnalysis(self):
+        """对文件夹中所有图像按当前参数计算孔壁粗糙度，结果保存为CSV"""
+        folder_path = QFileDialog.getExistingDirectory(self, "选择图像文件夹")
+        if not folder_path:
+            return
+        image_extensions = ['.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff']
+        files = sorted(f for f in os.listdir(folder_path)
+                       if os.path.splitext(f)[1].lower() in image_extensions)
+        if not files:
+            QMessageBox.warning(self, "批量粗糙度分析", "所选文件夹中没有找到支持的图像文件")
+            return
+        
+        csv_path, _ = QFileDialog.getSaveFileName(self, "保存粗糙度结果",
+                                                  os.path.join(folder_path, "roughness.csv"), "CSV文件 (*.csv)")
+        if not csv_path:
+            return
+        
+        cutoff_um = getattr(self, 'roughness_cutoff_um', hole_engine.DEFAULT_ROUGHNESS_CUTOFF_UM)
+        progress = QProgressDialog("正在计算粗糙度...", "取消", 0, len(files), self)
+        progress.setWindowModality(Qt.WindowModal)
+        rows = []
+        for i, name in enumerate(files):
+            progress.setValue(i)
+            QApplication.processEvents()
+            if progress.wasCanceled():
+                break
+            path = os.path.join(folder_path, name)
+            try:
+                image = image_io.read_gray(path)
+                if image is None:
+                    raise IOError("无法读取图像")
+                roughness, profile = hole_engine.roughness_for_image(image, self.params, PIXEL_TO_UM_X,
+                                                                     PIXEL_TO_UM_Y, cutoff_um)
+                rows.append(hole_engine.roughness_row(name, roughness, profile))
+            except Exception as e:
+                print(f"计算 {name} 的粗糙度时出错: {str(e)}")
+                rows.append({'filename': name, 'status': f'error: {e}'})
+        progress.setValue(len(files))
+        
+        try:
+            with open(csv_path, 'w', newline='', encoding='utf-8-sig') as f:
+                writer = csv.DictWriter(f, fieldnames=hole_engine.ROUGHNESS_FIELDS)
+                writer.writeheader()
+                writer.writerows(rows)
+            ok_count = sum(1 for row in rows if row.get('status') == 'ok')
+            QMessageBox.information(self, "批量粗糙度分析",
+                                    f"已处理 {len(rows)} 张图像（成功 {ok_count} 张）\n结果已保存到: {csv_path}")
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"保存粗糙度结果时出错: {str(e)}")
 
     def showManualMeasurementResult(self, points, distance, h_distance, v_distance):
         """显示手动测量结果对话框
@@ -5157,23 +4994,8 @@ class HoleDetectionApp(QMainWindow):
             result_img = cv2.cvtColor(self.original_image.copy(), cv2.COLOR_GRAY2BGR)
             binary_img = self.binary_image
 
-            # 1. 寻找顶部表面直线
-            row_projection = np.sum(binary_img, axis=1)
-            row_projection_smooth = np.convolve(row_projection, np.ones(5)/5, mode='same')
-            threshold = np.max(row_projection_smooth) * (self.params['row_projection_threshold'] / 100.0)
-            significant_rows = np.where(row_projection_smooth > threshold)[0]
-            
-            horizontal_lines = []
-            current_group = []
-            if len(significant_rows) > 0:
-                for i in range(len(significant_rows)):
-                    if not current_group or significant_rows[i] - current_group[-1] <= 5:
-                        current_group.append(significant_rows[i])
-                    else:
-                        horizontal_lines.append(int(np.mean(current_group)))
-                        current_group = [significant_rows[i]]
-                if current_group:
-                    horizontal_lines.append(int(np.mean(current_group)))
+            # 1. 寻找顶部表面直线（水平线分组与自动测量共用分析缓存）
+            horizontal_lines = self.getAnalysisContext().horizontal_lines(self.params['row_projection_threshold'])
             
             if not horizontal_lines:
                 QMessageBox.warning(self, "错误", "无法找到顶部表面。")
@@ -5278,6 +5100,8 @@ class HoleDetectionApp(QMainWindow):
                 self.processImage()
 
 if __name__ == "__main__":
+    # 打包为 exe 后，批量检测的工作进程需要由此进入 multiprocessing，而不是再次启动界面
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = HoleDetectionApp()
     window.show()
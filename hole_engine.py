@@ -0,0 +1,1256 @@
+"""
+孔洞测量引擎（无界面）
+
+从主界面 HoleDetectionApp.processImage / detect_hole_dimensions 中抽取的纯计算部分，
+供主界面、参数自动调优、批处理等共用，保证各处使用完全相同的算法。
+"""
+import numpy as np
+import cv2
+
+import perf_trace
+
+# 默认参数，与主界面"重置参数设置"一致
+DEFAULT_PARAMS = {
+    'gaussian_kernel': 5,
+    'adaptive_block_size': 51,
+    'adaptive_c': 5,
+    'binary_threshold': 128,  # 全局二值化阈值参数
+    'top_line_index': 1,  # 第几条水平线作为顶部
+    'row_projection_threshold': 70,  # 行投影阈值
+    'gap_min_width': 50,  # 缺口最小宽度
+    'horizontal_kernel_size': 25,  # 水平线检测核大小
+    'column_projection_threshold': 30,  # 列投影阈值
+    'column_peak_window': 10,  # 峰值检测窗口大小
+    'bottom_enhance_contrast': 1.5,  # 底部增强对比度
+    'bottom_search_range': 0.8,  # 底部搜索范围（占图像高度的比例）
+    'bottom_line_index': 0,  # 第几条水平线作为底部
+    'short_line_min_length': 5,  # 短横线最小长度
+    'short_line_min_white_ratio': 0.4,  # 短横线区域白色像素最小比例
+    'short_line_max_white_ratio': 0.9,  # 短横线区域白色像素最大比例
+    'invert_binary': False,  # 是否反转二值图像
+    'pixel_to_um_x': 1.60,  # X方向（直径）像素到微米的转换比例
+    'pixel_to_um_y': 1.94,  # Y方向（深度）像素到微米的转换比例
+    'denoise_tier': 'auto',  # 噪声图像去噪档位，'auto'表示根据噪声估计自动选择
+    'denoise_target_snr': 60.0  # 自动选择去噪档位时的目标信噪比
+}
+
+# 影响二值化结果的参数，用于缓存二值图像
+PREPROCESS_KEYS = ('gaussian_kernel', 'adaptive_block_size', 'adaptive_c',
+                   'binary_threshold', 'invert_binary')
+
+
+def preprocess_key(params):
+    """返回决定二值图像的参数元组，可作为缓存键"""
+    return tuple(params[k] for k in PREPROCESS_KEYS)
+
+
+@perf_trace.traced('preprocess')
+def preprocess_image(image, params):
+    """
+    高斯滤波 + 自适应/OTSU/全局阈值合并 + 形态学开闭运算，得到二值图像
+
+    参数:
+        image: 灰度图像 (uint8)
+        params: 参数字典
+
+    返回:
+        二值图像 (uint8, 0/255)
+    """
+    # 应用高斯滤波减少噪声
+    gaussian_kernel_size = params['gaussian_kernel']
+    with perf_trace.span('gaussian_blur'):
+        blurred = cv2.GaussianBlur(image, (gaussian_kernel_size, gaussian_kernel_size), 0)
+
+    # 应用自适应二值化
+    adaptive_block_size = params['adaptive_block_size']
+    adaptive_c = params['adaptive_c']
+    with perf_trace.span('adaptive_threshold'):
+        binary_adaptive = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                                cv2.THRESH_BINARY, adaptive_block_size, adaptive_c)
+
+    with perf_trace.span('global_threshold'):
+        # 全局OTSU二值化
+        _, binary_otsu = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+        # 使用自定义全局阈值进行二值化
+        _, binary_global = cv2.threshold(blurred, params['binary_threshold'], 255, cv2.THRESH_BINARY)
+
+        # 合并三种二值化结果
+        binary_combined = cv2.bitwise_and(binary_otsu, binary_adaptive)
+        binary_combined = cv2.bitwise_and(binary_combined, binary_global)
+
+    # 形态学操作
+    with perf_trace.span('morphology'):
+        kernel = np.ones((3, 3), np.uint8)
+        binary_opened = cv2.morphologyEx(binary_combined, cv2.MORPH_OPEN, kernel)
+        binary_final = cv2.morphologyEx(binary_opened, cv2.MORPH_CLOSE, kernel)
+
+    # 如果需要反转二值图像
+    if params['invert_binary']:
+        binary_final = 255 - binary_final
+
+    return binary_final
+
+
+def smooth_row_projection(binary_image):
+    """计算行投影并做5点平滑"""
+    row_projection = np.sum(binary_image, axis=1)
+    return np.convolve(row_projection, np.ones(5)/5, mode='same')
+
+
+def group_horizontal_lines(row_projection_smooth, threshold_percent):
+    """
+    在平滑行投影中找到所有显著水平线，并将相距不超过5行的行分为一组
+
+    返回:
+        按从上到下排序的水平线行号列表
+    """
+    threshold = np.max(row_projection_smooth) * (threshold_percent / 100.0)
+    significant_rows = np.where(row_projection_smooth > threshold)[0]
+
+    horizontal_lines = []
+    current_group = []
+
+    for i in range(len(significant_rows)):
+        if i == 0 or significant_rows[i] - significant_rows[i-1] <= 5:
+            current_group.append(significant_rows[i])
+        else:
+            if current_group:
+                horizontal_lines.append(int(np.mean(current_group)))
+                current_group = [significant_rows[i]]
+
+    # 添加最后一组
+    if current_group:
+        horizontal_lines.append(int(np.mean(current_group)))
+
+    horizontal_lines.sort()
+    return horizontal_lines
+
+
+@perf_trace.traced('row_projection')
+def find_horizontal_lines(binary_image, threshold_percent):
+    """
+    通过行投影检测水平线
+
+    返回:
+        (水平线行号列表, 平滑后的行投影)
+    """
+    row_projection_smooth = smooth_row_projection(binary_image)
+    return group_horizontal_lines(row_projection_smooth, threshold_percent), row_projection_smooth
+
+
+@perf_trace.traced('gap_search')
+def find_top_gap(binary_image, upper_surface_row, gap_min_width, search_range=10):
+    """
+    在上表面附近搜索白线上最宽的黑色缺口
+
+    返回:
+        (缺口所在行, 缺口起点, 缺口终点, 缺口宽度)，未找到时宽度为0，起止点为图像宽度的1/3和2/3
+    """
+    height, width = binary_image.shape[:2]
+    best_row = upper_surface_row
+    max_gap_width = 0
+    hole_start = 0
+    hole_end = 0
+
+    # 在选定行附近搜索最明显的缺口
+    for i in range(max(0, upper_surface_row - search_range),
+                   min(height, upper_surface_row + search_range)):
+        line = binary_image[i, :]
+
+        # 寻找黑白转换点
+        transitions = np.where(np.diff(line) != 0)[0]
+        if len(transitions) >= 2:
+            # 查找连续的白-黑-白模式（白线上的黑色缺口）
+            for j in range(0, len(transitions) - 1):
+                # 确认这是白到黑的转换（缺口开始）
+                if line[transitions[j]] == 255 and transitions[j] + 1 < len(line) and line[transitions[j] + 1] == 0:
+                    # 查找黑到白的转换点（缺口结束）
+                    for k in range(j + 1, len(transitions)):
+                        if line[transitions[k]] == 0 and transitions[k] + 1 < len(line) and line[transitions[k] + 1] == 255:
+                            gap_width = transitions[k] - transitions[j]
+
+                            # 检查缺口是否符合最小宽度要求，并且是否是目前找到的最宽的缺口
+                            if gap_width > gap_min_width and gap_width > max_gap_width:
+                                max_gap_width = gap_width
+                                best_row = i
+                                hole_start = transitions[j]
+                                hole_end = transitions[k]
+                            break
+
+    if max_gap_width > 0:
+        return best_row, int(hole_start), int(hole_end), int(max_gap_width)
+
+    # 备选检测方法：寻找行中最长的黑色区域
+    for i in range(max(0, upper_surface_row - search_range),
+                   min(height, upper_surface_row + search_range)):
+        line = binary_image[i, :]
+        black_regions = []
+        start = None
+
+        # 寻找所有黑色区域
+        for j in range(len(line)):
+            if line[j] == 0 and start is None:  # 黑色区域开始
+                start = j
+            elif line[j] == 255 and start is not None:  # 黑色区域结束
+                black_regions.append((start, j))
+                start = None
+
+        # 处理最后一个黑色区域（如果存在）
+        if start is not None:
+            black_regions.append((start, len(line)))
+
+        # 在黑色区域中找最宽的一个
+        for region in black_regions:
+            region_width = region[1] - region[0]
+            # 检查该区域是否在一条明显的白线上
+            if region[0] > 0 and region[1] < len(line) - 1 and line[region[0] - 1] == 255 and line[region[1]] == 255:
+                if region_width > gap_min_width and region_width > max_gap_width:
+                    max_gap_width = region_width
+                    best_row = i
+                    hole_start = region[0]
+                    hole_end = region[1]
+
+    if max_gap_width > 0:
+        return best_row, int(hole_start), int(hole_end), int(max_gap_width)
+
+    # 最后的备选方案
+    return upper_surface_row, width // 3, width * 2 // 3, 0
+
+
+@perf_trace.traced('bottom_search')
+def find_bottom_short_line(binary_image, upper_surface_row, hole_start, hole_end, params):
+    """
+    在孔中心区域搜索底部短横线
+
+    返回:
+        字典，包含:
+            bottom_row: 找到的底部行（未找到为None）
+            method: 'short_line'、'peak' 或 None
+            min_x, max_x, start_row, end_row: 搜索区域
+            column_sum: 孔中心区域的投影（调试用）
+            filtered_lines: 候选水平线 [(行, 强度), ...]
+    """
+    height, width = binary_image.shape[:2]
+    max_search_depth = int(height * params['bottom_search_range'])
+    search_end_row = min(height, upper_surface_row + max_search_depth)
+
+    hole_center_x = (hole_start + hole_end) // 2
+    hole_width = hole_end - hole_start
+    search_width = max(hole_width // 2, 30)  # 孔宽度的一半或至少30像素
+
+    hole_center_min_x = max(0, hole_center_x - search_width)
+    hole_center_max_x = min(width, hole_center_x + search_width)
+    search_start_row = upper_surface_row + 50
+
+    # 计算孔中心区域的投影，用于确定底部位置
+    column_sum = np.sum(binary_image[search_start_row:search_end_row,
+                                     hole_center_min_x:hole_center_max_x], axis=1)
+
+    result = {
+        'bottom_row': None,
+        'method': None,
+        'min_x': hole_center_min_x,
+        'max_x': hole_center_max_x,
+        'start_row': search_start_row,
+        'end_row': search_end_row,
+        'column_sum': column_sum,
+        'filtered_lines': [],
+    }
+
+    if len(column_sum) == 0:
+        return result
+
+    # 自适应确定短横线的阈值，避免受噪声影响
+    projection_mean = np.mean(column_sum)
+    projection_std = np.std(column_sum)
+
+    # 检测峰值 - 峰值表示水平线（高于平均值+标准差的区域）
+    potential_lines = []
+    min_peak_height = projection_mean + projection_std * 1.5
+
+    for i in range(len(column_sum)):
+        if column_sum[i] > min_peak_height:
+            # 检查是否是局部最大值
+            window = 5
+            start_idx = max(0, i - window)
+            end_idx = min(len(column_sum), i + window + 1)
+            if column_sum[i] == np.max(column_sum[start_idx:end_idx]):
+                row_position = search_start_row + i
+                potential_lines.append((row_position, column_sum[i]))
+
+    # 去除过近的峰值
+    filtered_lines = []
+    if potential_lines:
+        filtered_lines.append(potential_lines[0])
+        for i in range(1, len(potential_lines)):
+            if potential_lines[i][0] - filtered_lines[-1][0] > 20:  # 至少20像素的距离
+                filtered_lines.append(potential_lines[i])
+
+    filtered_lines.sort(key=lambda x: x[0])
+    result['filtered_lines'] = filtered_lines
+
+    # 特别关注孔洞底部区域，避免错误检测上方的噪声
+    min_valid_depth = 100  # 至少需要100像素的深度
+
+    for row_pos, strength in filtered_lines:
+        # 只考虑距离上表面足够远的水平线
+        if row_pos < upper_surface_row + min_valid_depth:
+            continue
+
+        line_segment = binary_image[row_pos, hole_center_min_x:hole_center_max_x]
+        if len(line_segment) == 0:
+            continue
+
+        # 寻找短横线特征：白色像素比例适中
+        white_ratio = np.sum(line_segment == 255) / len(line_segment)
+        if params['short_line_min_white_ratio'] < white_ratio < params['short_line_max_white_ratio']:
+            # 在这一行中查找最长的连续白色区域
+            max_run_length = 0
+            current_run = 0
+            for pixel in line_segment:
+                if pixel == 255:
+                    current_run += 1
+                else:
+                    max_run_length = max(max_run_length, current_run)
+                    current_run = 0
+            max_run_length = max(max_run_length, current_run)
+
+            # 如果有足够长的连续白色区域，认为这是短横线
+            if max_run_length > params['short_line_min_length']:
+                result['bottom_row'] = int(row_pos)
+                result['method'] = 'short_line'
+                return result
+
+    # 如果还是没找到底部，尝试在可能的峰值中选择强度最大的一个
+    valid_lines = [line for line in filtered_lines
+                   if line[0] > upper_surface_row + min_valid_depth]
+    if valid_lines:
+        max_strength_line = max(valid_lines, key=lambda x: x[1])
+        result['bottom_row'] = int(max_strength_line[0])
+        result['method'] = 'peak'
+
+    return result
+
+
+def find_hole_edges_at_row(binary_image, row, hole_start, hole_end, search_range=10):
+    """
+    在指定行查找孔洞的左右边缘，在已知孔洞边界附近搜索实际的黑白过渡
+
+    返回:
+        (是否找到, 左边缘列, 右边缘列)
+    """
+    if binary_image is None:
+        return False, 0, 0
+
+    if row < 0 or row >= binary_image.shape[0]:
+        return False, 0, 0
+
+    left_x = hole_start
+    right_x = hole_end
+    line = binary_image[row, :]
+    width = binary_image.shape[1]
+
+    # 在左边缘附近搜索实际边界（从白到黑的过渡）
+    left_search_start = max(0, left_x - search_range)
+    left_search_end = min(width - 1, left_x + search_range)
+    for x in range(left_search_start, left_search_end):
+        if x < len(line)-1 and line[x] == 255 and line[x+1] == 0:
+            left_x = x
+            break
+
+    # 在右边缘附近搜索实际边界（从黑到白的过渡）
+    right_search_start = max(0, right_x - search_range)
+    right_search_end = min(width - 1, right_x + search_range)
+    for x in range(right_search_start, right_search_end):
+        if x < len(line)-1 and line[x] == 0 and line[x+1] == 255:
+            right_x = x
+            break
+
+    # 确保左边缘在右边缘之前
+    if left_x >= right_x:
+        left_x = hole_start
+        right_x = hole_end
+
+    return True, int(left_x), int(right_x)
+
+
+@perf_trace.traced('detect_hole_dimensions')
+def detect_hole_dimensions(binary_image, params, pixel_to_um_x=None, pixel_to_um_y=None,
+                           horizontal_lines=None):
+    """
+    检测孔的直径、深度及上下0.1mm处直径
+
+    参数:
+        binary_image: preprocess_image 得到的二值图像
+        params: 参数字典
+        pixel_to_um_x, pixel_to_um_y: 像素到微米的转换比例，默认取自params
+        horizontal_lines: 可选，已计算好的水平线列表
+
+    返回:
+        测量结果字典（行列坐标为像素，直径深度为微米）
+    """
+    if pixel_to_um_x is None:
+        pixel_to_um_x = params['pixel_to_um_x']
+    if pixel_to_um_y is None:
+        pixel_to_um_y = params['pixel_to_um_y']
+
+    height, width = binary_image.shape[:2]
+
+    # 计算行投影以找到水平线
+    if horizontal_lines is None:
+        horizontal_lines, _ = find_horizontal_lines(binary_image, params['row_projection_threshold'])
+
+    # 确定孔的顶部位置
+    top_line_index = params['top_line_index']
+    if len(horizontal_lines) > top_line_index:
+        upper_surface_row = horizontal_lines[top_line_index]
+    else:
+        upper_surface_row = height // 4
+
+    # 在顶部位置找缺口
+    upper_surface_row, hole_start, hole_end, max_gap_width = find_top_gap(
+        binary_image, upper_surface_row, params['gap_min_width'])
+    hole_diameter = (hole_end - hole_start) * pixel_to_um_x
+
+    # 首先尝试使用底部线索引
+    bottom_method = None
+    bottom_search = None
+    bottom_line_index = params['bottom_line_index']
+    bottom_surface_row = None
+    if 0 <= bottom_line_index < len(horizontal_lines):
+        # 确保选择的底部线在顶部线之下
+        if horizontal_lines[bottom_line_index] > upper_surface_row + 20:
+            bottom_surface_row = horizontal_lines[bottom_line_index]
+            bottom_method = 'line_index'
+
+    # 如果未找到底部，在孔中心区域搜索底部短横线
+    if bottom_surface_row is None:
+        bottom_search = find_bottom_short_line(binary_image, upper_surface_row,
+                                               hole_start, hole_end, params)
+        if bottom_search['bottom_row'] is not None:
+            bottom_surface_row = bottom_search['bottom_row']
+            bottom_method = bottom_search['method']
+        else:
+            # 默认将底部设置为顶部行的一定距离下方
+            bottom_surface_row = min(height - 1, upper_surface_row + 100)
+            bottom_method = 'default'
+
+    # 计算深度
+    hole_depth = (bottom_surface_row - upper_surface_row) * pixel_to_um_y
+
+    # 计算上表面下0.1mm和底部上0.1mm处的行位置
+    distance_01mm_pixels = int(0.1 * 1000 / pixel_to_um_y)
+    upper_measure_row = min(max(0, upper_surface_row + distance_01mm_pixels), height - 1)
+    lower_measure_row = min(max(0, bottom_surface_row - distance_01mm_pixels), height - 1)
+
+    with perf_trace.span('hole_edges'):
+        upper_edges = find_hole_edges_at_row(binary_image, upper_measure_row, hole_start, hole_end)
+        lower_edges = find_hole_edges_at_row(binary_image, lower_measure_row, hole_start, hole_end)
+
+    upper_diameter = (upper_edges[2] - upper_edges[1]) * pixel_to_um_x if upper_edges[0] else 0
+    lower_diameter = (lower_edges[2] - lower_edges[1]) * pixel_to_um_x if lower_edges[0] else 0
+
+    # 计算标准直径（上下两处的平均值）
+    if upper_diameter > 0 and lower_diameter > 0:
+        standard_diameter = (upper_diameter + lower_diameter) / 2
+    elif upper_diameter > 0:
+        standard_diameter = upper_diameter
+    elif lower_diameter > 0:
+        standard_diameter = lower_diameter
+    else:
+        standard_diameter = hole_diameter
+
+    return {
+        'horizontal_lines': horizontal_lines,
+        'upper_surface_row': int(upper_surface_row),
+        'bottom_surface_row': int(bottom_surface_row),
+        'hole_start': hole_start,
+        'hole_end': hole_end,
+        'max_gap_width': max_gap_width,
+        'hole_diameter': float(hole_diameter),
+        'hole_depth': float(hole_depth),
+        'bottom_method': bottom_method,
+        'bottom_search': bottom_search,
+        'upper_measure_row': int(upper_measure_row),
+        'lower_measure_row': int(lower_measure_row),
+        'upper_edges': upper_edges,
+        'lower_edges': lower_edges,
+        'upper_diameter_at_01mm': float(upper_diameter),
+        'lower_diameter_at_01mm': float(lower_diameter),
+        'standard_diameter': float(standard_diameter),
+    }
+
+
+def measure_image(image, params, pixel_to_um_x=None, pixel_to_um_y=None):
+    """
+    对一张灰度图像完成预处理与孔洞尺寸检测
+
+    返回:
+        (二值图像, 测量结果字典)
+    """
+    binary_image = preprocess_image(image, params)
+    return binary_image, detect_hole_dimensions(binary_image, params, pixel_to_um_x, pixel_to_um_y)
+
+
+# 测量结果中可直接保存为表格列的标量字段
+DETECTION_FIELDS = ['hole_diameter', 'standard_diameter', 'hole_depth',
+                    'upper_diameter_at_01mm', 'lower_diameter_at_01mm',
+                    'upper_surface_row', 'bottom_surface_row', 'hole_start', 'hole_end', 'bottom_method']
+
+
+def detection_summary(detection):
+    """取出 DETECTION_FIELDS 对应的标量（numpy 数值转为 Python 类型，可直接写入CSV/JSON/数据库）"""
+    summary = {}
+    for key in DETECTION_FIELDS:
+        value = detection.get(key)
+        summary[key] = value.item() if hasattr(value, 'item') else value
+    return summary
+
+
+def _row_prefix_sums(rows):
+    """
+    计算逐行前缀和（首列补0），任意行段 [a, b) 的灰度和为 P[r, b] - P[r, a]
+
+    参数:
+        rows: 二维8位灰度数组（若干图像行的同一列范围）
+
+    返回:
+        形状为 (行数, 列数 + 1) 的前缀和数组；单行累加不超过 255 * 列数，int32 足够
+    """
+    prefix = np.zeros((rows.shape[0], rows.shape[1] + 1), dtype=np.int32)
+    np.cumsum(rows, axis=1, dtype=np.int32, out=prefix[:, 1:])
+    return prefix
+
+
+def _find_taper_bottom_from_roi(image, roi_horizontal, bottom_half_start, roi_x_start,
+                                hole_center_x, search_width, expected_bottom_width, peaks):
+    """
+    按峰值对ROI中的候选短横线打分，返回最佳段（字典）或None
+
+    候选峰值行的原始灰度一次性求前缀和，每一段的均值和两侧均值都以O(1)得到，
+    同一行的所有候选段以数组计算。
+    """
+    best_short_line = None
+    best_short_line_score = 0
+
+    peaks = peaks[:5]  # 仅考虑前5个最强峰值
+    if not peaks:
+        return None
+    line_length = roi_horizontal.shape[1]
+    peak_rows = bottom_half_start + np.array([peak_idx for peak_idx, _ in peaks])
+    prefixes = _row_prefix_sums(image[peak_rows, roi_x_start:roi_x_start + line_length])
+
+    for (peak_idx, _), prefix in zip(peaks, prefixes):
+        # 将峰值映射回原始图像坐标
+        peak_row = bottom_half_start + peak_idx
+        line_roi = roi_horizontal[peak_idx, :]
+
+        # 寻找该行中的所有连通区域，相邻转换点两两配对
+        transitions = np.where(np.diff(line_roi) != 0)[0]
+        if len(transitions) < 2:
+            continue
+        starts = transitions[0:len(transitions) - 1:2]
+        ends = transitions[1::2][:len(starts)]
+        lengths = ends - starts
+
+        # 检查是否足够长且位于中心区域
+        segment_centers = roi_x_start + (starts + ends) // 2
+        dist_from_center = np.abs(segment_centers - hole_center_x)
+        length_scores = np.minimum(lengths / expected_bottom_width, 1.0)
+        center_scores = 1.0 - np.minimum(dist_from_center / (search_width / 2), 1.0)
+
+        # 检查颜色对比度（短横线应该较亮），段两侧都有像素时才计算
+        contrast_scores = np.zeros(len(starts))
+        inner = (starts > 0) & (ends < line_length)
+        if np.any(inner):
+            s, e = starts[inner], ends[inner]
+            segment_avg = (prefix[e] - prefix[s]) / (e - s)
+            left_avg = prefix[s] / s
+            right_avg = (prefix[line_length] - prefix[e]) / (line_length - e)
+            surrounding_avg = (left_avg + right_avg) / 2
+            contrast_scores[inner] = np.clip((segment_avg - surrounding_avg) / 50, 0, 1.0)
+
+        total_scores = length_scores * 0.4 + center_scores * 0.4 + contrast_scores * 0.2
+
+        valid = np.where(lengths >= 5)[0]  # 最小长度阈值
+        if len(valid) == 0:
+            continue
+        best = valid[np.argmax(total_scores[valid])]
+        if total_scores[best] > best_short_line_score:
+            best_short_line_score = total_scores[best]
+            best_short_line = {
+                'start': int(roi_x_start + starts[best]),
+                'end': int(roi_x_start + ends[best]),
+                'length': int(lengths[best]),
+                'score': float(total_scores[best]),
+                'row': int(peak_row)
+            }
+
+    return best_short_line
+
+
+def _score_hough_lines(lines, image, roi_x_start, roi_x_end, bottom_half_start,
+                       hole_center_x, hole_width, expected_bottom_width):
+    """
+    对霍夫变换得到的ROI线段批量打分，线段所在行及上下3行的灰度均值由前缀和得到
+
+    返回:
+        (最佳线段 (x1, y1, x2, y2) 或 None, 最佳得分)
+    """
+    segs = lines.reshape(-1, 4).astype(np.int64)
+    x1 = segs[:, 0] + roi_x_start
+    x2 = segs[:, 2] + roi_x_start
+    y1 = segs[:, 1] + bottom_half_start
+    y2 = segs[:, 3] + bottom_half_start
+
+    # 只保留水平线（允许轻微倾斜）
+    horizontal = np.abs(y2 - y1) <= 3
+    if not np.any(horizontal):
+        return None, 0
+
+    lengths = np.abs(x2 - x1)
+    length_scores = np.minimum(lengths / expected_bottom_width, 1.0)
+    center_pos = (x1 + x2) // 2
+    center_scores = 1.0 - np.minimum(np.abs(center_pos - hole_center_x) / (hole_width / 2), 1.0)
+
+    # 亮度对比度：线段所在行与上下3行同一列范围的均值之差
+    height_img = image.shape[0]
+    y_mid = (y1 + y2) // 2
+    x_lo = np.minimum(x1, x2) - roi_x_start
+    x_hi = np.maximum(x1, x2) - roi_x_start
+
+    contrast_scores = np.zeros(len(segs))
+    has_pixels = (lengths > 0) & (y_mid < height_img)
+    if np.any(has_pixels):
+        lo, hi = x_lo[has_pixels], x_hi[has_pixels]
+        n = hi - lo
+        mid = y_mid[has_pixels]
+        rows = np.concatenate([mid, np.maximum(0, mid - 3), np.minimum(height_img - 1, mid + 3)])
+        # 涉及的行只求一次前缀和
+        unique_rows, row_index = np.unique(rows, return_inverse=True)
+        prefix = _row_prefix_sums(image[unique_rows, roi_x_start:roi_x_end])
+        row_index = row_index.reshape(3, -1)
+
+        def row_mean(index):
+            return (prefix[index, hi] - prefix[index, lo]) / n
+
+        segment_avg = row_mean(row_index[0])
+        surrounding_avg = (row_mean(row_index[1]) + row_mean(row_index[2])) / 2
+        contrast_scores[has_pixels] = np.clip((segment_avg - surrounding_avg) / 30, 0, 1.0)
+
+    total_scores = length_scores * 0.4 + center_scores * 0.4 + contrast_scores * 0.2
+    total_scores[~horizontal] = -np.inf
+
+    best = int(np.argmax(total_scores))
+    if total_scores[best] <= 0:
+        return None, 0
+    return (int(x1[best]), int(y1[best]), int(x2[best]), int(y2[best])), float(total_scores[best])
+
+
+def _find_binary_dark_segment(line, hole_center_x, hole_width, expected_bottom_width):
+    """
+    在二值图像的一行中寻找白-黑-白模式的最佳黑色短横线
+
+    返回:
+        (start, end, score) 或 None（得分不超过0.5时）
+    """
+    transitions = np.where(np.diff(line) != 0)[0]
+    if len(transitions) < 2:
+        return None
+
+    last = len(line) - 1
+    starts = transitions[:-1]
+    ends = transitions[1:]
+    dark = ((line[np.maximum(0, starts - 1)] == 255) &
+            (line[np.minimum(starts + 1, last)] == 0) &
+            (line[np.minimum(ends + 1, last)] == 255))
+    dist_from_hole_center = np.abs((starts + ends) // 2 - hole_center_x)
+    candidates = np.where(dark & (dist_from_hole_center < hole_width * 0.7))[0]
+    if len(candidates) == 0:
+        return None
+
+    lengths = ends[candidates] - starts[candidates]
+    length_scores = np.minimum(lengths / expected_bottom_width, 1.0)
+    center_scores = 1.0 - np.minimum(dist_from_hole_center[candidates] / (hole_width / 2), 1.0)
+    total_scores = length_scores * 0.6 + center_scores * 0.4
+
+    best = int(np.argmax(total_scores))
+    if total_scores[best] <= 0.5:
+        return None
+    index = candidates[best]
+    return int(starts[index]), int(ends[index]), float(total_scores[best])
+
+
+@perf_trace.traced('taper')
+def measure_taper(image, binary_image, upper_surface_row, hole_start, hole_end, bottom_search_range,
+                  context=None):
+    """
+    根据已检测的孔口位置寻找底部短横线并计算锥度
+
+    参数:
+        image: 原始灰度图像
+        binary_image: 二值图像（霍夫变换失败时的备选检测使用）
+        upper_surface_row, hole_start, hole_end: detect_hole_dimensions 得到的孔口位置
+        bottom_search_range: 底部搜索范围（占图像高度的比例）
+        context: 可选的 analysis_context.AnalysisContext，其 image 为本图像时复用ROI的阈值和边缘结果
+
+    返回:
+        字典，包含四个角点、宽度、高度（像素）、锥度、锥度角、底部检测方法及ROI中间结果
+    """
+    height_img, width_img = image.shape[:2]
+    top_left = (hole_start, upper_surface_row)
+    top_right = (hole_end, upper_surface_row)
+
+    # 计算搜索范围
+    bottom_half_start = upper_surface_row + 50  # 从顶部下方50像素开始搜索
+    search_end_row = min(height_img, int(height_img * bottom_search_range))
+
+    # 计算中心区域和期望宽度
+    hole_center_x = (hole_start + hole_end) // 2
+    hole_width = hole_end - hole_start
+    expected_bottom_width = hole_width * 0.85  # 假设底部略窄于顶部
+
+    # 创建感兴趣区域ROI，集中在孔洞中心区域
+    search_width = max(hole_width, 60)  # 保证搜索宽度足够
+    roi_x_start = max(0, hole_center_x - search_width // 2)
+    roi_x_end = min(width_img, hole_center_x + search_width // 2)
+    roi = image[bottom_half_start:search_end_row, roi_x_start:roi_x_end]
+    roi_bounds = (bottom_half_start, search_end_row, roi_x_start, roi_x_end)
+    if context is not None and context.image is not image:
+        context = None
+
+    # 使用自适应阈值、边缘和水平开运算增强ROI中的短横线
+    if context is not None:
+        roi_binary = context.adaptive_threshold(31, 5, roi=roi_bounds)
+        roi_edges = context.canny(30, 100, blur_kernel=5, roi=roi_bounds)
+    else:
+        roi_binary = cv2.adaptiveThreshold(roi, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                           cv2.THRESH_BINARY, 31, 5)
+        roi_enhanced = cv2.GaussianBlur(roi, (5, 5), 0)
+        roi_edges = cv2.Canny(roi_enhanced, 30, 100)
+    kernel_h = np.ones((1, 15), np.uint8)  # 水平核
+    roi_horizontal = cv2.morphologyEx(roi_binary, cv2.MORPH_OPEN, kernel_h)
+
+    # 计算行投影，查找短横线的位置
+    row_projection = np.sum(roi_horizontal, axis=1)
+    row_projection_smooth = np.convolve(row_projection, np.ones(5)/5, mode='same')
+
+    # 找到投影中的峰值，对应短横线位置
+    peaks = []
+    peak_threshold = np.mean(row_projection_smooth) + np.std(row_projection_smooth)
+    for i in range(1, len(row_projection_smooth) - 1):
+        if (row_projection_smooth[i] > row_projection_smooth[i-1] and
+                row_projection_smooth[i] > row_projection_smooth[i+1]):
+            intensity = row_projection_smooth[i]
+            # 筛选明显的峰值，避免噪声
+            if intensity > peak_threshold:
+                peaks.append((i, intensity))
+
+    # 按照投影强度降序排序峰值
+    peaks.sort(key=lambda x: x[1], reverse=True)
+
+    bottom_left = None
+    bottom_right = None
+    best_short_line_row = None
+    method = None
+
+    best_short_line = _find_taper_bottom_from_roi(image, roi_horizontal, bottom_half_start, roi_x_start,
+                                                  hole_center_x, search_width, expected_bottom_width, peaks)
+    if best_short_line is not None:
+        bottom_left = (best_short_line['start'], best_short_line['row'])
+        bottom_right = (best_short_line['end'], best_short_line['row'])
+        best_short_line_row = best_short_line['row']
+        method = 'short_line'
+
+    # 如果没有找到好的短横线，尝试使用水平线霍夫变换
+    if bottom_left is None:
+        if context is not None:
+            hough_edges = context.canny(50, 150, roi=roi_bounds)
+        else:
+            hough_edges = cv2.Canny(roi, 50, 150)
+        lines = cv2.HoughLinesP(hough_edges, 1, np.pi/180, 20,
+                                minLineLength=expected_bottom_width*0.3,
+                                maxLineGap=20)
+
+        if lines is not None:
+            best_line, best_score = _score_hough_lines(lines, image, roi_x_start, roi_x_end, bottom_half_start,
+                                                       hole_center_x, hole_width, expected_bottom_width)
+
+            if best_line and best_score > 0.5:
+                x1, y1, x2, y2 = best_line
+                bottom_left = (min(x1, x2), (y1 + y2) // 2)
+                bottom_right = (max(x1, x2), (y1 + y2) // 2)
+                best_short_line_row = (y1 + y2) // 2
+                method = 'hough'
+
+    # 如果仍然没有找到，尝试使用二值图像中的转换点
+    if bottom_left is None:
+        # 在下半部分中从下往上搜索黑白转换模式
+        for row in range(int((bottom_half_start + search_end_row) * 0.7), bottom_half_start, -2):
+            found = _find_binary_dark_segment(binary_image[row, :], hole_center_x,
+                                              hole_width, expected_bottom_width)
+            if found is not None:
+                bottom_left = (found[0], row)
+                bottom_right = (found[1], row)
+                best_short_line_row = row
+                method = 'binary'
+                break
+
+    # 如果仍然没有找到，回退到图像下部位置估计
+    if bottom_left is None:
+        estimated_bottom_row = int(upper_surface_row + (height_img - upper_surface_row) * 0.7)
+        bottom_width = (hole_end - hole_start) * 0.8  # 假设底部宽度为顶部的80%
+        bottom_left = (int(hole_center_x - bottom_width / 2), estimated_bottom_row)
+        bottom_right = (int(hole_center_x + bottom_width / 2), estimated_bottom_row)
+        best_short_line_row = estimated_bottom_row
+        method = 'estimate'
+
+    # 确保所有点的坐标都是整数
+    top_left = (int(top_left[0]), int(top_left[1]))
+    top_right = (int(top_right[0]), int(top_right[1]))
+    bottom_left = (int(bottom_left[0]), int(bottom_left[1]))
+    bottom_right = (int(bottom_right[0]), int(bottom_right[1]))
+
+    # 锥度 = (顶部宽度 - 底部宽度) / (2 * 高度)
+    top_width = top_right[0] - top_left[0]
+    bottom_width = bottom_right[0] - bottom_left[0]
+    height = bottom_left[1] - top_left[1]
+    if height > 0:
+        taper = (top_width - bottom_width) / (2 * height)
+        taper_angle = np.arctan(taper) * 180 / np.pi
+    else:
+        taper = None
+        taper_angle = None
+
+    return {
+        'top_left': top_left,
+        'top_right': top_right,
+        'bottom_left': bottom_left,
+        'bottom_right': bottom_right,
+        'bottom_row': best_short_line_row,
+        'short_line': best_short_line,
+        'method': method,
+        'top_width': top_width,
+        'bottom_width': bottom_width,
+        'height': height,
+        'taper': taper,
+        'taper_angle': taper_angle,
+        'roi': roi,
+        'roi_binary': roi_binary,
+        'roi_edges': roi_edges,
+        'roi_horizontal': roi_horizontal,
+        'row_projection_smooth': row_projection_smooth,
+    }
+
+
+def fit_line(y, x, method='ransac', threshold=1.5, iterations=100, seed=0):
+    """
+    拟合直线 x = slope * y + intercept（孔壁近似竖直，以行号为自变量）
+
+    参数:
+        y, x: 一维坐标数组
+        method: 'lsq' 最小二乘，或 'ransac'（随机采样两点，取内点最多的直线后对内点最小二乘）
+        threshold: RANSAC 内点的最大残差（像素）
+        iterations: RANSAC 采样次数
+
+    返回:
+        (slope, intercept, 内点布尔数组)；点数少于2时返回 None
+    """
+    y = np.asarray(y, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    n = len(y)
+    if n < 2:
+        return None
+
+    inliers = np.ones(n, dtype=bool)
+    if method == 'ransac' and n > 2:
+        # 一次性生成所有候选直线并计算残差矩阵
+        rng = np.random.default_rng(seed)
+        i = rng.integers(0, n, iterations)
+        j = rng.integers(0, n, iterations)
+        usable = y[i] != y[j]
+        i, j = i[usable], j[usable]
+        if len(i) > 0:
+            slopes = (x[j] - x[i]) / (y[j] - y[i])
+            intercepts = x[i] - slopes * y[i]
+            # 候选直线在至多512个均匀抽取的点上计数内点，最终内点在全部点上判定
+            sample = slice(None, None, -(-n // 512))
+            residuals = np.abs(x[sample][None, :] - (slopes[:, None] * y[sample][None, :] + intercepts[:, None]))
+            counts = np.count_nonzero(residuals <= threshold, axis=1)
+            best = int(np.argmax(counts))
+            if counts[best] >= 2:
+                inliers = np.abs(x - (slopes[best] * y + intercepts[best])) <= threshold
+    elif method not in ('lsq', 'ransac'):
+        raise ValueError(f"未知的拟合方法: {method}")
+
+    slope, intercept = np.polyfit(y[inliers], x[inliers], 1)
+    return float(slope), float(intercept), inliers
+
+
+@perf_trace.traced('wall_profile')
+def extract_wall_profile(binary_image, upper_surface_row, bottom_surface_row, hole_start, hole_end,
+                         pixel_to_um_x=1.0, pixel_to_um_y=1.0, search_range=10, method='ransac',
+                         ransac_threshold=1.5):
+    """
+    提取孔口到孔底之间每一行的左右孔壁边缘，并拟合孔壁直线
+
+    从孔中心列向两侧搜索：左边缘为中心左侧最近的白色像素（白→黑过渡），右边缘为中心右侧
+    第一个白色像素之前的黑色像素（黑→白过渡）。搜索窗口向外扩展 search_range 像素，向内
+    直到孔中心，因此锥度造成的孔壁内收不受窗口限制。中心像素不是黑色或窗口内没有白色像素
+    的行记为无效（NaN）。两侧孔壁分别用各自找到边缘的行拟合（孔壁轮廓线常有断续），
+    逐行直径只在两侧都找到边缘的行给出。
+
+    参数:
+        binary_image: 二值图像（孔内为黑色）
+        upper_surface_row, bottom_surface_row: 孔口和孔底所在行
+        hole_start, hole_end: 孔口左右边缘列
+        pixel_to_um_x, pixel_to_um_y: 像素到微米的转换比例
+        search_range: 孔口边缘向外的搜索范围（像素）
+        method: 孔壁直线拟合方法，'ransac' 或 'lsq'
+        ransac_threshold: RANSAC 内点残差阈值（像素）
+
+    返回:
+        字典，逐行数组（rows, left_edges, right_edges, centerline, depth_um, diameter_um,
+        diameter_fit_um, valid 两侧均找到）、两侧覆盖率、每侧孔壁的拟合 (slope, intercept)、内点、残差RMS，
+        以及锥度、锥度角、两侧孔壁角、中心线倾斜角和入口/出口/平均直径（微米）；
+        锥度和锥度角按微米换算（taper_um、taper_angle_um），与按像素计算的 measure_taper 的 taper_angle 不同
+    """
+    height, width = binary_image.shape[:2]
+    row_start = max(0, int(upper_surface_row))
+    row_end = min(height, int(bottom_surface_row))
+    rows = np.arange(row_start, row_end)
+    center = (int(hole_start) + int(hole_end)) // 2
+
+    left_edges = np.full(len(rows), np.nan)
+    right_edges = np.full(len(rows), np.nan)
+    if len(rows) > 0 and 0 <= center < width:
+        band = binary_image[row_start:row_end]
+        left_lo = max(0, int(hole_start) - search_range)
+        right_hi = min(width, int(hole_end) + search_range + 1)
+        center_black = band[:, center] == 0
+
+        # 左侧窗口 [left_lo, center)：反向argmax得到离中心最近的白色像素
+        left_white = band[:, left_lo:center] == 255
+        if left_white.shape[1] > 0:
+            nearest = left_white.shape[1] - 1 - np.argmax(left_white[:, ::-1], axis=1)
+            found = left_white.any(axis=1) & center_black
+            left_edges[found] = left_lo + nearest[found]
+
+        # 右侧窗口 (center, right_hi)：argmax得到中心右侧第一个白色像素
+        right_white = band[:, center + 1:right_hi] == 255
+        if right_white.shape[1] > 0:
+            first = np.argmax(right_white, axis=1)
+            found = right_white.any(axis=1) & center_black
+            right_edges[found] = center + first[found]
+
+    left_valid = ~np.isnan(left_edges)
+    right_valid = ~np.isnan(right_edges)
+    valid = left_valid & right_valid
+    depth_um = (rows - row_start) * pixel_to_um_y
+    diameter_um = (right_edges - left_edges) * pixel_to_um_x
+    centerline = (left_edges + right_edges) / 2
+
+    result = {
+        'rows': rows,
+        'left_edges': left_edges,
+        'right_edges': right_edges,
+        'valid': valid,
+        'centerline': centerline,
+        'depth_um': depth_um,
+        'diameter_um': diameter_um,
+        'coverage': float(np.mean(valid)) if len(rows) else 0.0,
+        'left_coverage': float(np.mean(left_valid)) if len(rows) else 0.0,
+        'right_coverage': float(np.mean(right_valid)) if len(rows) else 0.0,
+        'method': method,
+        'left_fit': None,
+        'right_fit': None,
+        'left_inliers': None,   # 对应 left_edges 中有效行的内点标记
+        'right_inliers': None,
+        'left_rms': None,
+        'right_rms': None,
+        'diameter_fit_um': None,
+        'taper_um': None,
+        'taper_angle_um': None,
+        'left_wall_angle': None,
+        'right_wall_angle': None,
+        'tilt_angle': None,
+        'entrance_diameter_um': None,
+        'exit_diameter_um': None,
+        'mean_diameter_um': float(np.mean(diameter_um[valid])) if np.any(valid) else None,
+    }
+
+    left_fit = fit_line(rows[left_valid], left_edges[left_valid], method, ransac_threshold)
+    right_fit = fit_line(rows[right_valid], right_edges[right_valid], method, ransac_threshold)
+    if left_fit is None or right_fit is None:
+        return result
+
+    (a_left, b_left, left_inliers), (a_right, b_right, right_inliers) = left_fit, right_fit
+    left_residual = left_edges[left_valid] - (a_left * rows[left_valid] + b_left)
+    right_residual = right_edges[right_valid] - (a_right * rows[right_valid] + b_right)
+
+    # 斜率换算为物理单位（微米/微米）：x 方向与 y 方向像素尺寸可能不同
+    scale = pixel_to_um_x / pixel_to_um_y
+    left_angle = np.degrees(np.arctan(a_left * scale))      # 正值表示左壁随深度向内收
+    right_angle = np.degrees(np.arctan(-a_right * scale))   # 正值表示右壁随深度向内收
+    taper = (a_left - a_right) / 2 * scale                  # 与 measure_taper 定义一致：(顶宽-底宽)/(2*高度)
+    diameter_fit_um = ((a_right - a_left) * rows + (b_right - b_left)) * pixel_to_um_x
+
+    result.update({
+        'left_fit': (a_left, b_left),
+        'right_fit': (a_right, b_right),
+        'left_inliers': left_inliers,
+        'right_inliers': right_inliers,
+        'left_rms': float(np.sqrt(np.mean(left_residual[left_inliers] ** 2))),
+        'right_rms': float(np.sqrt(np.mean(right_residual[right_inliers] ** 2))),
+        'diameter_fit_um': diameter_fit_um,
+        'taper_um': float(taper),
+        'taper_angle_um': float(np.degrees(np.arctan(taper))),
+        'left_wall_angle': float(left_angle),
+        'right_wall_angle': float(right_angle),
+        'tilt_angle': float(np.degrees(np.arctan((a_left + a_right) / 2 * scale))),
+        'entrance_diameter_um': float(diameter_fit_um[0]),
+        'exit_diameter_um': float(diameter_fit_um[-1]),
+    })
+    return result
+
+
+# 粗糙度/波纹度分离的默认截止波长（μm），取 ISO 4288 标准系列中最短的 0.08 mm
+DEFAULT_ROUGHNESS_CUTOFF_UM = 80.0
+
+# ISO 16610-21 高斯滤波器常数 sqrt(ln2 / pi)
+_GAUSSIAN_FILTER_ALPHA = np.sqrt(np.log(2) / np.pi)
+
+
+def principal_axis(points):
+    """
+    用2x2协方差矩阵的闭式特征向量求二维点集的主方向（等价于单主成分PCA）
+
+    参数:
+        points: (N, 2) 点坐标
+
+    返回:
+        (均值点, 单位主方向向量)
+    """
+    points = np.asarray(points, dtype=np.float64)
+    mean = points.mean(axis=0)
+    d = points - mean
+    sxx = np.mean(d[:, 0] ** 2)
+    syy = np.mean(d[:, 1] ** 2)
+    sxy = np.mean(d[:, 0] * d[:, 1])
+    # 对称矩阵 [[sxx, sxy], [sxy, syy]] 最大特征值对应的特征向量方向角
+    theta = 0.5 * np.arctan2(2 * sxy, sxx - syy)
+    return mean, np.array([np.cos(theta), np.sin(theta)])
+
+
+def _height_parameters(z, sections=5):
+    """
+    轮廓幅度参数：Xa 算术平均偏差、Xq 均方根偏差、Xz 各取样段峰谷值的平均、Xt 全长峰谷值
+    """
+    z = z - np.mean(z)
+    parts = [part for part in np.array_split(z, sections) if len(part) > 0]
+    return {
+        'a': float(np.mean(np.abs(z))),
+        'q': float(np.sqrt(np.mean(z ** 2))),
+        'z': float(np.mean([part.max() - part.min() for part in parts])),
+        't': float(z.max() - z.min()),
+    }
+
+
+def gaussian_profile_filter(z, spacing, cutoff):
+    """
+    在频域对等间距轮廓做高斯低通滤波（ISO 16610-21 传输特性），得到波纹度轮廓
+
+    两端各镜像延拓一倍长度以减小FFT的周期边界效应。
+
+    参数:
+        z: 等间距采样的轮廓高度
+        spacing: 采样间距
+        cutoff: 截止波长（与 spacing 同单位），该波长处传输率为50%
+    """
+    n = len(z)
+    padded = np.concatenate([z[::-1], z, z[::-1]])
+    freqs = np.fft.rfftfreq(len(padded), d=spacing)
+    transfer = np.exp(-np.pi * (_GAUSSIAN_FILTER_ALPHA * cutoff * freqs) ** 2)
+    return np.fft.irfft(np.fft.rfft(padded) * transfer, n=len(padded))[n:2 * n]
+
+
+def wall_roughness(points_um, cutoff_um=DEFAULT_ROUGHNESS_CUTOFF_UM, sections=5):
+    """
+    计算单侧孔壁的表面粗糙度参数
+
+    先用闭式主方向拟合孔壁直线，以点到直线的有符号距离作为原始轮廓（P），按主方向位置
+    重采样为等间距后用高斯滤波分离波纹度（W，长波）和粗糙度（R，短波）。
+
+    参数:
+        points_um: (N, 2) 孔壁边缘点，单位μm（x, y）
+        cutoff_um: 粗糙度/波纹度截止波长（μm）
+        sections: Rz 的取样段数
+
+    返回:
+        字典，包含 Pa/Pq/Pz/Pt、Wa/Wq/Wz/Wt、Ra/Rq/Rz/Rt（μm）、主方向相对竖直方向的角度、
+        粗糙度主波长、弧弦比以及等间距轮廓数组；点数不足时返回 None
+    """
+    points_um = np.asarray(points_um, dtype=np.float64)
+    if len(points_um) < max(8, sections):
+        return None
+
+    mean, axis = principal_axis(points_um)
+    normal = np.array([-axis[1], axis[0]])
+    d = points_um - mean
+    position = d @ axis
+    height = d @ normal
+
+    order = np.argsort(position, kind='stable')
+    position, height = position[order], height[order]
+    # 同一位置有多个点时取平均，再插值为等间距
+    position, inverse = np.unique(position, return_inverse=True)
+    height = np.bincount(inverse, weights=height) / np.bincount(inverse)
+    if len(position) < max(8, sections):
+        return None
+    spacing = float(np.median(np.diff(position)))
+    grid = np.arange(position[0], position[-1] + spacing / 2, spacing)
+    primary = np.interp(grid, position, height)
+    primary -= primary.mean()
+
+    waviness = gaussian_profile_filter(primary, spacing, cutoff_um)
+    roughness = primary - waviness
+
+    # 粗糙度分量的主波长（功率谱峰值，不含直流）
+    power = np.abs(np.fft.rfft(roughness)) ** 2
+    freqs = np.fft.rfftfreq(len(roughness), d=spacing)
+    peak = int(np.argmax(power[1:])) + 1 if len(power) > 1 else 0
+    dominant_wavelength = float(1.0 / freqs[peak]) if peak > 0 else None
+
+    arc_length = np.sum(np.hypot(np.diff(grid), np.diff(primary)))
+    chord_length = grid[-1] - grid[0]
+
+    angle = np.degrees(np.arctan2(axis[0], axis[1]))
+    result = {
+        'n_points': int(len(points_um)),
+        'axis_angle': float((angle + 90) % 180 - 90),   # 主方向偏离竖直方向的角度
+        'spacing_um': spacing,
+        'cutoff_um': float(cutoff_um),
+        'dominant_wavelength_um': dominant_wavelength,
+        'arc_chord_ratio': float(arc_length / chord_length) if chord_length > 0 else 1.0,
+        'position_um': grid,
+        'primary_um': primary,
+        'waviness_um': waviness,
+        'roughness_um': roughness,
+    }
+    for prefix, profile in (('P', primary), ('W', waviness), ('R', roughness)):
+        for key, value in _height_parameters(profile, sections).items():
+            result[prefix + key] = value
+    return result
+
+
+def _roughness_grade(roughness_score):
+    if roughness_score > 80:
+        return "非常光滑"
+    elif roughness_score > 60:
+        return "光滑"
+    elif roughness_score > 40:
+        return "一般"
+    return "粗糙"
+
+
+@perf_trace.traced('roughness')
+def analyze_roughness(binary_image, upper_surface_row, bottom_surface_row, hole_start, hole_end,
+                      pixel_to_um_x=1.0, pixel_to_um_y=1.0, cutoff_um=DEFAULT_ROUGHNESS_CUTOFF_UM,
+                      wall_profile=None):
+    """
+    分别计算左右孔壁的表面粗糙度
+
+    孔壁边缘点取自 extract_wall_profile（可传入已计算的 wall_profile 以避免重复提取），
+    只使用孔壁直线拟合的内点，各侧孔壁单独评价。
+
+    返回:
+        字典: walls（{'left': ..., 'right': ...}，见 wall_roughness）、两侧平均的 Ra/Rq/Rz（μm）、
+        contours（两侧孔壁点，便于 cv2.polylines 绘制）、roughness_score（0-100，越高越光滑）、
+        roughness_grade、smoothness（两侧原始轮廓Pq的平均，像素）、curvature（弧弦比平均）；
+        两侧都没有足够的边缘点时 roughness_score 为 None
+    """
+    if wall_profile is None:
+        wall_profile = extract_wall_profile(binary_image, upper_surface_row, bottom_surface_row,
+                                            hole_start, hole_end, pixel_to_um_x, pixel_to_um_y)
+
+    result = {
+        'walls': {},
+        'contours': [],
+        'Ra': None,
+        'Rq': None,
+        'Rz': None,
+        'cutoff_um': float(cutoff_um),
+        'roughness_score': None,
+        'roughness_grade': None,
+        'smoothness': None,
+        'curvature': None,
+    }
+
+    rows = wall_profile['rows']
+    for side in ('left', 'right'):
+        edges = wall_profile[f'{side}_edges']
+        found = ~np.isnan(edges)
+        inliers = wall_profile[f'{side}_inliers']
+        if inliers is not None:
+            found[found] = inliers
+        points_px = np.column_stack([edges[found], rows[found]])
+        metrics = wall_roughness(points_px * [pixel_to_um_x, pixel_to_um_y], cutoff_um)
+        if metrics is None:
+            continue
+        metrics['points'] = points_px
+        result['walls'][side] = metrics
+        result['contours'].append(points_px.astype(np.int32).reshape(-1, 1, 2))
+
+    walls = list(result['walls'].values())
+    if not walls:
+        return result
+
+    for key in ('Ra', 'Rq', 'Rz'):
+        result[key] = float(np.mean([wall[key] for wall in walls]))
+
+    # 兼容原有评分：以原始轮廓均方根偏差（像素）衡量平滑度
+    smoothness = float(np.mean([wall['Pq'] for wall in walls])) / pixel_to_um_x
+    roughness_score = 100 / (1 + smoothness)
+    result['roughness_score'] = roughness_score
+    result['roughness_grade'] = _roughness_grade(roughness_score)
+    result['smoothness'] = smoothness
+    result['curvature'] = float(np.mean([wall['arc_chord_ratio'] for wall in walls]))
+    return result
+
+
+ROUGHNESS_FIELDS = ['filename', 'status', 'cutoff_um', 'Ra', 'Rq', 'Rz',
+                    'left_Ra', 'left_Rq', 'left_Rz', 'left_Wa', 'left_Pq',
+                    'right_Ra', 'right_Rq', 'right_Rz', 'right_Wa', 'right_Pq',
+                    'taper_angle_um', 'tilt_angle']
+
+
+def roughness_for_image(image, params, pixel_to_um_x=None, pixel_to_um_y=None,
+                        cutoff_um=DEFAULT_ROUGHNESS_CUTOFF_UM):
+    """
+    对一张图像完成检测、孔壁轮廓提取和粗糙度计算（批处理使用）
+
+    返回:
+        (粗糙度结果字典, 孔壁轮廓字典)
+    """
+    px_x = params['pixel_to_um_x'] if pixel_to_um_x is None else pixel_to_um_x
+    px_y = params['pixel_to_um_y'] if pixel_to_um_y is None else pixel_to_um_y
+    binary_image, detection = measure_image(image, params, px_x, px_y)
+    profile = extract_wall_profile(binary_image, detection['upper_surface_row'], detection['bottom_surface_row'],
+                                   detection['hole_start'], detection['hole_end'], px_x, px_y)
+    roughness = analyze_roughness(binary_image, detection['upper_surface_row'], detection['bottom_surface_row'],
+                                  detection['hole_start'], detection['hole_end'], px_x, px_y, cutoff_um,
+                                  wall_profile=profile)
+    return roughness, profile
+
+
+def roughness_row(filename, roughness, profile):
+    """把粗糙度结果整理为 ROUGHNESS_FIELDS 对应的一行"""
+    row = {'filename': filename, 'status': 'ok' if roughness['walls'] else 'no_wall',
+           'cutoff_um': roughness['cutoff_um'], 'Ra': roughness['Ra'], 'Rq': roughness['Rq'],
+           'Rz': roughness['Rz'], 'taper_angle_um': profile['taper_angle_um'], 'tilt_angle': profile['tilt_angle']}
+    for side in ('left', 'right'):
+        wall = roughness['walls'].get(side, {})
+        for key in ('Ra', 'Rq', 'Rz', 'Wa', 'Pq'):
+            row[f'{side}_{key}'] = wall.get(key)
+    return row
@@ -0,0 +1,420 @@
+"""
+孔洞检测命令行工具
+
+子命令:
+    measure  测量指定的图像文件或文件夹，结果写入测量数据库和JSON
+    watch    监视输入文件夹，新图像写入完成后自动交给进程池测量
+    serve    启动本地HTTP测量服务（见 measure_service）
+
+显微镜电脑把图像放入 input/ 后无需人工“打开文件夹”，几秒内即可在 output/ 和数据库中得到结果。
+
+用法示例:
+    python holedetect.py watch input/ -o output/ --params params.json --workers 2
+    python holedetect.py measure input/a.png input/b.png -o output/
+    python holedetect.py serve --params params.json --port 8765
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, as_completed, FIRST_COMPLETED
+
+import hole_engine
+from measurement_store import MeasurementStore
+import image_io
+
+# 正在写入的临时文件（复制工具、浏览器下载等）
+TEMP_SUFFIXES = ('.tmp', '.part', '.crdownload', '~')
+
+# 工作进程内的参数（进程启动时加载一次）
+_worker_params = None
+
+
+def _init_worker(params):
+    global _worker_params
+    _worker_params = params
+    # Ctrl+C 只由主进程处理：工作进程继续完成手上的图像，结果由主进程保存后再退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def measure_path(path, params=None):
+    """
+    读取并测量一个图像文件
+
+    返回:
+        测量记录字典（measurement_store.MEASUREMENT_COLUMNS 中除 params_id 外的字段）
+    """
+    params = params or _worker_params
+    start = time.perf_counter()
+    record = {'path': os.path.abspath(path), 'filename': os.path.basename(path)}
+    try:
+        stat = os.stat(path)
+        record['file_mtime'] = stat.st_mtime
+        record['file_size'] = stat.st_size
+        image = image_io.read_gray(path)
+        if image is None:
+            raise IOError("无法读取图像")
+        _, detection = hole_engine.measure_image(image, params)
+        record.update(hole_engine.detection_summary(detection))
+        record['status'] = 'ok'
+    except Exception as e:
+        record['status'] = f'error: {e}'
+    record['processing_ms'] = (time.perf_counter() - start) * 1000
+    return record
+
+
+def load_params(path):
+    params = dict(hole_engine.DEFAULT_PARAMS)
+    if path:
+        with open(path, 'r') as f:
+            params.update(json.load(f))
+    return params
+
+
+def write_json_atomic(path, data):
+    """先写临时文件再替换，读取方不会读到写了一半的文件"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def write_result(output_dir, record):
+    name = os.path.splitext(record['filename'])[0]
+    write_json_atomic(os.path.join(output_dir, f"{name}_measurement.json"), record)
+
+
+class FolderWatcher:
+    """
+    轮询文件夹，返回已写入完成的新图像
+
+    文件大小和修改时间在 settle 秒内不再变化、且能以只读方式打开时视为写入完成。
+    安装了 watchdog 时用文件系统事件提前唤醒轮询（inotify / ReadDirectoryChangesW），否则按间隔轮询。
+    """
+
+    def __init__(self, folder, settle=1.0, use_events=True):
+        self.folder = folder
+        self.settle = settle
+        self.wakeup = threading.Event()
+        self._candidates = {}  # 路径 -> (大小, 修改时间, 稳定开始时间)
+        self._done = {}  # 路径 -> (大小, 修改时间)
+        self._observer = None
+        if use_events:
+            self._start_observer()
+
+    def _start_observer(self):
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return
+        wakeup = self.wakeup
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                wakeup.set()
+
+        self._observer = Observer()
+        self._observer.schedule(_Handler(), self.folder, recursive=False)
+        self._observer.daemon = True
+        self._observer.start()
+
+    @property
+    def mode(self):
+        return 'events' if self._observer is not None else 'polling'
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+
+    def wait(self, timeout):
+        """等待文件系统事件或超时"""
+        self.wakeup.wait(timeout)
+        self.wakeup.clear()
+
+    @staticmethod
+    def _is_image(name):
+        lower = name.lower()
+        return (not name.startswith('.') and lower.endswith(image_io.IMAGE_EXTENSIONS) and
+                not lower.endswith(TEMP_SUFFIXES))
+
+    @staticmethod
+    def _readable(path):
+        try:
+            with open(path, 'rb'):
+                return True
+        except OSError:
+            return False
+
+    def poll(self):
+        """扫描一次文件夹，返回 [(路径, 大小, 修改时间), ...]，每个文件版本只返回一次"""
+        now = time.monotonic()
+        ready = []
+        seen = set()
+        try:
+            entries = list(os.scandir(self.folder))
+        except OSError as e:
+            print(f"扫描文件夹时出错: {str(e)}")
+            return ready
+
+        for entry in entries:
+            if not entry.is_file() or not self._is_image(entry.name):
+                continue
+            path = entry.path
+            seen.add(path)
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            version = (stat.st_size, stat.st_mtime)
+            if self._done.get(path) == version:
+                continue
+            candidate = self._candidates.get(path)
+            if candidate is None or candidate[:2] != version:
+                self._candidates[path] = version + (now,)
+                continue
+            if stat.st_size > 0 and now - candidate[2] >= self.settle and self._readable(path):
+                del self._candidates[path]
+                self._done[path] = version
+                ready.append((path,) + version)
+
+        # 已删除或移走的文件
+        for path in list(self._candidates):
+            if path not in seen:
+                del self._candidates[path]
+        for path in list(self._done):
+            if path not in seen:
+                del self._done[path]
+        return ready
+
+    @property
+    def settling(self):
+        """尚未写入完成的文件数"""
+        return len(self._candidates)
+
+
+def _status(state, watcher, stats, queued, in_flight):
+    now = time.time()
+    recent = [t for t in stats['finish_times'] if now - t <= 60]
+    return {
+        'state': state,
+        'mode': watcher.mode,
+        'folder': os.path.abspath(watcher.folder),
+        'started_at': stats['started_at'],
+        'updated_at': now,
+        'processed': stats['processed'],
+        'failed': stats['failed'],
+        'queued': queued,
+        'in_flight': in_flight,
+        'settling': watcher.settling,
+        'per_minute': len(recent),
+        'avg_processing_ms': stats['processing_ms'] / stats['processed'] if stats['processed'] else None,
+        'avg_latency_s': stats['latency_s'] / stats['processed'] if stats['processed'] else None,
+        'last_file': stats['last_file'],
+        'last_status': stats['last_status'],
+    }
+
+
+def watch(args):
+    """监视文件夹主循环"""
+    if not os.path.isdir(args.folder):
+        print(f"错误: 文件夹不存在: {args.folder}")
+        return 1
+    os.makedirs(args.output, exist_ok=True)
+    if args.archive:
+        os.makedirs(args.archive, exist_ok=True)
+    params = load_params(args.params)
+    workers = args.workers or os.cpu_count() or 1
+    max_pending = args.max_pending or workers * 2
+    status_path = args.status or os.path.join(args.output, 'watch_status.json')
+
+    store = MeasurementStore(args.db or os.path.join(args.output, 'measurements.db'))
+    pid = store.add_params(params)
+    watcher = FolderWatcher(args.folder, settle=args.settle, use_events=not args.no_events)
+    queue = deque()  # 等待提交的 (路径, 大小, 修改时间, 发现时间)
+    in_flight = {}  # future -> 发现时间
+    stats = {'started_at': time.time(), 'processed': 0, 'failed': 0, 'processing_ms': 0.0,
+             'latency_s': 0.0, 'last_file': None, 'last_status': None,
+             'finish_times': deque(maxlen=10000)}
+    last_status_write = 0.0
+
+    def finish(future):
+        """保存一张已完成图像的结果"""
+        found_at = in_flight.pop(future)
+        record = future.result()
+        record['params_id'] = pid
+        store.add(record)
+        write_result(args.output, record)
+        if args.archive and record['status'] == 'ok':
+            try:
+                shutil.move(record['path'], os.path.join(args.archive, record['filename']))
+            except OSError as e:
+                print(f"移动 {record['filename']} 到归档文件夹时出错: {str(e)}")
+        stats['processed'] += 1
+        stats['failed'] += record['status'] != 'ok'
+        stats['processing_ms'] += record['processing_ms']
+        stats['latency_s'] += time.time() - found_at
+        stats['last_file'] = record['filename']
+        stats['last_status'] = record['status']
+        stats['finish_times'].append(time.time())
+        print(f"  {record['filename']}: {record['status']}"
+              + (f"，直径 {record['standard_diameter']:.2f} μm，深度 {record['hole_depth']:.2f} μm"
+                 if record['status'] == 'ok' else ""))
+
+    print(f"监视 {os.path.abspath(args.folder)}（{watcher.mode}），{workers} 个工作进程，"
+          f"结果输出到 {os.path.abspath(args.output)}，按 Ctrl+C 停止")
+    state = 'running'
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(params,))
+    try:
+        while True:
+            for path, size, mtime in watcher.poll():
+                if not args.reprocess and store.has(os.path.abspath(path), mtime, size, pid):
+                    continue
+                queue.append((path, size, mtime, time.time()))
+
+            # 背压：同时在处理中的图像不超过 max_pending，其余留在队列中
+            while queue and len(in_flight) < max_pending:
+                path, size, mtime, found_at = queue.popleft()
+                in_flight[executor.submit(measure_path, path)] = found_at
+
+            if in_flight:
+                done, _ = wait(list(in_flight), timeout=args.interval, return_when=FIRST_COMPLETED)
+            else:
+                done = []
+                if args.once and not queue and not watcher.settling:
+                    break
+                watcher.wait(args.interval)
+
+            for future in done:
+                finish(future)
+
+            if time.monotonic() - last_status_write >= 1.0:
+                write_json_atomic(status_path, _status(state, watcher, stats, len(queue), len(in_flight)))
+                last_status_write = time.monotonic()
+    except KeyboardInterrupt:
+        # 尚未开始的图像直接取消（下次启动时重新发现），已开始的等待完成并保存结果
+        for future in list(in_flight):
+            if future.cancel():
+                in_flight.pop(future)
+        print(f"正在停止，等待处理中的 {len(in_flight)} 张图像完成...")
+        for future in as_completed(list(in_flight)):
+            try:
+                finish(future)
+            except Exception as e:
+                print(f"保存处理中的图像结果时出错: {str(e)}")
+    finally:
+        state = 'stopped'
+        executor.shutdown(wait=True, cancel_futures=True)
+        watcher.stop()
+        write_json_atomic(status_path, _status(state, watcher, stats, len(queue), 0))
+        store.close()
+
+    print(f"已停止: 处理 {stats['processed']} 张，失败 {stats['failed']} 张")
+    return 0
+
+
+def measure(args):
+    """测量指定文件或文件夹中的所有图像"""
+    paths = []
+    for item in args.paths:
+        if os.path.isdir(item):
+            paths.extend(sorted(os.path.join(item, f) for f in os.listdir(item)
+                                if f.lower().endswith(image_io.IMAGE_EXTENSIONS)))
+        else:
+            paths.append(item)
+    if not paths:
+        print("错误: 没有图像")
+        return 1
+
+    os.makedirs(args.output, exist_ok=True)
+    params = load_params(args.params)
+    with MeasurementStore(args.db or os.path.join(args.output, 'measurements.db')) as store:
+        pid = store.add_params(params)
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                 initargs=(params,)) as executor:
+            records = list(executor.map(measure_path, paths))
+        for record in records:
+            record['params_id'] = pid
+            write_result(args.output, record)
+        store.add_many(records)
+
+    failed = [r for r in records if r['status'] != 'ok']
+    for record in records:
+        if record['status'] == 'ok':
+            print(f"  {record['filename']}: 直径 {record['standard_diameter']:.2f} μm，"
+                  f"深度 {record['hole_depth']:.2f} μm")
+        else:
+            print(f"  {record['filename']}: {record['status']}")
+    print(f"完成: 成功 {len(records) - len(failed)} 张，失败 {len(failed)} 张")
+    return 0
+
+
+def serve(args):
+    """启动本地测量服务"""
+    import measure_service
+    params_list = [load_params(path) for path in (args.params or [])]
+    service = measure_service.MeasurementService(params_list, db_path=args.db, workers=args.workers,
+                                                 batch_size=args.batch_size, max_wait_ms=args.batch_wait_ms,
+                                                 max_queue=args.max_queue)
+    measure_service.serve(service, args.host, args.port, verbose=args.verbose)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="孔洞检测命令行工具")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_common(sub):
+        sub.add_argument('-o', '--output', default='output', help="结果输出文件夹")
+        sub.add_argument('--params', help="检测参数JSON（默认使用 hole_engine.DEFAULT_PARAMS）")
+        sub.add_argument('--db', help="测量数据库路径，默认 <输出文件夹>/measurements.db")
+        sub.add_argument('--workers', type=int, default=None, help="工作进程数，默认CPU核数")
+
+    measure_parser = subparsers.add_parser('measure', help="测量图像文件或文件夹")
+    measure_parser.add_argument('paths', nargs='+', help="图像文件或文件夹")
+    add_common(measure_parser)
+    measure_parser.set_defaults(func=measure)
+
+    watch_parser = subparsers.add_parser('watch', help="监视文件夹并自动测量新图像")
+    watch_parser.add_argument('folder', help="输入文件夹")
+    add_common(watch_parser)
+    watch_parser.add_argument('--interval', type=float, default=0.5, help="轮询间隔（秒）")
+    watch_parser.add_argument('--settle', type=float, default=1.0,
+                              help="文件大小和修改时间保持不变多少秒后视为写入完成")
+    watch_parser.add_argument('--max-pending', type=int, default=None,
+                              help="同时在处理中的图像数上限，默认工作进程数的2倍")
+    watch_parser.add_argument('--status', help="状态文件路径，默认 <输出文件夹>/watch_status.json")
+    watch_parser.add_argument('--archive', help="测量成功后把输入图像移动到该文件夹")
+    watch_parser.add_argument('--reprocess', action='store_true', help="数据库中已有结果的图像也重新测量")
+    watch_parser.add_argument('--no-events', action='store_true', help="不使用文件系统事件，只轮询")
+    watch_parser.add_argument('--once', action='store_true', help="处理完文件夹中现有图像后退出")
+    watch_parser.set_defaults(func=watch)
+
+    serve_parser = subparsers.add_parser('serve', help="启动本地HTTP测量服务")
+    serve_parser.add_argument('--host', default='127.0.0.1', help="监听地址（默认只允许本机访问）")
+    serve_parser.add_argument('--port', type=int, default=8765, help="端口")
+    serve_parser.add_argument('--params', action='append',
+                              help="预加载的参数JSON，可重复指定；第一个为默认参数")
+    serve_parser.add_argument('--db', help="测量数据库路径，预加载其中登记的参数，新登记的参数也写入此库")
+    serve_parser.add_argument('--workers', type=int, default=None, help="工作进程数，默认CPU核数")
+    serve_parser.add_argument('--batch-size', type=int, default=8, help="每批最多合并的请求数")
+    serve_parser.add_argument('--batch-wait-ms', type=float, default=5.0, help="收集一批请求的最长等待时间（毫秒）")
+    serve_parser.add_argument('--max-queue', type=int, default=256, help="排队请求上限，超出返回503")
+    serve_parser.add_argument('--verbose', action='store_true', help="打印每个HTTP请求")
+    serve_parser.set_defaults(func=serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""
+统一的图像读取
+
+所有模块通过这里读取灰度图像：
+    - 直接解码为灰度（不先解码为彩色再转换，也不经过 PIL 再复制为 numpy 数组）
+    - 非 ASCII 路径：Windows 上 cv2.imread 不支持，改为内存映射文件后 cv2.imdecode，不额外复制文件内容
+    - 所有格式都先用 OpenCV 解码（不按格式选择解码器），OpenCV 无法解码的格式（如部分压缩方式的 TIFF、GIF）回退到 PIL
+    - 忽略 EXIF 方向标记（IMREAD_IGNORE_ORIENTATION），与原来 PIL convert('L') 的读取结果一致，
+      带方向标记的 JPEG 不会被旋转，已有测量结果的像素坐标不变
+    - 预览/缩略图使用 IMREAD_REDUCED_GRAYSCALE_2/4/8（JPEG 在解码时直接缩小，其他格式解码后缩小）
+    - 记录每种格式的解码次数和耗时，并提供后台预读取，切换图像时下一张已在内存中
+
+用法:
+    image = image_io.read_gray(path)
+    preview = image_io.read_gray(path, image_io.preview_reduce(image_io.image_size(path), 512))
+    print(image_io.format_decode_stats())
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import cv2
+
+import perf_trace
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+_REDUCED_FLAGS = {
+    1: cv2.IMREAD_GRAYSCALE | cv2.IMREAD_IGNORE_ORIENTATION,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2 | cv2.IMREAD_IGNORE_ORIENTATION,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4 | cv2.IMREAD_IGNORE_ORIENTATION,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8 | cv2.IMREAD_IGNORE_ORIENTATION,
+}
+
+# 各扩展名的解码统计：扩展名 -> {'count', 'ms', 'bytes', 'decoder'}
+_decode_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _needs_buffer(path):
+    """Windows 上 cv2.imread 只接受本地代码页路径，非 ASCII 路径改用内存缓冲区解码"""
+    return os.name == 'nt' and not path.isascii()
+
+
+def _record(ext, elapsed_ms, num_bytes, decoder):
+    with _stats_lock:
+        entry = _decode_stats.setdefault(ext, {'count': 0, 'ms': 0.0, 'bytes': 0, 'decoder': {}})
+        entry['count'] += 1
+        entry['ms'] += elapsed_ms
+        entry['bytes'] += num_bytes
+        entry['decoder'][decoder] = entry['decoder'].get(decoder, 0) + 1
+
+
+def _read_pil(path, reduce):
+    from PIL import Image
+    with Image.open(path) as image:
+        target = (max(1, image.width // reduce), max(1, image.height // reduce))
+        if reduce > 1:
+            image.draft('L', target)  # JPEG 在解码时直接缩小
+        image = image.convert('L')
+        if reduce > 1 and image.size != target:
+            image = image.resize(target, Image.BOX)
+        return np.array(image)
+
+
+def decode_gray(data, reduce=1):
+    """解码内存中的图像文件字节（如网络请求体）为灰度图像，失败返回None"""
+    buffer = np.frombuffer(data, np.uint8) if isinstance(data, (bytes, bytearray, memoryview)) else data
+    return cv2.imdecode(buffer, _REDUCED_FLAGS[reduce])
+
+
+def read_gray_timed(path, reduce=1):
+    """
+    读取灰度图像并返回解码信息
+
+    参数:
+        reduce: 缩小倍数 1/2/4/8
+
+    返回:
+        (图像或None, {'decoder', 'decode_ms', 'reduce', 'file_size'})
+    """
+    if reduce not in _REDUCED_FLAGS:
+        raise ValueError(f"reduce 必须是 1、2、4 或 8，得到 {reduce}")
+    path = os.fspath(path)
+    ext = os.path.splitext(path)[1].lower()
+    start = time.perf_counter()
+    image = None
+    decoder = 'cv2.imread'
+    if not os.path.isfile(path):
+        return None, {'decoder': None, 'decode_ms': 0.0, 'reduce': reduce, 'file_size': 0}
+    with perf_trace.span('decode', 'io', reduce=reduce):
+        try:
+            if _needs_buffer(path):
+                decoder = 'cv2.imdecode'
+                # 内存映射：文件内容不复制到 Python 堆中
+                image = cv2.imdecode(np.memmap(path, dtype=np.uint8, mode='r'), _REDUCED_FLAGS[reduce])
+            else:
+                image = cv2.imread(path, _REDUCED_FLAGS[reduce])
+        except (OSError, ValueError, cv2.error):
+            image = None
+        if image is None:
+            decoder = 'PIL'
+            try:
+                image = _read_pil(path, reduce)
+            except Exception:
+                image = None
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    file_size = os.path.getsize(path)
+    if image is not None:
+        _record(ext, elapsed_ms, file_size, decoder)
+    return image, {'decoder': decoder, 'decode_ms': elapsed_ms, 'reduce': reduce, 'file_size': file_size}
+
+
+def read_gray(path, reduce=1):
+    """读取灰度图像（支持中文路径），失败返回None"""
+    return read_gray_timed(path, reduce)[0]
+
+
+def image_size(path):
+    """只读取文件头得到 (宽, 高)，需要 PIL；无法获取时返回None"""
+    try:
+        from PIL import Image
+        with Image.open(path) as image:
+            return image.size
+    except Exception:
+        return None
+
+
+def preview_reduce(size, max_side):
+    """不小于 max_side 的前提下可用的最大缩小倍数"""
+    if size is None:
+        return 1
+    longest = max(size)
+    for factor in (8, 4, 2):
+        if longest // factor >= max_side:
+            return factor
+    return 1
+
+
+def decode_stats():
+    """返回各扩展名的解码统计副本"""
+    with _stats_lock:
+        return {ext: dict(entry, decoder=dict(entry['decoder'])) for ext, entry in _decode_stats.items()}
+
+
+def format_decode_stats():
+    lines = []
+    for ext, entry in sorted(decode_stats().items()):
+        mean_ms = entry['ms'] / entry['count']
+        decoders = ", ".join(f"{name}×{count}" for name, count in entry['decoder'].items())
+        lines.append(f"{ext or '(无扩展名)'}: {entry['count']} 张，平均 {mean_ms:.1f} ms，"
+                     f"平均 {entry['bytes'] / entry['count'] / 1e6:.2f} MB（{decoders}）")
+    return "\n".join(lines)
+
+
+class ImagePrefetcher:
+    """
+    在后台线程中预先解码相邻图像（OpenCV 解码时释放 GIL，不阻塞界面线程）
+
+    用法:
+        image = prefetcher.get(paths[i])
+        prefetcher.prefetch([paths[i + 1], paths[i - 1]])
+    """
+
+    def __init__(self, capacity=3):
+        self.capacity = capacity
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-prefetch')
+        self._futures = {}  # 路径 -> Future（按插入顺序淘汰）
+        self._lock = threading.Lock()
+
+    def prefetch(self, paths):
+        with self._lock:
+            for path in paths:
+                if path and path not in self._futures:
+                    self._futures[path] = self._executor.submit(read_gray, path)
+            while len(self._futures) > self.capacity:
+                oldest = next(iter(self._futures))
+                self._futures.pop(oldest).cancel()
+
+    def get(self, path):
+        """返回图像：已预读取则直接取结果，否则在当前线程解码"""
+        with self._lock:
+            future = self._futures.pop(path, None)
+        if future is not None and not future.cancelled():
+            image = future.result()
+            if image is not None:
+                return image
+        return read_gray(path)
+
+    def nbytes(self):
+        with self._lock:
+            futures = list(self._futures.values())
+        return sum(f.result().nbytes for f in futures if f.done() and not f.cancelled() and f.result() is not None)
+
+    def clear(self):
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+            self._futures.clear()
+
+    def shutdown(self):
+        self.clear()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,400 @@
+"""
+本地测量服务（HTTP，默认只监听 127.0.0.1）
+
+供 MES 等外部系统调用，与主界面、批处理使用同一检测实现（hole_engine.measure_image）。
+并发请求先进入队列，由分批线程在几毫秒内合并为一批交给常驻进程池，
+工作进程启动时已加载参数并完成 OpenCV 预热，单张图像不再承担进程启动开销。
+
+接口:
+    POST /measure?params=<参数编号>&filename=<名称>   请求体为图像文件字节
+    POST /measure   JSON {"path": "D:/img/a.png", "params": "<参数编号>"}
+    GET  /params    已加载的参数编号
+    POST /params    JSON 参数字典，返回参数编号
+    GET  /status    请求数、错误数、延迟分位数、批大小、吞吐量等
+
+用法:
+    python holedetect.py serve --params params.json --port 8765
+"""
+import os
+import json
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+import hole_engine
+from measurement_store import MeasurementStore, params_id
+import image_io
+
+DEFAULT_PORT = 8765
+# 统计延迟分位数时保留的最近请求数
+_METRIC_WINDOW = 2000
+
+# 工作进程内预加载的参数：编号 -> 参数字典
+_worker_params = {}
+
+
+def _init_worker(params_by_id):
+    """工作进程初始化：加载参数并预热 OpenCV（首次调用的线程池和内存分配开销）"""
+    global _worker_params
+    _worker_params = dict(params_by_id)
+    if _worker_params:
+        hole_engine.preprocess_image(np.full((64, 64), 128, np.uint8), next(iter(_worker_params.values())))
+
+
+def _measure_batch(items, extra_params):
+    """
+    在工作进程中测量一批图像
+
+    参数:
+        items: [(图像字节或None, 路径或None, 参数编号), ...]
+        extra_params: 启动后新登记、工作进程尚未加载的参数
+
+    返回:
+        与 items 对应的结果字典列表；started_at 为开始处理该图像的时刻（time.time()，
+        主进程据此计算包括进程池内排队和批内等待在内的排队时间）
+    """
+    results = []
+    for data, path, pid in items:
+        start = time.perf_counter()
+        result = {'params_id': pid, 'started_at': time.time()}
+        try:
+            params = extra_params.get(pid) or _worker_params[pid]
+            if data is not None:
+                image = image_io.decode_gray(data)
+            else:
+                image = image_io.read_gray(path)
+            if image is None:
+                raise IOError("无法解码图像")
+            decoded = time.perf_counter()
+            _, detection = hole_engine.measure_image(image, params)
+            result.update(hole_engine.detection_summary(detection))
+            result['status'] = 'ok'
+            result['decode_ms'] = (decoded - start) * 1000
+        except Exception as e:
+            result['status'] = f'error: {e}'
+        result['processing_ms'] = (time.perf_counter() - start) * 1000
+        results.append(result)
+    return results
+
+
+class ServiceMetrics:
+    """线程安全的请求统计"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.batches = 0
+        self.latency_ms = deque(maxlen=_METRIC_WINDOW)
+        self.queue_ms = deque(maxlen=_METRIC_WINDOW)
+        self.processing_ms = deque(maxlen=_METRIC_WINDOW)
+        self.batch_sizes = deque(maxlen=_METRIC_WINDOW)
+        self.finish_times = deque(maxlen=100000)
+
+    def record_batch(self, size):
+        with self.lock:
+            self.batches += 1
+            self.batch_sizes.append(size)
+
+    def record_request(self, latency_ms, queue_ms, result):
+        with self.lock:
+            self.requests += 1
+            if result.get('status') != 'ok':
+                self.errors += 1
+            self.latency_ms.append(latency_ms)
+            self.queue_ms.append(queue_ms)
+            self.processing_ms.append(result.get('processing_ms', 0.0))
+            self.finish_times.append(time.time())
+
+    @staticmethod
+    def _percentiles(values):
+        if not values:
+            return None
+        p50, p95, p99 = np.percentile(np.fromiter(values, float), [50, 95, 99])
+        return {'p50': round(p50, 2), 'p95': round(p95, 2), 'p99': round(p99, 2),
+                'max': round(max(values), 2)}
+
+    def snapshot(self):
+        with self.lock:
+            now = time.time()
+            # 运行不足1分钟时按实际运行时间计算吞吐量
+            window = min(60.0, max(now - self.started_at, 1e-3))
+            return {
+                'uptime_s': round(now - self.started_at, 1),
+                'requests': self.requests,
+                'errors': self.errors,
+                'rejected': self.rejected,
+                'batches': self.batches,
+                'mean_batch_size': round(float(np.mean(self.batch_sizes)), 2) if self.batch_sizes else None,
+                'throughput_per_s_1min': round(sum(1 for t in self.finish_times if now - t <= 60) / window, 3),
+                'latency_ms': self._percentiles(self.latency_ms),
+                'queue_ms': self._percentiles(self.queue_ms),
+                'processing_ms': self._percentiles(self.processing_ms),
+            }
+
+
+class MicroBatcher:
+    """
+    把并发请求合并为批次提交给进程池
+
+    第一条请求到达后最多再等 max_wait_ms 收集后续请求（或凑满 batch_size）；
+    已提交的批次达到 max_inflight（默认等于工作进程数）时暂停提交，请求在队列中累积，负载越高批次越大；
+    批次不在进程池内部排队，/status 的 queue_ms 反映请求实际等待的时间。
+    """
+
+    def __init__(self, service, batch_size=8, max_wait_ms=5.0, max_inflight=None, max_queue=256):
+        self.service = service
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.inflight = threading.Semaphore(max_inflight or service.workers)
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._stopped = False
+        self._thread.start()
+
+    def submit(self, data, path, pid):
+        """排入一条请求，返回 Future；队列已满时抛出 queue.Full"""
+        future = Future()
+        # 入队时刻用 time.time()，与工作进程记录的开始处理时刻可以直接相减
+        self.queue.put_nowait((data, path, pid, time.time(), future))
+        return future
+
+    def stop(self):
+        self._stopped = True
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=5)
+
+    def _collect(self):
+        first = self.queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._stopped = True
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while not self._stopped:
+            # 先等待空闲的批次位置再收集：进程池忙时请求在队列中累积，下一批随之变大
+            self.inflight.acquire()
+            batch = self._collect()
+            if batch is None:
+                self.inflight.release()
+                break
+            items = [(data, path, pid) for data, path, pid, _, _ in batch]
+            try:
+                task = self.service.executor.submit(_measure_batch, items,
+                                                    self.service.extra_params(pid for _, _, pid in items))
+            except Exception as e:
+                self.inflight.release()
+                for item in batch:
+                    item[4].set_exception(e)
+                continue
+            self.service.metrics.record_batch(len(batch))
+            task.add_done_callback(lambda done, batch=batch: self._finish(done, batch))
+
+    def _finish(self, task, batch):
+        self.inflight.release()
+        try:
+            results = task.result()
+        except Exception as e:
+            for item in batch:
+                item[4].set_exception(e)
+            return
+        now = time.time()
+        for (_, _, _, queued_at, future), result in zip(batch, results):
+            # 排队时间：入队到开始处理（含批次在进程池中的等待和同一批中前面图像的处理时间）
+            result['queue_ms'] = max(0.0, result.pop('started_at') - queued_at) * 1000
+            result['latency_ms'] = (now - queued_at) * 1000
+            self.service.metrics.record_request(result['latency_ms'], result['queue_ms'], result)
+            future.set_result(result)
+
+
+class MeasurementService:
+    """常驻进程池 + 参数登记 + 分批器"""
+
+    def __init__(self, params_list=(), db_path=None, workers=None, batch_size=8, max_wait_ms=5.0,
+                 max_queue=256):
+        self.workers = workers or os.cpu_count() or 1
+        self.db_path = db_path
+        self.params = {}
+        self.lock = threading.Lock()
+        for params in params_list:
+            self.params[params_id(params)] = params
+        if db_path:
+            with MeasurementStore(db_path) as store:
+                for row in store.conn.execute("SELECT id, params FROM params"):
+                    self.params.setdefault(row['id'], json.loads(row['params']))
+        if not self.params:
+            default = dict(hole_engine.DEFAULT_PARAMS)
+            self.params[params_id(default)] = default
+        self.default_params_id = next(iter(self.params))
+        self.preloaded = set(self.params)
+        self.metrics = ServiceMetrics()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                            initargs=(self.params,))
+        self.batcher = MicroBatcher(self, batch_size, max_wait_ms, max_queue=max_queue)
+
+    def register_params(self, params):
+        full = dict(hole_engine.DEFAULT_PARAMS)
+        full.update(params)
+        pid = params_id(full)
+        with self.lock:
+            self.params.setdefault(pid, full)
+        if self.db_path:
+            with MeasurementStore(self.db_path) as store:
+                store.add_params(full)
+        return pid
+
+    def extra_params(self, pids):
+        """批次中工作进程尚未预加载的参数"""
+        with self.lock:
+            return {pid: self.params[pid] for pid in set(pids) if pid not in self.preloaded}
+
+    def measure(self, data=None, path=None, pid=None, timeout=60.0):
+        """
+        测量一张图像（阻塞直到结果返回）
+
+        返回:
+            结果字典；参数编号未知时抛出 KeyError，队列已满时抛出 queue.Full
+        """
+        pid = pid or self.default_params_id
+        if pid not in self.params:
+            raise KeyError(pid)
+        return self.batcher.submit(data, path, pid).result(timeout)
+
+    def status(self):
+        snapshot = self.metrics.snapshot()
+        snapshot.update({'workers': self.workers, 'queued': self.batcher.queue.qsize(),
+                         'batch_size': self.batcher.batch_size,
+                         'batch_wait_ms': self.batcher.max_wait * 1000,
+                         'params': sorted(self.params), 'default_params': self.default_params_id})
+        return snapshot
+
+    def close(self):
+        self.batcher.stop()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'HoleMeasureService/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, code, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    @staticmethod
+    def _json_object(body):
+        """解析 JSON 请求体，不是对象（如数组、数字）时抛出 ValueError（返回 400）"""
+        request = json.loads(body or b'{}')
+        if not isinstance(request, dict):
+            raise ValueError('JSON 请求体必须是对象')
+        return request
+
+    def do_GET(self):
+        route = urlparse(self.path).path
+        if route == '/status':
+            self._send_json(200, self.server.service.status())
+        elif route == '/params':
+            self._send_json(200, {'params': sorted(self.server.service.params),
+                                  'default': self.server.service.default_params_id})
+        else:
+            self._send_json(404, {'error': f'未知路径: {route}'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        service = self.server.service
+        try:
+            body = self._read_body()
+            if url.path == '/params':
+                self._send_json(200, {'id': service.register_params(self._json_object(body))})
+                return
+            if url.path != '/measure':
+                self._send_json(404, {'error': f'未知路径: {url.path}'})
+                return
+
+            pid = query.get('params', [None])[0]
+            data = path = None
+            filename = query.get('filename', [None])[0]
+            if self.headers.get('Content-Type', '').startswith('application/json'):
+                request = self._json_object(body)
+                path = request.get('path')
+                pid = request.get('params', pid)
+                if pid is not None and not isinstance(pid, str):
+                    self._send_json(400, {'error': 'params 字段必须是参数编号字符串'})
+                    return
+                filename = filename or (path and path.replace('\\', '/').rsplit('/', 1)[-1])
+                if not path:
+                    self._send_json(400, {'error': 'JSON 请求需要 path 字段'})
+                    return
+            elif body:
+                data = body
+            else:
+                self._send_json(400, {'error': '请求体为空'})
+                return
+
+            result = service.measure(data, path, pid)
+            result['filename'] = filename
+            self._send_json(200 if result['status'] == 'ok' else 422, result)
+        except KeyError as e:
+            self._send_json(404, {'error': f'未知参数编号: {e}'})
+        except queue.Full:
+            with service.metrics.lock:
+                service.metrics.rejected += 1
+            self._send_json(503, {'error': '请求队列已满，请稍后重试'})
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {'error': str(e)})
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+
+
+def serve(service, host='127.0.0.1', port=DEFAULT_PORT, verbose=False):
+    """启动 HTTP 服务，阻塞直到 Ctrl+C"""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    print(f"测量服务已启动: http://{host}:{port}（{service.workers} 个工作进程，"
+          f"参数 {', '.join(sorted(service.params))}，默认 {service.default_params_id}），按 Ctrl+C 停止")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("正在停止测量服务...")
+    finally:
+        server.server_close()
+        service.close()
@@ -0,0 +1,129 @@
+"""
+测量结果存储（SQLite）
+
+保存自动测量的结果及所用参数，供监视文件夹、批处理和外部系统查询。
+参数按内容哈希保存一次，每条测量记录引用参数编号，便于追溯。
+
+用法:
+    with MeasurementStore('output/measurements.db') as store:
+        params_id = store.add_params(params)
+        store.add({'path': path, 'status': 'ok', 'params_id': params_id, **hole_engine.detection_summary(d)})
+        rows = store.query(status='ok', limit=100)
+"""
+import json
+import time
+import sqlite3
+import hashlib
+
+import hole_engine
+
+# 除测量字段外的记录列
+RECORD_FIELDS = ['path', 'filename', 'file_mtime', 'file_size', 'params_id', 'status',
+                 'processing_ms', 'created_at']
+MEASUREMENT_COLUMNS = RECORD_FIELDS + hole_engine.DETECTION_FIELDS
+
+_COLUMN_TYPES = {'path': 'TEXT', 'filename': 'TEXT', 'file_mtime': 'REAL', 'file_size': 'INTEGER',
+                 'params_id': 'TEXT', 'status': 'TEXT', 'processing_ms': 'REAL', 'created_at': 'REAL',
+                 'bottom_method': 'TEXT', 'upper_surface_row': 'INTEGER', 'bottom_surface_row': 'INTEGER',
+                 'hole_start': 'INTEGER', 'hole_end': 'INTEGER'}
+
+
+def params_id(params):
+    """参数字典的内容哈希（12位十六进制），相同参数得到相同编号"""
+    text = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+class MeasurementStore:
+    """测量结果数据库；同一时间只应由一个进程写入（读取可以并发）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        # WAL 模式下读取方（如报表或状态页）不会阻塞写入
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        columns = ", ".join(f"{name} {_COLUMN_TYPES.get(name, 'REAL')}" for name in MEASUREMENT_COLUMNS)
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS measurements (id INTEGER PRIMARY KEY, {columns})")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_measurements_path ON measurements (path)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS params (id TEXT PRIMARY KEY, params TEXT, created_at REAL)")
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def add_params(self, params):
+        """保存参数（已存在则忽略），返回参数编号"""
+        pid = params_id(params)
+        self.conn.execute("INSERT OR IGNORE INTO params (id, params, created_at) VALUES (?, ?, ?)",
+                          (pid, json.dumps(params, ensure_ascii=False, default=str), time.time()))
+        self.conn.commit()
+        return pid
+
+    def get_params(self, pid):
+        row = self.conn.execute("SELECT params FROM params WHERE id = ?", (pid,)).fetchone()
+        return json.loads(row['params']) if row else None
+
+    def add_many(self, records):
+        """在一个事务中写入多条记录（缺少的列为NULL）"""
+        now = time.time()
+        placeholders = ", ".join("?" for _ in MEASUREMENT_COLUMNS)
+        rows = [tuple(now if name == 'created_at' and record.get(name) is None else record.get(name)
+                      for name in MEASUREMENT_COLUMNS) for record in records]
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO measurements ({', '.join(MEASUREMENT_COLUMNS)}) VALUES ({placeholders})", rows)
+        return len(rows)
+
+    def add(self, record):
+        self.add_many([record])
+
+    def has(self, path, file_mtime=None, file_size=None, params_id=None):
+        """是否已有该文件（同一修改时间、大小和参数）的测量记录"""
+        sql = "SELECT 1 FROM measurements WHERE path = ?"
+        values = [path]
+        for name, value in (('file_mtime', file_mtime), ('file_size', file_size), ('params_id', params_id)):
+            if value is not None:
+                sql += f" AND {name} = ?"
+                values.append(value)
+        return self.conn.execute(sql + " LIMIT 1", values).fetchone() is not None
+
+    def query(self, path=None, status=None, since=None, limit=None):
+        """
+        查询记录（按写入顺序）
+
+        参数:
+            since: 只返回 created_at 不早于该时间戳的记录
+        返回:
+            字典列表
+        """
+        sql = "SELECT * FROM measurements WHERE 1 = 1"
+        values = []
+        if path is not None:
+            sql += " AND path = ?"
+            values.append(path)
+        if status is not None:
+            sql += " AND status = ?"
+            values.append(status)
+        if since is not None:
+            sql += " AND created_at >= ?"
+            values.append(since)
+        sql += " ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            values.append(int(limit))
+        return [dict(row) for row in self.conn.execute(sql, values)]
+
+    def count(self, status=None):
+        if status is None:
+            return self.conn.execute("SELECT COUNT(*) FROM measurements").fetchone()[0]
+        return self.conn.execute("SELECT COUNT(*) FROM measurements WHERE status = ?", (status,)).fetchone()[0]
@@ -0,0 +1,346 @@
+"""
+内存统计与缓存预算
+
+按"所有者"统计图像缓冲区占用的字节数（同一块内存的多个视图只计一次），统计存活的
+matplotlib 图形和 QPixmap 数量，按需开启 tracemalloc 查看分配最多的代码位置，
+并提供软内存预算：超出预算时按优先级调用已注册缓存的释放函数。
+
+用法:
+    memory_monitor.track('主窗口', window, ['original_image', 'binary_image'])
+    memory_monitor.register_cache('OCT解码帧', size_fn, evict_fn)
+    memory_monitor.check_budget()
+"""
+import gc
+import os
+import sys
+import weakref
+import tracemalloc
+
+import numpy as np
+
+
+def _budget_from_env(name='HOLE_MEMORY_BUDGET_MB', default_mb=2048):
+    """从环境变量读取软预算（MB），格式不正确或为负数时使用默认值"""
+    text = os.environ.get(name)
+    if text is None:
+        return default_mb * 1024 * 1024
+    try:
+        value = float(text)
+    except ValueError:
+        value = -1.0
+    if not value >= 0 or value == float('inf'):
+        print(f"环境变量 {name}={text!r} 无效，使用默认内存预算 {default_mb} MB")
+        value = default_mb
+    return int(value * 1024 * 1024)
+
+
+# 默认软预算（字节），可用环境变量 HOLE_MEMORY_BUDGET_MB 覆盖，0 表示不限制
+DEFAULT_BUDGET = _budget_from_env()
+
+_owners = []  # [(名称, 弱引用, 属性列表), ...]
+_caches = []  # [{'name', 'size_fn', 'evict_fn', 'priority'}, ...]
+_budget = DEFAULT_BUDGET
+
+
+def format_bytes(num_bytes):
+    """字节数格式化为可读字符串"""
+    if num_bytes is None:
+        return "未知"
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(num_bytes) < 1024 or unit == 'GB':
+            return f"{num_bytes:.1f} {unit}" if unit != 'B' else f"{int(num_bytes)} B"
+        num_bytes /= 1024.0
+
+
+def track(name, owner, attrs):
+    """
+    登记一个缓冲区所有者
+
+    参数:
+        name: 显示名称
+        owner: 持有图像的对象（弱引用，对象销毁后自动移除）
+        attrs: 需要统计的属性名列表，属性值可以是数组或包含数组的列表/字典
+    """
+    untrack(name)
+    _owners.append((name, weakref.ref(owner), list(attrs)))
+
+
+def untrack(name):
+    _owners[:] = [item for item in _owners if item[0] != name]
+
+
+def _iter_arrays(value, depth=0):
+    """递归取出对象中的 numpy 数组"""
+    if isinstance(value, np.ndarray):
+        yield value
+    elif depth < 3 and isinstance(value, dict):
+        for item in value.values():
+            yield from _iter_arrays(item, depth + 1)
+    elif depth < 3 and isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _iter_arrays(item, depth + 1)
+
+
+def _base_buffer(array):
+    """返回数组真正持有内存的对象，用于去重视图"""
+    base = array
+    while isinstance(base.base, np.ndarray):
+        base = base.base
+    return base
+
+
+def buffer_report():
+    """
+    统计各所有者持有的图像缓冲区
+
+    返回:
+        {所有者名称: {属性名: 字节数}}；同一块内存在全部所有者中只计一次
+    """
+    report = {}
+    seen = set()
+    for name, ref, attrs in list(_owners):
+        owner = ref()
+        if owner is None:
+            untrack(name)
+            continue
+        entry = {}
+        for attr in attrs:
+            total = 0
+            for array in _iter_arrays(getattr(owner, attr, None)):
+                base = _base_buffer(array)
+                if id(base) in seen:
+                    continue
+                seen.add(id(base))
+                total += base.nbytes
+            if total:
+                entry[attr] = total
+        report[name] = entry
+    return report
+
+
+def cache_report():
+    """返回 {缓存名称: 字节数}"""
+    report = {}
+    for cache in _caches:
+        try:
+            report[cache['name']] = int(cache['size_fn']())
+        except Exception as e:
+            print(f"统计缓存 {cache['name']} 时出错: {str(e)}")
+            report[cache['name']] = 0
+    return report
+
+
+def register_cache(name, size_fn, evict_fn, priority=0):
+    """
+    登记可释放的缓存
+
+    参数:
+        size_fn: 返回当前占用字节数的函数
+        evict_fn: 释放缓存的函数，返回释放的字节数（可返回None）
+        priority: 数值越小越先被释放
+    """
+    unregister_cache(name)
+    _caches.append({'name': name, 'size_fn': size_fn, 'evict_fn': evict_fn, 'priority': priority})
+    _caches.sort(key=lambda c: c['priority'])
+
+
+def unregister_cache(name):
+    _caches[:] = [c for c in _caches if c['name'] != name]
+
+
+def process_rss():
+    """当前进程常驻内存（字节），无法获取时返回None"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    if sys.platform == 'win32':
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                            ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                            ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize
+        except Exception:
+            pass
+    return None
+
+
+def object_counts():
+    """
+    统计存活的图形对象
+
+    返回:
+        {'pyplot_figures', 'figures', 'qpixmaps', 'qimages'}（对应模块未加载时为0）
+    """
+    counts = {'pyplot_figures': 0, 'figures': 0, 'qpixmaps': 0, 'qimages': 0}
+    plt = sys.modules.get('matplotlib.pyplot')
+    if plt is not None:
+        counts['pyplot_figures'] = len(plt.get_fignums())
+
+    figure_mod = sys.modules.get('matplotlib.figure')
+    qtgui = sys.modules.get('PyQt5.QtGui')
+    figure_cls = getattr(figure_mod, 'Figure', None)
+    pixmap_cls = getattr(qtgui, 'QPixmap', None)
+    image_cls = getattr(qtgui, 'QImage', None)
+    if figure_cls is None and pixmap_cls is None:
+        return counts
+
+    for obj in gc.get_objects():
+        if figure_cls is not None and isinstance(obj, figure_cls):
+            counts['figures'] += 1
+        elif pixmap_cls is not None and isinstance(obj, pixmap_cls):
+            counts['qpixmaps'] += 1
+        elif image_cls is not None and isinstance(obj, image_cls):
+            counts['qimages'] += 1
+    return counts
+
+
+def snapshot():
+    """汇总当前内存状态"""
+    buffers = buffer_report()
+    caches = cache_report()
+    return {
+        'rss': process_rss(),
+        'buffers': buffers,
+        'buffers_total': sum(sum(entry.values()) for entry in buffers.values()),
+        'caches': caches,
+        'caches_total': sum(caches.values()),
+        'objects': object_counts(),
+        'budget': _budget,
+        'tracemalloc': tracemalloc.is_tracing(),
+    }
+
+
+def format_snapshot(snap=None):
+    """生成多行文本报告"""
+    snap = snap or snapshot()
+    lines = [f"进程常驻内存: {format_bytes(snap['rss'])}",
+             f"软预算: {format_bytes(snap['budget']) if snap['budget'] else '不限制'}",
+             "",
+             f"图像缓冲区合计: {format_bytes(snap['buffers_total'])}"]
+    for owner, entry in snap['buffers'].items():
+        lines.append(f"  {owner}: {format_bytes(sum(entry.values()))}")
+        for attr, size in sorted(entry.items(), key=lambda x: x[1], reverse=True):
+            lines.append(f"    {attr}: {format_bytes(size)}")
+    lines.append("")
+    lines.append(f"可释放缓存合计: {format_bytes(snap['caches_total'])}")
+    for name, size in snap['caches'].items():
+        lines.append(f"  {name}: {format_bytes(size)}")
+    lines.append("")
+    objects = snap['objects']
+    lines.append(f"matplotlib 图形: {objects['figures']}（pyplot 管理 {objects['pyplot_figures']}）")
+    lines.append(f"QPixmap: {objects['qpixmaps']}, QImage: {objects['qimages']}")
+    return "\n".join(lines)
+
+
+def set_budget(num_bytes):
+    """设置软预算（字节），0 表示不限制"""
+    global _budget
+    _budget = max(0, int(num_bytes))
+
+
+def get_budget():
+    return _budget
+
+
+def current_usage():
+    """
+    预算比较使用的当前占用：已统计的图像缓冲区和已注册缓存的字节数之和
+
+    不使用进程常驻内存：numpy/Qt 释放的内存通常不会归还操作系统，常驻内存超过预算后
+    每次检查都会清空全部缓存而占用并不下降
+    """
+    return (sum(sum(entry.values()) for entry in buffer_report().values()) +
+            sum(cache_report().values()))
+
+
+def evict(names=None):
+    """
+    释放缓存
+
+    参数:
+        names: 要释放的缓存名称列表，None 表示全部
+
+    返回:
+        [(缓存名称, 释放字节数), ...]
+    """
+    evicted = []
+    for cache in list(_caches):
+        if names is not None and cache['name'] not in names:
+            continue
+        try:
+            before = int(cache['size_fn']())
+            freed = cache['evict_fn']()
+            evicted.append((cache['name'], before if freed is None else int(freed)))
+        except Exception as e:
+            print(f"释放缓存 {cache['name']} 时出错: {str(e)}")
+    gc.collect()
+    return evicted
+
+
+def check_budget():
+    """
+    超出软预算时按优先级逐个释放缓存，直到回到预算内或没有可释放的缓存
+
+    返回:
+        [(缓存名称, 释放字节数), ...]
+    """
+    if not _budget:
+        return []
+    evicted = []
+    for cache in list(_caches):
+        if current_usage() <= _budget:
+            break
+        evicted.extend(evict([cache['name']]))
+    if evicted:
+        print(f"内存超出软预算 {format_bytes(_budget)}，已释放缓存: " +
+              ", ".join(f"{name} ({format_bytes(size)})" for name, size in evicted))
+    return evicted
+
+
+def start_tracemalloc(frames=10):
+    """开启 tracemalloc（会明显增加内存和CPU开销，仅在排查时使用）"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stop_tracemalloc():
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def top_allocations(limit=15, key_type='lineno'):
+    """
+    返回 tracemalloc 统计的分配最多的代码位置
+
+    返回:
+        [(位置描述, 字节数, 分配次数), ...]；未开启时返回空列表
+    """
+    if not tracemalloc.is_tracing():
+        return []
+    snap = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    stats = snap.statistics(key_type)[:limit]
+    result = []
+    for stat in stats:
+        frame = stat.traceback[0]
+        result.append((f"{os.path.basename(frame.filename)}:{frame.lineno}", stat.size, stat.count))
+    return result
@@ -0,0 +1,137 @@
+"""
+OCT B扫描切片的批量孔径检测（不依赖界面）
+
+每张切片按 主窗口参数 + 该切片的微调参数 在进程池中直接调用 hole_engine 测量，
+工作进程从文件或内存映射的体数据读取切片，不经进程间管道复制图像。结果按完成顺序返回，
+界面只需定时轮询并更新列表，不再逐张借用主窗口的图像和重绘流程。
+
+Windows（以及打包后的 exe）以 spawn 方式启动工作进程：每个工作进程会重新导入主模块
+（hole_detection_qt 及其 PyQt/matplotlib/pandas 依赖），启动需要一两秒，因此进程池只在批量检测时创建；
+入口脚本必须在 `if __name__ == "__main__":` 下首先调用 multiprocessing.freeze_support()。
+
+用法:
+    tasks = [SliceTask(i, store.source(i), slice_params(main_params, fine_tune.get(i))) for i in range(len(store))]
+    detector = SliceBatchDetector(tasks, pixel_to_um_x, pixel_to_um_y)
+    for result in detector.iter_results():
+        print(result['index'], result['status'], result['diameter_px'])
+"""
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import hole_engine
+import oct_volume
+
+# source: 图像路径或 (oct_volume.OCTVolume, 切片序号)
+SliceTask = namedtuple('SliceTask', ['index', 'source', 'params'])
+
+
+def slice_params(base_params, overrides=None):
+    """默认参数 <- 主窗口参数 <- 该切片的微调参数"""
+    params = dict(hole_engine.DEFAULT_PARAMS)
+    params.update(base_params or {})
+    if overrides:
+        params.update(overrides)
+    return params
+
+
+def detect_slice(task, pixel_to_um_x=None, pixel_to_um_y=None):
+    """
+    检测一张切片的孔径
+
+    返回:
+        结果字典：index、status、points（上表面处孔的左右端点）、diameter_px、
+        processing_ms 以及 hole_engine.DETECTION_FIELDS 中的字段
+    """
+    start = time.perf_counter()
+    result = {'index': task.index, 'points': None, 'diameter_px': None}
+    try:
+        image = oct_volume.read_slice(task.source)
+        if image is None:
+            raise IOError(f"无法读取图像: {task.source}")
+        _, detection = hole_engine.measure_image(image, task.params, pixel_to_um_x, pixel_to_um_y)
+        row = detection['upper_surface_row']
+        hole_start, hole_end = int(detection['hole_start']), int(detection['hole_end'])
+        result['points'] = [(hole_start, row), (hole_end, row)]
+        result['diameter_px'] = float(hole_end - hole_start)
+        result.update(hole_engine.detection_summary(detection))
+        result['status'] = 'ok'
+    except Exception as e:
+        result['status'] = f'error: {e}'
+    result['processing_ms'] = (time.perf_counter() - start) * 1000
+    return result
+
+
+class SliceBatchDetector:
+    """
+    在进程池中检测一批切片；poll() 不阻塞地取出已完成的结果，cancel() 丢弃尚未开始的切片
+
+    参数:
+        tasks: SliceTask 列表
+        workers: 工作进程数，默认CPU核数（不超过切片数）
+    """
+
+    def __init__(self, tasks, pixel_to_um_x=None, pixel_to_um_y=None, workers=None):
+        self.total = len(tasks)
+        self.completed = 0
+        self.cancelled = False
+        self.workers = max(1, min(workers or os.cpu_count() or 1, self.total))
+        self.start_time = time.perf_counter()
+        self._executor = None
+        self._pending = {}  # Future -> 切片序号
+        if tasks:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            for task in tasks:
+                future = self._executor.submit(detect_slice, task, pixel_to_um_x, pixel_to_um_y)
+                self._pending[future] = task.index
+
+    @property
+    def finished(self):
+        return not self._pending
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def poll(self, timeout=0):
+        """
+        取出已完成的结果
+
+        参数:
+            timeout: 没有已完成结果时最多等待的秒数，None 表示等到至少一个完成
+        """
+        if not self._pending:
+            return []
+        done, _ = wait(list(self._pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        results = []
+        for future in done:
+            index = self._pending.pop(future)
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # 工作进程异常退出（BrokenProcessPool 等）
+                results.append({'index': index, 'status': f'error: {e}', 'points': None, 'diameter_px': None})
+        self.completed += len(results)
+        if not self._pending:
+            self._shutdown()
+        return results
+
+    def iter_results(self):
+        """阻塞地按完成顺序产生全部结果"""
+        while not self.finished:
+            yield from self.poll(timeout=None)
+
+    def cancel(self):
+        """取消尚未完成的切片（正在处理的切片在后台完成后丢弃）"""
+        if self._pending:
+            self.cancelled = True
+            for future in self._pending:
+                future.cancel()
+            self._pending.clear()
+        self._shutdown()
+
+    def _shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
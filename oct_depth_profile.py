@@ -0,0 +1,121 @@
+"""
+OCT体数据的多深度三维孔重建（直径-深度曲线、锥度、轴线倾斜）
+
+开始重建 只用上表面处的孔口端点拟合一个圆；这里在上表面以下的多个深度层同时重建：
+    1. oct_volume_detect 检测上表面和孔口，再一次找出每张切片每一层的孔壁内侧位置
+    2. 每层的孔壁点换算到 XY 平面（X = 列 × pixel_to_um_x，Y = 扫描位置），
+       所有层的圆用 circle_fit 批量拟合（默认 Taubin，可选几何精化；几百层与一层耗时相当）
+    3. 各层圆心 (X, Y, 深度) 用 SVD 拟合空间直线作为孔轴，得到轴线倾斜角
+    4. 半径随深度线性拟合（圆锥）或取中值（圆柱），得到锥度和锥度角度
+锥度定义与 hole_engine.measure_taper 相同：每侧单位深度的半径减小量，角度为其反正切。
+
+用法:
+    profile = reconstruct_depth_profile(volume, pixel_to_um_x=1.6, pixel_to_um_y=1.94)
+    for depth, diameter in zip(profile['depths_um'], profile['diameters_um']):
+        print(depth, diameter)
+    print(profile['taper_angle_deg'], profile['axis_tilt_deg'])
+"""
+import numpy as np
+
+import circle_fit
+import oct_volume_detect
+
+FIT_MODELS = ('cone', 'cylinder')
+
+
+def fit_axis(points_3d, weights=None):
+    """
+    用 SVD 拟合空间直线（与 oct_utils.fit_plane 相同的主方向分解，取最大奇异值方向）
+
+    返回:
+        (直线上的点（加权质心）, 单位方向向量（Z 分量为正）)
+    """
+    points_3d = np.asarray(points_3d, dtype=float)
+    weights = np.ones(len(points_3d)) if weights is None else np.asarray(weights, dtype=float)
+    centroid = (points_3d * weights[:, None]).sum(axis=0) / weights.sum()
+    _, _, vt = np.linalg.svd((points_3d - centroid) * np.sqrt(weights)[:, None], full_matrices=False)
+    direction = vt[0]
+    if direction[2] < 0:
+        direction = -direction
+    return centroid, direction
+
+
+def fit_taper(depths_um, radii_um, weights=None):
+    """
+    半径随深度的加权线性拟合 r = r0 - taper × depth
+
+    返回:
+        (r0, taper)，taper 为正表示孔向下收窄
+    """
+    slope, intercept = np.polyfit(depths_um, radii_um, 1, w=None if weights is None else np.sqrt(weights))
+    return float(intercept), float(-slope)
+
+
+def reconstruct_depth_profile(volume, pixel_to_um_x, pixel_to_um_y, params=None, edges=None,
+                              level_step_px=2, max_depth_um=None, min_slices=5, model='cone',
+                              fit_method='taubin', refine=False):
+    """
+    在上表面以下的多个深度层重建孔的截面圆，并拟合孔轴和锥度
+
+    参数:
+        volume: oct_volume.OCTVolume（需要切片间距）
+        pixel_to_um_x, pixel_to_um_y: 横向和深度方向每像素微米数
+        params: 检测参数（见 oct_volume_detect.detect_volume_edges）
+        edges: 已有的 detect_volume_edges 结果，缺省时重新检测
+        level_step_px: 相邻深度层的行距
+        max_depth_um: 最大深度，默认到图像底部
+        min_slices: 一层至少在多少张切片上检测到孔壁才拟合该层
+        model: 'cone' 半径随深度线性变化，'cylinder' 半径取各层中值
+        fit_method: 各层的代数拟合方法（见 circle_fit.ALGEBRAIC_METHODS）
+        refine: 是否再做几何（正交距离）精化
+
+    返回:
+        结果字典：depths_um、centers_um (层数, 2)、radii_um、diameters_um、slice_counts、
+        rms_residual_um（各层点到圆的均方根距离）、axis_point_um、axis_direction、axis_tilt_deg、
+        top_diameter_um、taper、taper_angle_deg、model、walls（WallEdges）；没有可拟合的层时抛出 ValueError
+    """
+    if model not in FIT_MODELS:
+        raise ValueError(f"未知的拟合模型: {model}")
+    if edges is None:
+        edges = oct_volume_detect.detect_volume_edges(volume, params)
+    height = volume.slice_shape[0]
+    deepest = height - np.nanmin(edges.surface_rows) if edges.valid.any() else 0
+    if max_depth_um is not None:
+        deepest = min(deepest, max_depth_um / pixel_to_um_y + 1)
+    offsets = np.arange(0, int(deepest), level_step_px)
+    walls = oct_volume_detect.detect_wall_edges(volume, edges, offsets, params)
+
+    # 每层的点：左右孔壁 (层数, 2×张数, 2)
+    positions = np.array([volume.position(i) for i in range(len(volume))])
+    x = np.concatenate([walls.left.T, walls.right.T], axis=1) * pixel_to_um_x
+    y = np.broadcast_to(np.concatenate([positions, positions]), x.shape)
+    points = np.stack([x, y], axis=-1)
+    slice_counts = walls.valid.sum(axis=0)
+
+    fits = circle_fit.fit_circles(points, method=fit_method)
+    if refine:
+        fits = circle_fit.refine_circles(points, initial=fits)
+    keep = (slice_counts >= min_slices) & np.isfinite(fits.r)
+    if not keep.any():
+        raise ValueError("没有足够的深度层检测到孔壁")
+
+    depths = offsets[keep] * pixel_to_um_y
+    centers = np.column_stack([fits.cx[keep], fits.cy[keep]])
+    radii = fits.r[keep]
+    weights = slice_counts[keep].astype(float)
+
+    if keep.sum() >= 2:
+        axis_point, direction = fit_axis(np.column_stack([centers, depths]), weights)
+        tilt = float(np.degrees(np.arccos(np.clip(direction[2], -1.0, 1.0))))
+    else:
+        axis_point, direction, tilt = np.append(centers[0], depths[0]), np.array([0.0, 0.0, 1.0]), 0.0
+    if model == 'cone' and keep.sum() >= 2:
+        r0, taper = fit_taper(depths, radii, weights)
+    else:
+        r0, taper = float(np.median(radii)), 0.0
+
+    return {'depths_um': depths, 'centers_um': centers, 'radii_um': radii, 'diameters_um': 2 * radii,
+            'slice_counts': slice_counts[keep], 'rms_residual_um': fits.rms[keep],
+            'axis_point_um': axis_point, 'axis_direction': direction, 'axis_tilt_deg': tilt,
+            'top_diameter_um': 2 * r0, 'taper': taper, 'taper_angle_deg': float(np.degrees(np.arctan(taper))),
+            'model': model, 'walls': walls}
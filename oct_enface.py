@@ -0,0 +1,223 @@
+"""
+OCT体数据的俯视（en-face）投影与孔轮廓直接检测
+
+逐张切片找弦长再拟合圆之外的第二种独立估计：
+    1. 沿用 oct_volume_detect 检测并跟踪每张B扫描的上表面
+    2. 取上表面以下 [offset, offset+depth) 行的平均或最小灰度，得到 (张数, 宽) 的俯视投影
+    3. 按切片间距和横向像素尺寸把投影缩放为方形像素
+    4. 在俯视图上一次检测孔口：轮廓（最大的不接触左右边界的暗连通域，圆和椭圆拟合）或霍夫圆
+
+坐标与 oct_utils.transform_to_2d_coords 一致：X = 列 × pixel_to_um_x，Y = 扫描位置（微米），
+因此结果可以直接与弦长拟合（oct_utils.fit_circle_2d）的圆心和半径比较。
+
+用法:
+    result = detect_enface_circle(volume, pixel_to_um_x=1.6)
+    print(result['diameter_um'], result['center_um'])
+    print(compare_with_chord_fit(result, chord_center, chord_radius))
+"""
+import numpy as np
+import cv2
+
+import circle_fit
+import oct_volume_detect
+
+PROJECTION_MODES = ('mean', 'min')
+DETECTION_METHODS = ('contour', 'hough')
+
+# 归一化到 uint8 时使用的分位数（抑制少量过亮/过暗的散斑）
+_NORMALIZE_PERCENTILES = (1, 99)
+
+
+def enface_projection(volume, surface_rows, offset=0, depth=8, mode='mean'):
+    """
+    上表面以下深度窗口内的俯视投影
+
+    参数:
+        volume: oct_volume.OCTVolume 或 (张数, 高, 宽) 数组
+        surface_rows: (张数,) 上表面行号（oct_volume_detect.detect_surface）
+        offset: 窗口起点相对上表面的行数
+        depth: 窗口行数
+        mode: 'mean' 平均灰度，'min' 最小灰度（孔内更暗，边缘更锐利但对散斑更敏感）
+
+    返回:
+        (张数, 宽) float32 数组；上表面缺失的切片用相邻切片线性插值
+    """
+    if mode not in PROJECTION_MODES:
+        raise ValueError(f"未知的投影方式: {mode}")
+    window = oct_volume_detect.gather_rows(volume, surface_rows, range(offset, offset + max(1, depth)))
+    projection = window.mean(axis=1) if mode == 'mean' else window.min(axis=1)
+
+    missing = np.isnan(projection[:, 0])
+    if missing.all():
+        raise ValueError("所有切片都未检测到上表面")
+    if missing.any():
+        known = np.flatnonzero(~missing)
+        for column in range(projection.shape[1]):
+            projection[missing, column] = np.interp(np.flatnonzero(missing), known, projection[known, column])
+    return projection
+
+
+def to_isotropic(projection, slice_spacing_um, pixel_to_um_x):
+    """
+    把投影缩放为方形像素（横向像素尺寸不变，切片方向按间距重采样）并归一化为 uint8
+
+    返回:
+        (uint8 图像, 每像素微米数)；图像第 y 行对应投影的第 (y + 0.5) × 张数 / 行数 - 0.5 张切片
+        （cv2.resize 按像素中心对齐，见 rows_to_slices）
+    """
+    row_scale = float(slice_spacing_um) / float(pixel_to_um_x)
+    height = max(1, int(round(projection.shape[0] * row_scale)))
+    image = cv2.resize(projection.astype(np.float32), (projection.shape[1], height), interpolation=cv2.INTER_LINEAR)
+    low, high = np.percentile(image, _NORMALIZE_PERCENTILES)
+    scaled = (image - low) * (255.0 / max(high - low, 1e-6))
+    return np.clip(scaled, 0, 255).astype(np.uint8), float(pixel_to_um_x)
+
+
+def rows_to_slices(rows, slice_count, image_height):
+    """方形像素俯视图的行坐标 -> 切片序号（浮点），与 cv2.resize 的像素中心对齐一致"""
+    return (np.asarray(rows, dtype=float) + 0.5) * (slice_count / image_height) - 0.5
+
+
+def _fit_circle(points):
+    """代数法（Kåsa）最小二乘拟合圆，返回 (cx, cy, r)"""
+    fit = circle_fit.fit_circles(np.asarray(points, dtype=float), method='kasa')
+    return float(fit.cx[0]), float(fit.cy[0]), float(fit.r[0])
+
+
+def _hole_contour(image, min_area_px):
+    """
+    阈值化后取面积最大的暗连通域轮廓
+
+    接触左右边界的暗区是B扫描范围外的背景，不作为孔口；孔口可以被第一张/最后一张切片截断，
+    这时只返回不在图像边界上的轮廓点（一段圆弧）
+    """
+    _, dark = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+    dark = cv2.morphologyEx(dark, cv2.MORPH_OPEN, kernel)
+    dark = cv2.morphologyEx(dark, cv2.MORPH_CLOSE, kernel)
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(dark, connectivity=8)
+    height, width = image.shape
+    best = None
+    for label in range(1, count):
+        x, y, w, h, area = stats[label]
+        if x == 0 or x + w >= width or area < min_area_px:
+            continue
+        if best is None or area > stats[best, cv2.CC_STAT_AREA]:
+            best = label
+    if best is None:
+        return None
+    mask = (labels == best).astype(np.uint8)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    contour = max(contours, key=cv2.contourArea).reshape(-1, 2)
+    inside = (contour[:, 1] > 0) & (contour[:, 1] < height - 1)
+    return contour[inside]
+
+
+def _detect_contour(image, min_radius_px):
+    contour = _hole_contour(image, np.pi * min_radius_px ** 2)
+    if contour is None or len(contour) < 5:
+        return None
+    cx, cy, r = _fit_circle(contour)
+    (ex, ey), (ew, eh), angle = cv2.fitEllipse(contour)
+    return {'center_px': (cx, cy), 'radius_px': r, 'contour_px': contour,
+            'ellipse_px': ((ex, ey), (ew, eh), angle)}
+
+
+def _detect_hough(image, min_radius_px):
+    blurred = cv2.GaussianBlur(image, (5, 5), 0)
+    max_radius = min(image.shape) // 2
+    # 累加器分辨率减半（dp=2），整幅俯视图只找一个圆
+    circles = cv2.HoughCircles(blurred, cv2.HOUGH_GRADIENT, dp=2, minDist=max(image.shape),
+                               param1=100, param2=20, minRadius=int(min_radius_px), maxRadius=max_radius)
+    if circles is None:
+        return None
+    cx, cy, r = (float(v) for v in circles[0, 0])
+    return {'center_px': (cx, cy), 'radius_px': r, 'contour_px': None, 'ellipse_px': None}
+
+
+def detect_enface_circle(volume, pixel_to_um_x, slice_spacing_um=None, start_position_um=None,
+                         params=None, method='contour', mode='mean', offset=0, depth=8,
+                         min_radius_um=10.0, surface_rows=None):
+    """
+    由俯视投影直接检测孔口的圆（和椭圆）
+
+    参数:
+        volume: oct_volume.OCTVolume 或 (张数, 高, 宽) 数组
+        pixel_to_um_x: 横向每像素微米数
+        slice_spacing_um, start_position_um: 切片间距和第一张切片的扫描位置，默认取自 OCTVolume 元数据
+        params: 检测参数（上表面检测使用，见 oct_volume_detect.detect_surface）
+        method: 'contour' 轮廓拟合 或 'hough' 霍夫圆
+        mode, offset, depth: 投影方式和深度窗口，见 enface_projection
+        min_radius_um: 忽略半径小于该值的暗区
+        surface_rows: 已检测的上表面行号，缺省时重新检测
+
+    返回:
+        结果字典：method、center_um、radius_um、diameter_um、ellipse_um（长轴/短轴/角度，仅轮廓法）、
+        contour_um、image（方形像素的俯视图）、um_per_px、origin_um；未检测到孔口时返回 None
+    """
+    if method not in DETECTION_METHODS:
+        raise ValueError(f"未知的检测方法: {method}")
+    if slice_spacing_um is None:
+        slice_spacing_um = volume.slice_spacing_um
+    if not slice_spacing_um:
+        raise ValueError("缺少切片间距 slice_spacing_um")
+    if start_position_um is None:
+        start_position_um = volume.position(0) if hasattr(volume, 'position') else 0.0
+    if surface_rows is None:
+        surface_rows, _ = oct_volume_detect.detect_surface(volume, params)
+
+    projection = enface_projection(volume, surface_rows, offset, depth, mode)
+    image, um_per_px = to_isotropic(projection, slice_spacing_um, pixel_to_um_x)
+    min_radius_px = max(2.0, min_radius_um / um_per_px)
+    found = _detect_contour(image, min_radius_px) if method == 'contour' else _detect_hough(image, min_radius_px)
+    if found is None:
+        return None
+
+    # 俯视图像素 -> 微米（列对应 X，行按像素中心对齐换算回切片序号再乘切片间距）
+    def to_um(points):
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        slices = rows_to_slices(points[:, 1], projection.shape[0], image.shape[0])
+        return np.column_stack([points[:, 0] * um_per_px, start_position_um + slices * slice_spacing_um])
+
+    cx, cy = to_um(found['center_px'])[0]
+    radius_um = found['radius_px'] * um_per_px
+    result = {'method': method, 'mode': mode,
+              'center_um': (float(cx), float(cy)), 'radius_um': float(radius_um), 'diameter_um': float(2 * radius_um),
+              'ellipse_um': None, 'contour_um': None,
+              'image': image, 'um_per_px': um_per_px, 'origin_um': (0.0, float(start_position_um)),
+              'found_px': found}
+    if found['contour_px'] is not None:
+        result['contour_um'] = to_um(found['contour_px'])
+    if found['ellipse_px'] is not None:
+        _, (width, height), angle = found['ellipse_px']
+        result['ellipse_um'] = (max(width, height) * um_per_px, min(width, height) * um_per_px, float(angle))
+    return result
+
+
+def compare_with_chord_fit(result, chord_center, chord_radius):
+    """
+    俯视检测结果与弦长拟合结果的差异
+
+    返回:
+        字典：diameter_diff_um（俯视 - 弦长）、relative_diff（相对弦长直径）、center_offset_um
+    """
+    chord_diameter = 2 * float(chord_radius)
+    diff = result['diameter_um'] - chord_diameter
+    offset = float(np.hypot(result['center_um'][0] - chord_center[0], result['center_um'][1] - chord_center[1]))
+    return {'diameter_diff_um': diff,
+            'relative_diff': diff / chord_diameter if chord_diameter > 0 else float('nan'),
+            'center_offset_um': offset}
+
+
+def draw_enface_result(result):
+    """在俯视图上绘制检测到的轮廓、椭圆和圆，返回 BGR 图像"""
+    canvas = cv2.cvtColor(result['image'], cv2.COLOR_GRAY2BGR)
+    found = result['found_px']
+    if found['contour_px'] is not None:
+        canvas[found['contour_px'][:, 1], found['contour_px'][:, 0]] = (0, 255, 0)
+    if found['ellipse_px'] is not None:
+        cv2.ellipse(canvas, found['ellipse_px'], (255, 0, 0), 1)
+    cx, cy = found['center_px']
+    cv2.circle(canvas, (int(round(cx)), int(round(cy))), int(round(found['radius_px'])), (0, 0, 255), 1)
+    cv2.drawMarker(canvas, (int(round(cx)), int(round(cy))), (0, 0, 255), cv2.MARKER_CROSS, 8, 1)
+    return canvas
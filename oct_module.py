@@ -1,14 +1,23 @@
 import os
+import time
 import numpy as np
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QListWidget,
                            QLabel, QTextEdit, QFileDialog, QMessageBox, QAbstractItemView,
                            QInputDialog, QApplication, QListWidgetItem, QProgressDialog, QComboBox,
                            QSlider, QGridLayout, QDialogButtonBox, QGroupBox, QFrame, QCheckBox,
                            QSpinBox, QDoubleSpinBox)
-from PyQt5.QtCore import Qt, QPoint
-from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtCore import Qt, QPoint, QTimer
+from PyQt5.QtGui import QImage, QPixmap, QColor, QBrush
 import cv2
 import oct_utils
+import memory_monitor
+import oct_batch
+import oct_store
+import oct_volume
+import oct_volume_detect
+import oct_enface
+import oct_depth_profile
+import circle_fit
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
@@ -254,23 +263,55 @@ class OCTHoleReconstructionDialog(QDialog):
         self.pixel_to_um = self.pixel_to_um_x
         
         # 初始化变量
-        self.oct_images = []
+        # 切片只常驻路径、位置和标记点，图像按需解码并按内存预算缓存
+        self.oct_images = oct_store.OCTSliceStore()
+        self.oct_display_scale = (1.0, 1.0)  # 当前显示的预览相对全分辨率的缩放比例
         self.oct_points_3d = None
         self.oct_plane_params = None
         self.oct_circle_center = None
         self.oct_radius = None
+        self.enface_result = None  # 俯视投影检测结果（与弦长拟合交叉校验）
+        self.oct_uncertainty = None  # 重建直径和圆心的置信区间（circle_fit.circle_uncertainty）
+        # 标记过程中的实时估计：每张切片的端点增量加入/删除，不必每次重新重建
+        self.live_fit = circle_fit.IncrementalCircleFit()
+        self.live_fit_previous = None  # 上一次实时估计的直径，用于显示变化量
         self.oct_current_index = -1
         self.fit_method = 'algebraic'  # 默认使用代数拟合方法
         self.result_image_path = None  # 用于保存结果图片路径
         self.fine_tune_params = {} # 保存每张图的微调参数
         self.result_fig = None # 用于保存matplotlib的figure对象
         self.diameter_lines = [] # 保存绘图中的直径线对象
+        # 后台批量检测状态
+        self.batch_detector = None
+        self.batch_progress = None
+        self.batch_results = {'ok': 0, 'failed': 0}
+        self.batchTimer = QTimer(self)
+        self.batchTimer.timeout.connect(self.poll_batch_detect)
         
         # 设置中文字体
         self.font_prop = self.get_chinese_font()
 
+        # 登记内存统计：解码后的切片和预览可以随时从文件重新读取
+        memory_monitor.register_cache('OCT切片缓存', self.oct_images.nbytes, self.oct_images.clear, priority=2)
+
         self.setup_ui()
     
+    def done(self, result):
+        """关闭对话框时注销缓存并关闭结果图形"""
+        memory_monitor.unregister_cache('OCT切片缓存')
+        # 关闭时直接丢弃未完成的批量检测，不再弹出结果提示
+        if self.batch_detector is not None:
+            self.batchTimer.stop()
+            self.batch_detector.cancel()
+            self.batch_detector = None
+        if self.result_fig is not None:
+            plt.close(self.result_fig)
+        super().done(result)
+    
+    def get_oct_image(self, index):
+        """返回第 index 张OCT图像（全分辨率，按需从文件解码）"""
+        return self.oct_images.image(index)
+    
     def get_chinese_font(self):
         """获取可用的中文字体"""
         fonts = ['SimHei', 'Microsoft YaHei', 'SimSun', 'KaiTi', 'FangSong']
@@ -312,6 +353,11 @@ class OCTHoleReconstructionDialog(QDialog):
         addBatchButton.clicked.connect(self.add_oct_images_batch)
         buttonLayout.addWidget(addBatchButton)
         
+        # 添加体数据按钮（raw/NPY 堆栈）
+        addVolumeButton = QPushButton("添加体数据")
+        addVolumeButton.clicked.connect(self.add_oct_volume)
+        buttonLayout.addWidget(addVolumeButton)
+        
         # 删除图像按钮
         removeButton = QPushButton("删除图像")
         removeButton.clicked.connect(self.remove_oct_image)
@@ -328,6 +374,24 @@ class OCTHoleReconstructionDialog(QDialog):
         batchDetectButton.clicked.connect(self.batch_auto_detect)
         buttonLayout.addWidget(batchDetectButton)
         
+        # 体数据整体检测按钮（整卷一次向量化检测）
+        volumeDetectButton = QPushButton("体数据整体检测")
+        volumeDetectButton.setToolTip("对通过“添加体数据”加入的切片，整卷一次检测上表面和孔口边缘")
+        volumeDetectButton.clicked.connect(self.detect_volume_boundaries)
+        buttonLayout.addWidget(volumeDetectButton)
+        
+        # 俯视投影检测按钮（在上表面以下的俯视投影上直接找孔口）
+        enfaceButton = QPushButton("俯视投影检测")
+        enfaceButton.setToolTip("对体数据计算上表面以下的俯视投影，直接检测孔口圆并与弦长拟合结果对比")
+        enfaceButton.clicked.connect(self.detect_enface_hole)
+        buttonLayout.addWidget(enfaceButton)
+        
+        # 多深度重建按钮（各深度层的截面圆、锥度和轴线倾斜）
+        depthProfileButton = QPushButton("多深度重建")
+        depthProfileButton.setToolTip("对体数据在上表面以下的多个深度同时拟合截面圆，给出直径-深度曲线、锥度和轴线倾斜")
+        depthProfileButton.clicked.connect(self.reconstruct_depth_profile)
+        buttonLayout.addWidget(depthProfileButton)
+        
         # 开始处理按钮
         processButton = QPushButton("开始重建")
         processButton.clicked.connect(self.process_oct_reconstruction)
@@ -351,8 +415,18 @@ class OCTHoleReconstructionDialog(QDialog):
         fitMethodLayout = QHBoxLayout()
         fitMethodLayout.addWidget(QLabel("拟合方法:"))
         self.fit_method_combo = QComboBox()
-        self.fit_method_combo.addItems(["代数法", "几何法"])
+        self.fit_method_combo.addItems(["代数法", "几何法", "稳健法(RANSAC)", "稳健法(LMedS)"])
+        self.fit_method_combo.setToolTip("稳健法自动排除误检的切片（如孔口落在散斑上），并在列表中以红色标出")
         fitMethodLayout.addWidget(self.fit_method_combo)
+        
+        # 俯视投影检测的方法和投影方式
+        fitMethodLayout.addWidget(QLabel("俯视检测:"))
+        self.enface_method_combo = QComboBox()
+        self.enface_method_combo.addItems(["轮廓拟合", "霍夫圆"])
+        fitMethodLayout.addWidget(self.enface_method_combo)
+        self.enface_mode_combo = QComboBox()
+        self.enface_mode_combo.addItems(["平均投影", "最小投影"])
+        fitMethodLayout.addWidget(self.enface_mode_combo)
         fitMethodLayout.addStretch()
         
         layout.addLayout(fitMethodLayout)
@@ -368,6 +442,13 @@ class OCTHoleReconstructionDialog(QDialog):
         self.analyze_upper_lower_checkbox.setToolTip("分析圆孔下方0.1mm和上方0.1mm的直径并取平均值")
         alignLayout.addWidget(self.analyze_upper_lower_checkbox)
         
+        # 置信区间：按切片重采样后批量重新拟合
+        alignLayout.addWidget(QLabel("95%置信区间:"))
+        self.uncertainty_combo = QComboBox()
+        self.uncertainty_combo.addItems(["不计算", "自助法(1000次)", "刀切法"])
+        self.uncertainty_combo.setToolTip("按切片重采样并重新拟合，给出直径和圆心的95%置信区间")
+        alignLayout.addWidget(self.uncertainty_combo)
+        
         alignLayout.addStretch()
         layout.addLayout(alignLayout)
         
@@ -417,6 +498,12 @@ class OCTHoleReconstructionDialog(QDialog):
         layout.addWidget(QLabel("重建结果:"))
         layout.addWidget(self.oct_result_text)
         
+        # 标记切片时实时更新的直径和圆心（代数法增量拟合 + 几何精化）
+        self.live_fit_label = QLabel("实时估计: 尚未标记切片")
+        self.live_fit_label.setToolTip("每标记或检测一张切片即更新；变化量稳定后可停止标记。未做中点对齐和稳健拟合，最终结果以“开始重建”为准")
+        self.live_fit_label.setStyleSheet("color: #1a5276; padding: 3px;")
+        layout.addWidget(self.live_fit_label)
+        
         # 显示像素转换系数
         self.pixelInfoLabel = QLabel(f"当前像素转换系数: X方向 {self.pixel_to_um_x:.2f} μm/px，Y方向 {self.pixel_to_um_y:.2f} μm/px")
         self.pixelInfoLabel.setStyleSheet("color: #666; font-style: italic; padding: 5px;")
@@ -468,15 +555,13 @@ class OCTHoleReconstructionDialog(QDialog):
                     self, "输入扫描位置", "请输入此OCT图像在Y方向上的扫描位置(单位:微米):", 0, -10000, 10000, 2)
                 
                 if ok:
-                    # 读取图像
-                    img = cv2.imdecode(np.fromfile(filePath, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
-                    if img is None:
-                        QMessageBox.warning(self, "错误", f"无法读取图像: {filePath}")
+                    # 添加到列表（图像在显示时才解码）
+                    try:
+                        self.oct_images.append(filePath, position)
+                    except IOError as e:
+                        QMessageBox.warning(self, "错误", f"无法读取图像: {e}")
                         return
                     
-                    # 添加到列表
-                    self.oct_images.append({"path": filePath, "image": img, "position": position, "points": []})
-                    
                     # 更新列表控件
                     item = QListWidgetItem(f"图像 {len(self.oct_images)}: Y={position}μm")
                     self.oct_image_list.addItem(item)
@@ -520,17 +605,15 @@ class OCTHoleReconstructionDialog(QDialog):
                 initial_image_count = len(self.oct_images)
 
                 for i, filePath in enumerate(filePaths):
-                    # 读取图像
-                    img = cv2.imdecode(np.fromfile(filePath, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
-                    if img is None:
-                        QMessageBox.warning(self, "错误", f"无法读取图像: {filePath}")
-                        continue
-                    
                     # 计算Y坐标
                     position = start_y + i * interval
                     
-                    # 添加到列表
-                    self.oct_images.append({"path": filePath, "image": img, "position": position, "points": []})
+                    # 添加到列表（只记录路径，图像在显示或检测时才解码）
+                    try:
+                        self.oct_images.append(filePath, position)
+                    except IOError as e:
+                        QMessageBox.warning(self, "错误", f"无法读取图像: {e}")
+                        continue
                     
                     # 更新列表控件
                     item_text = f"图像 {len(self.oct_images)}: Y={position:.2f}μm"
@@ -546,6 +629,72 @@ class OCTHoleReconstructionDialog(QDialog):
             print(f"批量添加OCT图像时出错: {str(e)}")
             QMessageBox.warning(self, "错误", f"批量添加OCT图像时出错: {str(e)}")
     
+    def add_oct_volume(self):
+        """添加 raw/NPY 体数据中的全部B扫描（内存映射，只有显示或检测的切片会被读入）"""
+        try:
+            filePath, _ = QFileDialog.getOpenFileName(
+                self, "选择OCT体数据", "", "OCT体数据 (*.npy *.raw *.bin *.img);;所有文件 (*)")
+            if not filePath:
+                return
+            
+            meta = oct_volume.read_sidecar(filePath)
+            saved_meta = dict(meta)  # 附属元数据中已有的内容，用户补充的部分在打开成功后写回
+            if not filePath.lower().endswith('.npy') and ('shape' not in meta or 'dtype' not in meta):
+                # raw 文件没有附属元数据时询问尺寸和数据类型
+                text, ok = QInputDialog.getText(
+                    self, "体数据格式", "请输入 张数 高 宽 数据类型（如 400 512 1024 uint16）:")
+                if not ok:
+                    return
+                parts = text.split()
+                if len(parts) != 4:
+                    QMessageBox.warning(self, "错误", "格式应为: 张数 高 宽 数据类型")
+                    return
+                meta['shape'] = [int(v) for v in parts[:3]]
+                meta['dtype'] = parts[3]
+            
+            if not meta.get('slice_spacing_um'):
+                spacing, ok = QInputDialog.getDouble(
+                    self, "输入扫描间隔", "元数据中没有切片间距，请输入相邻B扫描的Y轴间隔(单位:微米):", 10, 0, 10000, 3)
+                if not ok:
+                    return
+                meta['slice_spacing_um'] = spacing
+            entered = {key: meta[key] for key in ('shape', 'dtype', 'slice_spacing_um')
+                       if key in meta and saved_meta.get(key) != meta[key]}
+            if 'start_position_um' not in meta and self.oct_images:
+                # 接在已有图像之后
+                meta['start_position_um'] = self.oct_images[-1]["position"] + meta['slice_spacing_um']
+            
+            volume = oct_volume.OCTVolume(filePath, meta)
+            
+            # 保存用户输入的尺寸、数据类型和切片间距，下次打开同一文件时不再询问
+            # （起始位置取决于当前列表，不保存）
+            if entered:
+                try:
+                    oct_volume.write_sidecar(filePath, dict(saved_meta, **entered))
+                    print(f"已保存体数据元数据: {filePath}.json")
+                except OSError as e:
+                    print(f"保存体数据元数据失败: {str(e)}")
+            
+            # 元数据带有像素标定时同步到界面
+            if meta.get('pixel_to_um_x'):
+                self.pixelToUmXSpinBox.setValue(float(meta['pixel_to_um_x']))
+            if meta.get('pixel_to_um_y'):
+                self.pixelToUmYSpinBox.setValue(float(meta['pixel_to_um_y']))
+            
+            initial_image_count = len(self.oct_images)
+            count = self.oct_images.append_volume(volume)
+            for i in range(initial_image_count, len(self.oct_images)):
+                self.oct_image_list.addItem(QListWidgetItem(f"图像 {i+1}: Y={self.oct_images[i]['position']:.2f}μm"))
+            
+            print(f"已打开体数据 {filePath}: {count} 张B扫描，切片尺寸 {volume.slice_shape}，"
+                  f"{volume.dtype}，间隔 {volume.slice_spacing_um} μm")
+            if count:
+                self.oct_image_list.setCurrentRow(initial_image_count)
+                self.show_selected_image()
+        except Exception as e:
+            print(f"添加OCT体数据时出错: {str(e)}")
+            QMessageBox.warning(self, "错误", f"添加OCT体数据时出错: {str(e)}")
+    
     def handle_auto_detect(self):
         """根据按钮状态处理自动检测或微调"""
         if self.oct_current_index < 0:
@@ -561,8 +710,7 @@ class OCTHoleReconstructionDialog(QDialog):
                 QMessageBox.warning(self, "警告", "请先选择一个OCT图像")
                 return
             
-            current_image_data = self.oct_images[self.oct_current_index]
-            img = current_image_data["image"].copy()
+            img = self.get_oct_image(self.oct_current_index).copy()
 
             # 获取微调参数 - 如果没有，则从主窗口获取当前参数
             if self.oct_current_index in self.fine_tune_params:
@@ -653,6 +801,7 @@ class OCTHoleReconstructionDialog(QDialog):
                     
                     # 保存点坐标
                     self.oct_images[self.oct_current_index]["points"] = [p1, p2]
+                    self.update_live_fit([self.oct_current_index])
                     
                     # 计算直径
                     distance_px = np.sqrt((p2[0] - p1[0])**2 + (p2[1] - p1[1])**2)
@@ -691,7 +840,9 @@ class OCTHoleReconstructionDialog(QDialog):
         try:
             currentRow = self.oct_image_list.currentRow()
             if currentRow >= 0:
+                self.live_fit.remove(id(self.oct_images[currentRow]))
                 self.oct_images.pop(currentRow)
+                self.show_live_fit()
                 self.oct_image_list.takeItem(currentRow)
                 
                 # 更新列表显示
@@ -723,45 +874,8 @@ class OCTHoleReconstructionDialog(QDialog):
                 self.autoDetectButton.setEnabled(False)
 
             if currentRow >= 0 and currentRow < len(self.oct_images):
-                img = self.oct_images[currentRow]["image"].copy()
-                
-                # 转换为彩色图像以便绘制彩色标记
-                img_color = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
-                
-                # 绘制已标记的点
-                points = self.oct_images[currentRow].get("points", [])
-                if len(points) >= 2:
-                    p1, p2 = points[:2]
-                    cv2.circle(img_color, (p1[0], p1[1]), 5, (0, 255, 0), -1)
-                    cv2.circle(img_color, (p2[0], p2[1]), 5, (0, 255, 0), -1)
-                    cv2.line(img_color, (p1[0], p1[1]), (p2[0], p2[1]), (0, 0, 255), 2)
-                    
-                    # 计算直径
-                    distance_pixels = np.sqrt((p2[0] - p1[0])**2 + (p2[1] - p1[1])**2)
-                    
-                    # 获取像素到微米的转换比例
-                    pixel_to_um = 1.0
-                    if hasattr(self.parent, 'PIXEL_TO_UM'):
-                        pixel_to_um = self.parent.PIXEL_TO_UM
-                    
-                    distance_um = distance_pixels * pixel_to_um
-                    
-                    # 在图像上标注直径
-                    mid_x = (p1[0] + p2[0]) // 2
-                    mid_y = (p1[1] + p2[1]) // 2 + 20
-                    
-                    # 添加文字背景
-                    text = f"{distance_pixels:.1f} px ({distance_um:.1f} μm)"
-                    (text_w, text_h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)
-                    cv2.rectangle(img_color, 
-                                 (mid_x - text_w//2 - 5, mid_y - text_h - 5), 
-                                 (mid_x + text_w//2 + 5, mid_y + 5), 
-                                 (255, 255, 255), -1)
-                    
-                    # 添加文字
-                    cv2.putText(img_color, text,
-                              (mid_x - text_w//2, mid_y), 
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+                # 缩小后的标注预览（按标记点缓存，切换选中项时不重新解码和绘制）
+                img_color, self.oct_display_scale = self.oct_images.annotated_preview(currentRow, self.pixel_to_um_x)
                 
                 # 显示图像
                 h, w = img_color.shape[:2]
@@ -823,11 +937,13 @@ class OCTHoleReconstructionDialog(QDialog):
         """OCT图像上点击选择点的回调函数"""
         try:
             if hasattr(self, 'oct_current_index') and self.oct_current_index < len(self.oct_images):
-                # 转换QPoint为普通坐标
-                converted_points = [(p.x(), p.y()) for p in points]
+                # 预览坐标换算为全分辨率坐标
+                sx, sy = self.oct_display_scale
+                converted_points = [(int(round(p.x() / sx)), int(round(p.y() / sy))) for p in points]
                 
                 # 保存点坐标（最多保存两个点）
                 self.oct_images[self.oct_current_index]["points"] = converted_points[:2]
+                self.update_live_fit([self.oct_current_index])
                 
                 # 重新显示图像以更新点的显示
                 self.show_selected_image()
@@ -851,7 +967,8 @@ class OCTHoleReconstructionDialog(QDialog):
         """处理OCT图像重建真实圆孔"""
         try:
             # 检查是否有足够的图像和点
-            valid_images = [img for img in self.oct_images if len(img.get("points", [])) >= 2]
+            valid_indices = [i for i, img in enumerate(self.oct_images) if len(img.get("points", [])) >= 2]
+            valid_images = [self.oct_images[i] for i in valid_indices]
             
             if len(valid_images) < 3:
                 QMessageBox.warning(self, "警告", "需要至少3张已标记直径点的OCT图像才能进行重建!")
@@ -903,12 +1020,34 @@ class OCTHoleReconstructionDialog(QDialog):
             # 2. 在XY平面上直接拟合圆
             # 根据选择的拟合方法进行圆拟合
             fit_method_text = self.fit_method_combo.currentText()
-            fit_method = 'geometric' if fit_method_text == '几何法' else 'algebraic'
+            fit_method = {'几何法': 'geometric', '稳健法(RANSAC)': 'ransac',
+                          '稳健法(LMedS)': 'lmeds'}.get(fit_method_text, 'algebraic')
             
-            if fit_method == 'geometric':
+            outlier_slices = []
+            if fit_method in ('ransac', 'lmeds'):
+                center_x, center_y, radius, inliers = oct_utils.fit_circle_robust(points_for_fitting, fit_method)
+                # 任一端点为离群点的切片（第 k 张有效切片对应第 2k、2k+1 个点）
+                outlier_slices = [valid_indices[k] for k in range(len(valid_indices))
+                                  if not (inliers[2 * k] and inliers[2 * k + 1])]
+            elif fit_method == 'geometric':
                 center_x, center_y, radius = oct_utils.fit_circle_geometric(points_for_fitting)
             else:
                 center_x, center_y, radius = oct_utils.fit_circle_2d(points_for_fitting)
+            self.mark_outlier_slices(outlier_slices)
+            
+            # 置信区间（稳健法只使用未判定为离群的切片）
+            self.oct_uncertainty = None
+            uncertainty_text = self.uncertainty_combo.currentText()
+            excluded = set(outlier_slices)
+            keep = [k for k in range(len(valid_indices)) if valid_indices[k] not in excluded]
+            if uncertainty_text != "不计算" and len(keep) >= 3:
+                keep_points = np.asarray(points_for_fitting)[[p for k in keep for p in (2 * k, 2 * k + 1)]]
+                start = time.perf_counter()
+                self.oct_uncertainty = circle_fit.circle_uncertainty(
+                    keep_points, groups=np.repeat(np.arange(len(keep)), 2),
+                    method='jackknife' if uncertainty_text == "刀切法" else 'bootstrap', samples=1000,
+                    fit_method='kasa' if fit_method == 'algebraic' else 'taubin', refine=fit_method != 'algebraic')
+                print(f"置信区间计算用时 {time.perf_counter() - start:.3f} 秒: {self.oct_uncertainty['diameter']}")
                 
             self.oct_circle_center = np.array([center_x, center_y])
             self.oct_radius = radius
@@ -964,6 +1103,50 @@ class OCTHoleReconstructionDialog(QDialog):
                 </tr>
                 """
 
+            # 置信区间（属于圆拟合的常规重建直径 2R；使用上下0.1mm平均直径时单独注明）
+            uncertainty_html = ""
+            if self.oct_uncertainty is not None:
+                u = self.oct_uncertainty
+                method_name = "刀切法" if u['method'] == 'jackknife' else f"自助法 {u['samples']} 次"
+                replaced_note = "；不适用于上下0.1mm平均直径" if diameter_um != 2 * radius else ""
+                uncertainty_html = f"""
+                <tr>
+                    <td style='font-weight: bold; padding: 4px;'>常规重建直径:</td>
+                    <td style='padding: 4px;'>{2 * radius:.2f} μm（圆拟合）</td>
+                </tr>
+                <tr>
+                    <td style='font-weight: bold; padding: 4px;'>圆拟合直径95%置信区间:</td>
+                    <td style='padding: 4px;'>[{u['diameter']['low']:.2f}, {u['diameter']['high']:.2f}] μm（标准误 {u['diameter']['se']:.2f} μm，{method_name}{replaced_note}）</td>
+                </tr>
+                <tr>
+                    <td style='font-weight: bold; padding: 4px;'>圆心95%置信区间:</td>
+                    <td style='padding: 4px;'>X [{u['cx']['low']:.2f}, {u['cx']['high']:.2f}]，Y [{u['cy']['low']:.2f}, {u['cy']['high']:.2f}] μm</td>
+                </tr>
+                """
+            
+            # 稳健拟合排除的切片
+            outlier_html = ""
+            if fit_method in ('ransac', 'lmeds'):
+                outlier_names = "、".join(str(i + 1) for i in outlier_slices) if outlier_slices else "无"
+                outlier_html = f"""
+                <tr>
+                    <td style='font-weight: bold; padding: 4px;'>离群切片:</td>
+                    <td style='padding: 4px;'><span style='color: #dc3545;'>{outlier_names}</span>（共 {len(outlier_slices)} 张，离群端点未参与拟合）</td>
+                </tr>
+                """
+            
+            # 已有俯视投影检测结果时一并显示两种方法的差异
+            enface_html = ""
+            if self.enface_result is not None:
+                check = oct_enface.compare_with_chord_fit(self.enface_result, self.oct_circle_center, radius)
+                enface_html = f"""
+                <tr>
+                    <td style='font-weight: bold; padding: 4px;'>俯视投影直径:</td>
+                    <td style='padding: 4px;'>{self.enface_result['diameter_um']:.2f} μm
+                    （差 {check['diameter_diff_um']:+.2f} μm，{check['relative_diff'] * 100:+.1f}%；圆心偏移 {check['center_offset_um']:.2f} μm）</td>
+                </tr>
+                """
+            
             # 美化结果显示
             result_html = f"""
             <div style='font-family: "Microsoft YaHei", "Segoe UI", sans-serif; font-size: 14px;'>
@@ -992,7 +1175,10 @@ class OCTHoleReconstructionDialog(QDialog):
                         <td style='font-weight: bold; padding: 4px;'>真实直径:</td>
                         <td style='padding: 4px;'><span style='color: #dc3545; font-weight: bold; font-size: 16px;'>{diameter_um:.2f} μm</span></td>
                     </tr>
+                    {uncertainty_html}
+                    {outlier_html}
                     {upper_lower_result_html}
+                    {enface_html}
                     {depth_ratio_html}
                 </table>
             </div>
@@ -1009,6 +1195,71 @@ class OCTHoleReconstructionDialog(QDialog):
             print(f"OCT重建处理时出错: {str(e)}")
             QMessageBox.warning(self, "错误", f"OCT重建处理时出错: {str(e)}")
     
+    def update_live_fit(self, indices=None):
+        """
+        标记点变化后增量更新实时估计
+        
+        参数:
+            indices: 标记点发生变化的切片序号；None 表示全部重新加入（如X方向换算系数改变）
+        """
+        if indices is None:
+            self.live_fit.clear()
+            indices = range(len(self.oct_images))
+        for i in indices:
+            data = self.oct_images[i]
+            points = data.get("points", [])
+            if len(points) >= 2:
+                # 与 oct_utils.transform_to_2d_coords 相同：X = 列 × 换算系数，Y = 扫描位置
+                (x1, _), (x2, _) = points[:2]
+                self.live_fit.update(id(data), [[x1 * self.pixel_to_um_x, data["position"]],
+                                                [x2 * self.pixel_to_um_x, data["position"]]])
+            else:
+                self.live_fit.remove(id(data))
+        self.show_live_fit()
+    
+    def show_live_fit(self):
+        """刷新实时估计标签（几何精化以上一次结果为初值）"""
+        slices = len(self.live_fit)
+        fits = self.live_fit.refine() if slices >= 2 else None
+        if fits is None or not np.isfinite(fits.r[0]):
+            self.live_fit_previous = None
+            self.live_fit_label.setText(f"实时估计: 已标记 {slices} 张切片，至少需要2张")
+            return
+        _, _, algebraic_radius = self.live_fit.fit()
+        diameter = 2 * float(fits.r[0])
+        change = "" if self.live_fit_previous is None else f"，较上次 {diameter - self.live_fit_previous:+.2f} μm"
+        self.live_fit_previous = diameter
+        self.live_fit_label.setText(
+            f"实时估计（{slices} 张切片）: 直径 {diameter:.2f} μm（代数法 {2 * algebraic_radius:.2f} μm），"
+            f"圆心 ({fits.cx[0]:.2f}, {fits.cy[0]:.2f}) μm{change}")
+    
+    def uncertainty_csv_rows(self):
+        """置信区间的CSV行（参数,数值,单位），未计算时为空"""
+        if self.oct_uncertainty is None:
+            return ""
+        u = self.oct_uncertainty
+        method_name = "刀切法" if u['method'] == 'jackknife' else "自助法"
+        rows = [f"置信区间方法,{method_name},",
+                f"有效重采样次数,{u['samples']},"]
+        # 区间属于圆拟合结果（常规重建直径 2R），不是上下0.1mm平均直径
+        for key, name in (('diameter', '常规重建直径'), ('cx', '圆心X'), ('cy', '圆心Y')):
+            rows.append(f"{name}95%置信下限,{u[key]['low']:.2f},μm")
+            rows.append(f"{name}95%置信上限,{u[key]['high']:.2f},μm")
+            rows.append(f"{name}标准误,{u[key]['se']:.3f},μm")
+        return "\n".join(rows) + "\n"
+    
+    def mark_outlier_slices(self, outlier_slices):
+        """在图像列表中用红色标出稳健拟合判定的离群切片，其余恢复默认颜色"""
+        outliers = set(outlier_slices)
+        for i in range(self.oct_image_list.count()):
+            item = self.oct_image_list.item(i)
+            if i in outliers:
+                item.setForeground(QColor(220, 53, 69))
+                item.setToolTip("稳健拟合判定为离群切片（离群端点未参与拟合），请检查标记点或删除")
+            else:
+                item.setForeground(QBrush())
+                item.setToolTip("")
+    
     def visualize_oct_results(self, points_to_plot, pixel_to_um=1.0):
         """生成可视化结果并显示"""
         try:
@@ -1020,6 +1271,10 @@ class OCTHoleReconstructionDialog(QDialog):
             print(f"可视化OCT结果: 待绘制点数={len(points_to_plot) / 2}")
             print(f"OCT点数据形状: {points_to_plot.shape}")
             
+            # 关闭上一次的结果图形，否则 pyplot 会一直持有它
+            if self.result_fig is not None:
+                plt.close(self.result_fig)
+            
             # 使用工具函数生成简化版可视化结果
             self.result_fig = oct_utils.create_simple_visualization(
                 points_to_plot, 
@@ -1109,7 +1364,8 @@ class OCTHoleReconstructionDialog(QDialog):
                     if self.reference_depth > 0:
                         ratio = self.reference_depth / avg_diameter
                         csv_data += f"参考深度,{self.reference_depth:.2f},μm\n"
-                        csv_data += f"深径比,{ratio:.2f},"
+                        csv_data += f"深径比,{ratio:.2f},\n"
+                    csv_data += self.uncertainty_csv_rows()
 
                 with zipfile.ZipFile(filePath, 'w') as zipf:
                     # 保存文本结果
@@ -1132,22 +1388,43 @@ Y方向转换系数,{self.pixel_to_um_y:.2f},μm/px
                         if self.reference_depth > 0:
                             ratio = self.reference_depth / (2 * self.oct_radius)
                             csv_data += f"参考深度,{self.reference_depth:.2f},μm\n"
-                            csv_data += f"深径比,{ratio:.2f},"
+                            csv_data += f"深径比,{ratio:.2f},\n"
+                        csv_data += self.uncertainty_csv_rows()
                         zipf.writestr("measurement_data.csv", csv_data.encode('utf-8'))
                     
+                    # 自助法各次重采样的直径，便于复核置信区间
+                    if self.oct_uncertainty is not None and self.oct_uncertainty['method'] == 'bootstrap':
+                        samples_csv = "重采样序号,直径(μm)\n" + "".join(
+                            f"{i + 1},{d:.4f}\n" for i, d in enumerate(self.oct_uncertainty['diameters']))
+                        zipf.writestr("bootstrap_diameters.csv", samples_csv.encode('utf-8'))
+                    
                     # 保存可视化图片
                     temp_img_path = os.path.join(tempfile.gettempdir(), "temp_reconstruction.png")
                     self.result_fig.savefig(temp_img_path, dpi=300)
                     zipf.write(temp_img_path, os.path.basename("reconstruction_view.png"))
                     
-                    # 保存原始OCT图像
+                    # 保存原始OCT图像（体数据中的切片没有单独的文件，按灰度图编码为PNG写入）
                     oct_image_folder = "source_oct_images"
+                    skipped = 0
                     for i, img_data in enumerate(self.oct_images):
-                        if os.path.exists(img_data["path"]):
+                        if "volume" in img_data:
+                            ok, encoded = cv2.imencode('.png', oct_volume.read_slice(self.oct_images.source(i)))
+                            if ok:
+                                volume_name = os.path.splitext(os.path.basename(img_data["volume"].path))[0]
+                                arcname = f"{oct_image_folder}/image_{i+1}_{volume_name}_slice{img_data['slice_index']}.png"
+                                zipf.writestr(arcname, encoded.tobytes())
+                            else:
+                                skipped += 1
+                        elif os.path.exists(img_data["path"]):
                             arcname = f"{oct_image_folder}/image_{i+1}_{os.path.basename(img_data['path'])}"
                             zipf.write(img_data["path"], arcname)
+                        else:
+                            skipped += 1
 
-                QMessageBox.information(self, "成功", f"结果已成功导出到:\n{filePath}")
+                message = f"结果已成功导出到:\n{filePath}"
+                if skipped:
+                    message += f"\n\n有 {skipped} 张原始OCT图像无法读取，未包含在导出文件中"
+                QMessageBox.information(self, "成功", message)
 
         except Exception as e:
             import traceback
@@ -1155,134 +1432,290 @@ Y方向转换系数,{self.pixel_to_um_y:.2f},μm/px
             QMessageBox.critical(self, "错误", f"导出结果时出错: {str(e)}")
     
     def batch_auto_detect(self):
-        """批量自动检测所有OCT图像的孔径"""
+        """在后台进程池中批量检测所有OCT图像的孔径（每张图使用各自的微调参数），结果到达时逐项更新列表"""
         try:
             if len(self.oct_images) == 0:
                 QMessageBox.warning(self, "警告", "请先添加OCT图像")
                 return
+            if self.batch_detector is not None:
+                return
+            
+            # 主窗口当前参数 + 每张图的微调参数
+            base_params = self.parent.params if self.parent is not None and hasattr(self.parent, 'params') else None
+            tasks = [oct_batch.SliceTask(i, self.oct_images.source(i), oct_batch.slice_params(base_params, self.fine_tune_params.get(i)))
+                     for i in range(len(self.oct_images))]
             
             # 创建进度对话框
-            progress = QProgressDialog("正在批量检测孔径...", "取消", 0, len(self.oct_images), self)
+            progress = QProgressDialog("正在批量检测孔径...", "取消", 0, len(tasks), self)
             progress.setWindowTitle("批量处理")
             progress.setWindowModality(Qt.WindowModal)
+            progress.setMinimumDuration(0)
+            progress.canceled.connect(self.cancel_batch_detect)
             progress.show()
             
-            # 临时保存父窗口的原始图像和二值图像
-            original_img = None
-            binary_img = None
+            self.batch_progress = progress
+            self.batch_results = {'ok': 0, 'failed': 0}
+            self.batch_detector = oct_batch.SliceBatchDetector(tasks, self.pixel_to_um_x, self.pixel_to_um_y)
+            print(f"批量检测 {len(tasks)} 张OCT图像，{self.batch_detector.workers} 个工作进程")
+            self.batchTimer.start(50)
+        except Exception as e:
+            print(f"批量自动检测时出错: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            QMessageBox.warning(self, "错误", f"批量自动检测时出错: {str(e)}")
+    
+    def detect_volume_boundaries(self):
+        """对体数据中的切片整卷检测孔口边缘（oct_volume_detect），结果写入各切片的标记点"""
+        try:
+            # 按体数据分组：体数据 -> [(列表序号, 切片序号)]
+            groups = {}
+            for i, data in enumerate(self.oct_images):
+                if "volume" in data:
+                    groups.setdefault(id(data["volume"]), (data["volume"], []))[1].append((i, data["slice_index"]))
+            if not groups:
+                QMessageBox.warning(self, "警告", "列表中没有来自体数据的切片，单张图像请使用“批量自动检测”")
+                return
             
-            if self.parent:
-                if hasattr(self.parent, 'original_image'):
-                    original_img = self.parent.original_image
-                if hasattr(self.parent, 'binary_image'):
-                    binary_img = self.parent.binary_image
+            params = self.parent.params if self.parent is not None and hasattr(self.parent, 'params') else None
+            ok_count = 0
+            fail_count = 0
+            updated = []
+            start = time.perf_counter()
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            try:
+                for volume, members in groups.values():
+                    edges = oct_volume_detect.detect_volume_edges(volume, params)
+                    for i, k in members:
+                        if not edges.valid[k]:
+                            fail_count += 1
+                            continue
+                        x1, y1, x2, y2 = (round(float(v), 2) for v in edges.segments[k])
+                        self.oct_images[i]["points"] = [(x1, y1), (x2, y2)]
+                        updated.append(i)
+                        distance_px = x2 - x1
+                        self.oct_image_list.item(i).setText(
+                            f"图像 {i+1}: Y={self.oct_images[i]['position']:.2f}μm, "
+                            f"直径={distance_px:.1f}px ({distance_px * self.pixel_to_um_x:.1f}μm)")
+                        ok_count += 1
+            finally:
+                QApplication.restoreOverrideCursor()
+            self.update_live_fit(updated)
             
-            # 获取像素到微米的转换比例
-            pixel_to_um = 1.0
-            if hasattr(self.parent, 'PIXEL_TO_UM'):
-                pixel_to_um = self.parent.PIXEL_TO_UM
+            elapsed = time.perf_counter() - start
+            print(f"体数据整体检测: 成功 {ok_count}，未检测到孔口 {fail_count}，用时 {elapsed:.2f} 秒")
+            if self.oct_current_index >= 0:
+                self.show_selected_image()
+            QMessageBox.information(self, "体数据整体检测",
+                                    f"成功: {ok_count} 张切片\n未检测到孔口: {fail_count} 张切片\n用时: {elapsed:.2f} 秒")
+        except Exception as e:
+            print(f"体数据整体检测时出错: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            QMessageBox.warning(self, "错误", f"体数据整体检测时出错: {str(e)}")
+    
+    def current_volume(self):
+        """当前选中切片所属的体数据，未选中体数据切片时取列表中的第一个，没有体数据时返回None"""
+        if 0 <= self.oct_current_index < len(self.oct_images) and "volume" in self.oct_images[self.oct_current_index]:
+            return self.oct_images[self.oct_current_index]["volume"]
+        for data in self.oct_images:
+            if "volume" in data:
+                return data["volume"]
+        return None
+    
+    def detect_enface_hole(self):
+        """在体数据的俯视投影上直接检测孔口圆（oct_enface），并与弦长拟合结果交叉校验"""
+        try:
+            volume = self.current_volume()
+            if volume is None:
+                QMessageBox.warning(self, "警告", "俯视投影检测需要通过“添加体数据”加入的切片")
+                return
             
-            success_count = 0
-            fail_count = 0
+            method = 'hough' if self.enface_method_combo.currentText() == "霍夫圆" else 'contour'
+            mode = 'min' if self.enface_mode_combo.currentText() == "最小投影" else 'mean'
+            params = self.parent.params if self.parent is not None and hasattr(self.parent, 'params') else None
             
-            # 处理每个图像
-            for i, img_data in enumerate(self.oct_images):
-                progress.setValue(i)
-                QApplication.processEvents()
-                
-                if progress.wasCanceled():
-                    break
-                
-                # 获取图像
-                img = img_data["image"].copy()
-                
-                # 使用父窗口的孔洞检测算法
-                if self.parent and hasattr(self.parent, 'detect_hole_dimensions'):
-                    # 设置当前图像
-                    self.parent.original_image = img
-                    
-                    # 进行预处理以生成二值图像
-                    # 使用高斯模糊减少噪声
-                    blurred = cv2.GaussianBlur(img, (5, 5), 0)
-                    
-                    # 自适应阈值分割
-                    binary = cv2.adaptiveThreshold(
-                        blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                        cv2.THRESH_BINARY, 21, 5)
-                    
-                    # 设置二值图像
-                    self.parent.binary_image = binary
-                    
-                    # 确保diameter_history属性存在
-                    if not hasattr(self.parent, 'diameter_history'):
-                        self.parent.diameter_history = []
-                    
-                    if not hasattr(self.parent, 'measurement_count'):
-                        self.parent.measurement_count = 0
-                    
-                    try:
-                        # 调用孔洞检测方法
-                        self.parent.processImage()  # 先进行图像处理
-                        self.parent.detect_hole_dimensions()  # 然后检测孔洞
-                        
-                        # 获取结果
-                        if hasattr(self.parent, 'hole_start') and hasattr(self.parent, 'hole_end') and hasattr(self.parent, 'upper_surface_row'):
-                            # 获取检测到的点
-                            p1 = (self.parent.hole_start, self.parent.upper_surface_row)
-                            p2 = (self.parent.hole_end, self.parent.upper_surface_row)
-                            
-                            # 保存点坐标
-                            self.oct_images[i]["points"] = [p1, p2]
-                            
-                            # 计算直径
-                            distance_px = np.sqrt((p2[0] - p1[0])**2 + (p2[1] - p1[1])**2)
-                            position = self.oct_images[i]["position"]
-                            
-                            # 计算微米单位直径
-                            distance_um = distance_px * self.pixel_to_um_x
-                            
-                            # 更新列表项文本
-                            self.oct_image_list.item(i).setText(
-                                f"图像 {i+1}: Y={position}μm, 直径={distance_px:.1f}px ({distance_um:.1f}μm)")
-                            
-                            success_count += 1
-                        else:
-                            fail_count += 1
-                    except Exception as e:
-                        print(f"图像 {i+1} 自动检测失败: {str(e)}")
-                        fail_count += 1
+            start = time.perf_counter()
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            try:
+                result = oct_enface.detect_enface_circle(volume, self.pixel_to_um_x, params=params,
+                                                         method=method, mode=mode)
+            finally:
+                QApplication.restoreOverrideCursor()
+            elapsed = time.perf_counter() - start
             
-            # 恢复父窗口原始状态
-            if self.parent:
-                if original_img is not None:
-                    self.parent.original_image = original_img
-                if binary_img is not None:
-                    self.parent.binary_image = binary_img
+            if result is None:
+                QMessageBox.warning(self, "俯视投影检测", "俯视投影中未检测到孔口")
+                return
+            self.enface_result = result
             
-            # 完成进度
-            progress.setValue(len(self.oct_images))
+            lines = [f"方法: {self.enface_method_combo.currentText()}（{self.enface_mode_combo.currentText()}）",
+                     f"圆心 (X,Y): ({result['center_um'][0]:.2f}, {result['center_um'][1]:.2f}) μm",
+                     f"直径: {result['diameter_um']:.2f} μm"]
+            if result['ellipse_um'] is not None:
+                major, minor, angle = result['ellipse_um']
+                lines.append(f"椭圆长/短轴: {major:.2f} / {minor:.2f} μm，角度 {angle:.1f}°")
+            if self.oct_radius is not None:
+                check = oct_enface.compare_with_chord_fit(result, self.oct_circle_center, self.oct_radius)
+                lines.append(f"弦长拟合直径: {2 * self.oct_radius:.2f} μm")
+                lines.append(f"直径差: {check['diameter_diff_um']:+.2f} μm（{check['relative_diff'] * 100:+.1f}%），"
+                             f"圆心偏移: {check['center_offset_um']:.2f} μm")
+            else:
+                lines.append("尚未进行弦长重建，点击“开始重建”后可对比两种结果")
+            lines.append(f"用时: {elapsed:.2f} 秒")
+            print("俯视投影检测: " + "；".join(lines))
             
-            # 显示结果
-            QMessageBox.information(
-                self, 
-                "批量检测完成", 
-                f"批量检测完成。\n成功: {success_count} 张图像\n失败: {fail_count} 张图像"
-            )
+            # 在对话框中显示带检测结果的俯视图
+            overlay = cv2.cvtColor(oct_enface.draw_enface_result(result), cv2.COLOR_BGR2RGB)
+            height, width = overlay.shape[:2]
+            qimage = QImage(overlay.data, width, height, 3 * width, QImage.Format_RGB888)
+            dialog = QDialog(self)
+            dialog.setWindowTitle("俯视投影检测结果")
+            dialogLayout = QVBoxLayout(dialog)
+            imageLabel = QLabel()
+            imageLabel.setPixmap(QPixmap.fromImage(qimage).scaled(800, 600, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+            dialogLayout.addWidget(imageLabel)
+            dialogLayout.addWidget(QLabel("\n".join(lines)))
+            buttons = QDialogButtonBox(QDialogButtonBox.Ok)
+            buttons.accepted.connect(dialog.accept)
+            dialogLayout.addWidget(buttons)
+            dialog.exec_()
+        except Exception as e:
+            print(f"俯视投影检测时出错: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            QMessageBox.warning(self, "错误", f"俯视投影检测时出错: {str(e)}")
+    
+    def reconstruct_depth_profile(self):
+        """在体数据上表面以下的多个深度层同时重建截面圆（oct_depth_profile），显示直径-深度曲线"""
+        try:
+            volume = self.current_volume()
+            if volume is None:
+                QMessageBox.warning(self, "警告", "多深度重建需要通过“添加体数据”加入的切片")
+                return
             
-            # 如果当前有选择的图像，刷新显示
-            if hasattr(self, 'oct_current_index') and self.oct_current_index >= 0:
-                self.show_selected_image()
-                
+            params = self.parent.params if self.parent is not None and hasattr(self.parent, 'params') else None
+            start = time.perf_counter()
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            try:
+                profile = oct_depth_profile.reconstruct_depth_profile(volume, self.pixel_to_um_x, self.pixel_to_um_y,
+                                                                      params=params)
+            finally:
+                QApplication.restoreOverrideCursor()
+            elapsed = time.perf_counter() - start
+            
+            depths = profile['depths_um']
+            diameters = profile['diameters_um']
+            lines = [f"深度层数: {len(depths)}（0 - {depths[-1]:.1f} μm）",
+                     f"孔口直径（线性拟合）: {profile['top_diameter_um']:.2f} μm",
+                     f"锥度: {profile['taper']:.6f}，锥度角度: {profile['taper_angle_deg']:.2f}°",
+                     f"轴线倾斜: {profile['axis_tilt_deg']:.2f}°",
+                     f"用时: {elapsed:.2f} 秒"]
+            print("多深度重建: " + "；".join(lines))
+            
+            dialog = QDialog(self)
+            dialog.setWindowTitle("多深度重建结果")
+            dialogLayout = QVBoxLayout(dialog)
+            figure = Figure(figsize=(6, 4), dpi=100)
+            canvas = FigureCanvas(figure)
+            ax = figure.add_subplot(111)
+            ax.plot(diameters, depths, 'o', markersize=3, label='各层拟合直径')
+            ax.plot(profile['top_diameter_um'] - 2 * profile['taper'] * depths, depths, 'r-', label='圆锥拟合')
+            ax.invert_yaxis()
+            ax.set_xlabel('直径 (μm)', fontproperties=self.font_prop)
+            ax.set_ylabel('深度 (μm)', fontproperties=self.font_prop)
+            ax.legend(prop=self.font_prop)
+            ax.grid(True, linestyle='--', alpha=0.5)
+            figure.tight_layout()
+            dialogLayout.addWidget(NavigationToolbar(canvas, dialog))
+            dialogLayout.addWidget(canvas)
+            dialogLayout.addWidget(QLabel("\n".join(lines)))
+            buttons = QDialogButtonBox(QDialogButtonBox.Ok)
+            buttons.accepted.connect(dialog.accept)
+            dialogLayout.addWidget(buttons)
+            dialog.exec_()
         except Exception as e:
-            print(f"批量自动检测时出错: {str(e)}")
+            print(f"多深度重建时出错: {str(e)}")
             import traceback
             traceback.print_exc()
-            QMessageBox.warning(self, "错误", f"批量自动检测时出错: {str(e)}") 
+            QMessageBox.warning(self, "错误", f"多深度重建时出错: {str(e)}")
+    
+    def poll_batch_detect(self):
+        """定时取出已完成的检测结果并更新列表和进度"""
+        detector = self.batch_detector
+        if detector is None:
+            self.batchTimer.stop()
+            return
+        
+        updated = []
+        for result in detector.poll():
+            i = result['index']
+            if i >= len(self.oct_images):
+                continue
+            if result['status'] != 'ok':
+                print(f"图像 {i+1} 自动检测失败: {result['status']}")
+                self.batch_results['failed'] += 1
+                continue
+            
+            # 保存点坐标
+            self.oct_images[i]["points"] = result['points']
+            updated.append(i)
+            
+            # 更新列表项文本
+            distance_px = result['diameter_px']
+            distance_um = distance_px * self.pixel_to_um_x
+            position = self.oct_images[i]["position"]
+            self.oct_image_list.item(i).setText(
+                f"图像 {i+1}: Y={position}μm, 直径={distance_px:.1f}px ({distance_um:.1f}μm)")
+            self.batch_results['ok'] += 1
+            
+            if i == self.oct_current_index:
+                self.show_selected_image()
+        
+        if updated:
+            self.update_live_fit(updated)
+        if self.batch_progress is not None:
+            self.batch_progress.setValue(detector.completed)
+        
+        if detector.finished:
+            self.finish_batch_detect()
+    
+    def cancel_batch_detect(self):
+        """取消批量检测：尚未开始的图像不再处理，已得到的结果保留"""
+        if self.batch_detector is not None:
+            self.batch_detector.cancel()
+            self.finish_batch_detect()
+    
+    def finish_batch_detect(self):
+        """停止轮询并显示批量检测结果"""
+        detector = self.batch_detector
+        self.batch_detector = None
+        self.batchTimer.stop()
+        if self.batch_progress is not None:
+            # 先置空再关闭：关闭进度对话框会发出 canceled 信号
+            progress, self.batch_progress = self.batch_progress, None
+            progress.close()
+        if detector is None:
+            return
+        
+        ok_count = self.batch_results['ok']
+        fail_count = self.batch_results['failed']
+        status = "已取消" if detector.cancelled else "完成"
+        print(f"批量检测{status}: 成功 {ok_count}，失败 {fail_count}，用时 {detector.elapsed:.1f} 秒")
+        QMessageBox.information(
+            self, 
+            f"批量检测{status}", 
+            f"批量检测{status}。\n成功: {ok_count} 张图像\n失败: {fail_count} 张图像\n用时: {detector.elapsed:.1f} 秒"
+        )
+        
+        # 如果当前有选择的图像，刷新显示
+        if self.oct_current_index >= 0:
+            self.show_selected_image()
     
     def updatePixelToUmX(self, value):
         """更新X方向的像素转换系数"""
         self.pixel_to_um_x = value
         self.pixel_to_um = value  # 兼容旧代码
+        self.update_live_fit()
         self.update_preview()
     
     def updatePixelToUmY(self, value):
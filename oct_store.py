@@ -0,0 +1,268 @@
+"""
+OCT切片存储
+
+每张B扫描切片常驻内存的只有路径、扫描位置和标记点（一个小字典），图像按需解码：
+    - 全分辨率图像放在按字节预算淘汰的LRU中，只有自动检测/微调需要
+    - 显示用的预览按缩小倍数直接解码（JPEG 在解码时缩小），不经过全分辨率图像
+    - 标注后的预览按 (路径, 标记点, 换算比例) 缓存，切换选中项时不重新绘制
+
+标记点始终保存为全分辨率坐标，预览上的点击坐标用 preview_scale 换算。
+切片也可以来自内存映射的体数据（oct_volume.OCTVolume），此时不经过文件解码。
+
+用法:
+    store = OCTSliceStore()
+    store.append(path, position)
+    image = store.image(i)                          # 全分辨率灰度图像
+    preview, (sx, sy) = store.annotated_preview(i, pixel_to_um_x)
+"""
+import os
+from collections import OrderedDict
+
+import numpy as np
+import cv2
+
+import image_io
+import oct_volume
+
+# 全分辨率图像和预览的默认内存预算（字节）
+DEFAULT_IMAGE_BUDGET = 256 * 1024 * 1024
+DEFAULT_PREVIEW_BUDGET = 64 * 1024 * 1024
+# 预览长边的像素数（显示区域为400像素，留出高分屏和放大的余量）
+DEFAULT_PREVIEW_MAX_SIDE = 800
+
+
+def _nbytes(value):
+    """数组或 (数组, 附加信息) 元组占用的字节数"""
+    return value[0].nbytes if isinstance(value, tuple) else value.nbytes
+
+
+class _ByteLRU:
+    """按字节预算淘汰的 LRU（值为 numpy 数组或 (数组, 附加信息) 元组）"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self._items = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self._items.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._bytes -= _nbytes(old)
+        self._items[key] = value
+        self._bytes += _nbytes(value)
+        # 至少保留刚放入的一项，即使它本身超出预算
+        while self._bytes > self.budget and len(self._items) > 1:
+            _, evicted = self._items.popitem(last=False)
+            self._bytes -= _nbytes(evicted)
+
+    def discard(self, match):
+        """删除键满足 match(key) 的项"""
+        for key in [k for k in self._items if match(k)]:
+            self._bytes -= _nbytes(self._items.pop(key))
+
+    def nbytes(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self):
+        freed = self._bytes
+        self._items.clear()
+        self._bytes = 0
+        return freed
+
+
+class OCTSliceStore:
+    """
+    OCT切片列表；按序号取得的切片是 {'path', 'position', 'points'} 字典，可直接修改 points
+
+    参数:
+        image_budget: 全分辨率图像缓存的字节预算
+        preview_budget: 预览（灰度和标注后的彩色图）缓存的字节预算
+        preview_max_side: 预览长边像素数
+    """
+
+    def __init__(self, image_budget=DEFAULT_IMAGE_BUDGET, preview_budget=DEFAULT_PREVIEW_BUDGET,
+                 preview_max_side=DEFAULT_PREVIEW_MAX_SIDE):
+        self.slices = []
+        self.preview_max_side = preview_max_side
+        self._images = _ByteLRU(image_budget)
+        self._previews = _ByteLRU(preview_budget)
+
+    # 列表接口（与原来的 oct_images 列表兼容）
+    def __len__(self):
+        return len(self.slices)
+
+    def __getitem__(self, index):
+        return self.slices[index]
+
+    def __iter__(self):
+        return iter(self.slices)
+
+    def append(self, path, position, points=None):
+        """添加切片（不解码图像）；文件不存在时抛出 IOError"""
+        if not os.path.isfile(path):
+            raise IOError(f"文件不存在: {path}")
+        self.slices.append({"path": path, "position": position, "points": list(points or [])})
+        return len(self.slices) - 1
+
+    def append_volume(self, volume, indices=None):
+        """
+        添加体数据中的切片（默认全部），扫描位置取自体数据的切片间距
+
+        返回:
+            新增的切片数
+        """
+        indices = range(len(volume)) if indices is None else indices
+        height, width = volume.slice_shape
+        for i in indices:
+            self.slices.append({"path": f"{volume.path}[{i}]", "position": volume.position(i), "points": [],
+                                "volume": volume, "slice_index": i, "size": (width, height)})
+        return len(indices)
+
+    def source(self, index):
+        """批量检测任务使用的切片来源：图像路径或 (体数据, 序号)，见 oct_volume.read_slice"""
+        data = self.slices[index]
+        if "volume" in data:
+            return (data["volume"], data["slice_index"])
+        return data["path"]
+
+    def pop(self, index):
+        data = self.slices.pop(index)
+        # 同一文件可能被添加多次，只有最后一个引用被删除时才释放缓存
+        if not any(other["path"] == data["path"] for other in self.slices):
+            self._images.discard(lambda key: key == data["path"])
+            self._previews.discard(lambda key: key[1] == data["path"])
+        return data
+
+    def image(self, index):
+        """全分辨率灰度图像（按需解码）"""
+        data = self.slices[index]
+        if "volume" in data and data["volume"].dtype == np.uint8:
+            # uint8 体数据直接返回内存映射视图，由操作系统页缓存负责
+            return data["volume"].slice_gray(data["slice_index"])
+        image = self._images.get(data["path"])
+        if image is None:
+            image = oct_volume.read_slice(self.source(index))
+            if image is None:
+                raise IOError(f"无法读取图像: {data['path']}")
+            data["size"] = (image.shape[1], image.shape[0])
+            self._images.put(data["path"], image)
+        return image
+
+    def _preview_base(self, index):
+        """缩小的灰度预览及其相对全分辨率的缩放比例 (sx, sy)"""
+        data = self.slices[index]
+        key = ('gray', data["path"])
+        # 缓存按路径共享（同一文件可添加多次），缩放比例与预览一起保存
+        cached = self._previews.get(key)
+        if cached is not None:
+            return cached
+
+        size = data.get("size") or image_io.image_size(data["path"])
+        reduce = image_io.preview_reduce(size, self.preview_max_side)
+        shared = False  # 预览是否与全分辨率缓存共用数组
+        if "volume" in data:
+            # 体数据按步长抽样，只访问被抽到的行
+            preview = np.ascontiguousarray(data["volume"].slice_gray(data["slice_index"], step=reduce))
+        elif reduce > 1:
+            preview = image_io.read_gray(data["path"], reduce)
+            if preview is None:
+                raise IOError(f"无法读取图像: {data['path']}")
+        else:
+            # 图像本身较小或无法读取文件头时，从全分辨率图像缩小
+            preview = self.image(index)
+            size = data["size"]
+            shared = True
+        # 缩小解码只保证长边不小于 preview_max_side，再缩放到目标尺寸
+        scale = self.preview_max_side / max(preview.shape[:2])
+        if scale < 1:
+            preview = cv2.resize(preview, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        elif shared:
+            preview = preview.copy()
+        data["size"] = size
+        cached = (preview, (preview.shape[1] / size[0], preview.shape[0] / size[1]))
+        self._previews.put(key, cached)
+        return cached
+
+    def annotated_preview(self, index, pixel_to_um=1.0):
+        """
+        带直径标注的彩色预览 (BGR)
+
+        返回:
+            (预览图像, (sx, sy))，预览坐标 = 全分辨率坐标 × 缩放比例
+        """
+        data = self.slices[index]
+        points = tuple(tuple(p) for p in data.get("points", [])[:2])
+        key = ('annotated', data["path"], points, pixel_to_um)
+        cached = self._previews.get(key)
+        if cached is not None:
+            return cached
+
+        preview, (sx, sy) = self._preview_base(index)
+        annotated = cv2.cvtColor(preview, cv2.COLOR_GRAY2BGR)
+        if len(points) >= 2:
+            draw_diameter(annotated, points[0], points[1], (sx, sy), pixel_to_um)
+        cached = (annotated, (sx, sy))
+        self._previews.put(key, cached)
+        return cached
+
+    def nbytes(self):
+        return self._images.nbytes() + self._previews.nbytes()
+
+    def evict_images(self):
+        """释放全分辨率图像缓存（预览保留），返回释放的字节数"""
+        return self._images.clear()
+
+    def clear(self):
+        """释放全部解码缓存，返回释放的字节数"""
+        return self._images.clear() + self._previews.clear()
+
+    def stats(self):
+        return {'slices': len(self.slices),
+                'images': len(self._images), 'image_bytes': self._images.nbytes(),
+                'previews': len(self._previews), 'preview_bytes': self._previews.nbytes(),
+                'hits': self._images.hits + self._previews.hits,
+                'misses': self._images.misses + self._previews.misses}
+
+
+def draw_diameter(image, p1, p2, scale, pixel_to_um=1.0):
+    """
+    在预览图上绘制直径端点、连线和长度标注
+
+    参数:
+        p1, p2: 全分辨率坐标
+        scale: 预览缩放比例 (sx, sy)
+    """
+    sx, sy = scale
+    q1 = (int(round(p1[0] * sx)), int(round(p1[1] * sy)))
+    q2 = (int(round(p2[0] * sx)), int(round(p2[1] * sy)))
+    cv2.circle(image, q1, 5, (0, 255, 0), -1)
+    cv2.circle(image, q2, 5, (0, 255, 0), -1)
+    cv2.line(image, q1, q2, (0, 0, 255), 2)
+
+    # 长度按全分辨率像素计算
+    distance_pixels = float(np.hypot(p2[0] - p1[0], p2[1] - p1[1]))
+    distance_um = distance_pixels * pixel_to_um
+
+    mid_x = (q1[0] + q2[0]) // 2
+    mid_y = (q1[1] + q2[1]) // 2 + 20
+
+    # 添加文字背景
+    text = f"{distance_pixels:.1f} px ({distance_um:.1f} um)"
+    (text_w, text_h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+    cv2.rectangle(image, (mid_x - text_w // 2 - 5, mid_y - text_h - 5),
+                  (mid_x + text_w // 2 + 5, mid_y + 5), (255, 255, 255), -1)
+    cv2.putText(image, text, (mid_x - text_w // 2, mid_y), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
@@ -2,7 +2,6 @@ import numpy as np
 import cv2
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
-from sklearn.decomposition import PCA
 import os
 import tempfile
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget,
@@ -12,37 +11,31 @@ from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QTa
 from PyQt5.QtGui import QPixmap, QImage, QIcon
 from PyQt5.QtCore import Qt
 import pandas as pd
-from scipy.optimize import least_squares
+import circle_fit
 
 def fit_circle_algebraic(points_2d):
     """
-    使用代数最小二乘法拟合2D平面上的圆（内部函数）
+    使用代数最小二乘法（Kåsa）拟合2D平面上的圆（内部函数）
+
+    批量拟合多组点时直接使用 circle_fit.fit_circles
     """
     if len(points_2d) < 3:
         raise ValueError("至少需要3个点才能拟合圆")
     
-    x = points_2d[:, 0]
-    y = points_2d[:, 1]
-    
-    A = np.column_stack([2*x, 2*y, np.ones(len(x))])
-    b = x**2 + y**2
-    
-    try:
-        solution, _, _, _ = np.linalg.lstsq(A, b, rcond=None)
-        center_x, center_y = solution[0], solution[1]
-        radius = np.sqrt(solution[2] + center_x**2 + center_y**2)
-        return center_x, center_y, radius
-    except Exception as e:
-        print(f"代数圆拟合出错: {str(e)}")
-        raise
+    fit = circle_fit.fit_circles(points_2d, method='kasa')
+    if not np.isfinite(fit.r[0]):
+        print("代数圆拟合出错: 点集退化（共线）")
+        raise ValueError("点集退化（共线），无法拟合圆")
+    return fit.cx[0], fit.cy[0], fit.r[0]
 
-def fit_circle_geometric(points_2d):
+def fit_circle_geometric(points_2d, verbose=False):
     """
     使用迭代法（Levenberg-Marquardt）进行几何拟合，最小化真实几何距离。
     这是拟合圆的黄金标准方法。
     
     参数:
         points_2d: 形状为(n,2)的平面点集
+        verbose: 是否打印拟合结果和误差
         
     返回:
         圆心坐标和半径 (center_x, center_y, radius)
@@ -50,115 +43,101 @@ def fit_circle_geometric(points_2d):
     if len(points_2d) < 3:
         raise ValueError("至少需要3个点才能拟合圆")
 
-    # 1. 使用代数方法提供一个高质量的初始猜测值
-    try:
-        center_x_initial, center_y_initial, radius_initial = fit_circle_algebraic(points_2d)
-    except Exception as e:
-        print(f"几何拟合的初始值计算（代数法）失败: {e}，将使用简单平均值。")
-        center_x_initial = np.mean(points_2d[:, 0])
-        center_y_initial = np.mean(points_2d[:, 1])
-        radius_initial = np.mean(np.sqrt((points_2d[:, 0] - center_x_initial)**2 + (points_2d[:, 1] - center_y_initial)**2))
-
-    initial_guess = [center_x_initial, center_y_initial, radius_initial]
+    # 1. 使用代数方法提供一个高质量的初始猜测值（Taubin 的偏差小于 Kåsa）
+    initial = circle_fit.fit_circles(points_2d, method='taubin')
+    if not np.isfinite(initial.r[0]):
+        print("几何拟合的初始值计算（代数法）失败，将使用简单平均值。")
+        initial = _centroid_initial_guess(points_2d)
 
-    def residuals(params, x, y):
-        """计算每个点到圆的真实几何距离（残差）"""
-        center_x, center_y, radius = params
-        return np.sqrt((x - center_x)**2 + (y - center_y)**2) - radius
-
-    # 2. 使用非线性最小二乘法进行迭代优化
-    x = points_2d[:, 0]
-    y = points_2d[:, 1]
-    
-    # 为半径设置下限（不能为负）
-    bounds = ([-np.inf, -np.inf, 0], [np.inf, np.inf, np.inf])
-
-    try:
-        # 使用Levenberg-Marquardt算法，更精确地最小化几何距离
-        res_lsq = least_squares(residuals, initial_guess, args=(x, y), bounds=bounds, method='trf', loss='linear')
-        
-        center_x, center_y, radius = res_lsq.x
-        
-        # 计算拟合误差，用于评估拟合质量
-        errors = np.abs(residuals([center_x, center_y, radius], x, y))
-        mean_error = np.mean(errors)
-        max_error = np.max(errors)
-        
+    # 2. 解析雅可比矩阵的 Levenberg-Marquardt 迭代（circle_fit.refine_circles）
+    fit = circle_fit.refine_circles(points_2d, initial=initial)
+    center_x, center_y, radius = fit.cx[0], fit.cy[0], fit.r[0]
+    if not np.isfinite(radius):
+        print("迭代几何拟合过程中出错: 未收敛")
+        raise ValueError("几何拟合未收敛")
+    
+    if verbose:
         print(f"迭代几何拟合成功: 中心=({center_x:.1f}, {center_y:.1f}), 半径={radius:.1f}")
-        print(f"拟合质量: 平均误差={mean_error:.3f}, 最大误差={max_error:.3f}")
-        
-        return center_x, center_y, radius
-    except Exception as e:
-        print(f"迭代几何拟合过程中出错: {str(e)}")
-        # 如果迭代失败，则抛出异常
-        raise e
+        print(f"拟合质量: 平均误差={_mean_abs_residual(points_2d, fit):.3f}, 最大误差={fit.max_abs[0]:.3f}")
+    
+    return center_x, center_y, radius
 
-def fit_circle_geometric_forced(points_2d):
+def fit_circle_geometric_forced(points_2d, verbose=False):
     """
     强制使用几何拟合，即使结果可能不理想。
     这个函数不会回退到代数法，用于展示真正的几何拟合结果。
+    verbose 为 True 时打印拟合结果和误差。
     """
     if len(points_2d) < 3:
         raise ValueError("至少需要3个点才能拟合圆")
     
-    # 计算质心作为初始圆心猜测
-    center_x_initial = np.mean(points_2d[:, 0])
-    center_y_initial = np.mean(points_2d[:, 1])
-    
-    # 计算平均距离作为初始半径猜测
-    distances = np.sqrt((points_2d[:, 0] - center_x_initial)**2 + (points_2d[:, 1] - center_y_initial)**2)
-    radius_initial = np.mean(distances)
-    
-    initial_guess = [center_x_initial, center_y_initial, radius_initial]
+    # 以质心和平均距离作为初始猜测，使用更严格的收敛条件和更多迭代次数
+    fit = circle_fit.refine_circles(points_2d, initial=_centroid_initial_guess(points_2d),
+                                    max_iterations=1000, tolerance=1e-15)
+    center_x, center_y, radius = fit.cx[0], fit.cy[0], fit.r[0]
     
-    def residuals(params, x, y):
-        """计算每个点到圆的真实几何距离（残差）"""
-        center_x, center_y, radius = params
-        return np.sqrt((x - center_x)**2 + (y - center_y)**2) - radius
-    
-    # 使用非线性最小二乘法进行迭代优化
-    x = points_2d[:, 0]
-    y = points_2d[:, 1]
-    
-    # 使用更严格的优化参数
-    res_lsq = least_squares(residuals, initial_guess, args=(x, y), 
-                           method='trf', loss='linear', 
-                           ftol=1e-12, xtol=1e-12, gtol=1e-12, 
-                           max_nfev=1000)  # 增加最大迭代次数
-    
-    center_x, center_y, radius = res_lsq.x
-    
-    # 计算拟合质量指标
-    errors = np.abs(residuals([center_x, center_y, radius], x, y))
-    mean_error = np.mean(errors)
-    max_error = np.max(errors)
-    
-    print(f"强制几何拟合: 中心=({center_x:.1f}, {center_y:.1f}), 半径={radius:.1f}")
-    print(f"拟合质量: 平均误差={mean_error:.3f}, 最大误差={max_error:.3f}")
+    if verbose:
+        print(f"强制几何拟合: 中心=({center_x:.1f}, {center_y:.1f}), 半径={radius:.1f}")
+        print(f"拟合质量: 平均误差={_mean_abs_residual(points_2d, fit):.3f}, 最大误差={fit.max_abs[0]:.3f}")
     
     return center_x, center_y, radius
 
-def fit_circle_2d(points_2d, method='algebraic'):
+def _centroid_initial_guess(points_2d):
+    """质心作为圆心、平均距离作为半径的初始猜测 (cx, cy, r)，各为长度1的数组"""
+    points_2d = np.asarray(points_2d, dtype=float)
+    center_x, center_y = points_2d.mean(axis=0)
+    radius = np.mean(np.hypot(points_2d[:, 0] - center_x, points_2d[:, 1] - center_y))
+    return np.array([center_x]), np.array([center_y]), np.array([radius])
+
+def _mean_abs_residual(points_2d, fit):
+    return float(np.nanmean(np.abs(circle_fit.circle_residuals(points_2d, fit.cx, fit.cy, fit.r))))
+
+def fit_circle_robust(points_2d, method='ransac', threshold=None, verbose=False):
+    """
+    RANSAC/LMedS 稳健拟合，误检的端点（如孔口落在散斑上）不影响结果
+    
+    参数:
+        points_2d: 形状为(n,2)的平面点集
+        method: 'ransac' 或 'lmeds'
+        threshold: 内点距离阈值（微米），默认自动估计
+        verbose: 是否打印拟合结果和离群点数
+        
+    返回:
+        (center_x, center_y, radius, inliers)，inliers 为长度n的布尔数组
+    """
+    fit, inliers = circle_fit.robust_fit_circle(np.asarray(points_2d, dtype=float), method, threshold)
+    center_x, center_y, radius = fit.cx[0], fit.cy[0], fit.r[0]
+    if verbose:
+        print(f"稳健拟合({method}): 中心=({center_x:.1f}, {center_y:.1f}), 半径={radius:.1f}，"
+              f"离群点 {int((~inliers).sum())}/{len(inliers)}，内点均方根误差={fit.rms[0]:.3f}")
+    return center_x, center_y, radius, inliers
+
+def fit_circle_2d(points_2d, method='algebraic', verbose=False):
     """
     使用指定方法拟合2D平面上的圆
     
     参数:
         points_2d: 形状为(n,2)的平面点集
-        method: 'algebraic'代数法, 'geometric'几何法, 或 'geometric_forced'强制几何法
+        method: 'algebraic'代数法, 'geometric'几何法, 'geometric_forced'强制几何法,
+                或 'ransac'/'lmeds' 稳健拟合（离群点标记见 fit_circle_robust）
+        verbose: 是否打印拟合方法和结果
         
     返回:
         圆心坐标和半径 (center_x, center_y, radius)
     """
-    print(f"开始拟合圆，使用方法: {method}，点数: {len(points_2d)}")
+    if verbose:
+        print(f"开始拟合圆，使用方法: {method}，点数: {len(points_2d)}")
     
-    if method == 'geometric':
+    if method in circle_fit.ROBUST_METHODS:
+        return fit_circle_robust(points_2d, method, verbose=verbose)[:3]
+    elif method == 'geometric':
         try:
-            return fit_circle_geometric(points_2d)
+            return fit_circle_geometric(points_2d, verbose)
         except Exception as e:
             print(f"几何拟合失败，回退到代数方法: {str(e)}")
             return fit_circle_algebraic(points_2d)
     elif method == 'geometric_forced':
-        return fit_circle_geometric_forced(points_2d)
+        return fit_circle_geometric_forced(points_2d, verbose)
     else:  # 默认使用代数法
         return fit_circle_algebraic(points_2d)
 
@@ -255,7 +234,7 @@ def create_simple_visualization(points_xy, circle_center, radius, pixel_to_um=1.
 # 保留以下函数以保持兼容性，但在新的实现中不会被调用
 def fit_plane(points_3d):
     """
-    使用PCA拟合3D点云的平面
+    使用SVD拟合3D点云的平面（与PCA的第三主成分相同，不依赖 scikit-learn）
     返回平面的法向量和中心点
     """
     # 计算点的质心
@@ -264,12 +243,11 @@ def fit_plane(points_3d):
     # 中心化数据
     centered_points = points_3d - centroid
     
-    # 使用PCA分解
-    pca = PCA(n_components=3)
-    pca.fit(centered_points)
+    # 使用SVD分解
+    _, _, vh = np.linalg.svd(centered_points, full_matrices=False)
     
     # 最小奇异值对应的右奇异向量即为平面法向量
-    normal = pca.components_[2]
+    normal = vh[-1]
     
     # 计算d值: ax + by + cz + d = 0 => d = -(ax + by + cz)
     d = -np.dot(normal, centroid)
@@ -360,6 +338,8 @@ class OCTHoleReconstructionDialog(QDialog):
         self.fit_method_combo.addItem("代数法 (Algebraic) - 速度快，适合噪声数据", "algebraic")
         self.fit_method_combo.addItem("几何法 (Geometric) - 精确，可能回退", "geometric")
         self.fit_method_combo.addItem("强制几何法 (Forced Geometric) - 纯几何拟合", "geometric_forced")
+        self.fit_method_combo.addItem("稳健法 (RANSAC) - 排除误检点", "ransac")
+        self.fit_method_combo.addItem("稳健法 (LMedS) - 排除误检点", "lmeds")
         self.fit_method_combo.setCurrentIndex(0)
         self.fit_method_combo.currentIndexChanged.connect(self.process_and_reconstruct_if_ready)
         
@@ -0,0 +1,174 @@
+"""
+OCT体数据读取（raw / NPY 堆栈）
+
+扫描仪导出的整卷数据通过内存映射打开（np.memmap / np.load(mmap_mode='r')），
+打开时不读取像素，取某一张B扫描只得到视图，操作系统只调入实际访问的页面。
+
+元数据（形状、数据类型、切片间距等）来自同名的 JSON 附属文件
+（volume.raw.json 或 volume.json），raw 文件没有附属文件时由调用方给出：
+    {
+        "shape": [张数, 高, 宽],          # 按 slice_axis 取切片
+        "dtype": "uint16",
+        "offset": 0,                      # 文件头字节数（仅 raw）
+        "order": "C",
+        "slice_axis": 0,
+        "slice_spacing_um": 10.0,         # 相邻B扫描的扫描位置间隔
+        "start_position_um": 0.0,
+        "pixel_to_um_x": 1.6,
+        "pixel_to_um_y": 1.94,
+        "display_range": [0, 4095]        # 非 uint8 数据转换为显示灰度的范围，缺省时抽样估计
+    }
+
+用法:
+    volume = open_volume('scan.npy')
+    for i in range(len(volume)):
+        image = volume.slice_gray(i)      # uint8 数据为零拷贝视图
+        position = volume.position(i)
+"""
+import os
+import json
+
+import numpy as np
+
+import image_io
+
+VOLUME_EXTENSIONS = ('.npy', '.raw', '.bin', '.img')
+
+# 估计显示范围时抽取的切片数和每张切片的采样步长
+_RANGE_SAMPLE_SLICES = 8
+_RANGE_SAMPLE_STEP = 4
+
+
+def sidecar_path(path):
+    """返回存在的元数据文件路径（volume.raw.json 优先于 volume.json），都不存在时返回None"""
+    for candidate in (path + '.json', os.path.splitext(path)[0] + '.json'):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def read_sidecar(path):
+    meta_path = sidecar_path(path)
+    if meta_path is None:
+        return {}
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_sidecar(path, meta):
+    """把元数据写入 volume.raw.json（例如用户在界面中输入的 raw 尺寸）"""
+    with open(path + '.json', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+
+class OCTVolume:
+    """
+    内存映射的OCT体数据
+
+    参数:
+        path: .npy 或 raw 文件
+        meta: 元数据字典（见模块说明），.npy 的形状和数据类型取自文件头
+    """
+
+    def __init__(self, path, meta=None):
+        self.path = path
+        self.meta = dict(meta or {})
+        self._open()
+
+    def _open(self):
+        meta = self.meta
+        if self.path.lower().endswith('.npy'):
+            data = np.load(self.path, mmap_mode='r')
+            meta['shape'] = list(data.shape)
+            meta['dtype'] = data.dtype.str
+        else:
+            if 'shape' not in meta or 'dtype' not in meta:
+                raise ValueError(f"raw 文件需要 shape 和 dtype: {self.path}")
+            data = np.memmap(self.path, dtype=np.dtype(meta['dtype']), mode='r',
+                             offset=int(meta.get('offset', 0)), shape=tuple(meta['shape']),
+                             order=meta.get('order', 'C'))
+        if data.ndim != 3:
+            raise ValueError(f"体数据应为三维，得到形状 {data.shape}")
+        # 切片轴移到最前（视图，不复制）
+        self.data = np.moveaxis(data, int(meta.get('slice_axis', 0)), 0)
+        self._display_range = meta.get('display_range')
+
+    # 通过进程间传递（如批量检测的工作进程）时只传路径和元数据，在对方进程中重新映射
+    def __getstate__(self):
+        meta = dict(self.meta)
+        if self._display_range is not None:
+            meta['display_range'] = self._display_range  # 各进程使用同一显示范围
+        return {'path': self.path, 'meta': meta}
+
+    def __setstate__(self, state):
+        self.path = state['path']
+        self.meta = state['meta']
+        self._open()
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    @property
+    def slice_shape(self):
+        return self.data.shape[1:]
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    @property
+    def slice_spacing_um(self):
+        return self.meta.get('slice_spacing_um')
+
+    def position(self, index):
+        """第 index 张B扫描的扫描位置（微米）"""
+        return float(self.meta.get('start_position_um', 0.0)) + index * float(self.slice_spacing_um or 0.0)
+
+    def slice(self, index):
+        """原始数据类型的切片视图（零拷贝）"""
+        return self.data[index]
+
+    def display_range(self):
+        """非 uint8 数据映射到 0-255 的范围；元数据未给出时从少量切片抽样估计（0.5%-99.5%分位数）"""
+        if self._display_range is None:
+            count = len(self)
+            indices = np.unique(np.linspace(0, count - 1, min(count, _RANGE_SAMPLE_SLICES)).astype(int))
+            sample = np.concatenate([np.asarray(self.data[i, ::_RANGE_SAMPLE_STEP, ::_RANGE_SAMPLE_STEP]).ravel()
+                                     for i in indices])
+            low, high = np.percentile(sample, [0.5, 99.5])
+            self._display_range = [float(low), float(high) if high > low else float(low) + 1.0]
+        return self._display_range
+
+    def slice_gray(self, index, step=1):
+        """
+        uint8 灰度切片：uint8 数据直接返回视图，其他类型按 display_range 线性缩放
+
+        参数:
+            step: 行列抽样步长（预览用，只访问被抽到的行）
+        """
+        data = self.data[index, ::step, ::step]
+        if data.dtype == np.uint8:
+            return data
+        low, high = self.display_range()
+        scaled = (np.asarray(data, dtype=np.float32) - low) * (255.0 / (high - low))
+        return np.clip(scaled, 0, 255).astype(np.uint8)
+
+
+def open_volume(path, **meta):
+    """
+    打开体数据文件；关键字参数覆盖附属 JSON 中的同名元数据
+
+    例如: open_volume('scan.raw', shape=[400, 512, 1024], dtype='uint16', slice_spacing_um=5)
+    """
+    merged = read_sidecar(path)
+    merged.update({key: value for key, value in meta.items() if value is not None})
+    return OCTVolume(path, merged)
+
+
+def read_slice(source):
+    """读取批处理任务中的切片：source 为图像路径或 (OCTVolume, 序号)"""
+    if isinstance(source, tuple):
+        volume, index = source
+        # 复制为连续数组，避免后续处理在内存映射上反复缺页
+        return np.ascontiguousarray(volume.slice_gray(index))
+    return image_io.read_gray(source)
@@ -0,0 +1,305 @@
+"""
+OCT体数据的向量化孔边缘检测
+
+把整卷B扫描当作三维数组 (张数, 高, 宽) 一次处理，不逐张调用二维检测流程：
+    1. 体数据抽样求 OTSU 阈值
+    2. 每张切片的行投影（亮像素比例）按块一次算出，沿行平滑后分组为水平线，
+       取第 top_line_index 条作为上表面（与 hole_engine 的分组规则一致）
+    3. 上表面沿切片方向跟踪：与相邻切片的滑动中值相差过大或缺失的切片用中值代替
+    4. 在每张切片的上表面带内取列方向亮度剖面，阈值化后找最宽的内部暗区（孔口），
+       边缘按阈值交叉线性插值到亚像素
+结果 segments 的每行为 [x1, y1, x2, y2]，可直接交给 oct_utils.transform_to_2d_coords。
+
+用法:
+    edges = detect_volume_edges(volume, params)
+    points_2d = edges.segments[edges.valid]
+"""
+import warnings
+from collections import namedtuple
+
+import numpy as np
+import cv2
+
+import hole_engine
+
+# segments: (n, 4) 浮点数组，未检测到孔口的切片为 NaN；valid: (n,) 布尔数组
+VolumeEdges = namedtuple('VolumeEdges', ['segments', 'valid', 'surface_rows', 'gap_widths', 'threshold'])
+# left/right: (n, 层数) 孔壁内侧的亚像素列号，valid 为 False 处为 NaN；offsets: 各层相对上表面的行数
+WallEdges = namedtuple('WallEdges', ['left', 'right', 'valid', 'offsets'])
+
+# 求阈值时最多抽取的切片数和切片内的采样步长
+_THRESHOLD_SAMPLE_SLICES = 16
+_THRESHOLD_SAMPLE_STEP = 4
+# 相距不超过该行数的显著行归为同一条水平线（同 hole_engine.group_horizontal_lines）
+_LINE_GROUP_ROWS = 5
+
+
+def _as_array(volume):
+    """OCTVolume 或 (张数, 高, 宽) 数组"""
+    return volume if isinstance(volume, np.ndarray) else volume.data
+
+
+def _to_gray(volume, values):
+    """把从体数据取出的原始数值转换为 uint8 灰度（与 OCTVolume.slice_gray 相同的缩放）"""
+    if values.dtype == np.uint8:
+        return values
+    low, high = volume.display_range()
+    scaled = (values.astype(np.float32) - low) * (255.0 / (high - low))
+    return np.clip(scaled, 0, 255).astype(np.uint8)
+
+
+def _gray_chunk(volume, start, stop):
+    """取 [start, stop) 张切片的 uint8 灰度块"""
+    return _to_gray(volume, np.asarray(_as_array(volume)[start:stop]))
+
+
+def volume_threshold(volume):
+    """从均匀抽取的切片中按 OTSU 求亮/暗阈值"""
+    count = len(_as_array(volume))
+    indices = np.unique(np.linspace(0, count - 1, min(count, _THRESHOLD_SAMPLE_SLICES)).astype(int))
+    sample = np.concatenate([_gray_chunk(volume, i, i + 1)[0, ::_THRESHOLD_SAMPLE_STEP, ::_THRESHOLD_SAMPLE_STEP].ravel()
+                             for i in indices])
+    threshold, _ = cv2.threshold(sample.reshape(-1, 1), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return float(threshold)
+
+
+def _box_filter_rows(values, size, border):
+    """对二维数组的每一行做长度为 size 的滑动平均"""
+    return cv2.blur(values.astype(np.float32), (size, 1), borderType=border)
+
+
+def _surface_rows(profiles, threshold_percent, line_index):
+    """
+    由平滑行投影求每张切片第 line_index 条水平线的行号
+
+    参数:
+        profiles: (张数, 高) 平滑后的行投影
+    返回:
+        (张数,) 浮点数组，没有足够水平线的切片为 NaN
+    """
+    significant = profiles > profiles.max(axis=1, keepdims=True) * (threshold_percent / 100.0)
+    # 膨胀 2 行：相距不超过5行的显著行连成一段
+    half = _LINE_GROUP_ROWS // 2
+    padded = np.pad(significant, ((0, 0), (half, half)))
+    merged = np.zeros_like(significant)
+    for offset in range(2 * half + 1):
+        merged |= padded[:, offset:offset + significant.shape[1]]
+    starts = merged & ~np.pad(merged, ((0, 0), (1, 0)))[:, :-1]
+    line_number = np.cumsum(starts, axis=1)
+    in_line = significant & merged & (line_number == line_index + 1)
+    count = in_line.sum(axis=1)
+    rows = np.arange(profiles.shape[1])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        surface = (in_line * rows).sum(axis=1) / count
+    surface[count == 0] = np.nan
+    return surface
+
+
+def track_surface(surface_rows, window=5, max_jump_px=10):
+    """
+    沿切片方向跟踪上表面：缺失或与滑动中值相差超过 max_jump_px 的切片取中值
+
+    返回:
+        (张数,) 浮点数组（全部缺失时保持 NaN）
+    """
+    if window <= 1 or len(surface_rows) < 2:
+        return surface_rows
+    half = window // 2
+    padded = np.pad(surface_rows, half, mode='edge')
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # 全为 NaN 的窗口
+        median = np.nanmedian(windows, axis=1)
+    outlier = np.isnan(surface_rows) | (np.abs(surface_rows - median) > max_jump_px)
+    tracked = surface_rows.copy()
+    tracked[outlier] = median[outlier]
+    return tracked
+
+
+def gather_rows(volume, surface_rows, offsets):
+    """
+    取每张切片上表面以下 offsets 各行（可为负）的灰度
+
+    参数:
+        surface_rows: (张数,) 上表面行号，NaN 的切片不读取
+        offsets: 相对上表面的行偏移序列
+
+    返回:
+        (张数, len(offsets), 宽) float32，上表面缺失的切片为 NaN
+    """
+    data = _as_array(volume)
+    count, height, width = data.shape
+    offsets = np.asarray(offsets, dtype=int)
+    rows_out = np.full((count, len(offsets), width), np.nan, np.float32)
+    valid = np.flatnonzero(~np.isnan(surface_rows))
+    if len(valid) == 0:
+        return rows_out
+    rows = np.clip(np.rint(surface_rows[valid])[:, None].astype(int) + offsets, 0, height - 1)
+    # 一次花式索引取出所有切片的这些行（内存映射时只调入这些页面）
+    rows_out[valid] = _to_gray(volume, np.asarray(data[valid[:, None], rows]))
+    return rows_out
+
+
+def _widest_gaps(dark, profiles, threshold, gap_min_width):
+    """
+    每行中两侧都是亮区的最宽暗段，边缘按阈值交叉线性插值
+
+    返回:
+        (x1, x2, 宽度)，各为 (张数,) 浮点数组，没有缺口的切片为 NaN
+    """
+    count, width = dark.shape
+    edges = np.diff(np.pad(dark, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+    start_slices, start_cols = np.nonzero(edges == 1)   # 暗段第一列
+    end_slices, end_cols = np.nonzero(edges == -1)      # 暗段之后的第一列
+    lengths = end_cols - start_cols
+    usable = (start_cols > 0) & (end_cols < width) & (lengths > gap_min_width)
+    start_slices, start_cols, end_cols, lengths = (start_slices[usable], start_cols[usable],
+                                                   end_cols[usable], lengths[usable])
+
+    x1 = np.full(count, np.nan)
+    x2 = np.full(count, np.nan)
+    gap = np.full(count, np.nan)
+    if len(lengths) == 0:
+        return x1, x2, gap
+    # 每张切片取最长的一段
+    order = np.lexsort((-lengths, start_slices))
+    slices, first = np.unique(start_slices[order], return_index=True)
+    chosen = order[first]
+    a, b = start_cols[chosen] - 1, start_cols[chosen]       # 亮 -> 暗
+    c, d = end_cols[chosen] - 1, end_cols[chosen]           # 暗 -> 亮
+    qa, qb = profiles[slices, a], profiles[slices, b]
+    qc, qd = profiles[slices, c], profiles[slices, d]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        left = a + np.clip(np.nan_to_num((qa - threshold) / (qa - qb), nan=0.5), 0, 1)
+        right = c + np.clip(np.nan_to_num((threshold - qc) / (qd - qc), nan=0.5), 0, 1)
+    x1[slices] = left
+    x2[slices] = right
+    gap[slices] = right - left
+    return x1, x2, gap
+
+
+def _row_gaps(profiles, threshold, gap_min_width, column_smooth_px):
+    """
+    对 (行数, 宽) 灰度剖面做列方向平滑后找每行的孔口（最宽的内部暗段）
+
+    返回:
+        (x1, x2, 宽度)，NaN 行及没有缺口的行为 NaN
+    """
+    if column_smooth_px > 1:
+        finite = np.isfinite(profiles)
+        profiles = np.where(finite, _box_filter_rows(np.nan_to_num(profiles), column_smooth_px, cv2.BORDER_REPLICATE),
+                            np.nan)
+    dark = np.nan_to_num(profiles, nan=threshold + 1) < threshold
+    return _widest_gaps(dark, profiles, threshold, gap_min_width)
+
+
+def detect_surface(volume, params=None, chunk_slices=16, track_window=5, max_jump_px=10, threshold=None):
+    """
+    检测并沿切片方向跟踪每张B扫描的上表面
+
+    参数含义见 detect_volume_edges
+
+    返回:
+        (上表面行号 (张数,) 浮点数组, 亮/暗阈值)
+    """
+    params = dict(hole_engine.DEFAULT_PARAMS, **(params or {}))
+    data = _as_array(volume)
+    if data.dtype != np.uint8 and not hasattr(volume, 'display_range'):
+        raise ValueError("非 uint8 数据请通过 oct_volume.OCTVolume 传入（需要显示范围）")
+    count, height, width = data.shape
+    if threshold is None:
+        threshold = volume_threshold(volume)
+
+    # 行投影（按块一次计算多张切片）
+    row_profiles = np.empty((count, height), np.float32)
+    for start in range(0, count, chunk_slices):
+        stop = min(count, start + chunk_slices)
+        chunk = _gray_chunk(volume, start, stop)
+        row_profiles[start:stop] = (chunk > threshold).mean(axis=2, dtype=np.float32)
+    row_profiles = _box_filter_rows(row_profiles, 5, cv2.BORDER_CONSTANT)
+
+    surface = _surface_rows(row_profiles, params['row_projection_threshold'], params['top_line_index'])
+    return track_surface(surface, track_window, max_jump_px), threshold
+
+
+def detect_volume_edges(volume, params=None, chunk_slices=16, band_px=2, column_smooth_px=5,
+                        track_window=5, max_jump_px=10, threshold=None):
+    """
+    检测整卷每张B扫描的上表面和孔口边缘
+
+    参数:
+        volume: oct_volume.OCTVolume 或 (张数, 高, 宽) 数组
+        params: 检测参数，使用其中的 top_line_index、row_projection_threshold、gap_min_width
+        chunk_slices: 每次处理的切片数（限制临时内存）
+        band_px: 上表面带的半宽（行）
+        column_smooth_px: 列方向剖面的平滑长度，抑制散斑
+        track_window, max_jump_px: 上表面沿切片方向跟踪的窗口和允许跳变
+        threshold: 亮/暗阈值，默认由 OTSU 求得
+
+    返回:
+        VolumeEdges
+    """
+    params = dict(hole_engine.DEFAULT_PARAMS, **(params or {}))
+    # 1-2. 上表面行号（按块计算行投影并沿切片方向跟踪）
+    surface, threshold = detect_surface(volume, params, chunk_slices, track_window, max_jump_px, threshold)
+
+    # 3. 上表面带内的列方向剖面与孔口
+    profiles = gather_rows(volume, surface, range(-band_px, band_px + 1)).mean(axis=1)
+    x1, x2, gap = _row_gaps(profiles, threshold, params['gap_min_width'], column_smooth_px)
+
+    segments = np.column_stack([x1, surface, x2, surface])
+    valid = np.isfinite(segments).all(axis=1)
+    segments[~valid] = np.nan
+    return VolumeEdges(segments, valid, surface, gap, threshold)
+
+
+def detect_wall_edges(volume, edges, offsets, params=None, band_px=2, column_smooth_px=1, margin_px=20,
+                      chunk_levels=16):
+    """
+    检测每张切片在上表面以下多个深度层的孔壁内侧位置
+
+    每层取上下 band_px 行的平均灰度（孔壁是竖直的细亮线，沿深度平均抑制散斑而不削弱孔壁），
+    找最宽的内部暗段（同孔口检测），只接受包含该切片孔口中点、且不超出孔口两侧 margin_px 的暗段；
+    所有切片的同一批层一次处理。
+
+    参数:
+        edges: detect_volume_edges 的结果（提供上表面、孔口和阈值）
+        offsets: 各层相对上表面的行数（递增）
+        band_px: 每层沿深度平均的半宽（行）
+        column_smooth_px: 列方向平滑长度（孔壁只有几像素宽，默认不平滑）
+        margin_px: 孔壁允许超出孔口的列数（倒锥孔或孔口倒角）
+        chunk_levels: 每次取出的层数（限制临时内存）
+
+    返回:
+        WallEdges
+    """
+    params = dict(hole_engine.DEFAULT_PARAMS, **(params or {}))
+    height = _as_array(volume).shape[1]
+    offsets = np.asarray(offsets, dtype=int)
+    count, levels = len(edges.surface_rows), len(offsets)
+    left = np.full((count, levels), np.nan)
+    right = np.full((count, levels), np.nan)
+
+    top_left = edges.segments[:, 0][:, None]
+    top_right = edges.segments[:, 2][:, None]
+    middle = (top_left + top_right) / 2
+    # 没有孔口的切片不检测孔壁
+    surface = np.where(edges.valid, edges.surface_rows, np.nan)
+    band = np.arange(-band_px, band_px + 1)
+    for start in range(0, levels, chunk_levels):
+        chunk = offsets[start:start + chunk_levels]
+        rows = gather_rows(volume, surface, (chunk[:, None] + band).ravel())
+        rows = rows.reshape(count, len(chunk), len(band), -1).mean(axis=2)   # (张数, 层数, 宽)
+        below = surface[:, None] + chunk[None, :] + band_px < height          # 超出图像底部的层无效
+        rows[~below] = np.nan
+        x1, x2, _ = _row_gaps(rows.reshape(-1, rows.shape[2]), edges.threshold,
+                              params['gap_min_width'], column_smooth_px)
+        left[:, start:start + len(chunk)] = x1.reshape(count, -1)
+        right[:, start:start + len(chunk)] = x2.reshape(count, -1)
+
+    with np.errstate(invalid='ignore'):
+        valid = ((left < middle) & (right > middle) &
+                 (left > top_left - margin_px) & (right < top_right + margin_px))
+    left[~valid] = np.nan
+    right[~valid] = np.nan
+    return WallEdges(left, right, valid, offsets)
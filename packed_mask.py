@@ -0,0 +1,151 @@
+"""
+按位压缩存储的二值掩膜
+
+二值图像以 0/255 的 uint8 数组保存时每个像素占 1 字节，PackedMask 用 np.packbits 按行
+压缩为每像素 1 位（内存约为原来的 1/8），并支持：
+    - 按行区间解压（只解压需要的行）
+    - 基于 popcount 的行投影和分块解压的列投影，无需解压整幅图像
+    - 1 位 PNG 导出/读取（与 PIL '1' 模式的行填充和位序一致，无需转换）
+    - zlib 二次压缩的字节序列，适合在大批量任务中保留全部掩膜
+
+用法:
+    mask = PackedMask.from_array(binary_image)
+    rows = mask.row_projection()            # 等价于 np.sum(binary_image, axis=1)
+    part = mask.unpack(100, 200)            # binary_image[100:200]
+    mask.save('result_binary.png')
+"""
+import zlib
+
+import numpy as np
+
+# 0..255 每个字节中 1 的个数（numpy 2.0 以下没有 np.bitwise_count 时查表）
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+# 列投影每次解压的行数（临时数组约 宽度×256 字节，可留在缓存中）
+_COLUMN_CHUNK_ROWS = 256
+
+
+def _popcount(bits):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bits)
+    return _POPCOUNT[bits]
+
+
+class PackedMask:
+    """每像素 1 位的二值掩膜（非零像素为前景）"""
+
+    __slots__ = ('bits', 'shape')
+
+    def __init__(self, bits, shape):
+        """
+        参数:
+            bits: np.packbits(mask, axis=1) 得到的 (H, ceil(W/8)) uint8 数组
+            shape: 原始掩膜尺寸 (H, W)
+        """
+        self.bits = np.ascontiguousarray(bits, dtype=np.uint8)
+        self.shape = (int(shape[0]), int(shape[1]))
+
+    @classmethod
+    def from_array(cls, mask):
+        """由二维数组创建（非零即前景）"""
+        mask = np.asarray(mask)
+        if mask.ndim != 2:
+            raise ValueError(f"二值掩膜必须是二维数组，得到形状 {mask.shape}")
+        return cls(np.packbits(mask != 0, axis=1), mask.shape)
+
+    @property
+    def height(self):
+        return self.shape[0]
+
+    @property
+    def width(self):
+        return self.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+    def unpack(self, start=0, stop=None, value=255):
+        """
+        解压第 start 到 stop 行
+
+        返回:
+            uint8 数组，前景为 value、背景为 0（默认与预处理得到的二值图像相同）
+        """
+        rows = np.unpackbits(self.bits[start:stop], axis=1, count=self.width)
+        if value != 1:
+            rows *= np.uint8(value)
+        return rows
+
+    def to_array(self, value=255):
+        return self.unpack(value=value)
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.to_array()
+        return array if dtype is None else array.astype(dtype)
+
+    def count(self):
+        """前景像素总数"""
+        return int(_popcount(self.bits).sum(dtype=np.int64))
+
+    def row_counts(self):
+        """每行前景像素数"""
+        return _popcount(self.bits).sum(axis=1, dtype=np.int64)
+
+    def column_counts(self):
+        """每列前景像素数（分块解压为 0/1 后累加，不生成整幅图像）"""
+        counts = np.zeros(self.width, dtype=np.int64)
+        for start in range(0, self.height, _COLUMN_CHUNK_ROWS):
+            counts += self.unpack(start, start + _COLUMN_CHUNK_ROWS, value=1).sum(axis=0, dtype=np.int32)
+        return counts
+
+    def row_projection(self, value=255):
+        """与 np.sum(binary_image, axis=1) 相同的行投影"""
+        return self.row_counts() * value
+
+    def column_projection(self, value=255):
+        """与 np.sum(binary_image, axis=0) 相同的列投影"""
+        return self.column_counts() * value
+
+    def __eq__(self, other):
+        return (isinstance(other, PackedMask) and self.shape == other.shape and
+                np.array_equal(self.bits, other.bits))
+
+    def __repr__(self):
+        return f"PackedMask({self.height}x{self.width}, {self.nbytes} bytes)"
+
+    # ---- 序列化与导出 ----
+
+    def tobytes(self, level=1):
+        """zlib 压缩的字节序列（前 8 字节为高、宽）"""
+        header = np.array(self.shape, dtype='<u4').tobytes()
+        return header + zlib.compress(self.bits.tobytes(), level)
+
+    @classmethod
+    def frombytes(cls, data):
+        height, width = np.frombuffer(data[:8], dtype='<u4')
+        bits = np.frombuffer(zlib.decompress(data[8:]), dtype=np.uint8)
+        return cls(bits.reshape(int(height), -1), (height, width))
+
+    def to_image(self):
+        """转换为 PIL '1' 模式图像（直接使用压缩数据，不解压）"""
+        from PIL import Image
+        return Image.frombytes('1', (self.width, self.height), self.bits.tobytes())
+
+    def save(self, path):
+        """保存为 1 位 PNG/TIFF 等（由扩展名决定格式；JPEG 等不支持 1 位的格式会转为灰度）"""
+        image = self.to_image()
+        try:
+            image.save(path)
+        except OSError:
+            image.convert('L').save(path)
+
+    @classmethod
+    def load(cls, path):
+        """读取二值图像文件（灰度图像以非零为前景）"""
+        from PIL import Image
+        with Image.open(path) as image:
+            if image.mode == '1':
+                return cls(np.frombuffer(image.tobytes(), dtype=np.uint8).reshape(image.height, -1),
+                           (image.height, image.width))
+            return cls.from_array(np.asarray(image.convert('L')))
@@ -0,0 +1,400 @@
+"""
+检测参数自动调优工具
+
+根据一个图像文件夹和对应的参考直径/深度CSV，使用随机搜索、网格搜索或逐次减半(successive halving)
+在多进程中搜索 hole_engine 的检测参数，并输出主界面"加载参数"可直接读取的JSON文件。
+
+用法示例:
+    python param_tuner.py input/ reference.csv -o best_params.json --method halving --trials 200
+"""
+import os
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import itertools
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import hole_engine
+import image_io
+from packed_mask import PackedMask
+
+# 搜索空间：取值范围与主界面滑块一致
+SEARCH_SPACE = {
+    'gaussian_kernel': list(range(1, 22, 2)),
+    'adaptive_block_size': list(range(3, 102, 2)),
+    'adaptive_c': list(range(1, 31)),
+    'binary_threshold': list(range(0, 256, 4)),
+    'top_line_index': list(range(0, 4)),
+    'row_projection_threshold': list(range(10, 91)),
+    'gap_min_width': list(range(10, 201, 2)),
+    'bottom_search_range': [v / 100.0 for v in range(10, 101, 5)],
+    'bottom_line_index': list(range(0, 4)),
+    'short_line_min_length': list(range(1, 21)),
+    'short_line_min_white_ratio': [v / 100.0 for v in range(10, 61, 5)],
+    'short_line_max_white_ratio': [v / 100.0 for v in range(60, 101, 5)],
+}
+
+# 网格搜索使用的粗网格
+GRID_SPACE = {
+    'gaussian_kernel': [3, 5, 9],
+    'adaptive_block_size': [31, 51, 81],
+    'adaptive_c': [3, 5, 10],
+    'binary_threshold': [64, 128, 180],
+    'top_line_index': [0, 1],
+    'row_projection_threshold': [50, 70, 85],
+    'gap_min_width': [30, 50, 100],
+    'bottom_search_range': [0.6, 0.8, 1.0],
+    'bottom_line_index': [0, 2],
+    'short_line_min_length': [3, 5, 10],
+    'short_line_min_white_ratio': [0.3, 0.4],
+    'short_line_max_white_ratio': [0.8, 0.9],
+}
+
+# 网格搜索默认只对以下参数展开，其余参数保持基准值
+DEFAULT_GRID_KEYS = ['gaussian_kernel', 'adaptive_block_size', 'adaptive_c',
+                     'binary_threshold', 'row_projection_threshold', 'gap_min_width']
+
+# 测量失败时每项误差的惩罚值（相对误差）
+FAILURE_PENALTY = 1.0
+
+# 每个工作进程最多缓存的二值图像组数（按位压缩保存，32 组约占原来 4 组未压缩图像的内存）
+_BINARY_CACHE_SIZE = 32
+
+# 工作进程内的全局状态
+_worker_images = None
+_worker_references = None
+_worker_binary_cache = None
+
+
+def _pick_column(fieldnames, candidates):
+    for name in candidates:
+        if name in fieldnames:
+            return name
+    return None
+
+
+def load_references(csv_path):
+    """
+    读取参考值CSV
+
+    CSV需包含文件名列（filename / 文件名）以及直径列（diameter / diameter_um / 直径 (μm)）
+    和/或深度列（depth / depth_um / 深度 (μm)），单位为微米。缺失的值留空即可。
+
+    返回:
+        OrderedDict: 文件名 -> (参考直径, 参考深度)，缺失为None
+    """
+    references = OrderedDict()
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames or []
+        name_col = _pick_column(fieldnames, ['filename', 'file', '文件名', '图像'])
+        diameter_col = _pick_column(fieldnames, ['diameter', 'diameter_um', '直径 (μm)', '直径'])
+        depth_col = _pick_column(fieldnames, ['depth', 'depth_um', '深度 (μm)', '深度'])
+        if name_col is None or (diameter_col is None and depth_col is None):
+            raise ValueError(f"参考CSV缺少文件名或直径/深度列: {fieldnames}")
+
+        for row in reader:
+            name = (row.get(name_col) or '').strip()
+            if not name:
+                continue
+            diameter = row.get(diameter_col) if diameter_col else None
+            depth = row.get(depth_col) if depth_col else None
+            references[name] = (float(diameter) if diameter not in (None, '') else None,
+                                float(depth) if depth not in (None, '') else None)
+    return references
+
+
+def _init_worker(image_paths, references):
+    """工作进程初始化：读入所有图像，之后的试验只传参数"""
+    global _worker_images, _worker_references, _worker_binary_cache
+    _worker_images = [image_io.read_gray(p) for p in image_paths]
+    _worker_references = references
+    _worker_binary_cache = OrderedDict()
+
+
+def _get_binaries(params):
+    """按预处理参数缓存所有图像的二值结果（PackedMask），相同预处理参数的试验共享"""
+    key = hole_engine.preprocess_key(params)
+    binaries = _worker_binary_cache.get(key)
+    if binaries is None:
+        binaries = [None] * len(_worker_images)
+        _worker_binary_cache[key] = binaries
+        while len(_worker_binary_cache) > _BINARY_CACHE_SIZE:
+            _worker_binary_cache.popitem(last=False)
+    else:
+        _worker_binary_cache.move_to_end(key)
+    return binaries
+
+
+def score_measurement(result, reference):
+    """
+    计算单张图像的误差：直径与深度相对误差之和，测量失败按 FAILURE_PENALTY 计
+    """
+    ref_diameter, ref_depth = reference
+    error = 0.0
+    if ref_diameter:
+        diameter = result['standard_diameter'] if result else 0
+        error += min(abs(diameter - ref_diameter) / ref_diameter, FAILURE_PENALTY) if diameter > 0 else FAILURE_PENALTY
+    if ref_depth:
+        depth = result['hole_depth'] if result else 0
+        error += min(abs(depth - ref_depth) / ref_depth, FAILURE_PENALTY) if depth > 0 else FAILURE_PENALTY
+    return error
+
+
+def _evaluate_batch(trials, image_indices):
+    """
+    在工作进程中评估一组试验（同组试验通常共享预处理参数）
+
+    返回:
+        [(试验编号, 平均误差), ...]
+    """
+    scores = []
+    for trial_id, params in trials:
+        binaries = _get_binaries(params)
+        total = 0.0
+        for idx in image_indices:
+            image = _worker_images[idx]
+            result = None
+            if image is not None:
+                try:
+                    if binaries[idx] is None:
+                        binary = hole_engine.preprocess_image(image, params)
+                        binaries[idx] = PackedMask.from_array(binary)
+                    else:
+                        binary = binaries[idx].to_array()
+                    # 行投影直接由压缩掩膜计算
+                    row_projection_smooth = np.convolve(binaries[idx].row_projection(), np.ones(5)/5, mode='same')
+                    horizontal_lines = hole_engine.group_horizontal_lines(row_projection_smooth,
+                                                                          params['row_projection_threshold'])
+                    result = hole_engine.detect_hole_dimensions(binary, params, horizontal_lines=horizontal_lines)
+                except Exception:
+                    result = None
+            total += score_measurement(result, _worker_references[idx])
+        scores.append((trial_id, total / max(len(image_indices), 1)))
+    return scores
+
+
+def sample_random_params(base_params, rng, keys=None):
+    """在搜索空间中随机采样一组参数"""
+    params = dict(base_params)
+    for key in (keys or SEARCH_SPACE.keys()):
+        params[key] = rng.choice(SEARCH_SPACE[key])
+    if params['short_line_min_white_ratio'] >= params['short_line_max_white_ratio']:
+        params['short_line_min_white_ratio'], params['short_line_max_white_ratio'] = \
+            hole_engine.DEFAULT_PARAMS['short_line_min_white_ratio'], hole_engine.DEFAULT_PARAMS['short_line_max_white_ratio']
+    return params
+
+
+def generate_grid_params(base_params, keys):
+    """按粗网格展开指定参数的全部组合"""
+    values = [GRID_SPACE[k] for k in keys]
+    for combo in itertools.product(*values):
+        params = dict(base_params)
+        params.update(zip(keys, combo))
+        yield params
+
+
+class ParameterTuner:
+    """参数调优器，负责进程池调度和搜索策略"""
+
+    def __init__(self, image_paths, references, base_params=None, workers=None, seed=0):
+        self.image_paths = list(image_paths)
+        self.references = list(references)
+        self.base_params = dict(hole_engine.DEFAULT_PARAMS)
+        if base_params:
+            self.base_params.update(base_params)
+        self.workers = workers or os.cpu_count() or 1
+        self.rng = random.Random(seed)
+        self.history = []  # [(误差, 参数, 使用图像数), ...]
+        self.executor = None
+
+    def __enter__(self):
+        self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                            initializer=_init_worker,
+                                            initargs=(self.image_paths, self.references))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.executor.shutdown(wait=True)
+        self.executor = None
+
+    def evaluate(self, param_list, image_indices=None):
+        """
+        并行评估一组参数
+
+        同一预处理参数的试验被分到同一批次，使工作进程可复用缓存的二值图像。
+
+        返回:
+            与 param_list 对应的平均误差列表
+        """
+        if image_indices is None:
+            image_indices = list(range(len(self.image_paths)))
+
+        groups = OrderedDict()
+        for trial_id, params in enumerate(param_list):
+            groups.setdefault(hole_engine.preprocess_key(params), []).append((trial_id, params))
+
+        # 过大的组再拆分，保证所有工作进程都有任务
+        batch_size = max(1, len(param_list) // (self.workers * 4))
+        batches = []
+        for trials in groups.values():
+            for i in range(0, len(trials), batch_size):
+                batches.append(trials[i:i + batch_size])
+
+        scores = [None] * len(param_list)
+        futures = [self.executor.submit(_evaluate_batch, batch, image_indices) for batch in batches]
+        for future in futures:
+            for trial_id, score in future.result():
+                scores[trial_id] = score
+
+        for params, score in zip(param_list, scores):
+            self.history.append((score, params, len(image_indices)))
+        return scores
+
+    def random_search(self, n_trials):
+        param_list = [dict(self.base_params)] + \
+                     [sample_random_params(self.base_params, self.rng) for _ in range(n_trials - 1)]
+        scores = self.evaluate(param_list)
+        best = int(np.argmin(scores))
+        return param_list[best], scores[best]
+
+    def grid_search(self, keys, max_trials=None):
+        param_list = list(generate_grid_params(self.base_params, keys))
+        if max_trials and len(param_list) > max_trials:
+            print(f"网格共 {len(param_list)} 组，随机抽取 {max_trials} 组")
+            param_list = self.rng.sample(param_list, max_trials)
+        scores = self.evaluate(param_list)
+        best = int(np.argmin(scores))
+        return param_list[best], scores[best]
+
+    def successive_halving(self, n_trials, eta=3, min_images=None):
+        """
+        逐次减半：先用少量图像评估大量候选，每轮保留前 1/eta 并将图像数扩大 eta 倍
+        """
+        n_images = len(self.image_paths)
+        order = list(range(n_images))
+        self.rng.shuffle(order)
+
+        candidates = [dict(self.base_params)] + \
+                     [sample_random_params(self.base_params, self.rng) for _ in range(n_trials - 1)]
+
+        rounds = max(1, int(np.ceil(np.log(max(n_trials, 1)) / np.log(eta))))
+        budget = min_images or max(1, int(np.ceil(n_images / eta ** (rounds - 1))))
+
+        scores = []
+        while True:
+            budget = min(budget, n_images)
+            scores = self.evaluate(candidates, order[:budget])
+            print(f"  逐次减半: {len(candidates)} 组参数 x {budget} 张图像, 当前最小误差 {min(scores):.4f}")
+            if len(candidates) <= 1 or budget >= n_images and len(candidates) <= eta:
+                break
+            keep = max(1, len(candidates) // eta)
+            ranked = np.argsort(scores)[:keep]
+            candidates = [candidates[i] for i in ranked]
+            budget *= eta
+
+        if budget < n_images:
+            scores = self.evaluate(candidates)
+        best = int(np.argmin(scores))
+        return candidates[best], scores[best]
+
+
+def collect_images(folder, references):
+    """按参考CSV中的文件名在文件夹中查找图像"""
+    image_paths = []
+    image_refs = []
+    for name, reference in references.items():
+        path = os.path.join(folder, name)
+        if not os.path.isfile(path):
+            print(f"警告: 找不到图像 {path}，已跳过")
+            continue
+        image_paths.append(path)
+        image_refs.append(reference)
+    return image_paths, image_refs
+
+
+def save_history(history, csv_path):
+    """保存所有试验结果（按误差升序）"""
+    keys = list(SEARCH_SPACE.keys())
+    with open(csv_path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['error', 'n_images'] + keys)
+        for score, params, n_images in sorted(history, key=lambda x: x[0]):
+            writer.writerow([f"{score:.6f}", n_images] + [params[k] for k in keys])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="孔洞检测参数自动调优")
+    parser.add_argument('folder', help="图像文件夹")
+    parser.add_argument('reference_csv', help="参考直径/深度CSV（单位微米）")
+    parser.add_argument('-o', '--output', default='best_params.json', help="输出参数JSON路径")
+    parser.add_argument('--method', choices=['random', 'grid', 'halving'], default='halving',
+                        help="搜索方法：随机、网格、逐次减半")
+    parser.add_argument('--trials', type=int, default=200, help="候选参数组数（网格搜索时为最大组数）")
+    parser.add_argument('--grid-keys', default=','.join(DEFAULT_GRID_KEYS),
+                        help="网格搜索展开的参数，逗号分隔")
+    parser.add_argument('--eta', type=int, default=3, help="逐次减半的淘汰比例")
+    parser.add_argument('--base', help="基准参数JSON（例如主界面保存的参数），未搜索的参数取自此文件")
+    parser.add_argument('--workers', type=int, default=None, help="工作进程数，默认CPU核数")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子")
+    parser.add_argument('--history', help="保存全部试验结果的CSV路径")
+    args = parser.parse_args(argv)
+
+    references = load_references(args.reference_csv)
+    image_paths, image_refs = collect_images(args.folder, references)
+    if not image_paths:
+        print("错误: 没有可用的图像")
+        return 1
+
+    base_params = None
+    if args.base:
+        with open(args.base, 'r') as f:
+            base_params = json.load(f)
+
+    start_time = time.time()
+    print(f"共 {len(image_paths)} 张图像，搜索方法: {args.method}")
+
+    with ParameterTuner(image_paths, image_refs, base_params, args.workers, args.seed) as tuner:
+        baseline = tuner.evaluate([dict(tuner.base_params)])[0]
+        print(f"基准参数平均误差: {baseline:.4f}")
+
+        if args.method == 'random':
+            best_params, best_score = tuner.random_search(args.trials)
+        elif args.method == 'grid':
+            keys = [k.strip() for k in args.grid_keys.split(',') if k.strip()]
+            unknown = [k for k in keys if k not in GRID_SPACE]
+            if unknown:
+                print(f"错误: 未知的网格参数 {unknown}")
+                return 1
+            best_params, best_score = tuner.grid_search(keys, args.trials)
+        else:
+            best_params, best_score = tuner.successive_halving(args.trials, args.eta)
+
+        history = tuner.history
+
+    if best_score > baseline:
+        print("未找到优于基准的参数，输出基准参数")
+        best_params, best_score = dict(tuner.base_params), baseline
+
+    with open(args.output, 'w') as f:
+        json.dump(best_params, f, indent=4)
+
+    if args.history:
+        save_history(history, args.history)
+
+    print(f"最优平均误差: {best_score:.4f} （基准 {baseline:.4f}），共评估 {len(history)} 次，"
+          f"用时 {time.time() - start_time:.1f} 秒")
+    print(f"参数已保存到: {args.output}")
+    for key in SEARCH_SPACE:
+        print(f"  {key}: {best_params[key]}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
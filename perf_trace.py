@@ -0,0 +1,233 @@
+"""
+轻量级分阶段计时
+
+用法:
+    with perf_trace.span('gaussian_blur'):
+        ...
+
+未启用时 span() 返回共享的空上下文，开销只有一次函数调用；启用后使用 perf_counter_ns 记录
+每个阶段的起止时间，可汇总为最近一次处理的耗时分解，或导出为 Chrome trace-event JSON
+（在 chrome://tracing 或 https://ui.perfetto.dev 中打开）。
+
+设置环境变量 HOLE_TRACE=1 可在启动时启用。
+"""
+import os
+import json
+import time
+import functools
+import threading
+from collections import deque
+
+# 最多保留的事件数，超出后丢弃最早的事件
+MAX_EVENTS = 200000
+
+_enabled = os.environ.get('HOLE_TRACE', '') not in ('', '0')
+_events = deque(maxlen=MAX_EVENTS)
+_local = threading.local()
+_listeners = []
+_pid = os.getpid()
+
+
+class _NullSpan:
+    """未启用计时时使用的空上下文"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """一个计时区间，结束时写入事件缓冲区"""
+    __slots__ = ('name', 'category', 'args', 'start_ns', 'depth')
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        stack = _thread_stack()
+        self.depth = len(stack)
+        stack.append(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end_ns = time.perf_counter_ns()
+        stack = _thread_stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+
+        event = {
+            'name': self.name,
+            'cat': self.category,
+            'ph': 'X',
+            'ts': self.start_ns / 1000.0,
+            'dur': (end_ns - self.start_ns) / 1000.0,
+            'pid': _pid,
+            'tid': threading.get_ident(),
+            'depth': self.depth,
+        }
+        if self.args:
+            event['args'] = self.args
+        if exc_type is not None:
+            event.setdefault('args', {})['error'] = str(exc_value)
+        _events.append(event)
+
+        # 记录当前根区间内的事件，根区间结束时通知监听者
+        frame = getattr(_local, 'frame', None)
+        if frame is not None:
+            frame.append(event)
+        if self.depth == 0:
+            _local.frame = []
+            for listener in list(_listeners):
+                try:
+                    listener(event, frame or [event])
+                except Exception as e:
+                    print(f"性能计时监听器出错: {str(e)}")
+        return False
+
+
+def _thread_stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+        _local.frame = []
+    return stack
+
+
+def span(name, category='pipeline', **args):
+    """
+    创建计时区间（上下文管理器）
+
+    参数:
+        name: 阶段名称
+        category: 分类，对应 Chrome trace 的 cat 字段
+        args: 附加信息（如图像尺寸），写入事件的 args 字段
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, category, args)
+
+
+def traced(name=None, category='pipeline'):
+    """函数装饰器形式的 span"""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*a, **kw):
+            if not _enabled:
+                return func(*a, **kw)
+            with _Span(span_name, category, None):
+                return func(*a, **kw)
+        return wrapper
+    return decorator
+
+
+def enable(state=True):
+    """启用或关闭计时"""
+    global _enabled
+    _enabled = bool(state)
+
+
+def is_enabled():
+    return _enabled
+
+
+def clear():
+    """清空已记录的事件"""
+    _events.clear()
+
+
+def events():
+    """返回已记录事件的副本"""
+    return list(_events)
+
+
+def add_listener(callback):
+    """
+    注册根区间结束时的回调 callback(root_event, frame_events)
+
+    frame_events 为该根区间内（含自身）完成的全部事件，按结束顺序排列。
+    回调在计时所在线程中执行。
+    """
+    if callback not in _listeners:
+        _listeners.append(callback)
+
+
+def remove_listener(callback):
+    if callback in _listeners:
+        _listeners.remove(callback)
+
+
+def breakdown(frame_events):
+    """
+    将一次处理内的事件按阶段名汇总
+
+    返回:
+        [(阶段名, 深度, 总耗时ms, 次数), ...]，按首次开始时间排序
+    """
+    stages = {}
+    for event in frame_events:
+        entry = stages.get(event['name'])
+        if entry is None:
+            stages[event['name']] = [event['ts'], event['depth'], event['dur'] / 1000.0, 1]
+        else:
+            entry[0] = min(entry[0], event['ts'])
+            entry[1] = min(entry[1], event['depth'])
+            entry[2] += event['dur'] / 1000.0
+            entry[3] += 1
+    ordered = sorted(stages.items(), key=lambda item: item[1][0])
+    return [(name, depth, total, count) for name, (_, depth, total, count) in ordered]
+
+
+def format_breakdown(root_event, frame_events, max_items=6):
+    """生成状态栏使用的单行耗时摘要（只列出根区间的直接子阶段）"""
+    total_ms = root_event['dur'] / 1000.0
+    parts = [(name, ms) for name, depth, ms, _ in breakdown(frame_events)
+             if depth == root_event['depth'] + 1]
+    parts.sort(key=lambda item: item[1], reverse=True)
+    text = " | ".join(f"{name} {ms:.1f}" for name, ms in parts[:max_items])
+    return f"{root_event['name']} {total_ms:.1f} ms" + (f" ({text})" if text else "")
+
+
+def summary():
+    """
+    按阶段名统计所有已记录事件
+
+    返回:
+        {阶段名: {'count', 'total_ms', 'mean_ms', 'max_ms'}}
+    """
+    stats = {}
+    for event in list(_events):
+        ms = event['dur'] / 1000.0
+        entry = stats.setdefault(event['name'], {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        entry['count'] += 1
+        entry['total_ms'] += ms
+        entry['max_ms'] = max(entry['max_ms'], ms)
+    for entry in stats.values():
+        entry['mean_ms'] = entry['total_ms'] / entry['count']
+    return stats
+
+
+def export_chrome_trace(path):
+    """
+    导出 Chrome trace-event JSON
+
+    返回:
+        导出的事件数
+    """
+    trace_events = []
+    for event in list(_events):
+        item = {k: v for k, v in event.items() if k != 'depth'}
+        trace_events.append(item)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+    return len(trace_events)
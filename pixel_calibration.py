@@ -1,6 +1,6 @@
 import sys
 import cv2
-import numpy as np
+import image_io
 import os
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QLabel, QPushButton, QVBoxLayout, 
                             QHBoxLayout, QFileDialog, QWidget, QMessageBox, QGroupBox,
@@ -346,7 +346,7 @@ class PixelCalibrationApp(QMainWindow):
     def load_image(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "选择图像", "", "图像文件 (*.png *.jpg *.bmp *.tif)")
         if file_path:
-            self.image = cv2.imdecode(np.fromfile(file_path, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+            self.image = image_io.read_gray(file_path)
             if self.image is None:
                 QMessageBox.critical(self, "错误", f"无法加载图像: {file_path}")
                 return
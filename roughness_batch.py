@@ -0,0 +1,72 @@
+"""
+孔壁粗糙度批量计算工具
+
+对文件夹中的所有截面图像完成检测、逐行孔壁轮廓提取和左右孔壁粗糙度计算（Ra/Rq/Rz、
+波纹度 Wa 等），结果写入CSV。
+
+用法示例:
+    python roughness_batch.py input/ -o roughness.csv --params params.json --cutoff 80
+"""
+import os
+import sys
+import csv
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import hole_engine
+import image_io
+
+
+def process_file(path, params, cutoff_um):
+    """计算一张图像的粗糙度，返回 ROUGHNESS_FIELDS 对应的一行"""
+    name = os.path.basename(path)
+    try:
+        image = image_io.read_gray(path)
+        if image is None:
+            raise IOError("无法读取图像")
+        roughness, profile = hole_engine.roughness_for_image(image, params, cutoff_um=cutoff_um)
+        return hole_engine.roughness_row(name, roughness, profile)
+    except Exception as e:
+        return {'filename': name, 'status': f'error: {e}'}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="孔壁粗糙度批量计算")
+    parser.add_argument('folder', help="图像文件夹")
+    parser.add_argument('-o', '--output', default='roughness.csv', help="输出CSV路径")
+    parser.add_argument('--params', help="检测参数JSON（默认使用 hole_engine.DEFAULT_PARAMS）")
+    parser.add_argument('--cutoff', type=float, default=hole_engine.DEFAULT_ROUGHNESS_CUTOFF_UM,
+                        help="粗糙度/波纹度截止波长（μm）")
+    parser.add_argument('--workers', type=int, default=None, help="工作进程数，默认CPU核数")
+    args = parser.parse_args(argv)
+
+    params = dict(hole_engine.DEFAULT_PARAMS)
+    if args.params:
+        with open(args.params, 'r') as f:
+            params.update(json.load(f))
+
+    paths = sorted(os.path.join(args.folder, f) for f in os.listdir(args.folder)
+                   if f.lower().endswith(image_io.IMAGE_EXTENSIONS))
+    if not paths:
+        print("错误: 文件夹中没有图像")
+        return 1
+
+    print(f"共 {len(paths)} 张图像，截止波长 {args.cutoff:.1f} μm")
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        rows = list(executor.map(process_file, paths, [params] * len(paths), [args.cutoff] * len(paths)))
+
+    with open(args.output, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=hole_engine.ROUGHNESS_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    failed = [row for row in rows if row['status'] != 'ok']
+    for row in failed:
+        print(f"  {row['filename']}: {row['status']}")
+    print(f"完成: 成功 {len(rows) - len(failed)} 张，失败 {len(failed)} 张，结果已保存到: {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
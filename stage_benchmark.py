@@ -0,0 +1,260 @@
+"""
+检测流程分阶段性能基准
+
+在多种图像尺寸上分别计时解码、高斯滤波、自适应阈值、OTSU、形态学、行投影分组、缺口搜索、
+底部搜索、边缘查找、锥度计算、孔壁轮廓提取、粗糙度分析、circle_fit 批量圆拟合和 oct_utils.fit_circle_geometric，
+可保存为JSON基准，并与已有基准比较，超出容差的阶段标记为性能退化（退出码为1）。
+
+用法示例:
+    python stage_benchmark.py --save-baseline benchmarks/baseline.json
+    python stage_benchmark.py --baseline benchmarks/baseline.json --tolerance 0.2
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+from datetime import datetime
+
+import numpy as np
+import cv2
+
+import circle_fit
+import hole_engine
+import image_io
+import synthetic_holes
+
+DEFAULT_SIZES = ['1024x768', '2048x1536', '4096x3072']
+
+# 与图像尺寸无关的阶段记录在该键下
+POINTS_KEY = 'points'
+
+# 差值小于该值（毫秒）时不判定为退化，避免计时抖动误报
+MIN_REGRESSION_MS = 0.05
+
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def make_benchmark_image(width, height, seed=0):
+    """生成与尺寸匹配的合成截面图：孔深约占图像高度的45%"""
+    pixel_to_um_y = 1000.0 / (0.45 * height)
+    pixel_to_um_x = pixel_to_um_y * 1.60 / 1.94
+    image, truth = synthetic_holes.render_cross_section(
+        width=width, height=height,
+        pixel_to_um_x=pixel_to_um_x, pixel_to_um_y=pixel_to_um_y,
+        diameter_um=min(200.0, 0.2 * width * pixel_to_um_x), depth_um=1000.0,
+        taper_angle_deg=1.0, wall_roughness_um=0.5 * pixel_to_um_x,
+        speckle_contrast=0.2, seed=seed)
+    return image, pixel_to_um_x, pixel_to_um_y
+
+
+def time_stage(func, repeat, warmup=1):
+    """多次运行并返回耗时统计（毫秒）"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return {
+        'median_ms': float(np.median(samples)),
+        'min_ms': float(np.min(samples)),
+        'mean_ms': float(np.mean(samples)),
+        'repeat': repeat,
+    }
+
+
+def build_image_stages(image, params, pixel_to_um_x, pixel_to_um_y):
+    """
+    按检测流程准备各阶段的计时函数，每个阶段的输入预先计算好
+
+    返回:
+        [(阶段名, 无参函数), ...]
+    """
+    ok, encoded = cv2.imencode('.png', image)
+    if not ok:
+        raise IOError("PNG编码失败")
+
+    k = params['gaussian_kernel']
+    blurred = cv2.GaussianBlur(image, (k, k), 0)
+    binary = hole_engine.preprocess_image(image, params)
+    kernel = np.ones((3, 3), np.uint8)
+    # 与 hole_engine.preprocess_image 相同：自适应 ∧ OTSU ∧ 全局阈值，形态学在合并结果上计时
+    adaptive = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                                     params['adaptive_block_size'], params['adaptive_c'])
+    otsu = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    global_binary = cv2.threshold(blurred, params['binary_threshold'], 255, cv2.THRESH_BINARY)[1]
+    combined = cv2.bitwise_and(cv2.bitwise_and(otsu, adaptive), global_binary)
+
+    lines, _ = hole_engine.find_horizontal_lines(binary, params['row_projection_threshold'])
+    top_row = lines[params['top_line_index']] if len(lines) > params['top_line_index'] else image.shape[0] // 4
+    gap_row, hole_start, hole_end, _ = hole_engine.find_top_gap(binary, top_row, params['gap_min_width'])
+    detection = hole_engine.detect_hole_dimensions(binary, params, pixel_to_um_x, pixel_to_um_y)
+
+    def hole_edges():
+        hole_engine.find_hole_edges_at_row(binary, detection['upper_measure_row'], hole_start, hole_end)
+        hole_engine.find_hole_edges_at_row(binary, detection['lower_measure_row'], hole_start, hole_end)
+
+    return [
+        ('decode', lambda: image_io.decode_gray(encoded)),
+        ('decode_reduced_4', lambda: image_io.decode_gray(encoded, reduce=4)),
+        ('gaussian_blur', lambda: cv2.GaussianBlur(image, (k, k), 0)),
+        ('adaptive_threshold', lambda: cv2.adaptiveThreshold(
+            blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+            params['adaptive_block_size'], params['adaptive_c'])),
+        ('otsu', lambda: cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)),
+        ('morphology', lambda: cv2.morphologyEx(cv2.morphologyEx(combined, cv2.MORPH_OPEN, kernel),
+                                                cv2.MORPH_CLOSE, kernel)),
+        ('preprocess_total', lambda: hole_engine.preprocess_image(image, params)),
+        ('row_projection', lambda: hole_engine.find_horizontal_lines(binary, params['row_projection_threshold'])),
+        ('gap_search', lambda: hole_engine.find_top_gap(binary, top_row, params['gap_min_width'])),
+        ('bottom_search', lambda: hole_engine.find_bottom_short_line(binary, gap_row, hole_start, hole_end, params)),
+        ('hole_edges', hole_edges),
+        ('detect_total', lambda: hole_engine.detect_hole_dimensions(binary, params, pixel_to_um_x, pixel_to_um_y)),
+        ('taper', lambda: hole_engine.measure_taper(image, binary, detection['upper_surface_row'],
+                                                    detection['hole_start'], detection['hole_end'],
+                                                    params['bottom_search_range'])),
+        ('wall_profile', lambda: hole_engine.extract_wall_profile(binary, detection['upper_surface_row'],
+                                                                  detection['bottom_surface_row'],
+                                                                  detection['hole_start'], detection['hole_end'],
+                                                                  pixel_to_um_x, pixel_to_um_y)),
+        ('roughness', lambda: hole_engine.analyze_roughness(binary, detection['upper_surface_row'],
+                                                            detection['bottom_surface_row'],
+                                                            detection['hole_start'], detection['hole_end'],
+                                                            pixel_to_um_x, pixel_to_um_y)),
+    ]
+
+
+def build_point_stages(n_points=24, seed=0, batch_size=256):
+    """与图像尺寸无关的拟合阶段：circle_fit 的批量拟合，以及 oct_utils 的单圆几何拟合（缺少依赖时跳过）"""
+    rng = np.random.default_rng(seed)
+    angles = rng.uniform(0, 2 * np.pi, (batch_size, n_points))
+    batch = np.stack([500 + 100 * np.cos(angles), 300 + 100 * np.sin(angles)], axis=-1)
+    batch += rng.normal(0, 1.0, batch.shape)
+    points = batch[0]
+
+    stages = [
+        (f'fit_circles_taubin_x{batch_size}', lambda: circle_fit.fit_circles(batch, method='taubin')),
+        (f'refine_circles_x{batch_size}', lambda: circle_fit.refine_circles(batch)),
+    ]
+    try:
+        import oct_utils
+    except ImportError as e:
+        print(f"跳过 fit_circle_geometric: 无法导入 oct_utils ({e})")
+        return stages
+
+    return stages + [('fit_circle_geometric', lambda: oct_utils.fit_circle_geometric(points))]
+
+
+def run_benchmarks(sizes, repeat, stages=None, params=None):
+    """运行所有阶段，返回 {尺寸: {阶段: 统计}}"""
+    params = dict(hole_engine.DEFAULT_PARAMS, **(params or {}))
+    results = {}
+    for size in sizes:
+        width, height = parse_size(size)
+        image, pixel_to_um_x, pixel_to_um_y = make_benchmark_image(width, height)
+        results[size] = {}
+        print(f"[{size}]")
+        for name, func in build_image_stages(image, params, pixel_to_um_x, pixel_to_um_y):
+            if stages and name not in stages:
+                continue
+            try:
+                results[size][name] = time_stage(func, repeat)
+            except ImportError as e:
+                # 可选依赖缺失时跳过该阶段
+                print(f"  {name:<22s} 跳过: {e}")
+                continue
+            print(f"  {name:<22s} {results[size][name]['median_ms']:10.3f} ms")
+
+    point_stages = [s for s in build_point_stages() if not stages or s[0] in stages]
+    if point_stages:
+        results[POINTS_KEY] = {}
+        print(f"[{POINTS_KEY}]")
+        for name, func in point_stages:
+            results[POINTS_KEY][name] = time_stage(func, repeat)
+            print(f"  {name:<22s} {results[POINTS_KEY][name]['median_ms']:10.3f} ms")
+    return results
+
+
+def environment_info():
+    return {
+        'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """
+    与基准比较最小耗时（最小值受系统负载影响最小）
+
+    返回:
+        [(尺寸, 阶段, 基准ms, 当前ms, 比值), ...] 中超出容差的项
+    """
+    regressions = []
+    base_results = baseline.get('results', {})
+    print(f"\n与基准比较（容差 {tolerance:.0%}）:")
+    for size, stages in results.items():
+        for name, stats in stages.items():
+            base = base_results.get(size, {}).get(name)
+            if base is None:
+                print(f"  {size:>10s} {name:<22s} 无基准")
+                continue
+            ratio = stats['min_ms'] / max(base['min_ms'], 1e-9)
+            regressed = (ratio > 1 + tolerance and
+                         stats['min_ms'] - base['min_ms'] > MIN_REGRESSION_MS)
+            flag = "退化" if regressed else ("加速" if ratio < 1 - tolerance else "")
+            print(f"  {size:>10s} {name:<22s} {base['min_ms']:10.3f} -> {stats['min_ms']:10.3f} ms "
+                  f"({ratio:5.2f}x) {flag}")
+            if regressed:
+                regressions.append((size, name, base['min_ms'], stats['min_ms'], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="检测流程分阶段性能基准")
+    parser.add_argument('--sizes', default=','.join(DEFAULT_SIZES), help="图像尺寸列表，如 1024x768,2048x1536")
+    parser.add_argument('--repeat', type=int, default=5, help="每个阶段的重复次数")
+    parser.add_argument('--stages', help="只运行指定阶段，逗号分隔")
+    parser.add_argument('--params', help="检测参数JSON（默认使用 hole_engine.DEFAULT_PARAMS）")
+    parser.add_argument('--baseline', help="与该基准JSON比较")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="允许的相对变慢比例")
+    parser.add_argument('--save-baseline', help="将本次结果保存为基准JSON")
+    args = parser.parse_args(argv)
+
+    sizes = [s.strip() for s in args.sizes.split(',') if s.strip()]
+    stages = set(s.strip() for s in args.stages.split(',')) if args.stages else None
+    params = None
+    if args.params:
+        with open(args.params, 'r') as f:
+            params = json.load(f)
+
+    results = run_benchmarks(sizes, args.repeat, stages, params)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'meta': environment_info(), 'results': results}, f, indent=4)
+        print(f"\n基准已保存到: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n发现 {len(regressions)} 个阶段性能退化")
+            return 1
+        print("\n未发现性能退化")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
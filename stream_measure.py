@@ -0,0 +1,120 @@
+"""
+视频/图像序列流式测量工具
+
+从视频文件、编号图像序列或多页TIFF中逐帧读取，完成预处理和孔洞尺寸检测，
+把每帧的直径、深度写入时间序列CSV。帧不落盘，同时在处理中的帧数有上限，内存占用恒定。
+
+用法示例:
+    python stream_measure.py drilling.mp4 -o timeseries.csv --params params.json --step 5
+    python stream_measure.py "frames/img_%05d.png" --fps 30 --workers 4
+"""
+import sys
+import csv
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import hole_engine
+import frame_sources
+
+TIMESERIES_FIELDS = ['frame', 'time_s', 'status'] + hole_engine.DETECTION_FIELDS
+
+
+def measure_frame(frame, params, pixel_to_um_x=None, pixel_to_um_y=None):
+    """测量一帧，返回 TIMESERIES_FIELDS 对应的一行"""
+    row = {'frame': frame.index,
+           'time_s': None if frame.timestamp is None else round(frame.timestamp, 6)}
+    if frame.image is None:
+        row['status'] = 'error: 无法读取帧'
+        return row
+    try:
+        _, detection = hole_engine.measure_image(frame.image, params, pixel_to_um_x, pixel_to_um_y)
+    except Exception as e:
+        row['status'] = f'error: {e}'
+        return row
+    row['status'] = 'ok'
+    row.update(hole_engine.detection_summary(detection))
+    return row
+
+
+def measure_frames(frames, params, pixel_to_um_x=None, pixel_to_um_y=None, workers=1, max_pending=None):
+    """
+    按帧顺序产生测量结果
+
+    参数:
+        frames: Frame 迭代器（见 frame_sources）
+        workers: 线程数；OpenCV 运算释放 GIL，多线程可重叠解码与检测
+        max_pending: 同时在处理中的帧数上限，默认 workers 的 2 倍；读取端会等待，不会把整段视频读入内存
+
+    产生:
+        TIMESERIES_FIELDS 对应的字典
+    """
+    if workers <= 1:
+        for frame in frames:
+            yield measure_frame(frame, params, pixel_to_um_x, pixel_to_um_y)
+        return
+
+    max_pending = max_pending or workers * 2
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for frame in frames:
+            pending.append(executor.submit(measure_frame, frame, params, pixel_to_um_x, pixel_to_um_y))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="视频/图像序列流式孔洞测量")
+    parser.add_argument('source', help="视频文件、多页TIFF、图像文件夹、通配符或 printf 格式序列（如 img_%%04d.png）")
+    parser.add_argument('-o', '--output', default='timeseries.csv', help="输出时间序列CSV路径")
+    parser.add_argument('--params', help="检测参数JSON（默认使用 hole_engine.DEFAULT_PARAMS）")
+    parser.add_argument('--step', type=int, default=1, help="每隔多少帧测量一帧")
+    parser.add_argument('--start', type=int, default=0, help="起始帧号")
+    parser.add_argument('--stop', type=int, default=None, help="结束帧号（不含）")
+    parser.add_argument('--fps', type=float, default=None, help="图像序列/TIFF 的帧率，用于计算时间戳")
+    parser.add_argument('--workers', type=int, default=1, help="测量线程数")
+    args = parser.parse_args(argv)
+
+    params = dict(hole_engine.DEFAULT_PARAMS)
+    if args.params:
+        with open(args.params, 'r') as f:
+            params.update(json.load(f))
+
+    try:
+        frames = frame_sources.open_source(args.source, args.step, args.start, args.stop, args.fps)
+    except (IOError, ValueError) as e:
+        print(f"错误: {str(e)}")
+        return 1
+
+    print(f"来源: {args.source}（{frame_sources.source_kind(args.source)}），输出: {args.output}")
+    start_time = time.perf_counter()
+    processed = 0
+    failed = 0
+    with open(args.output, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=TIMESERIES_FIELDS)
+        writer.writeheader()
+        try:
+            for row in measure_frames(frames, params, workers=args.workers):
+                writer.writerow(row)
+                processed += 1
+                if row['status'] != 'ok':
+                    failed += 1
+                if processed % 100 == 0:
+                    f.flush()
+                    elapsed = time.perf_counter() - start_time
+                    print(f"  已处理 {processed} 帧（帧号 {row['frame']}），{processed / elapsed:.1f} 帧/秒")
+        except IOError as e:
+            print(f"读取来源时出错: {str(e)}")
+            return 1
+
+    elapsed = time.perf_counter() - start_time
+    print(f"完成: 共 {processed} 帧，失败 {failed} 帧，用时 {elapsed:.1f} 秒，结果已保存到: {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,433 @@
+"""
+合成孔洞截面图像生成器
+
+按给定的直径、深度、锥度、孔壁粗糙度、倾斜、底部短横线和OCT散斑渲染孔洞截面图，
+并可叠加与主界面 addNoise 相同模型的高斯/椒盐/泊松噪声。图像按行分块渲染，
+可生成16k像素级别的大图，用于可重复的精度与吞吐量测试。
+
+用法示例:
+    python synthetic_holes.py synthetic/ --count 20 --diameter 150:300 --depth 600:1200 --noise mixed
+生成的 ground_truth.csv 可直接作为 param_tuner.py 的参考值CSV。
+"""
+import os
+import sys
+import csv
+import argparse
+
+import numpy as np
+import cv2
+
+# 噪声类型编号与主界面 addNoise 一致
+NOISE_GAUSSIAN = 0
+NOISE_SALT_PEPPER = 1
+NOISE_POISSON = 2
+NOISE_TYPES = {
+    'gaussian': NOISE_GAUSSIAN,
+    'salt_pepper': NOISE_SALT_PEPPER,
+    'poisson': NOISE_POISSON,
+}
+
+# 默认截面参数（长度单位为微米）
+DEFAULT_SPEC = {
+    'width': 2000,  # 图像宽度（像素）
+    'height': 1500,  # 图像高度（像素）
+    'pixel_to_um_x': 1.60,  # X方向像素到微米的转换比例
+    'pixel_to_um_y': 1.94,  # Y方向像素到微米的转换比例
+    'diameter_um': 200.0,  # 孔口直径
+    'depth_um': 1000.0,  # 孔深
+    'taper_angle_deg': 1.0,  # 孔壁相对竖直方向的倾角（单侧）
+    'wall_roughness_um': 0.0,  # 孔壁位置起伏的标准差
+    'roughness_correlation_px': 15,  # 孔壁起伏的相关长度（像素）
+    'tilt_deg': 0.0,  # 整个截面的倾斜角
+    'surface_row_ratio': 0.25,  # 上表面所在位置（占图像高度的比例）
+    'reference_line': True,  # 是否在上表面上方绘制参考水平线（对应默认 top_line_index=1）
+    'reference_offset_px': 60,  # 参考线位于上表面上方的距离
+    'line_thickness_px': 5,  # 表面线、底部短横线的厚度
+    'wall_thickness_px': 3,  # 孔壁亮线厚度
+    'bottom_line_ratio': 0.8,  # 底部短横线长度占孔底宽度的比例
+    'background': 30,  # 背景灰度
+    'line_intensity': 220,  # 表面线和底部短横线灰度
+    'wall_intensity': 200,  # 孔壁灰度
+    'speckle_contrast': 0.0,  # OCT散斑对比度（0表示无散斑）
+    'noise_type': None,  # 'gaussian'、'salt_pepper'、'poisson' 或 None
+    'noise_seed': 0,  # 噪声强度等级，与 addNoise 的 seed 含义相同
+    'seed': 0,  # 随机种子（粗糙度、散斑、分块噪声）
+}
+
+# 分块渲染时每块的行数
+STRIP_ROWS = 512
+
+
+def noise_parameters(noise_type, seed=0):
+    """
+    返回 addNoise 中各噪声模型的强度参数
+
+    高斯噪声返回标准差，椒盐噪声返回噪声像素比例，泊松噪声返回量化因子
+    """
+    if noise_type == NOISE_GAUSSIAN:
+        return 25.0 + seed * 5
+    if noise_type == NOISE_SALT_PEPPER:
+        return 0.01 + seed * 0.005
+    if noise_type == NOISE_POISSON:
+        return 5.0 - seed * 0.5
+    raise ValueError(f"未知的噪声类型: {noise_type}")
+
+
+def add_noise(image, noise_type, seed=0):
+    """
+    添加不同类型的噪声（主界面 addNoise 的实现）
+
+    使用全局随机种子 np.random.seed(seed)，与历史结果逐像素一致。
+    """
+    np.random.seed(seed)  # 设置随机种子以获得可重现的结果
+    noisy_image = image.copy().astype(np.float32)
+
+    if noise_type == NOISE_GAUSSIAN:  # 高斯噪声
+        sigma = noise_parameters(noise_type, seed)
+        gauss = np.random.normal(0, sigma, image.shape)
+        noisy_image = noisy_image + gauss
+
+    elif noise_type == NOISE_SALT_PEPPER:  # 椒盐噪声
+        s_vs_p = 0.5
+        amount = noise_parameters(noise_type, seed)
+        # 添加盐噪声
+        salt_mask = np.random.random(image.shape) < (amount * s_vs_p)
+        noisy_image[salt_mask] = 255
+        # 添加椒噪声
+        pepper_mask = np.random.random(image.shape) < (amount * (1.0 - s_vs_p))
+        noisy_image[pepper_mask] = 0
+
+    elif noise_type == NOISE_POISSON:  # 泊松噪声
+        factor = noise_parameters(noise_type, seed)
+        noisy_image = np.random.poisson(noisy_image / factor) * factor
+
+    # 确保值在[0, 255]范围内
+    noisy_image = np.clip(noisy_image, 0, 255).astype(np.uint8)
+    return noisy_image
+
+
+def _add_noise_strip(strip, noise_type, level, rng):
+    """对一块图像原地添加噪声（strip为uint8，rng为np.random.Generator）"""
+    if noise_type == NOISE_GAUSSIAN:
+        noisy = strip + rng.normal(0, level, strip.shape).astype(np.float32)
+    elif noise_type == NOISE_SALT_PEPPER:
+        noisy = strip.astype(np.float32)
+        noisy[rng.random(strip.shape, dtype=np.float32) < level * 0.5] = 255
+        noisy[rng.random(strip.shape, dtype=np.float32) < level * 0.5] = 0
+    elif noise_type == NOISE_POISSON:
+        noisy = rng.poisson(strip / level).astype(np.float32) * level
+    else:
+        raise ValueError(f"未知的噪声类型: {noise_type}")
+    np.clip(noisy, 0, 255, out=noisy)
+    strip[...] = noisy.astype(np.uint8)
+
+
+def add_noise_strips(image, noise_type, seed=0, strip_rows=STRIP_ROWS, rng_seed=None):
+    """
+    按行分块添加与 add_noise 相同模型和强度的噪声，内存占用与图像行数无关
+
+    各块使用独立的随机数发生器，结果可重现，但与 add_noise 的随机序列不同。
+
+    参数:
+        image: uint8 灰度图像，原地修改
+        noise_type: 噪声类型编号
+        seed: 噪声强度等级
+        rng_seed: 随机种子，默认与 seed 相同
+    """
+    level = noise_parameters(noise_type, seed)
+    if rng_seed is None:
+        rng_seed = seed
+    for index, start in enumerate(range(0, image.shape[0], strip_rows)):
+        rng = np.random.default_rng([rng_seed, index])
+        _add_noise_strip(image[start:start + strip_rows], noise_type, level, rng)
+    return image
+
+
+def _wall_offsets(length, sigma_px, correlation_px, rng):
+    """生成平滑的孔壁起伏序列（像素）"""
+    if sigma_px <= 0 or length <= 0:
+        return np.zeros(length, dtype=np.float32)
+    raw = rng.normal(0, 1, length + 4 * correlation_px)
+    window = max(int(correlation_px), 1)
+    kernel = np.exp(-0.5 * (np.arange(-2 * window, 2 * window + 1) / window) ** 2)
+    smooth = np.convolve(raw, kernel / kernel.sum(), mode='same')[2 * correlation_px:2 * correlation_px + length]
+    std = smooth.std()
+    if std > 0:
+        smooth = smooth / std * sigma_px
+    return smooth.astype(np.float32)
+
+
+def compute_ground_truth(spec):
+    """
+    计算截面的几何真值（像素位置与微米尺寸）
+
+    直径真值的定义与 hole_engine 一致：标准直径为上表面下0.1mm和底部上0.1mm处直径的平均值。
+    """
+    px_x = spec['pixel_to_um_x']
+    px_y = spec['pixel_to_um_y']
+    tan_a = np.tan(np.radians(spec['taper_angle_deg']))
+
+    surface_row = int(round(spec['height'] * spec['surface_row_ratio']))
+    bottom_row = surface_row + int(round(spec['depth_um'] / px_y))
+    depth_um = (bottom_row - surface_row) * px_y
+    center_x = spec['width'] / 2.0
+
+    top_diameter = spec['diameter_um']
+    bottom_diameter = top_diameter - 2 * depth_um * tan_a
+    upper_diameter = top_diameter - 2 * 100.0 * tan_a
+    lower_diameter = bottom_diameter + 2 * 100.0 * tan_a
+
+    return {
+        'surface_row': surface_row,
+        'bottom_row': bottom_row,
+        'center_x': center_x,
+        'hole_start': int(round(center_x - top_diameter / px_x / 2)),
+        'hole_end': int(round(center_x + top_diameter / px_x / 2)),
+        'diameter': (upper_diameter + lower_diameter) / 2,
+        'depth': depth_um,
+        'top_diameter': top_diameter,
+        'bottom_diameter': bottom_diameter,
+        'upper_diameter_at_01mm': upper_diameter,
+        'lower_diameter_at_01mm': lower_diameter,
+        'taper_angle_deg': spec['taper_angle_deg'],
+    }
+
+
+def render_cross_section(spec=None, **overrides):
+    """
+    渲染一张合成孔洞截面图
+
+    参数:
+        spec: 参数字典，缺省项取 DEFAULT_SPEC
+        overrides: 单独覆盖的参数
+
+    返回:
+        (uint8 灰度图像, 真值字典)
+    """
+    params = dict(DEFAULT_SPEC)
+    if spec:
+        params.update(spec)
+    params.update(overrides)
+
+    width = int(params['width'])
+    height = int(params['height'])
+    truth = compute_ground_truth(params)
+    surface_row = truth['surface_row']
+    bottom_row = truth['bottom_row']
+    center_x = truth['center_x']
+
+    half_line = params['line_thickness_px'] / 2.0
+    if bottom_row + half_line >= height or bottom_row - surface_row < 120:
+        raise ValueError(f"孔深 {params['depth_um']}μm 与图像高度 {height}px 不匹配")
+    if truth['bottom_diameter'] <= 0:
+        raise ValueError("锥度过大，孔底宽度小于0")
+
+    rng = np.random.default_rng(params['seed'])
+    px_x = params['pixel_to_um_x']
+    px_y = params['pixel_to_um_y']
+    tan_a = np.tan(np.radians(params['taper_angle_deg']))
+
+    # 每一行的孔壁位置（孔内区域为 [left, right)）
+    rows = np.arange(height, dtype=np.float32)
+    depth_um = np.clip(rows - surface_row, 0, bottom_row - surface_row) * px_y
+    half_width = (params['diameter_um'] / 2 - depth_um * tan_a) / px_x
+    sigma_px = params['wall_roughness_um'] / px_x
+    correlation = int(params['roughness_correlation_px'])
+    left_wall = center_x - half_width + _wall_offsets(height, sigma_px, correlation, rng)
+    right_wall = center_x + half_width + _wall_offsets(height, sigma_px, correlation, rng)
+
+    # 孔口和孔底宽度使用名义值，保证缺口和短横线位置与真值一致
+    top_left, top_right = truth['hole_start'], truth['hole_end']
+    bottom_half = truth['bottom_diameter'] / px_x / 2 * params['bottom_line_ratio']
+
+    reference_row = surface_row - params['reference_offset_px']
+    wall_thickness = params['wall_thickness_px']
+    background = np.float32(params['background'])
+    line_value = np.float32(params['line_intensity'])
+    wall_value = np.float32(params['wall_intensity'])
+
+    theta = np.radians(params['tilt_deg'])
+    cos_t, sin_t = np.float32(np.cos(theta)), np.float32(np.sin(theta))
+    cx0, cy0 = np.float32(width / 2.0), np.float32(height / 2.0)
+    xs = np.arange(width, dtype=np.float32)[None, :]
+
+    speckle = params['speckle_contrast']
+    noise_type = params['noise_type']
+    if isinstance(noise_type, str):
+        noise_type = NOISE_TYPES[noise_type]
+
+    image = np.empty((height, width), dtype=np.uint8)
+    for index, start in enumerate(range(0, height, STRIP_ROWS)):
+        stop = min(height, start + STRIP_ROWS)
+        ys = np.arange(start, stop, dtype=np.float32)[:, None]
+
+        # 图像坐标转换到截面坐标（绕图像中心旋转）
+        if theta != 0:
+            u = cos_t * (xs - cx0) + sin_t * (ys - cy0) + cx0
+            v = -sin_t * (xs - cx0) + cos_t * (ys - cy0) + cy0
+        else:
+            u = np.broadcast_to(xs, (stop - start, width))
+            v = np.broadcast_to(ys, (stop - start, width))
+
+        row_index = np.clip(np.rint(v).astype(np.int32), 0, height - 1)
+        left = left_wall[row_index]
+        right = right_wall[row_index]
+
+        strip = np.full((stop - start, width), background, dtype=np.float32)
+
+        # 孔壁
+        in_depth = (v >= surface_row) & (v <= bottom_row)
+        wall = in_depth & (((u >= left - wall_thickness) & (u < left)) |
+                           ((u >= right) & (u < right + wall_thickness)))
+        strip[wall] = wall_value
+
+        # 上表面（孔口处断开）
+        surface = (np.abs(v - surface_row) <= half_line) & ((u < top_left) | (u >= top_right))
+        strip[surface] = line_value
+
+        # 参考线
+        if params['reference_line']:
+            strip[np.abs(v - reference_row) <= half_line] = line_value
+
+        # 底部短横线
+        bottom = (np.abs(v - bottom_row) <= half_line) & (np.abs(u - center_x) < bottom_half)
+        strip[bottom] = line_value
+
+        rng_strip = np.random.default_rng([params['seed'], index])
+
+        # OCT散斑：乘性Gamma分布，均值为1，对比度为 1/sqrt(L)
+        if speckle > 0:
+            looks = 1.0 / (speckle * speckle)
+            strip *= rng_strip.gamma(looks, 1.0 / looks, strip.shape).astype(np.float32)
+
+        np.clip(strip, 0, 255, out=strip)
+        image[start:stop] = strip.astype(np.uint8)
+
+        if noise_type is not None:
+            level = noise_parameters(noise_type, params['noise_seed'])
+            _add_noise_strip(image[start:stop], noise_type, level, rng_strip)
+
+    truth['tilt_deg'] = params['tilt_deg']
+    truth['wall_roughness_um'] = params['wall_roughness_um']
+    truth['speckle_contrast'] = speckle
+    truth['noise_type'] = params['noise_type'] or 'none'
+    truth['noise_seed'] = params['noise_seed']
+    truth['width'] = width
+    truth['height'] = height
+    return image, truth
+
+
+def _parse_range(text):
+    """解析 'a' 或 'a:b' 形式的取值范围"""
+    parts = [float(p) for p in str(text).split(':')]
+    if len(parts) == 1:
+        return parts[0], parts[0]
+    return parts[0], parts[1]
+
+
+def save_image(path, image):
+    """保存图像，支持中文路径"""
+    ext = os.path.splitext(path)[1] or '.png'
+    ok, buffer = cv2.imencode(ext, image)
+    if not ok:
+        raise IOError(f"无法编码图像: {path}")
+    buffer.tofile(path)
+
+
+GROUND_TRUTH_FIELDS = ['filename', 'diameter', 'depth', 'top_diameter', 'bottom_diameter',
+                       'upper_diameter_at_01mm', 'lower_diameter_at_01mm', 'taper_angle_deg',
+                       'surface_row', 'bottom_row', 'hole_start', 'hole_end', 'tilt_deg',
+                       'wall_roughness_um', 'speckle_contrast', 'noise_type', 'noise_seed',
+                       'width', 'height']
+
+
+def generate_dataset(output_dir, count, ranges, base_spec=None, seed=0, ext='.png'):
+    """
+    批量生成合成图像和真值CSV
+
+    参数:
+        output_dir: 输出目录
+        count: 图像数量
+        ranges: {参数名: (最小值, 最大值)}，每张图像在范围内均匀采样
+        base_spec: 固定参数
+        seed: 随机种子
+
+    返回:
+        真值CSV路径
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    noise_cycle = [None, 'gaussian', 'salt_pepper', 'poisson']
+
+    csv_path = os.path.join(output_dir, 'ground_truth.csv')
+    with open(csv_path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=GROUND_TRUTH_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for i in range(count):
+            spec = dict(base_spec or {})
+            for key, (low, high) in ranges.items():
+                spec[key] = float(rng.uniform(low, high)) if high > low else low
+            if spec.get('noise_type') == 'mixed':
+                spec['noise_type'] = noise_cycle[i % len(noise_cycle)]
+            spec['seed'] = seed * 100003 + i
+
+            image, truth = render_cross_section(spec)
+            filename = f"synthetic_{i:04d}{ext}"
+            save_image(os.path.join(output_dir, filename), image)
+            truth['filename'] = filename
+            writer.writerow(truth)
+            print(f"已生成 {filename}: 直径 {truth['diameter']:.2f}μm, 深度 {truth['depth']:.2f}μm")
+    return csv_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="合成孔洞截面图像生成器")
+    parser.add_argument('output_dir', help="输出目录")
+    parser.add_argument('--count', type=int, default=10, help="生成数量")
+    parser.add_argument('--width', type=int, default=DEFAULT_SPEC['width'], help="图像宽度（像素）")
+    parser.add_argument('--height', type=int, default=DEFAULT_SPEC['height'], help="图像高度（像素）")
+    parser.add_argument('--pixel-to-um-x', type=float, default=DEFAULT_SPEC['pixel_to_um_x'])
+    parser.add_argument('--pixel-to-um-y', type=float, default=DEFAULT_SPEC['pixel_to_um_y'])
+    parser.add_argument('--diameter', default='150:300', help="孔口直径范围（μm），如 150:300")
+    parser.add_argument('--depth', default='600:1200', help="孔深范围（μm）")
+    parser.add_argument('--taper', default='0:2', help="孔壁倾角范围（度）")
+    parser.add_argument('--roughness', default='0:2', help="孔壁粗糙度范围（μm）")
+    parser.add_argument('--tilt', default='0', help="截面倾斜角范围（度）")
+    parser.add_argument('--speckle', default='0', help="散斑对比度范围，0~1")
+    parser.add_argument('--noise', choices=['none', 'gaussian', 'salt_pepper', 'poisson', 'mixed'],
+                        default='none', help="叠加噪声类型，mixed 表示轮流使用")
+    parser.add_argument('--noise-seed', type=int, default=0, help="噪声强度等级（同 addNoise 的 seed）")
+    parser.add_argument('--no-reference-line', action='store_true', help="不绘制上表面上方的参考线")
+    parser.add_argument('--format', default='.png', help="图像格式扩展名")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子")
+    args = parser.parse_args(argv)
+
+    base_spec = {
+        'width': args.width,
+        'height': args.height,
+        'pixel_to_um_x': args.pixel_to_um_x,
+        'pixel_to_um_y': args.pixel_to_um_y,
+        'noise_type': None if args.noise == 'none' else args.noise,
+        'noise_seed': args.noise_seed,
+        'reference_line': not args.no_reference_line,
+    }
+    ranges = {
+        'diameter_um': _parse_range(args.diameter),
+        'depth_um': _parse_range(args.depth),
+        'taper_angle_deg': _parse_range(args.taper),
+        'wall_roughness_um': _parse_range(args.roughness),
+        'tilt_deg': _parse_range(args.tilt),
+        'speckle_contrast': _parse_range(args.speckle),
+    }
+
+    try:
+        csv_path = generate_dataset(args.output_dir, args.count, ranges, base_spec, args.seed, args.format)
+    except ValueError as e:
+        print(f"错误: {e}")
+        return 1
+    print(f"真值已保存到: {csv_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())